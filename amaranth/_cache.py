@@ -0,0 +1,96 @@
+import os
+import hashlib
+import tempfile
+import functools
+from contextlib import contextmanager
+
+from . import __version__
+
+
+__all__ = ["cache_dir", "source_digest", "replace_atomically", "trim_cache_dir"]
+
+
+def cache_dir(name, *, default):
+    """Return the directory of the on-disk cache called ``name``, or ``None`` if it is disabled.
+
+    The cache is configured by the ``AMARANTH_{name}_cache`` environment variable. It is disabled
+    if the variable is ``0``, and it is stored at the path given by the variable if it is not
+    a boolean value. Otherwise, the directory ``amaranth/{name}`` in the user cache directory is
+    used if the variable is ``1``, or if it is unset and ``default`` is true.
+    """
+    setting = os.getenv(f"AMARANTH_{name}_cache", "")
+    if setting in ("0", "off", "no", "false") or (setting == "" and not default):
+        return None
+    elif setting not in ("", "1", "on", "yes", "true"):
+        return setting
+    cache_home = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "amaranth", name)
+
+
+@functools.lru_cache(maxsize=None)
+def source_digest(*modules):
+    """Return a digest of the source code of ``modules``.
+
+    The digest is included in the keys of on-disk caches whose entries are generated by these
+    modules, since the version of Amaranth does not change when a source checkout is edited.
+    If the source of a module cannot be read, its name and the version of Amaranth are used.
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(module.__name__.encode())
+        digest.update(b"\0")
+        try:
+            with open(module.__file__, "rb") as file:
+                digest.update(file.read())
+        except (OSError, TypeError, AttributeError):
+            digest.update(__version__.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@contextmanager
+def replace_atomically(directory, filename):
+    """Create ``filename`` in ``directory`` from the file at the path returned by the context
+    manager, once its body completes.
+
+    The file is written under a temporary name first, so that concurrent processes never observe
+    a partially written entry. If the body raises an exception, the temporary file is removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    os.close(fd)
+    try:
+        yield temp_path
+        os.replace(temp_path, os.path.join(directory, filename))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def trim_cache_dir(directory, limit, *, suffix):
+    """Evict the least recently used files whose names end with ``suffix`` from ``directory``
+    until their total size is at most ``limit`` bytes.
+
+    Files are considered used when they are modified; readers of the cache update
+    the modification time of the entries they use.
+    """
+    try:
+        entries = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith(suffix) and not entry.name.startswith(".tmp_"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+    total_size = sum(size for _mtime, size, _path in entries)
+    entries.sort()
+    for _mtime, size, path in entries:
+        if total_size <= limit:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        total_size -= size
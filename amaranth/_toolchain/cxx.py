@@ -0,0 +1,74 @@
+import os
+import sys
+import shlex
+import tempfile
+import subprocess
+
+from . import require_tool
+
+
+__all__ = ["CxxError", "shared_library_suffix", "build_cxx"]
+
+
+class CxxError(Exception):
+    pass
+
+
+def shared_library_suffix():
+    if sys.platform == "win32":
+        return ".dll"
+    elif sys.platform == "darwin":
+        return ".dylib"
+    else:
+        return ".so"
+
+
+def build_cxx(*, cxx_sources, output_path, include_dirs=(), macros=(), flags=()):
+    """Build C++ sources into a shared library.
+
+    The compiler is taken from the ``CXX`` environment variable (``c++`` by default), and
+    additional flags from the ``CXXFLAGS`` environment variable (``-O1`` by default).
+
+    Arguments
+    ---------
+    cxx_sources : dict of str to str
+        Mapping from file names to the contents of C++ source files. All of the files are written
+        to a temporary directory, which is also added to the include path, and the ones with
+        a ``.cc`` or ``.cpp`` extension are compiled.
+    output_path : str
+        Path of the shared library to build.
+    include_dirs : iterable of str
+        Additional include directories.
+    macros : iterable of str
+        Preprocessor macros to define, as ``NAME`` or ``NAME=VALUE``.
+    flags : iterable of str
+        Additional compiler flags.
+
+    Raises
+    ------
+    :exc:`CxxError`
+        If the compiler fails.
+    """
+    cxx = require_tool("c++")
+    cxxflags = shlex.split(os.environ.get("CXXFLAGS", "-O1"))
+
+    with tempfile.TemporaryDirectory(prefix="amaranth_cxx_") as build_dir:
+        source_paths = []
+        for name, contents in cxx_sources.items():
+            path = os.path.join(build_dir, name)
+            with open(path, "w") as f:
+                f.write(contents)
+            if name.endswith((".cc", ".cpp")):
+                source_paths.append(path)
+
+        args = [cxx, "-std=c++14", "-shared", "-fPIC", *cxxflags, *flags, "-I", build_dir]
+        for include_dir in include_dirs:
+            args += ["-I", str(include_dir)]
+        for macro in macros:
+            args.append(f"-D{macro}")
+        args += ["-o", output_path, *source_paths]
+
+        result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                encoding="utf-8")
+        if result.returncode != 0:
+            raise CxxError(result.stdout.strip())
@@ -1,14 +1,22 @@
 from typing import Iterable
 from contextlib import contextmanager
 import io
-
+import os
+import sys
+import pickle
+import marshal
+import hashlib
+import multiprocessing
+import multiprocessing.connection
+
+from .. import __version__, _cache
 from ..utils import bits_for
 from .._utils import to_binary
 from ..lib import wiring
-from ..hdl import _ast, _ir, _nir
+from ..hdl import _ast, _ir, _nir, _xfrm
 
 
-__all__ = ["convert", "convert_fragment"]
+__all__ = ["ModuleCache", "convert", "convert_fragment"]
 
 
 _escape_map = str.maketrans({
@@ -85,6 +93,9 @@ class Emitter:
         yield
         self._indent = orig
 
+    def raw(self, text):
+        self._lines.append(text)
+
     def __str__(self):
         return "".join(self._lines)
 
@@ -99,6 +110,10 @@ class Design:
         self.modules[name] = res = Module(name, emit_src=self.emit_src, **kwargs)
         return res
 
+    def module_text(self, name, text):
+        assert name not in self.modules
+        self.modules[name] = ModuleText(text)
+
     def __str__(self):
         emitter = Emitter()
         for module in self.modules.values():
@@ -183,6 +198,15 @@ class Module:
         line()
 
 
+class ModuleText:
+    # A module that has already been emitted, and is included in the design as-is.
+    def __init__(self, text):
+        self.text = text
+
+    def emit(self, line):
+        line.raw(self.text)
+
+
 def _make_attributes(attrs, src_loc):
     res = {}
     if src_loc is not None:
@@ -1287,21 +1311,437 @@ class EmptyModuleChecker:
         return module_idx in self.empty
 
 
-def convert_fragment(fragment, ports=(), name="top", *, emit_src=True, **kwargs):
-    assert isinstance(fragment, (_ir.Fragment, _ir.Design))
-    name_map = _ast.SignalDict()
-    netlist = _ir.build_netlist(fragment, ports=ports, name=name, **kwargs)
+# Total size of an on-disk module cache after which the least recently used modules are evicted.
+_DISK_CACHE_LIMIT = 256 << 20
+
+
+class ModuleCache:
+    """Cache of the RTLIL text of netlist modules.
+
+    Converting a design with a cache emits RTLIL only for the modules that have changed since
+    they were last emitted with the same cache. The rest of the modules are included in the output
+    as they were emitted before. A module is identified by a digest of its structure: its name,
+    ports, signals, submodules, and cells (including their attributes and source locations), but
+    not the global numbering of cells and nets, which changes whenever any other part of
+    the design does.
+
+    The cache can be passed to :func:`convert` and :func:`convert_fragment` as :py:`cache=`. If it
+    is not, a cache in the directory specified by the ``AMARANTH_rtlil_cache`` environment
+    variable is used, if it is set; when set to :py:`1`, the directory ``amaranth/rtlil`` in
+    the user cache directory is used.
+
+    Arguments
+    ---------
+    path : :class:`str` or :py:`None`
+        Directory where the cache is stored, which is created if it does not exist. Once its
+        total size exceeds 256 MiB, the least recently used modules are evicted from it. If
+        :py:`None`, the cache is only kept in memory.
+
+    Attributes
+    ----------
+    hits : :class:`int`
+        Number of modules that were included from the cache.
+    misses : :class:`int`
+        Number of modules that were emitted and added to the cache.
+    """
+    def __init__(self, path=None):
+        self.path   = None if path is None else os.fspath(path)
+        self.hits   = 0
+        self.misses = 0
+        # Entries of a cache stored in a directory are only kept on the disk.
+        self._entries = {}
+
+    def _load(self, key):
+        if self.path is None:
+            return self._entries.get(key)
+        path = os.path.join(self.path, f"{key}.marshal")
+        try:
+            with open(path, "rb") as file:
+                entry = marshal.load(file)
+            # Mark the entry as recently used, for eviction.
+            os.utime(path)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return entry
+
+    def _store(self, key, entry):
+        if self.path is None:
+            self._entries[key] = entry
+            return
+        try:
+            with _cache.replace_atomically(self.path, f"{key}.marshal") as temp_path:
+                with open(temp_path, "wb") as file:
+                    marshal.dump(entry, file)
+        except OSError:
+            pass
+
+    def _trim(self, limit=None):
+        if self.path is not None:
+            _cache.trim_cache_dir(self.path, _DISK_CACHE_LIMIT if limit is None else limit,
+                                  suffix=".marshal")
+
+    def __repr__(self):
+        return f"ModuleCache({self.path!r})"
+
+
+_default_caches = {} # path -> ModuleCache
+
+
+def _default_cache():
+    # Conversion is only cached when requested with `AMARANTH_rtlil_cache=1`, or with the path
+    # to a cache directory.
+    path = _cache.cache_dir("rtlil", default=False)
+    if path is None:
+        return None
+    if path not in _default_caches:
+        _default_caches[path] = ModuleCache(path)
+    return _default_caches[path]
+
+
+_nir_slot_names = {} # type -> tuple of attribute names
+
+
+def _nir_slots(cls):
+    if cls not in _nir_slot_names:
+        _nir_slot_names[cls] = tuple(name for base in reversed(cls.__mro__)
+                                     for name in getattr(base, "__slots__", ()))
+    return _nir_slot_names[cls]
+
+
+def _module_key(netlist, module_idx, empty_checker, *, is_top, emit_src):
+    # Everything that `ModuleEmitter` reads is included in the key, with the cells and nets
+    # numbered in the order in which they are encountered in the module.
+    module = netlist.modules[module_idx]
+    local_cells = {cell_idx: ordinal for ordinal, cell_idx in enumerate(module.cells)}
+    nets = {_nir.Net.from_const(0): 0, _nir.Net.from_const(1): 1}
+    ionets = {}
+
+    def canonical_net(net):
+        if net.cell in local_cells:
+            nets[net] = ((local_cells[net.cell] + 1) << 16) | net.bit
+        else:
+            nets[net] = -len(nets)
+        return nets[net]
+
+    def canonical(obj):
+        if isinstance(obj, _nir.Value):
+            return tuple([nets[net] if net in nets else canonical_net(net) for net in obj])
+        elif isinstance(obj, _nir.Net):
+            return nets[obj] if obj in nets else canonical_net(obj)
+        elif isinstance(obj, _nir.IONet):
+            if obj not in ionets:
+                ionets[obj] = len(ionets)
+            return ionets[obj]
+        elif isinstance(obj, (tuple, list)):
+            return tuple(canonical(item) for item in obj)
+        elif isinstance(obj, dict):
+            return tuple((key, canonical(value)) for key, value in obj.items())
+        elif isinstance(obj, (_nir.Cell, _nir.Assignment, _nir.Format, _nir.FormatValue,
+                              _nir.SignalField)):
+            fields = [type(obj).__name__]
+            for name in _nir_slots(type(obj)):
+                value = getattr(obj, name)
+                if name == "module_idx":
+                    continue
+                elif name == "memory":
+                    value = local_cells[value]
+                elif name == "transparent_for":
+                    value = tuple(local_cells[cell_idx] for cell_idx in value)
+                else:
+                    value = canonical(value)
+                fields.append((name, value))
+            return tuple(fields)
+        else:
+            return obj
+
+    signals = []
+    for signal, name in module.signal_names.items():
+        shape = signal.shape()
+        signals.append((name, shape.width, shape.signed, canonical(signal.attrs), signal.src_loc,
+                        canonical(netlist.signals[signal]),
+                        canonical(netlist.signal_fields[signal])))
+    io_ports = []
+    for name, (value, dir) in module.io_ports.items():
+        if module.parent is None:
+            port = netlist.io_ports[value[0].port]
+            io_ports.append((name, canonical(value), dir, canonical(port.attrs), port.src_loc))
+        else:
+            io_ports.append((name, canonical(value), dir))
+    submodules = []
+    for submodule_idx in module.submodules:
+        submodule = netlist.modules[submodule_idx]
+        submodules.append((submodule.name, empty_checker.is_empty(submodule_idx),
+                           submodule.cell_src_loc, canonical(submodule.ports),
+                           canonical(submodule.io_ports)))
+    # The priority of `$print` and `$check` cells is derived from the global index of the cell.
+    priorities = tuple(cell_idx for cell_idx in module.cells
+                       if isinstance(netlist.cells[cell_idx], (_nir.AsyncPrint, _nir.SyncPrint,
+                                                               _nir.AsyncProperty,
+                                                               _nir.SyncProperty)))
+    # The emitted text also depends on the emitter and the lowering of the netlist, which may be
+    # edited without changing the version of Amaranth.
+    structure = (
+        __version__, _cache.source_digest(sys.modules[__name__], _ir, _nir),
+        is_top, emit_src, module.name, module.src_loc,
+        canonical(module.ports), tuple(io_ports), tuple(signals), tuple(submodules),
+        tuple(canonical(netlist.cells[cell_idx]) for cell_idx in module.cells), priorities,
+    )
+    return hashlib.sha256(repr(structure).encode()).hexdigest()
+
+
+def _convert_netlist(builder, netlist, name_map, *, is_definition=False, cache=None):
     empty_checker = EmptyModuleChecker(netlist)
-    builder = Design(emit_src=emit_src)
     for module_idx, module in enumerate(netlist.modules):
-        if empty_checker.is_empty(module_idx):
+        # The module of a definition is instantiated by name, so it is emitted even if empty.
+        if empty_checker.is_empty(module_idx) and not (is_definition and module_idx == 0):
             continue
-        module_builder = builder.module(".".join(module.name), src_loc=module.src_loc)
-        if module_idx == 0:
+        name = ".".join(module.name)
+        is_top = module_idx == 0 and not is_definition
+        if cache is not None:
+            key = _module_key(netlist, module_idx, empty_checker,
+                              is_top=is_top, emit_src=builder.emit_src)
+            entry = cache._load(key)
+            if entry is not None:
+                text, signal_names = entry
+                builder.module_text(name, text)
+                for signal, signal_name in zip(module.signal_names, signal_names):
+                    name_map[signal] = (*module.name, signal_name)
+                cache.hits += 1
+                continue
+        module_builder = builder.module(name, src_loc=module.src_loc)
+        if is_top:
             module_builder.attribute("top", 1)
         ModuleEmitter(module_builder, netlist, module, name_map,
                       empty_checker=empty_checker).emit()
-    return str(builder), name_map
+        if cache is not None:
+            emitter = Emitter()
+            module_builder.emit(emitter)
+            del builder.modules[name]
+            builder.module_text(name, str(emitter))
+            cache._store(key, (str(emitter), tuple(name_map[signal][-1]
+                                                   for signal in module.signal_names)))
+            cache.misses += 1
+
+
+def _convert_definition(definitions, variant, name_map, *, emit_src, all_undef_to_ff, cache):
+    _name, definition, _properties = variant
+    design = definitions.build(*variant)
+    netlist = _ir.build_netlist(design, all_undef_to_ff=all_undef_to_ff, definitions=definitions)
+    builder = Design(emit_src=emit_src)
+    definition_names = _ast.SignalDict()
+    _convert_netlist(builder, netlist, definition_names, is_definition=True, cache=cache)
+    # The signals of the clock and reset ports are created when the definition is built, and
+    # cannot be referenced by the caller, so they are not named.
+    domain_ports = {port_name for port_names in definition.domains.values()
+                              for port_name in port_names}
+    domain_signals = _ast.SignalSet(conn for port_name, conn, _dir in design.ports
+                                    if port_name in domain_ports)
+    name_map.update((signal, name) for signal, name in definition_names.items()
+                    if signal not in domain_signals)
+    return str(builder)
+
+
+class _SignalCollector(_xfrm.DomainCollector):
+    # Collects the signals of a fragment that may be named when its definition is converted.
+    def __init__(self):
+        super().__init__()
+        self.signals = _ast.SignalSet()
+
+    def on_Signal(self, value):
+        self.signals.add(value)
+
+    def on_fragment(self, fragment):
+        for domain in fragment.domains.values():
+            self.signals.add(domain.clk)
+            if domain.rst is not None:
+                self.signals.add(domain.rst)
+        super().on_fragment(fragment)
+
+
+def _nested_definitions(fragment):
+    for subfragment, _name, _src_loc in fragment.subfragments:
+        if isinstance(subfragment, _ir.DefinitionInstance):
+            yield subfragment.definition
+        else:
+            yield from _nested_definitions(subfragment)
+
+
+class _ForkedDefinitionVariants(_ir.DefinitionVariants):
+    # Module names are assigned by the parent process, which answers the workers in the order
+    # in which the definitions are emitted serially, so that the names do not depend on timing.
+    def __init__(self, conn):
+        super().__init__()
+        self.conn = conn
+
+    def resolve(self, design):
+        instances = [(fragment, self.variant(fragment), fragment_info.name)
+                     for fragment, fragment_info in design.fragments.items()
+                     if isinstance(fragment, _ir.DefinitionInstance)]
+        # Definitions are identified by their address, which is the same in the parent process.
+        self.conn.send(("resolve", [(id(definition), properties, hierarchy)
+                                    for _fragment, (definition, properties), hierarchy
+                                    in instances]))
+        for (fragment, _variant, _hierarchy), name in zip(instances, self.conn.recv()):
+            fragment.type = name
+
+
+def _convert_definition_worker(variant, signals, conn, kwargs):
+    cache = kwargs["cache"]
+    if cache is not None:
+        # Statistics are reported to the parent process, which adds them to its own.
+        cache.hits = cache.misses = 0
+    try:
+        name_map = _ast.SignalDict()
+        text = _convert_definition(_ForkedDefinitionVariants(conn), variant, name_map, **kwargs)
+    except Exception:
+        # The parent process converts the definition again to report the error.
+        conn.send(("error", None))
+    else:
+        # Signals are identified by their position in `signals`, which is the same list in
+        # the parent process.
+        positions = _ast.SignalDict((signal, position) for position, signal in enumerate(signals))
+        names = [(positions[signal], name) for signal, name in name_map.items()
+                 if signal in positions]
+        if cache is not None:
+            conn.send(("done", (text, names, cache.hits, cache.misses)))
+        else:
+            conn.send(("done", (text, names, 0, 0)))
+    conn.close()
+
+
+def _convert_definitions_forked(definitions, name_map, *, workers, **kwargs):
+    context = multiprocessing.get_context("fork")
+
+    variants = [] # in the order in which they are emitted serially
+    texts    = {} # variant index -> RTLIL text
+    requests = {} # variant index -> instances of definitions that are waiting for a module name
+    failed   = set()
+    running  = {} # connection -> (variant index, process)
+    conns    = {} # variant index -> connection
+    known    = {} # id(definition) -> definition
+    signals  = {} # variant index -> signals that may be named by the worker
+    signal_names = {} # variant index -> names of signals
+    next_start = next_resolve = 0
+
+    def convert_here(index):
+        signal_names[index] = _ast.SignalDict()
+        texts[index] = _convert_definition(definitions, variants[index], signal_names[index],
+                                           **kwargs)
+
+    variants += definitions.pending
+    definitions.pending.clear()
+    try:
+        while next_resolve < len(variants) or running:
+            while next_start < len(variants) and len(running) < workers:
+                _name, definition, _properties = variants[next_start]
+                known.update((id(nested), nested)
+                             for nested in _nested_definitions(definition.fragment))
+                collector = _SignalCollector()
+                collector(definition.fragment)
+                signals[next_start] = list(collector.signals)
+                conn, child_conn = context.Pipe()
+                process = context.Process(target=_convert_definition_worker,
+                    args=(variants[next_start], signals[next_start], child_conn, kwargs),
+                    daemon=True)
+                process.start()
+                child_conn.close()
+                running[conn] = next_start, process
+                conns[next_start] = conn
+                next_start += 1
+
+            # Instances of definitions are named in the same order as in `convert_fragment`, so
+            # a variant is only named once every variant preceding it has been.
+            while next_resolve < len(variants):
+                if next_resolve in requests:
+                    names = [definitions.claim((known[definition_id], properties), hierarchy)
+                             for definition_id, properties, hierarchy
+                             in requests.pop(next_resolve)]
+                    try:
+                        conns[next_resolve].send(names)
+                    except OSError:
+                        pass # the worker exited; this is handled when its connection is closed
+                elif next_resolve in failed:
+                    convert_here(next_resolve)
+                else:
+                    break
+                variants += definitions.pending
+                definitions.pending.clear()
+                next_resolve += 1
+            if not running:
+                continue
+
+            for conn in multiprocessing.connection.wait(list(running)):
+                index, process = running[conn]
+                try:
+                    kind, payload = conn.recv()
+                except (EOFError, OSError, pickle.UnpicklingError):
+                    kind, payload = "error", None
+                if kind == "resolve":
+                    requests[index] = payload
+                    continue
+                del running[conn]
+                conn.close()
+                process.join()
+                if kind == "done":
+                    texts[index], positions, hits, misses = payload
+                    signal_names[index] = [(signals[index][position], name)
+                                           for position, name in positions]
+                    if kwargs["cache"] is not None:
+                        kwargs["cache"].hits   += hits
+                        kwargs["cache"].misses += misses
+                elif index < next_resolve:
+                    convert_here(index)
+                else:
+                    failed.add(index)
+    finally:
+        for conn, (_index, process) in running.items():
+            process.kill()
+            process.join()
+            conn.close()
+    # A signal may be named by several definitions (such as the ports of a nested definition);
+    # the names are recorded in the same order as in `convert_fragment`, so that the last one wins.
+    for index in range(len(variants)):
+        name_map.update(signal_names[index])
+    return [texts[index] for index in range(len(variants))]
+
+
+def convert_fragment(fragment, ports=(), name="top", *, emit_src=True, all_undef_to_ff=False,
+                     workers=1, cache=None, **kwargs):
+    assert isinstance(fragment, (_ir.Fragment, _ir.Design))
+    if workers is None:
+        if hasattr(os, "sched_getaffinity"):
+            workers = len(os.sched_getaffinity(0))
+        else:
+            workers = os.cpu_count() or 1
+    if not isinstance(workers, int) or workers < 1:
+        raise TypeError(f"Number of workers must be a positive integer, not {workers!r}")
+    if cache is None:
+        cache = _default_cache()
+    elif not isinstance(cache, ModuleCache):
+        raise TypeError(f"Cache must be a ModuleCache or None, not {cache!r}")
+    name_map = _ast.SignalDict()
+    definitions = _ir.DefinitionVariants()
+    netlist = _ir.build_netlist(fragment, ports=ports, name=name, all_undef_to_ff=all_undef_to_ff,
+                                definitions=definitions, **kwargs)
+    builder = Design(emit_src=emit_src)
+    _convert_netlist(builder, netlist, name_map, cache=cache)
+    texts = [str(builder)]
+    # Definitions of memoized elaboratables are emitted once, after all of their instances.
+    # They are independent of each other, and can be converted in worker processes. These are
+    # the only parts of the design that `workers` applies to: the netlist of everything else
+    # is built and converted above, in this process, even if it consists of independent subtrees.
+    if workers > 1 and definitions.pending and "fork" in multiprocessing.get_all_start_methods():
+        texts += _convert_definitions_forked(definitions, name_map, workers=workers,
+                                             emit_src=emit_src, all_undef_to_ff=all_undef_to_ff,
+                                             cache=cache)
+    while definitions.pending:
+        texts.append(_convert_definition(definitions, definitions.pending.pop(0), name_map,
+                                         emit_src=emit_src, all_undef_to_ff=all_undef_to_ff,
+                                         cache=cache))
+    if cache is not None and cache.misses:
+        # Evict old modules once per conversion rather than after storing each of them.
+        cache._trim()
+    return "".join(texts), name_map
 
 
 def convert(elaboratable, name="top", platform=None, *, ports=None, emit_src=True, **kwargs):
@@ -1320,6 +1760,7 @@ def convert(elaboratable, name="top", platform=None, *, ports=None, emit_src=Tru
                 ports["__".join(map(str, path))] = (value, dir)
     elif ports is None:
         raise TypeError("The `convert()` function requires a `ports=` argument")
-    fragment = _ir.Fragment.get(elaboratable, platform)
+    with _ir.memoize_elaboration():
+        fragment = _ir.Fragment.get(elaboratable, platform)
     il_text, _name_map = convert_fragment(fragment, ports, name, emit_src=emit_src, **kwargs)
     return il_text
@@ -57,6 +57,7 @@ def convert(elaboratable, name="top", platform=None, *, ports=None, emit_src=Tru
                 ports["__".join(map(str, path))] = (value, dir)
     elif ports is None:
         raise TypeError("The `convert()` function requires a `ports=` argument")
-    fragment = _ir.Fragment.get(elaboratable, platform)
+    with _ir.memoize_elaboration():
+        fragment = _ir.Fragment.get(elaboratable, platform)
     verilog_text, name_map = convert_fragment(fragment, ports, name, emit_src=emit_src, strip_internal_attrs=strip_internal_attrs, **kwargs)
     return verilog_text
@@ -9,7 +9,7 @@ import jinja2
 from .. import __version__
 from .._toolchain import *
 from ..hdl import *
-from ..hdl._ir import IOBufferInstance, Design
+from ..hdl._ir import IOBufferInstance, Design, memoize_elaboration
 from ..hdl._xfrm import DomainLowerer
 from ..lib.cdc import ResetSynchronizer
 from ..lib import io
@@ -142,7 +142,8 @@ class Platform(ResourceManager, metaclass=ABCMeta):
         assert not self._prepared
         self._prepared = True
 
-        fragment = Fragment.get(elaboratable, self)
+        with memoize_elaboration():
+            fragment = Fragment.get(elaboratable, self)
         fragment._propagate_domains(self.create_missing_domain, platform=self)
         fragment = DomainLowerer()(fragment)
 
@@ -1,5 +1,7 @@
 from typing import Tuple
 from collections import defaultdict, OrderedDict
+from contextlib import contextmanager
+import contextvars
 import enum
 import warnings
 
@@ -12,6 +14,7 @@ __all__ = [
     "AlreadyElaborated", "UnusedElaboratable", "Elaboratable", "DuplicateElaboratable",
     "DomainRequirementFailed", "DriverConflict",
     "Fragment", "Instance", "IOBufferInstance", "RequirePosedge", "PortDirection",
+    "Definition", "DefinitionInstance", "DefinitionVariants", "memoize_elaboration",
     "Design", "build_netlist",
 ]
 
@@ -49,6 +52,21 @@ class DomainRequirementFailed(Exception):
 class Fragment:
     @staticmethod
     def get(obj, platform):
+        memo = _elaboration_memo.get()
+        if memo is not None and not memo.depth:
+            # The toplevel fragment must not be an instance, so a memoized toplevel elaboratable
+            # is wrapped in a fragment that instantiates it.
+            memo.depth += 1
+            try:
+                fragment = Fragment.get(obj, platform)
+            finally:
+                memo.depth -= 1
+            if isinstance(fragment, DefinitionInstance):
+                wrapper = Fragment(src_loc=fragment.src_loc)
+                wrapper.add_subfragment(fragment)
+                fragment = wrapper
+            return fragment
+
         code = None
         origins = []
         while True:
@@ -60,7 +78,11 @@ class Fragment:
                 code = obj.elaborate.__code__
                 UnusedElaboratable._MustUse__silence = False
                 obj._MustUse__used = True
-                new_obj = obj.elaborate(platform)
+                new_obj = None
+                if memo is not None:
+                    new_obj = memo.instantiate(obj, platform)
+                if new_obj is None:
+                    new_obj = obj.elaborate(platform)
             else:
                 raise TypeError(f"Object {obj!r} is not an 'Elaboratable' nor 'Fragment'")
             if new_obj is obj:
@@ -336,6 +358,190 @@ class RequirePosedge(Fragment):
         self.src_loc = src_loc or tracer.get_src_loc(src_loc_at)
 
 
+def _flatten_interface(obj):
+    from ..lib import wiring
+
+    signature = getattr(obj, "signature", None)
+    if not isinstance(signature, wiring.Signature):
+        raise TypeError(f"Elaboratable {obj!r} has an elaboration key, but does not have "
+                        f"a signature")
+    for path, member, value in signature.flatten(obj):
+        if isinstance(value, _ast.ValueCastable):
+            value = value.as_value()
+        yield "__".join(map(str, path)), value, "i" if member.flow == wiring.In else "o"
+
+
+class Definition:
+    """A fragment shared by all elaboratables with the same elaboration key.
+
+    The fragment is elaborated from the first of these elaboratables (the *origin*), and every
+    elaboratable is replaced with a :class:`DefinitionInstance` that connects its interface to
+    the ports of the definition. Clock domains used, but not defined, by the fragment become
+    ports as well, named after the clock and reset signals of the domain.
+
+    This is a private interface, without a stability guarantee.
+    """
+
+    def __init__(self, origin, fragment):
+        from ._xfrm import DomainCollector
+
+        if type(fragment) is not Fragment:
+            # The toplevel fragment of a netlist must be a plain fragment.
+            wrapper = Fragment(src_loc=fragment.src_loc)
+            wrapper.add_subfragment(fragment)
+            fragment = wrapper
+
+        self.origin   = origin
+        self.fragment = fragment
+        self.ports    = {} # port name -> (signal, direction)
+        self.domains  = {} # domain name -> (clock port name, reset port name)
+
+        assigned_names = set()
+        for name, value, dir in _flatten_interface(origin):
+            if not isinstance(value, _ast.Signal):
+                raise TypeError(f"Interface member {name!r} of elaboratable {origin!r} must be "
+                                f"a signal, not {value!r}")
+            assigned_names.add(name)
+            self.ports[name] = (value, dir)
+
+        collector = DomainCollector()
+        collector(fragment)
+        for domain in sorted(collector.used_domains):
+            prefix = "" if domain == "sync" else f"{domain}_"
+            self.domains[domain] = (_add_name(assigned_names, f"{prefix}clk"),
+                                    _add_name(assigned_names, f"{prefix}rst"))
+
+    def _interface_shape(self, ports):
+        return [(name, dir, value.shape()) for name, (value, dir) in ports.items()]
+
+    def instantiate(self, obj):
+        ports = {name: (value, dir) for name, value, dir in _flatten_interface(obj)}
+        if self._interface_shape(ports) != self._interface_shape(self.ports):
+            raise ValueError(f"Elaboratable {obj!r} has the same elaboration key as "
+                             f"{self.origin!r}, but a different interface")
+        instance = DefinitionInstance(self, src_loc=self.fragment.src_loc)
+        instance.ports.update(ports)
+        for domain, (clk_name, rst_name) in self.domains.items():
+            instance.ports[clk_name] = (_ast.ClockSignal(domain), "i")
+            instance.ports[rst_name] = (_ast.ResetSignal(domain, allow_reset_less=True), "i")
+        return instance
+
+
+class DefinitionInstance(Instance):
+    """An instance of a :class:`Definition`.
+
+    Its type is the name of the definition's module, which is only assigned by
+    :class:`DefinitionVariants` while building the netlist.
+
+    This is a private interface, without a stability guarantee.
+    """
+
+    def __init__(self, definition, *, src_loc=None, src_loc_at=0):
+        super().__init__(type(definition.origin).__qualname__,
+                         src_loc=src_loc, src_loc_at=1 + src_loc_at)
+        self.definition = definition
+
+
+class DefinitionVariants:
+    """Assigns module names to the definitions instantiated in a design.
+
+    A definition is built into a separate netlist once for every combination of the properties
+    of the clock domains it is instantiated in. Each such variant is named after the hierarchical
+    name of its first instance.
+
+    This is a private interface, without a stability guarantee.
+    """
+
+    def __init__(self):
+        self.names   = {} # (definition, domain properties) -> module name
+        self.pending = [] # (module name, definition, domain properties)
+
+    def resolve(self, design):
+        for fragment, fragment_info in design.fragments.items():
+            if isinstance(fragment, DefinitionInstance):
+                fragment.type = self.claim(self.variant(fragment), fragment_info.name)
+
+    @staticmethod
+    def variant(fragment):
+        definition = fragment.definition
+        properties = []
+        for domain in definition.domains:
+            cd = fragment.domains[fragment.domain_renames.get(domain, domain)]
+            properties.append((cd.clk_edge, cd.async_reset, cd.rst is None))
+        return definition, tuple(properties)
+
+    def claim(self, variant, hierarchy):
+        if variant not in self.names:
+            self.names[variant] = ".".join(hierarchy)
+            self.pending.append((self.names[variant], *variant))
+        return self.names[variant]
+
+    def build(self, name, definition, properties):
+        from ._xfrm import FragmentTransformer
+
+        # Preparing a fragment modifies it, so every variant is built from a separate copy.
+        fragment = FragmentTransformer()(definition.fragment)
+        ports = {name: (signal, PortDirection.Input if dir == "i" else PortDirection.Output)
+                 for name, (signal, dir) in definition.ports.items()}
+        for (domain, (clk_name, rst_name)), (clk_edge, async_reset, reset_less) in \
+                zip(definition.domains.items(), properties):
+            cd = _cd.ClockDomain(domain, clk_edge=clk_edge, async_reset=async_reset,
+                                 reset_less=reset_less)
+            fragment.add_domains(cd)
+            ports[clk_name] = (cd.clk, PortDirection.Input)
+            # The reset port of a reset-less domain exists, but is not used.
+            rst = _ast.Signal(name=rst_name) if cd.rst is None else cd.rst
+            ports[rst_name] = (rst, PortDirection.Input)
+        return fragment.prepare(ports, hierarchy=(name,))
+
+
+class _ElaborationMemo:
+    def __init__(self):
+        self.definitions = {} # (type, elaboration key) -> Definition
+        self.depth = 0
+
+    def instantiate(self, obj, platform):
+        # Looked up on the type, so that wrappers that forward attribute accesses to
+        # the elaboratable they transform (such as `DomainRenamer`) are not memoized themselves.
+        if getattr(type(obj), "elaboration_key", None) is None:
+            return None
+        key = obj.elaboration_key()
+        if key is None:
+            return None
+        try:
+            key = (type(obj), key)
+            hash(key)
+        except TypeError:
+            raise TypeError(f"Elaboration key of {obj!r} must be hashable, not {key[1]!r}") \
+                from None
+        if key not in self.definitions:
+            fragment = Fragment.get(obj.elaborate(platform), platform)
+            self.definitions[key] = Definition(obj, fragment)
+        return self.definitions[key].instantiate(obj)
+
+
+_elaboration_memo = contextvars.ContextVar("_elaboration_memo", default=None)
+
+
+@contextmanager
+def memoize_elaboration():
+    """Elaborate the elaboratables that have an elaboration key only once per key.
+
+    Within this context, :meth:`Fragment.get` elaborates only the first of the elaboratables
+    of the same type whose :py:`elaboration_key()` method returns equal values (other than
+    :py:`None`), and replaces all of them with instances of the resulting :class:`Definition`.
+    This is only meaningful when converting a design; simulators cannot simulate instances.
+    """
+    if _elaboration_memo.get() is not None:
+        yield
+        return
+    token = _elaboration_memo.set(_ElaborationMemo())
+    try:
+        yield
+    finally:
+        _elaboration_memo.reset(token)
+
+
 def _add_name(assigned_names, name):
     if name in assigned_names:
         name = f"{name}${len(assigned_names)}"
@@ -1520,27 +1726,26 @@ def _compute_net_flows(netlist: _nir.Netlist):
     #         - [no flow]
     #   - [no flow]
     #   - [no flow]
-    lca = {}
-
-    # Initialize by marking the definition point of every net.
-    for cell_idx, cell in enumerate(netlist.cells):
-        for net in cell.output_nets(cell_idx):
-            lca[net] = cell.module_idx
-            netlist.modules[cell.module_idx].net_flow[net] = _nir.ModuleNetFlow.Internal
+    #
+    # A net is always present in the module that contains its definition, where its flow is
+    # Internal unless it is routed out of that module. Such Internal flows are implied rather
+    # than stored, since most nets are never used outside of the module they are defined in.
+    lca = {} # only for the nets that are used outside of the module they are defined in
 
     # Marks a use of a net within a given module, and adjusts its netflows in all modules
     # as required.
     def use_net(net, use_module):
         if net.is_const:
             return
+        modules = netlist.modules
         # If the net is already present in the current module, we're done.
-        if net in netlist.modules[use_module].net_flow:
+        def_module = netlist.cells[net.cell].module_idx
+        if use_module == def_module or net in modules[use_module].net_flow:
             return
-        modules = netlist.modules
         # Otherwise, we need to route the net through the hierarchy from def_module
         # to use_module. We do that by treating use_module and def_module as pointers
         # and moving them up the hierarchy until they meet at the new LCA.
-        def_module = lca[net]
+        def_module = lca.get(net, def_module)
         # While def_module deeper than use_module, go up with def_module.
         while len(modules[def_module].name) > len(modules[use_module].name):
             modules[def_module].net_flow[net] = _nir.ModuleNetFlow.Output
@@ -1719,11 +1924,14 @@ def _compute_io_ports(netlist: _nir.Netlist, ports):
                 visited.update(value)
 
 
-def build_netlist(fragment, ports=(), *, name="top", all_undef_to_ff=False, **kwargs):
+def build_netlist(fragment, ports=(), *, name="top", all_undef_to_ff=False, definitions=None,
+                  **kwargs):
     if isinstance(fragment, Design):
         design = fragment
     else:
         design = fragment.prepare(ports=ports, hierarchy=(name,), **kwargs)
+    if definitions is not None:
+        definitions.resolve(design)
     netlist = _nir.Netlist()
     _emit_netlist(netlist, design, all_undef_to_ff=all_undef_to_ff)
     netlist.check_comb_cycles()
@@ -11,6 +11,56 @@ from .._utils import final
 __all__ = ["MemoryData", "MemoryInstance"]
 
 
+# Initial contents of memories deeper than this are stored sparsely, since most of their rows
+# are usually left at the default value.
+_SPARSE_MEMORY_DEPTH = 1 << 16
+
+
+class _SparseRows:
+    # A fixed-length list of memory rows that only stores the rows which have been set, and
+    # returns `default` for the others.
+    __slots__ = ("_default", "_depth", "_rows")
+
+    def __init__(self, default, depth):
+        self._default = default
+        self._depth   = depth
+        self._rows    = {}
+
+    def _index(self, index):
+        index = operator.index(index)
+        if index < 0:
+            index += self._depth
+        if index not in range(self._depth):
+            raise IndexError("list index out of range")
+        return index
+
+    def __len__(self):
+        return self._depth
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            indices = range(*index.indices(self._depth))
+            values = [self._default] * len(indices)
+            if len(self._rows) < len(indices):
+                for row_index, value in self._rows.items():
+                    if row_index in indices:
+                        values[indices.index(row_index)] = value
+            else:
+                for position, row_index in enumerate(indices):
+                    if row_index in self._rows:
+                        values[position] = self._rows[row_index]
+            return values
+        return self._rows.get(self._index(index), self._default)
+
+    def __setitem__(self, index, value):
+        self._rows[self._index(index)] = value
+
+    def __iter__(self):
+        rows, default = self._rows, self._default
+        for index in range(self._depth):
+            yield rows.get(index, default)
+
+
 @final
 class MemoryData:
     """Abstract description of a memory array.
@@ -72,11 +122,15 @@ class MemoryData:
             self._depth = depth
             self._frozen = False
 
+            if depth > _SPARSE_MEMORY_DEPTH:
+                make_rows = _SparseRows
+            else:
+                make_rows = lambda default, depth: [default] * depth
             if isinstance(shape, ShapeCastable):
-                self._elems = [None] * depth
-                self._raw = [Const.cast(Const(None, shape)).value] * depth
+                self._elems = make_rows(None, depth)
+                self._raw = make_rows(Const.cast(Const(None, shape)).value, depth)
             else:
-                self._elems = [0] * depth
+                self._elems = make_rows(0, depth)
                 self._raw = self._elems # intentionally mutably aliased
             elems = list(elems)
             if len(elems) > depth:
@@ -123,7 +177,7 @@ class MemoryData:
             return self._depth
 
         def __repr__(self):
-            return f"MemoryData.Init({self._elems!r}, shape={self._shape!r}, depth={self._depth})"
+            return f"MemoryData.Init({list(self._elems)!r}, shape={self._shape!r}, depth={self._depth})"
 
 
     @final
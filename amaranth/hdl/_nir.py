@@ -1,4 +1,7 @@
 from typing import Iterable, Any
+from array import array
+import bisect
+import collections
 import enum
 
 from ._ast import SignalDict
@@ -44,7 +47,7 @@ class Net(int):
     @classmethod
     def from_const(cls, val: int):
         assert val in (0, 1)
-        return cls(val)
+        return _const_nets[val]
 
     @classmethod
     def from_late(cls, val: int):
@@ -94,17 +97,43 @@ class Net(int):
     __str__ = __repr__
 
 
-class Value(tuple):
-    __slots__ = ()
+# Constant nets are used very often, and are shared rather than allocated every time.
+_const_nets = (Net(0), Net(1))
+
+
+class Value:
+    """An immutable sequence of nets.
+
+    The nets are stored as machine integers, which take much less memory than a tuple of
+    :class:`Net` objects, and are converted to :class:`Net` objects when accessed.
+    """
+    __slots__ = ("_nets",)
 
-    def __new__(cls, nets: 'Net | Iterable[Net]' = ()):
+    def __init__(self, nets: 'Net | Iterable[Net]' = ()):
         if isinstance(nets, Net):
-            return super().__new__(cls, (nets,))
-        return super().__new__(cls, (Net.ensure(net) for net in nets))
+            self._nets = array("q", (nets,))
+        elif isinstance(nets, Value):
+            self._nets = nets._nets
+        else:
+            self._nets = array("q", (Net.ensure(net) for net in nets))
+
+    @classmethod
+    def _from_array(cls, nets: array):
+        value = object.__new__(cls)
+        value._nets = nets
+        return value
+
+    @classmethod
+    def from_cell(cls, cell: int, width: int):
+        assert width in range((1 << 16) + 1)
+        assert cell >= 0
+        if cell == 0:
+            assert width == 0
+        return cls._from_array(array("q", range(cell << 16, (cell << 16) + width)))
 
     @classmethod
     def from_const(cls, value, width):
-        return cls(Net.from_const((value >> bit) & 1) for bit in range(width))
+        return cls._from_array(array("q", ((value >> bit) & 1 for bit in range(width))))
 
     @classmethod
     def zeros(cls, digits=1):
@@ -114,11 +143,36 @@ class Value(tuple):
     def ones(cls, digits=1):
         return cls.from_const(-1, digits)
 
+    def __len__(self):
+        return len(self._nets)
+
+    def __iter__(self):
+        return map(Net, self._nets)
+
+    def __reversed__(self):
+        return map(Net, reversed(self._nets))
+
+    def __contains__(self, net):
+        return net in self._nets
+
     def __getitem__(self, index):
         if isinstance(index, slice):
-            return type(self)(super().__getitem__(index))
+            return self._from_array(self._nets[index])
         else:
-            return super().__getitem__(index)
+            return Net(self._nets[index])
+
+    def __add__(self, other):
+        if not isinstance(other, Value):
+            return NotImplemented
+        return self._from_array(self._nets + other._nets)
+
+    def __eq__(self, other):
+        if not isinstance(other, Value):
+            return NotImplemented
+        return self._nets == other._nets
+
+    def __hash__(self):
+        return hash(self._nets.tobytes())
 
     def __repr__(self):
         pos = 0
@@ -168,7 +222,7 @@ class Value(tuple):
 
     @property
     def is_const(self):
-        return all(net.is_const for net in self)
+        return all(net in (0, 1) for net in self._nets)
 
     __str__ = __repr__
 
@@ -253,6 +307,9 @@ class FormatValue:
     format_desc: str
     signed: bool
     """
+
+    __slots__ = ("value", "format_desc", "signed")
+
     def __init__(self, value, format_desc, *, signed):
         assert isinstance(format_desc, str)
         assert isinstance(signed, bool)
@@ -273,6 +330,9 @@ class Format:
 
     chunks: tuple of str and FormatValue
     """
+
+    __slots__ = ("chunks",)
+
     def __init__(self, chunks):
         self.chunks = tuple(chunks)
         for chunk in self.chunks:
@@ -296,6 +356,9 @@ class Format:
 
 class SignalField:
     """Describes a single field of a signal."""
+
+    __slots__ = ("value", "signed", "enum_name", "enum_variants")
+
     def __init__(self, value, *, signed, enum_name=None, enum_variants=None):
         self.value = Value(value)
         self.signed = bool(signed)
@@ -363,6 +426,8 @@ class Netlist:
         return net
 
     def resolve_value(self, value: Value):
+        if all(net >= 0 for net in value._nets):
+            return value
         return Value(self.resolve_net(net) for net in value)
 
     def resolve_all_nets(self):
@@ -410,11 +475,12 @@ class Netlist:
 
     def add_value_cell(self, width: int, cell):
         cell_idx = self.add_cell(cell)
-        return Value(Net.from_cell(cell_idx, bit) for bit in range(width))
+        return Value.from_cell(cell_idx, width)
 
     def alloc_late_value(self, signal: _ast.Signal):
         self.last_late_net -= len(signal)
-        value = Value(Net.from_late(self.last_late_net + bit) for bit in range(len(signal)))
+        value = Value._from_array(array("q", range(self.last_late_net,
+                                                   self.last_late_net + len(signal))))
         for bit, net in enumerate(value):
             self.late_to_signal[net] = signal, bit
         return value
@@ -426,60 +492,165 @@ class Netlist:
         return top
 
     def check_comb_cycles(self):
-        class Cycle:
-            def __init__(self, start):
-                self.start = start
-                self.path = []
-
-        checked = set()
-        busy = set()
-
-        def traverse(net):
-            if net in checked:
-                return None
-
-            if net in busy:
-                return Cycle(net)
-            busy.add(net)
-
-            cycle = None
-            if net.is_const:
-                pass
-            elif net.is_late:
-                cycle = traverse(self.connections[net])
-                if cycle is not None:
-                    sig, bit = self.late_to_signal[net]
-                    cycle.path.append((sig, bit, sig.src_loc))
-            else:
-                for src, src_loc in self.cells[net.cell].comb_edges_to(net.bit):
-                    cycle = traverse(src)
-                    if cycle is not None:
-                        cycle.path.append((self.cells[net.cell], net.bit, src_loc))
-                        break
-
-            if cycle is not None and cycle.start == net:
-                msg = ["Combinational cycle detected, path:\n"]
-                for obj, bit, src_loc in reversed(cycle.path):
-                    if isinstance(obj, _ast.Signal):
-                        obj = f"signal {obj.name}"
-                    elif isinstance(obj, Operator):
-                        obj = f"operator {obj.operator}"
-                    else:
-                        obj = f"cell {obj.__class__.__qualname__}"
-                    src_loc = "<unknown>:0" if src_loc is None else f"{src_loc[0]}:{src_loc[1]}"
-                    msg.append(f"  {src_loc}: {obj} bit {bit}\n")
-                raise CombinationalCycle("".join(msg))
-
-            busy.remove(net)
-            checked.add(net)
-            return cycle
-
+        # Each net is a node of a graph with an edge from every net to each net it combinationally
+        # depends on. Cell output nets are numbered contiguously per cell, late nets after them, and
+        # the remaining nodes are hubs, each standing in for a group of edges shared by several
+        # output bits of a cell, which keeps the graph linear in the size of the netlist.
+        cell_base = array("q", bytes(8 * (len(self.cells) + 1)))
+        for cell_idx, cell in enumerate(self.cells):
+            # Bits 0 and 1 of the top cell are the constant nets, which always have a node.
+            cell_base[cell_idx + 1] = cell_base[cell_idx] + max(
+                (net.bit + 1 for net in cell.output_nets(cell_idx)), default=0 if cell_idx else 2)
+        late_base = cell_base[-1]
+        hub_base = late_base - self.last_late_net
+
+        def node_of(net):
+            if net < 0:
+                return late_base - 1 - net
+            return cell_base[net >> 16] + (net & 0xffff)
+
+        # Store the graph in compressed sparse row form: the edges of node `n` are at indices
+        # `edge_start[n]:edge_start[n + 1]` of `adjacency` and `adjacency_loc`. All edges of a node
+        # are known once its cell (or signal) has been visited, so the rows are filled in order.
+        edge_start = array("q")
+        adjacency = array("q")
+        adjacency_loc = []
+        hub_start = array("q")
+        hub_adjacency = array("q")
+        hub_adjacency_loc = []
         for cell_idx, cell in enumerate(self.cells):
-            for net in cell.output_nets(cell_idx):
-                assert traverse(net) is None
-        for value in self.signals.values():
-            for net in value:
-                assert traverse(net) is None
+            bit_edges = [[] for _ in range(cell_base[cell_idx + 1] - cell_base[cell_idx])]
+            for bits, edges in cell.comb_edge_groups(cell_idx):
+                edges = [(node_of(net), src_loc) for net, src_loc in edges]
+                if len(bits) > 1 and len(edges) > 1:
+                    hub_start.append(len(hub_adjacency))
+                    for target, src_loc in edges:
+                        hub_adjacency.append(target)
+                        hub_adjacency_loc.append(src_loc)
+                    edges = [(hub_base + len(hub_start) - 1, None)]
+                for bit in bits:
+                    bit_edges[bit] += edges
+            for edges in bit_edges:
+                edge_start.append(len(adjacency))
+                for target, src_loc in edges:
+                    adjacency.append(target)
+                    adjacency_loc.append(src_loc)
+        for net in range(-1, self.last_late_net - 1, -1):
+            edge_start.append(len(adjacency))
+            if net in self.connections:
+                sig, _bit = self.late_to_signal[net]
+                adjacency.append(node_of(self.connections[net]))
+                adjacency_loc.append(sig.src_loc)
+        for start in hub_start:
+            edge_start.append(len(adjacency) + start)
+        adjacency += hub_adjacency
+        adjacency_loc += hub_adjacency_loc
+        edge_start.append(len(adjacency))
+        node_count = len(edge_start) - 1
+        del hub_start, hub_adjacency, hub_adjacency_loc
+
+        # Find the strongly connected components with Tarjan's algorithm, using an explicit stack.
+        # Every component with more than one node, or with a node that depends on itself, contains
+        # a combinational cycle. Nodes without edges are trivially components of their own and are
+        # never pushed on the stacks.
+        order = array("q", [-1]) * node_count
+        lowlink = array("q", bytes(8 * node_count))
+        next_edge = edge_start[:-1]
+        on_stack = bytearray(node_count)
+        component = array("q", [-1]) * node_count
+        scc_stack = []
+        dfs_stack = []
+        cyclic = []
+        counter = 0
+        for root in range(node_count):
+            if order[root] != -1:
+                continue
+            order[root] = lowlink[root] = counter
+            counter += 1
+            if edge_start[root] == edge_start[root + 1]:
+                continue
+            scc_stack.append(root)
+            on_stack[root] = 1
+            dfs_stack.append(root)
+            while dfs_stack:
+                node = dfs_stack[-1]
+                edge, edge_end = next_edge[node], edge_start[node + 1]
+                while edge < edge_end:
+                    target = adjacency[edge]
+                    edge += 1
+                    if order[target] == -1:
+                        order[target] = lowlink[target] = counter
+                        counter += 1
+                        if edge_start[target] == edge_start[target + 1]:
+                            continue
+                        next_edge[node] = edge
+                        scc_stack.append(target)
+                        on_stack[target] = 1
+                        dfs_stack.append(target)
+                        break
+                    elif on_stack[target] and order[target] < lowlink[node]:
+                        lowlink[node] = order[target]
+                else:
+                    dfs_stack.pop()
+                    if dfs_stack and lowlink[node] < lowlink[dfs_stack[-1]]:
+                        lowlink[dfs_stack[-1]] = lowlink[node]
+                    if lowlink[node] == order[node]:
+                        members = []
+                        while True:
+                            member = scc_stack.pop()
+                            on_stack[member] = 0
+                            component[member] = node
+                            members.append(member)
+                            if member == node:
+                                break
+                        if (len(members) > 1 or
+                                node in adjacency[edge_start[node]:edge_start[node + 1]]):
+                            cyclic.append(min(members))
+
+        if not cyclic:
+            return
+        msg = []
+        for start in sorted(cyclic):
+            # Find the shortest path from the start node back to itself within its component.
+            previous = {}
+            queue = collections.deque([start])
+            while start not in previous:
+                node = queue.popleft()
+                for edge in range(edge_start[node], edge_start[node + 1]):
+                    target = adjacency[edge]
+                    if component[target] == component[start] and target not in previous:
+                        previous[target] = node, edge
+                        queue.append(target)
+            path = []
+            target = start
+            while True:
+                node, edge = previous[target]
+                if node >= hub_base:
+                    # The edge leaving a hub carries the source location of the edge it stands for.
+                    hub_src_loc = adjacency_loc[edge]
+                elif adjacency[edge] >= hub_base:
+                    path.append((node, hub_src_loc))
+                else:
+                    path.append((node, adjacency_loc[edge]))
+                target = node
+                if target == start:
+                    break
+            msg.append("Combinational cycle detected, path:\n")
+            for node, src_loc in reversed(path):
+                if node >= late_base:
+                    obj, bit = self.late_to_signal[late_base - 1 - node]
+                else:
+                    cell_idx = bisect.bisect_right(cell_base, node) - 1
+                    obj, bit = self.cells[cell_idx], node - cell_base[cell_idx]
+                if isinstance(obj, _ast.Signal):
+                    obj = f"signal {obj.name}"
+                elif isinstance(obj, Operator):
+                    obj = f"operator {obj.operator}"
+                else:
+                    obj = f"cell {obj.__class__.__qualname__}"
+                src_loc = "<unknown>:0" if src_loc is None else f"{src_loc[0]}:{src_loc[1]}"
+                msg.append(f"  {src_loc}: {obj} bit {bit}\n")
+        raise CombinationalCycle("".join(msg))
 
 
 class ModuleNetFlow(enum.Enum):
@@ -529,7 +700,8 @@ class Module:
     src_loc: str
     submodules: a list of nested module indices
     signal_names: a SignalDict from Signal to str, signal names visible in this module
-    net_flow: a dict from Net to NetFlow, describes how a net is used within this module
+    net_flow: a dict from Net to NetFlow, describes how a net is used within this module; the nets
+        that are defined in this module and only used within it are omitted
     ports: a dict from port name to (Value, ModuleNetFlow) pair
     io_ports: a dict from port name to (IOValue, IODirection) pair
     cells: a list of cell indices that belong to this module
@@ -559,6 +731,8 @@ class Cell:
     module: int, index of the module this cell belongs to (within Netlist.modules)
     """
 
+    __slots__ = ("module_idx", "src_loc")
+
     def __init__(self, module_idx: int, *, src_loc):
         self.module_idx = module_idx
         self.src_loc = src_loc
@@ -578,6 +752,14 @@ class Cell:
     def comb_edges_to(self, bit: int) -> "Iterable[(Net, Any)]":
         raise NotImplementedError
 
+    def comb_edge_groups(self, self_idx: int) -> "Iterable[(Iterable[int], list[(Net, Any)])]":
+        """Yields ``(bits, edges)`` pairs such that every one of the output ``bits`` has a
+        combinational edge to each of the ``edges``. Together, the groups describe the same edges
+        as :meth:`comb_edges_to`; cells whose output bits share inputs override this method
+        to describe them once per cell rather than once per bit."""
+        for net in sorted(self.output_nets(self_idx)):
+            yield (net.bit,), list(self.comb_edges_to(net.bit))
+
 
 class Top(Cell):
     """A special cell type representing top-level non-IO ports. Must be present in the netlist exactly
@@ -595,6 +777,9 @@ class Top(Cell):
     ports_o: dict of str to Value
     ports_i: dict of str to (int, int)
     """
+
+    __slots__ = ("ports_o", "ports_i")
+
     def __init__(self):
         super().__init__(module_idx=0, src_loc=None)
 
@@ -666,6 +851,8 @@ class Operator(Cell):
     inputs: tuple of Value
     """
 
+    __slots__ = ("operator", "inputs")
+
     def __init__(self, module_idx, *, operator: str, inputs, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -721,6 +908,19 @@ class Operator(Cell):
             yield (self.inputs[1][bit], self.src_loc)
             yield (self.inputs[2][bit], self.src_loc)
 
+    def comb_edge_groups(self, self_idx):
+        bits = range(self.width)
+        if self.operator in ("~", "&", "|", "^"):
+            for bit in bits:
+                yield (bit,), [(value[bit], self.src_loc) for value in self.inputs]
+        elif self.operator == "m":
+            yield bits, [(self.inputs[0][0], self.src_loc)]
+            for bit in bits:
+                yield (bit,), [(self.inputs[1][bit], self.src_loc),
+                               (self.inputs[2][bit], self.src_loc)]
+        else:
+            yield bits, [(net, self.src_loc) for value in self.inputs for net in value]
+
 
 class Part(Cell):
     """Corresponds to ``hdl.ast.Part``.
@@ -734,6 +934,9 @@ class Part(Cell):
     width: int
     stride: int
     """
+
+    __slots__ = ("value", "value_signed", "offset", "width", "stride")
+
     def __init__(self, module_idx, *, value, value_signed, offset, width, stride, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -766,6 +969,9 @@ class Part(Cell):
         for net in self.offset:
             yield (net, self.src_loc)
 
+    def comb_edge_groups(self, self_idx):
+        yield range(self.width), [(net, self.src_loc) for net in (*self.value, *self.offset)]
+
 
 class Matches(Cell):
     """A combinational cell performing a comparison like ``Value.matches``
@@ -777,6 +983,9 @@ class Matches(Cell):
     value: Value
     patterns: tuple of str, each str contains '0', '1', '-'
     """
+
+    __slots__ = ("value", "patterns")
+
     def __init__(self, module_idx, *, value, patterns, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -818,6 +1027,9 @@ class PriorityMatch(Cell):
     en: Net
     inputs: Value
     """
+
+    __slots__ = ("en", "inputs")
+
     def __init__(self, module_idx, *, en, inputs, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -842,6 +1054,11 @@ class PriorityMatch(Cell):
         for net in self.inputs[:bit + 1]:
             yield (net, self.src_loc)
 
+    def comb_edge_groups(self, self_idx):
+        yield range(len(self.inputs)), [(self.en, self.src_loc)]
+        for bit in range(len(self.inputs)):
+            yield (bit,), [(net, self.src_loc) for net in self.inputs[:bit + 1]]
+
 
 class Assignment:
     """A single assignment in an ``AssignmentList``.
@@ -859,6 +1076,9 @@ class Assignment:
     value: Value
     src_loc: str
     """
+
+    __slots__ = ("cond", "start", "value", "src_loc")
+
     def __init__(self, *, cond, start, value, src_loc):
         assert isinstance(start, int)
         self.cond = Net.ensure(cond)
@@ -889,6 +1109,9 @@ class AssignmentList(Cell):
     default: Value
     assignments: tuple of ``Assignment``
     """
+
+    __slots__ = ("default", "assignments")
+
     def __init__(self, module_idx, *, default, assignments, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -925,6 +1148,15 @@ class AssignmentList(Cell):
             if bit >= assign.start and bit < assign.start + len(assign.value):
                 yield (assign.value[bit - assign.start], assign.src_loc)
 
+    def comb_edge_groups(self, self_idx):
+        yield range(len(self.default)), [(assign.cond, assign.src_loc) for assign in self.assignments]
+        for bit, net in enumerate(self.default):
+            yield (bit,), [(net, self.src_loc)]
+        for assign in self.assignments:
+            for offset, net in enumerate(assign.value):
+                if assign.start + offset < len(self.default):
+                    yield (assign.start + offset,), [(net, assign.src_loc)]
+
 
 class FlipFlop(Cell):
     """A flip-flop. ``data`` is the data input. ``init`` is the initial and async reset value.
@@ -941,6 +1173,9 @@ class FlipFlop(Cell):
     arst: Net
     attributes: dict from str to int, Const, or str
     """
+
+    __slots__ = ("data", "init", "clk", "clk_edge", "arst", "attributes")
+
     def __init__(self, module_idx, *, data, init, clk, clk_edge, arst, attributes, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -973,6 +1208,9 @@ class FlipFlop(Cell):
         yield (self.clk, self.src_loc)
         yield (self.arst, self.src_loc)
 
+    def comb_edge_groups(self, self_idx):
+        yield range(len(self.data)), [(self.clk, self.src_loc), (self.arst, self.src_loc)]
+
 
 class Memory(Cell):
     """Corresponds to ``Memory``.  ``init`` must have length equal to ``depth``.
@@ -987,6 +1225,9 @@ class Memory(Cell):
     name: str
     attributes: dict from str to int, Const, or str
     """
+
+    __slots__ = ("width", "depth", "init", "name", "attributes")
+
     def __init__(self, module_idx, *, width, depth, init, name, attributes, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -1024,6 +1265,9 @@ class SyncWritePort(Cell):
     clk: Net
     clk_edge: str, either 'pos' or 'neg'
     """
+
+    __slots__ = ("memory", "data", "addr", "en", "clk", "clk_edge")
+
     def __init__(self, module_idx, memory, *, data, addr, en, clk, clk_edge, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -1061,6 +1305,9 @@ class AsyncReadPort(Cell):
     width: int
     addr: Value
     """
+
+    __slots__ = ("memory", "width", "addr")
+
     def __init__(self, module_idx, memory, *, width, addr, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -1084,6 +1331,9 @@ class AsyncReadPort(Cell):
         for net in self.addr:
             yield (net, self.src_loc)
 
+    def comb_edge_groups(self, self_idx):
+        yield range(self.width), [(net, self.src_loc) for net in self.addr]
+
 
 class SyncReadPort(Cell):
     """A single synchronous read port of a memory.  The cell output is the data port.
@@ -1101,6 +1351,9 @@ class SyncReadPort(Cell):
     clk_edge: str, either 'pos' or 'neg'
     transparent_for: tuple of int
     """
+
+    __slots__ = ("memory", "width", "addr", "en", "clk", "clk_edge", "transparent_for")
+
     def __init__(self, module_idx, memory, *, width, addr, en, clk, clk_edge, transparent_for, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -1141,6 +1394,9 @@ class AsyncPrint(Cell):
     en: Net
     format: Format
     """
+
+    __slots__ = ("en", "format")
+
     def __init__(self, module_idx, *, en, format, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -1174,6 +1430,8 @@ class SyncPrint(Cell):
     format: Format
     """
 
+    __slots__ = ("en", "clk", "clk_edge", "format")
+
     def __init__(self, module_idx, *, en, clk, clk_edge, format, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -1202,6 +1460,8 @@ class SyncPrint(Cell):
 class Initial(Cell):
     """Corresponds to ``Initial`` value."""
 
+    __slots__ = ()
+
     def input_nets(self):
         return set()
 
@@ -1228,6 +1488,9 @@ class AnyValue(Cell):
     kind: str, 'anyconst' or 'anyseq'
     width: int
     """
+
+    __slots__ = ("kind", "width")
+
     def __init__(self, module_idx, *, kind, width, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -1262,6 +1525,9 @@ class AsyncProperty(Cell):
     en: Net
     format: Format or None
     """
+
+    __slots__ = ("kind", "test", "en", "format")
+
     def __init__(self, module_idx, *, kind, test, en, format, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -1305,6 +1571,8 @@ class SyncProperty(Cell):
     format: Format or None
     """
 
+    __slots__ = ("kind", "test", "en", "clk", "clk_edge", "format")
+
     def __init__(self, module_idx, *, kind, test, en, clk, clk_edge, format, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -1358,6 +1626,8 @@ class Instance(Cell):
     ports_io: dict of str to (IOValue, IODirection)
     """
 
+    __slots__ = ("type", "name", "parameters", "attributes", "ports_i", "ports_o", "ports_io")
+
     def __init__(self, module_idx, *, type, name, parameters, attributes, ports_i, ports_o, ports_io, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
@@ -1426,6 +1696,9 @@ class IOBuffer(Cell):
     o: Value or None
     oe: Net or None
     """
+
+    __slots__ = ("port", "dir", "o", "oe")
+
     def __init__(self, module_idx, *, port, dir, o=None, oe=None, src_loc):
         super().__init__(module_idx, src_loc=src_loc)
 
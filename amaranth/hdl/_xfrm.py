@@ -294,6 +294,11 @@ class FragmentTransformer:
                 for port in fragment._write_ports
             ]
             self.map_memory_ports(fragment, new_fragment)
+        elif isinstance(fragment, DefinitionInstance):
+            new_fragment = DefinitionInstance(fragment.definition, src_loc=fragment.src_loc)
+            new_fragment.type = fragment.type
+            new_fragment.parameters = OrderedDict(fragment.parameters)
+            self.map_ports(fragment, new_fragment)
         elif isinstance(fragment, Instance):
             new_fragment = Instance(fragment.type, src_loc=fragment.src_loc)
             new_fragment.parameters = OrderedDict(fragment.parameters)
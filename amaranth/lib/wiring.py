@@ -1716,6 +1716,42 @@ class Component(Elaboratable):
         """
         return ComponentMetadata(self)
 
+    def elaboration_key(self):
+        """Key identifying the result of elaborating the component.
+
+        When a design is converted to RTLIL or Verilog (or built for a platform), the components
+        of the same class that return equal (and hashable) keys are elaborated only once. The
+        resulting module is emitted once, and every such component becomes an instance of it,
+        which makes conversion time and output size depend on the number of distinct components
+        rather than the number of their instances. Simulation is not affected.
+
+        The key must capture every parameter that affects elaboration; components with equal keys
+        must have interfaces of the same shape, and must interact with the rest of the design only
+        through their interface and the clock domains they use.
+
+        The default implementation returns :py:`None`, which disables this behavior.
+
+        .. testcode::
+
+            class Adder(wiring.Component):
+                def __init__(self, width):
+                    self.width = width
+                    super().__init__({
+                        "a": In(width),
+                        "b": In(width),
+                        "o": Out(width + 1),
+                    })
+
+                def elaboration_key(self):
+                    return self.width
+
+                def elaborate(self, platform):
+                    m = Module()
+                    m.d.comb += self.o.eq(self.a + self.b)
+                    return m
+        """
+        return None
+
 
 class InvalidMetadata(Exception):
     """Exception raised by :meth:`ComponentMetadata.validate` when the JSON representation of
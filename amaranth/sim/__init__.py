@@ -1,11 +1,16 @@
 from .core import Simulator
 from ._async import DomainReset, BrokenTrigger, SimulatorContext, TickTrigger, TriggerCombination
+from ._parallel import SimulationResult, run_many
+from ._profile import SimulationProfile, ProfileEntry
+from ._toggle import ToggleCoverage
 from ._pycoro import Settle, Delay, Tick, Passive, Active
 
 
 __all__ = [
     "DomainReset", "BrokenTrigger",
     "SimulatorContext", "Simulator", "TickTrigger", "TriggerCombination",
+    "SimulationResult", "run_many",
+    "SimulationProfile", "ProfileEntry", "ToggleCoverage",
     # deprecated
     "Settle", "Delay", "Tick", "Passive", "Active",
 ]
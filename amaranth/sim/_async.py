@@ -9,6 +9,7 @@ from contextlib import contextmanager
 from ..hdl import *
 from ..hdl._ast import Slice
 from ._base import BaseProcess, BaseEngine
+from ._membuf import pack_rows, rows_from_values
 
 
 __all__ = [
@@ -19,6 +20,21 @@ __all__ = [
 ]
 
 
+# Sampled in place of an absent reset signal. Reusing the same object lets engines recognize that
+# repeatedly created tick triggers sample the same values.
+_CONST_0 = Const(0)
+
+
+def _any_lane(value):
+    # When several lanes are simulated in lockstep, sampled values are lists with the value in
+    # each lane.
+    return any(value) if type(value) is list else value
+
+
+def _all_lanes(value):
+    return all(value) if type(value) is list else value
+
+
 class DomainReset(Exception):
     """Exception raised when a tick trigger is repeatedly awaited, and its domain has been reset."""
 
@@ -353,7 +369,7 @@ class TickTrigger:
                                 f"not {shape!r}")
         tick = self.sample(condition).__aiter__()
         done = False
-        while not done:
+        while not _all_lanes(done):
             clk, rst, *values, done = await tick.__anext__()
             if rst:
                 raise DomainReset
@@ -408,20 +424,20 @@ class TickTrigger:
         else:
             return (TriggerCombination(self._engine, self._process)
                 .edge(self._domain.clk, clk_polarity)
-                .sample(Const(0))
-                .sample(Const(0) if self._domain.rst is None else self._domain.rst)
+                .sample(_CONST_0)
+                .sample(_CONST_0 if self._domain.rst is None else self._domain.rst)
                 .sample(*self._sampled))
 
     def __await__(self):
         trigger = self._engine.add_trigger_combination(self._collect_trigger(), oneshot=True)
         clk_edge, rst_edge, rst_sample, *values = yield from trigger.__await__()
-        return (clk_edge, bool(rst_edge or rst_sample), *values)
+        return (clk_edge, bool(_any_lane(rst_edge) or _any_lane(rst_sample)), *values)
 
     async def __aiter__(self):
         trigger = self._engine.add_trigger_combination(self._collect_trigger(), oneshot=False)
         while True:
             clk_edge, rst_edge, rst_sample, *values = await trigger
-            yield (clk_edge, bool(rst_edge or rst_sample), *values)
+            yield (clk_edge, bool(_any_lane(rst_edge) or _any_lane(rst_sample)), *values)
 
 
 class SimulatorContext:
@@ -500,6 +516,71 @@ class SimulatorContext:
         """
         raise NotImplementedError
 
+    def memory_read(self, memory, start, count, *, byteorder="little"):
+        """Read consecutive rows of a memory.
+
+        Returns a :class:`bytes` object containing :py:`count` rows of :py:`memory` starting at
+        the address :py:`start`. Each row is :py:`(len(memory.shape) + 7) // 8` bytes long, with
+        the byte order specified by :py:`byteorder`, which is the format used by
+        :meth:`Simulator.load_memory`. The result can be converted to an :class:`array.array`
+        or a NumPy array without copying.
+
+        This method is equivalent to, but much faster than, calling :meth:`get` for each row.
+        It is only available in testbenches.
+
+        Raises
+        ------
+        :exc:`TypeError`
+            If the caller is a process.
+        :exc:`TypeError`
+            If :py:`memory` is not a :class:`~amaranth.hdl.MemoryData`.
+        :exc:`ValueError`
+            If the range of rows is not within the memory.
+        """
+        raise NotImplementedError
+
+    def memory_write(self, memory, start, values, *, byteorder="little"):
+        """Write consecutive rows of a memory.
+
+        Updates the rows of :py:`memory` starting at the address :py:`start` with :py:`values`,
+        which can be:
+
+        - A bytes-like object with single-byte elements (such as :class:`bytes`), containing
+          consecutive rows in the format returned by :meth:`memory_read`;
+        - Any other bytes-like object (such as an :class:`array.array` or a NumPy array), or
+          an iterable of :class:`int`, containing one row per element.
+
+        All of the rows are updated at once, and the processes waiting for the memory to change
+        are woken up only once. This method is equivalent to, but much faster than, calling
+        :meth:`set` for each row. It is available in both processes and testbenches.
+
+        When used in a testbench, this method returns only after the change propagates through
+        the simulated circuits, like :meth:`set`.
+
+        Raises
+        ------
+        :exc:`TypeError`
+            If :py:`memory` is not a :class:`~amaranth.hdl.MemoryData`.
+        :exc:`ValueError`
+            If the range of rows is not within the memory.
+        """
+        raise NotImplementedError
+
+    def _memory_state(self, memory, start, count):
+        if not isinstance(memory, MemoryData):
+            raise TypeError(f"Memory must be a MemoryData object, not {memory!r}")
+        if start < 0 or count < 0 or start + count > memory.depth:
+            raise ValueError(f"Memory range with {count} rows starting at address {start} is not "
+                             f"within a memory with depth {memory.depth}")
+        state = self._engine.state
+        return state.slots[state.get_memory(memory)]
+
+    def _memory_write(self, memory, start, values, byteorder):
+        if not isinstance(memory, MemoryData):
+            raise TypeError(f"Memory must be a MemoryData object, not {memory!r}")
+        rows = rows_from_values(values, Shape.cast(memory.shape).width, byteorder=byteorder)
+        self._memory_state(memory, start, len(rows)).write_rows(start, rows)
+
     @contextmanager
     def critical(self):
         """Context manager that temporarily makes the caller critical.
@@ -694,12 +775,14 @@ class ProcessContext(SimulatorContext):
     def set(self, expr: ValueCastable, value: typing.Any) -> None: ... # :nocov:
 
     def set(self, expr, value):
-        if isinstance(expr, ValueCastable):
-            shape = expr.shape()
-            if isinstance(shape, ShapeCastable):
-                value = shape.const(value)
-        value = Const.cast(value).value
-        self._engine.set_value(expr, value)
+        self._engine.get_accessor(expr).set(value)
+
+    def memory_read(self, memory, start, count, *, byteorder="little"):
+        raise TypeError("`.memory_read()` cannot be used to sample memories in simulator "
+                        "processes")
+
+    def memory_write(self, memory, start, values, *, byteorder="little"):
+        self._memory_write(memory, start, values, byteorder)
 
 
 class TestbenchContext(SimulatorContext):
@@ -710,12 +793,7 @@ class TestbenchContext(SimulatorContext):
     def get(self, expr: ValueCastable) -> typing.Any: ... # :nocov:
 
     def get(self, expr):
-        value = self._engine.get_value(expr)
-        if isinstance(expr, ValueCastable):
-            shape = expr.shape()
-            if isinstance(shape, ShapeCastable):
-                return shape.from_bits(value)
-        return value
+        return self._engine.get_accessor(expr).get()
 
     @typing.overload
     def set(self, expr: Value, value: int) -> None: ... # :nocov:
@@ -724,18 +802,22 @@ class TestbenchContext(SimulatorContext):
     def set(self, expr: ValueCastable, value: typing.Any) -> None: ... # :nocov:
 
     def set(self, expr, value):
-        if isinstance(expr, ValueCastable):
-            shape = expr.shape()
-            if isinstance(shape, ShapeCastable):
-                value = shape.const(value)
-        value = Const.cast(value).value
-        self._engine.set_value(expr, value)
+        self._engine.get_accessor(expr).set(value)
+        self._engine.step_design()
+
+    def memory_read(self, memory, start, count, *, byteorder="little"):
+        rows = self._memory_state(memory, start, count).read_rows(start, count)
+        return pack_rows(rows, Shape.cast(memory.shape).width, byteorder=byteorder)
+
+    def memory_write(self, memory, start, values, *, byteorder="little"):
+        self._memory_write(memory, start, values, byteorder)
         self._engine.step_design()
 
 
 class AsyncProcess(BaseProcess):
     def __init__(self, design, engine, constructor, *, testbench, background):
         self.constructor = constructor
+        self.testbench = testbench
         if testbench:
             self.context = TestbenchContext(design, engine, self)
         else:
@@ -748,6 +830,10 @@ class AsyncProcess(BaseProcess):
         self.runnable = True
         self.critical = not self.background
         self.waits_on = None
+        if getattr(self, "coroutine", None) is not None:
+            # The coroutine being replaced may have never run (e.g. when a checkpoint is restored
+            # after the testbench is added); closing it avoids a warning.
+            self.coroutine.close()
         self.coroutine = self.constructor(self.context)
         self.first_await = True
 
@@ -23,6 +23,12 @@ class BaseSignalState:
     curr = NotImplemented
     next = NotImplemented
 
+    def add_waker(self, waker):
+        raise NotImplementedError # :nocov:
+
+    def remove_waker(self, waker):
+        raise NotImplementedError # :nocov:
+
     def update(self, value, mask=~0):
         raise NotImplementedError # :nocov:
 
@@ -38,6 +44,12 @@ class BaseMemoryState:
     def write(self, addr, value, mask=None):
         raise NotImplementedError # :nocov:
 
+    def read_rows(self, start, count):
+        raise NotImplementedError # :nocov:
+
+    def write_rows(self, start, values):
+        raise NotImplementedError # :nocov:
+
 
 class BaseEngineState:
     def reset(self):
@@ -91,11 +103,32 @@ class BaseEngine:
     def set_value(self, expr, value):
         raise NotImplementedError # :nocov:
 
+    def get_accessor(self, expr):
+        raise NotImplementedError # :nocov:
+
     def step_design(self):
         raise NotImplementedError # :nocov:
 
     def advance(self):
         raise NotImplementedError # :nocov:
 
-    def write_vcd(self, *, vcd_file, gtkw_file, traces, fs_per_delta):
+    def advance_until(self, deadline):
+        while self.now < deadline:
+            self.advance()
+
+    def save_state(self):
+        raise NotImplementedError # :nocov:
+
+    def restore_state(self, checkpoint):
+        raise NotImplementedError # :nocov:
+
+    def profile(self):
+        raise NotImplementedError # :nocov:
+
+    def collect_toggles(self, *, traces, include, exclude):
+        raise NotImplementedError # :nocov:
+
+    def write_vcd(self, *, vcd_file, gtkw_file, traces, fs_per_delta, format="vcd",
+                  start=None, stop=None, trigger=None, pre_trigger=0, post_trigger=None,
+                  include=None, exclude=None):
         raise NotImplementedError # :nocov:
@@ -0,0 +1,137 @@
+from collections import deque
+
+
+__all__ = ["CaptureWriter"]
+
+
+class CaptureVariable:
+    __slots__ = ("scope", "name", "type", "size", "value", "last", "inner")
+
+    def __init__(self, scope, name, var_type, size, init):
+        self.scope = scope
+        self.name  = name
+        self.type  = var_type
+        self.size  = size
+        self.value = init # value at the earliest timestamp that may still be captured
+        self.last  = init # most recent value
+        self.inner = None
+
+
+class CaptureWriter:
+    """Windowed and triggered capture of waveforms.
+
+    Has the same interface as :class:`VCDWriter`, and forwards the changes that happen between
+    the :py:`start` (inclusive) and :py:`stop` (exclusive) timestamps to a writer created by
+    calling :py:`create_writer(start)` once capture begins. The values of all variables at
+    the beginning of the capture become the initial values of the created writer.
+
+    If :py:`pre_trigger` is not :py:`None`, capture only begins once :meth:`trigger` is called,
+    and includes up to :py:`pre_trigger` time units before it; the changes in this interval are
+    held in a ring buffer. If :py:`post_trigger` is not :py:`None`, capture ends that many time
+    units after the trigger, or at :py:`stop`, whichever is earlier. Only the first trigger is
+    taken into account.
+
+    If capture never begins, the created writer only contains the values of all variables at
+    the timestamp at which the writer is closed.
+    """
+
+    def __init__(self, create_writer, *, start=0, stop=None, pre_trigger=None, post_trigger=None):
+        self._create_writer = create_writer
+        self._start = start
+        self._stop = stop
+        self._pre_trigger = pre_trigger
+        self._post_trigger = post_trigger
+        self._vars = []
+        self._aliases = []
+        self._buffer = deque()
+        self._writer = None
+        self._done = False
+
+    def register_var(self, scope, name, var_type, size, init):
+        assert self._writer is None
+        var = CaptureVariable(scope, name, var_type, size, init)
+        self._vars.append(var)
+        return var
+
+    def register_alias(self, scope, name, var):
+        assert self._writer is None
+        self._aliases.append((scope, name, var))
+
+    def _begin(self, timestamp):
+        self._writer = writer = self._create_writer(timestamp)
+        for var in self._vars:
+            var.inner = writer.register_var(var.scope, var.name, var.type, var.size, var.value)
+        for scope, name, var in self._aliases:
+            writer.register_alias(scope, name, var.inner)
+
+    def _end(self, timestamp):
+        self._writer.close(timestamp)
+        self._done = True
+
+    def _trim(self, timestamp):
+        # Changes that are too old to be captured are folded into the values at the beginning
+        # of the capture.
+        buffer, horizon = self._buffer, timestamp - self._pre_trigger
+        while buffer and buffer[0][0] <= horizon:
+            _, var, value = buffer.popleft()
+            var.value = value
+
+    def trigger(self, timestamp):
+        """Begin capture if waiting for a trigger.
+
+        Returns :py:`False` if the trigger happened before the start of the capture window, and
+        should be checked again later, or :py:`True` otherwise.
+        """
+        if timestamp < self._start:
+            return False
+        if self._writer is not None or self._done:
+            return True
+        if self._stop is not None and timestamp >= self._stop:
+            return True
+        self._trim(timestamp)
+        self._begin(max(self._start, timestamp - self._pre_trigger))
+        change = self._writer.change
+        for var_timestamp, var, value in self._buffer:
+            change(var.inner, var_timestamp, value)
+        self._buffer.clear()
+        if self._post_trigger is not None:
+            stop = timestamp + self._post_trigger
+            if self._stop is None or stop < self._stop:
+                self._stop = stop
+        return True
+
+    def _forward(self, var, timestamp, value):
+        if self._stop is not None and timestamp >= self._stop:
+            self._end(self._stop)
+        else:
+            self._writer.change(var.inner, timestamp, value)
+
+    def change(self, var, timestamp, value):
+        if self._done or value == var.last:
+            return
+        var.last = value
+        if self._writer is not None:
+            self._forward(var, timestamp, value)
+        elif timestamp < self._start:
+            var.value = value
+        elif self._pre_trigger is not None:
+            if self._stop is None or timestamp < self._stop:
+                self._buffer.append((timestamp, var, value))
+                self._trim(timestamp)
+        else:
+            self._begin(self._start)
+            self._forward(var, timestamp, value)
+
+    def close(self, timestamp):
+        if self._done:
+            return
+        if self._stop is not None and timestamp > self._stop:
+            timestamp = self._stop
+        if self._writer is None:
+            if self._pre_trigger is None and self._start <= timestamp:
+                self._begin(self._start)
+            else:
+                for var in self._vars:
+                    var.value = var.last
+                self._begin(timestamp)
+        self._end(timestamp)
@@ -0,0 +1,110 @@
+import zlib
+import struct
+
+from ._membuf import row_size
+
+
+__all__ = ["Checkpoint"]
+
+
+class Checkpoint:
+    """State of a simulated design at a point in time.
+
+    Signals, memories, and clocks are identified by their hierarchical names, such that
+    a checkpoint can be restored into another simulation of the same design. Values are stored
+    in their two's complement representation, and memory rows in the format of a binary memory
+    image with little-endian rows. Only runs of memory rows that may differ from the initial
+    contents of the memory are stored; the other rows keep their initial contents.
+    """
+
+    _MAGIC = b"AMSIMCK\x02"
+
+    def __init__(self, now=0):
+        self.now      = now
+        self.signals  = {} # name: (width, curr, next)
+        self.memories = {} # name: (width, depth, [(start, rows)])
+        self.clocks   = {} # name: deadline of the next edge
+
+    def to_bytes(self):
+        chunks = []
+        def put_name(name):
+            name = name.encode("utf-8")
+            chunks.append(struct.pack("<I", len(name)))
+            chunks.append(name)
+        def put_value(width, value):
+            chunks.append(value.to_bytes((width + 7) // 8, "little"))
+
+        chunks.append(struct.pack("<QI", self.now, len(self.signals)))
+        for name, (width, curr, next) in self.signals.items():
+            put_name(name)
+            chunks.append(struct.pack("<I", width))
+            put_value(width, curr)
+            put_value(width, next)
+        chunks.append(struct.pack("<I", len(self.memories)))
+        for name, (width, depth, runs) in self.memories.items():
+            put_name(name)
+            chunks.append(struct.pack("<IQQ", width, depth, len(runs)))
+            for start, rows in runs:
+                chunks.append(struct.pack("<QQ", start, len(rows) // row_size(width)))
+                chunks.append(rows)
+        chunks.append(struct.pack("<I", len(self.clocks)))
+        for name, deadline in self.clocks.items():
+            put_name(name)
+            chunks.append(struct.pack("<Q", deadline))
+        return self._MAGIC + zlib.compress(b"".join(chunks))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = memoryview(data).cast("B")
+        if data[:len(cls._MAGIC)] != cls._MAGIC:
+            raise ValueError("Data is not a simulation checkpoint")
+        try:
+            data = zlib.decompress(data[len(cls._MAGIC):])
+        except zlib.error:
+            raise ValueError("Simulation checkpoint is corrupted") from None
+
+        offset = 0
+        def get(fmt):
+            nonlocal offset
+            values = struct.unpack_from(fmt, data, offset)
+            offset += struct.calcsize(fmt)
+            return values
+        def get_bytes(size):
+            nonlocal offset
+            if offset + size > len(data):
+                raise struct.error("unexpected end of data")
+            offset += size
+            return data[offset - size:offset]
+        def get_name():
+            length, = get("<I")
+            return bytes(get_bytes(length)).decode("utf-8")
+        def get_value(width):
+            return int.from_bytes(get_bytes((width + 7) // 8), "little")
+
+        try:
+            now, signal_count = get("<QI")
+            checkpoint = cls(now)
+            for _ in range(signal_count):
+                name = get_name()
+                width, = get("<I")
+                checkpoint.signals[name] = (width, get_value(width), get_value(width))
+            memory_count, = get("<I")
+            for _ in range(memory_count):
+                name = get_name()
+                width, depth, run_count = get("<IQQ")
+                runs = []
+                for _ in range(run_count):
+                    start, count = get("<QQ")
+                    if start + count > depth:
+                        raise struct.error("run outside of memory")
+                    runs.append((start, get_bytes(count * row_size(width))))
+                checkpoint.memories[name] = (width, depth, runs)
+            clock_count, = get("<I")
+            for _ in range(clock_count):
+                name = get_name()
+                checkpoint.clocks[name], = get("<Q")
+        except (struct.error, UnicodeDecodeError):
+            raise ValueError("Simulation checkpoint is corrupted") from None
+        if offset != len(data):
+            raise ValueError("Simulation checkpoint is corrupted")
+        return checkpoint
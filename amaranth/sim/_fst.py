@@ -0,0 +1,148 @@
+import os
+from datetime import datetime
+
+
+__all__ = ["FSTWriter"]
+
+
+class FSTVariable:
+    __slots__ = ("type", "size", "value", "handle", "emit")
+
+    def __init__(self, var_type, size, init):
+        self.type   = var_type
+        self.size   = size
+        self.value  = init
+        self.handle = None
+        self.emit   = None
+
+
+class FSTWriter:
+    """Fast Signal Trace writer.
+
+    Has the same interface as :class:`VCDWriter`, but writes the block-compressed, time-indexed
+    FST format using `libfst <https://github.com/gtkwave/libfst>`_, which is provided by
+    the ``pylibfst`` package.
+
+    The hierarchy is written once the first timestamp after :py:`start` is reached (or the writer
+    is closed), in the same order as in a VCD file; changes at the :py:`start` timestamp before
+    that only update the initial values.
+    """
+
+    def __init__(self, path, *, timescale, comment="", start=0):
+        # Although pylibfst is an optional dependency, import it here, so that it is only required
+        # when FST files are written.
+        from pylibfst import ffi, lib
+        self._ffi = ffi
+        self._lib = lib
+
+        self._path = os.fspath(path)
+        self._timescale = timescale
+        self._comment = comment
+        self._context = None
+        self._scope_vars = {}
+        self._scope_names = {}
+        self._vars = []
+        self._timestamp = start
+
+    def _declare(self, scope, name, var):
+        scope = tuple(scope)
+        names = self._scope_names.setdefault(scope, set())
+        if name in names:
+            raise KeyError(f"Duplicate var {name} in scope {'.'.join(scope)}")
+        names.add(name)
+        self._scope_vars.setdefault(scope, []).append((name, var))
+
+    def register_var(self, scope, name, var_type, size, init):
+        assert self._context is None
+        var = FSTVariable(var_type, size, init)
+        self._declare(scope, name, var)
+        self._vars.append(var)
+        return var
+
+    def register_alias(self, scope, name, var):
+        assert self._context is None
+        self._declare(scope, name, var)
+
+    def _create_emitter(self, var):
+        lib, context, handle, size = self._lib, self._context, var.handle, var.size
+        if var.type == "string":
+            def emit(value):
+                value = value.encode("utf-8")
+                lib.fstWriterEmitVariableLengthValueChange(context, handle, value, len(value))
+        elif size <= 64:
+            mask = (1 << size) - 1
+            def emit(value):
+                lib.fstWriterEmitValueChange64(context, handle, size, value & mask)
+        else:
+            modulus = 1 << size
+            def emit(value):
+                if value < 0:
+                    value += modulus
+                lib.fstWriterEmitValueChange(context, handle, format(value, f"0{size}b").encode())
+        return emit
+
+    def _create_context(self):
+        ffi, lib = self._ffi, self._lib
+        self._context = context = lib.fstWriterCreate(self._path.encode("utf-8"), 1)
+        if context == ffi.NULL:
+            raise OSError(f"Could not create FST file {self._path!r}")
+        lib.fstWriterSetPackType(context, lib.FST_WR_PT_LZ4)
+        lib.fstWriterSetTimescaleFromString(context, self._timescale.encode("utf-8"))
+        lib.fstWriterSetDate(context, str(datetime.now()).encode("utf-8"))
+        if self._comment:
+            lib.fstWriterSetComment(context, self._comment.encode("utf-8"))
+
+        prev_scope = ()
+        for scope in sorted(self._scope_vars):
+            common = 0
+            while (common < len(prev_scope) and common < len(scope) and
+                    prev_scope[common] == scope[common]):
+                common += 1
+            for _ in prev_scope[common:]:
+                lib.fstWriterSetUpscope(context)
+            for name in scope[common:]:
+                lib.fstWriterSetScope(context, lib.FST_ST_VCD_MODULE, name.encode("utf-8"),
+                                      ffi.NULL)
+            for name, var in self._scope_vars[scope]:
+                # The first declaration of a variable becomes the variable, and any others become
+                # its aliases, regardless of the order in which they were registered.
+                if var.type == "string":
+                    var_type, size = lib.FST_VT_GEN_STRING, 0
+                else:
+                    var_type, size = lib.FST_VT_VCD_WIRE, var.size
+                handle = lib.fstWriterCreateVar(context, var_type, lib.FST_VD_IMPLICIT, size,
+                                                name.encode("utf-8"), var.handle or 0)
+                if var.handle is None:
+                    var.handle = handle
+            prev_scope = scope
+        for _ in prev_scope:
+            lib.fstWriterSetUpscope(context)
+        self._scope_vars.clear()
+        self._scope_names.clear()
+
+        lib.fstWriterEmitTimeChange(context, self._timestamp)
+        for var in self._vars:
+            var.emit = self._create_emitter(var)
+            var.emit(var.value)
+
+    def change(self, var, timestamp, value):
+        if value == var.value:
+            return
+        if timestamp != self._timestamp:
+            if timestamp < self._timestamp:
+                raise ValueError(f"Out of order timestamp: {timestamp}")
+            if self._context is None:
+                self._create_context()
+            self._lib.fstWriterEmitTimeChange(self._context, timestamp)
+            self._timestamp = timestamp
+        var.value = value
+        if self._context is not None:
+            var.emit(value)
+
+    def close(self, timestamp):
+        if self._context is None:
+            self._create_context()
+        if timestamp != self._timestamp:
+            self._lib.fstWriterEmitTimeChange(self._context, timestamp)
+            self._timestamp = timestamp
+        self._lib.fstWriterClose(self._context)
@@ -0,0 +1,88 @@
+import sys
+import operator
+from array import array
+
+
+__all__ = ["row_size", "page_typecode", "unpack_rows", "pack_rows", "rows_from_values"]
+
+
+def row_size(width):
+    """Number of bytes occupied by a memory row of the given width in a binary image."""
+    return max(1, (width + 7) // 8)
+
+
+def page_typecode(width, signed):
+    """Type code of an :class:`array.array` that can hold rows of the given shape, or ``None``
+    if the rows are too wide for any of them."""
+    for typecode in ("bhilq" if signed else "BHILQ"):
+        if array(typecode).itemsize * 8 >= width:
+            return typecode
+    return None
+
+
+def _array_typecode(size):
+    for typecode in "BHILQ":
+        if array(typecode).itemsize == size:
+            return typecode
+    return None
+
+
+def unpack_rows(buffer, width, *, byteorder="little"):
+    """Convert a bytes-like object containing consecutive rows to a list of row values."""
+    size = row_size(width)
+    # The views are released before returning, so that the caller can close the buffer (which
+    # may be a memory-mapped file) right away.
+    with memoryview(buffer) as view, view.cast("B") as buffer:
+        if len(buffer) % size != 0:
+            raise ValueError(f"Memory image size {len(buffer)} is not a multiple of the row "
+                             f"size {size}")
+        typecode = _array_typecode(size)
+        if typecode is not None:
+            rows = array(typecode)
+            rows.frombytes(buffer)
+            if byteorder != sys.byteorder and size > 1:
+                rows.byteswap()
+            values = rows.tolist()
+        else:
+            values = [int.from_bytes(buffer[offset:offset + size], byteorder)
+                      for offset in range(0, len(buffer), size)]
+    if width < size * 8:
+        mask = (1 << width) - 1
+        values = [value & mask for value in values]
+    return values
+
+
+def pack_rows(values, width, *, byteorder="little"):
+    """Convert a list of row values to a :class:`bytes` object containing consecutive rows."""
+    size = row_size(width)
+    # Values of signed rows may be negative; only their two's complement representation is used.
+    mask = (1 << width) - 1
+    typecode = _array_typecode(size)
+    if typecode is not None:
+        rows = array(typecode, [value & mask for value in values])
+        if byteorder != sys.byteorder and size > 1:
+            rows.byteswap()
+        return rows.tobytes()
+    else:
+        return b"".join((value & mask).to_bytes(size, byteorder) for value in values)
+
+
+def rows_from_values(values, width, *, byteorder="little"):
+    """Convert row values provided by a testbench to a list of row values.
+
+    A bytes-like object with single-byte elements (such as :class:`bytes`) contains consecutive
+    rows, like a binary image; any other buffer (such as an :class:`array.array` or a NumPy array)
+    or iterable contains one row per element.
+    """
+    mask = (1 << width) - 1
+    try:
+        view = memoryview(values)
+    except TypeError:
+        return [operator.index(value) & mask for value in values]
+    if view.itemsize == 1:
+        return unpack_rows(view, width, byteorder=byteorder)
+    try:
+        elems = view.tolist()
+    except NotImplementedError:
+        elems = values
+    return [operator.index(value) & mask for value in elems]
@@ -0,0 +1,172 @@
+import os
+import pickle
+import traceback
+import multiprocessing
+import multiprocessing.connection
+
+from .core import Simulator
+
+
+__all__ = ["SimulationResult", "run_many"]
+
+
+class SimulationResult:
+    """Result of a simulation run by :func:`run_many`.
+
+    Attributes
+    ----------
+    index : :class:`int`
+        Position of the testbench in the :py:`testbenches` argument of :func:`run_many`.
+    name : :class:`str`
+        Name of the testbench function.
+    exception : :class:`BaseException` or :py:`None`
+        Exception raised while setting up or running the simulation, or :py:`None` if it completed
+        successfully. If the exception could not be transferred from the worker process, it is
+        replaced with a :exc:`RuntimeError` describing it.
+    traceback : :class:`str` or :py:`None`
+        Formatted traceback of :py:`exception`, or :py:`None` if it completed successfully.
+    vcd_file : :class:`str` or :py:`None`
+        Path to the waveform file captured for this simulation, if any.
+    """
+    def __init__(self, index, name, *, exception=None, traceback=None, vcd_file=None):
+        self.index     = index
+        self.name      = name
+        self.exception = exception
+        self.traceback = traceback
+        self.vcd_file  = vcd_file
+
+    @property
+    def passed(self):
+        """Whether the simulation completed without raising an exception."""
+        return self.exception is None
+
+    def __repr__(self):
+        status = "passed" if self.passed else f"failed: {self.exception!r}"
+        return f"<SimulationResult {self.index} {self.name} {status}>"
+
+
+def _testbench_name(testbench):
+    return getattr(testbench, "__qualname__", None) or repr(testbench)
+
+
+def _format_exception(exc):
+    return "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+
+
+def _run_one(sim, dut, index, testbench, vcd_file):
+    try:
+        testbench(sim, dut)
+        if vcd_file is not None:
+            with sim.write_vcd(vcd_file):
+                sim.run()
+        else:
+            sim.run()
+    except Exception as exc:
+        return SimulationResult(index, _testbench_name(testbench),
+            exception=exc, traceback=_format_exception(exc),
+            vcd_file=vcd_file)
+    else:
+        return SimulationResult(index, _testbench_name(testbench), vcd_file=vcd_file)
+
+
+def _run_worker(sim, dut, index, testbench, vcd_file, conn):
+    result = _run_one(sim, dut, index, testbench, vcd_file)
+    if result.exception is not None:
+        try:
+            pickle.loads(pickle.dumps(result.exception))
+        except Exception:
+            # The exception (or something it refers to) cannot be transferred to the parent.
+            result.exception = RuntimeError(repr(result.exception))
+    conn.send(result)
+    conn.close()
+
+
+def run_many(design_factory, testbenches, *, workers=None, vcd_dir=None, engine="pysim"):
+    """Run independent simulations of the same design in parallel.
+
+    The design is created by calling :py:`design_factory()`, elaborated, and compiled once. Each
+    simulation then starts from a copy of the compiled simulator made by forking the current
+    process, which shares the compiled design with its parent. Each of :py:`testbenches` is
+    a function called as :py:`testbench(sim, dut)`, where :py:`sim` is a :class:`Simulator` that
+    has not been run yet and :py:`dut` is the design returned by :py:`design_factory`; it adds
+    clocks, processes, and testbenches to :py:`sim`, which is then run until completion.
+
+    At most :py:`workers` simulations run at once; if not specified, one simulation is run for each
+    CPU available to the current process. If :py:`vcd_dir` is specified, waveforms of each
+    simulation are captured to a file in that directory. Every simulation uses the simulation
+    engine specified by :py:`engine`, which accepts the same values as the :py:`engine` argument
+    of :class:`Simulator` (:py:`"pysim"` or :py:`"cxxrtl"`).
+
+    If the platform does not support forking processes, or :py:`workers` is 1, the simulations are
+    run one after another in the current process, calling :py:`design_factory` again for each
+    of them.
+
+    Returns
+    -------
+    iterator of :class:`SimulationResult`
+        Result of each simulation, in the order in which they complete.
+    """
+    testbenches = list(testbenches)
+    if workers is None:
+        if hasattr(os, "sched_getaffinity"):
+            workers = len(os.sched_getaffinity(0))
+        else:
+            workers = os.cpu_count() or 1
+    if not isinstance(workers, int) or workers < 1:
+        raise TypeError(f"Number of workers must be a positive integer, not {workers!r}")
+    if vcd_dir is not None:
+        os.makedirs(vcd_dir, exist_ok=True)
+
+    def vcd_file(index):
+        if vcd_dir is not None:
+            return os.path.join(vcd_dir, f"{index}.vcd")
+
+    if workers == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return _run_serial(design_factory, testbenches, vcd_file, engine)
+    return _run_forked(design_factory, testbenches, vcd_file, engine, workers)
+
+
+def _run_serial(design_factory, testbenches, vcd_file, engine):
+    for index, testbench in enumerate(testbenches):
+        dut = design_factory()
+        sim = Simulator(dut, engine=engine)
+        yield _run_one(sim, dut, index, testbench, vcd_file(index))
+
+
+def _run_forked(design_factory, testbenches, vcd_file, engine, workers):
+    dut = design_factory()
+    sim = Simulator(dut, engine=engine)
+    context = multiprocessing.get_context("fork")
+
+    pending = list(enumerate(testbenches))
+    pending.reverse()
+    running = {} # connection -> (index, testbench, process)
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                index, testbench = pending.pop()
+                recv_conn, send_conn = context.Pipe(duplex=False)
+                process = context.Process(target=_run_worker,
+                    args=(sim, dut, index, testbench, vcd_file(index), send_conn), daemon=True)
+                process.start()
+                send_conn.close()
+                running[recv_conn] = index, testbench, process
+
+            for conn in multiprocessing.connection.wait(list(running)):
+                index, testbench, process = running.pop(conn)
+                try:
+                    result = conn.recv()
+                except (EOFError, OSError, pickle.UnpicklingError):
+                    process.join()
+                    exc = RuntimeError(f"Simulation worker exited with code {process.exitcode}")
+                    result = SimulationResult(index, _testbench_name(testbench),
+                        exception=exc, traceback=_format_exception(exc), vcd_file=vcd_file(index))
+                else:
+                    process.join()
+                conn.close()
+                yield result
+    finally:
+        for conn, (_index, _testbench, process) in running.items():
+            process.kill()
+            process.join()
+            conn.close()
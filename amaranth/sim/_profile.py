@@ -0,0 +1,236 @@
+import json
+import time
+
+
+__all__ = ["ProfileEntry", "SimulationProfile", "Profiler"]
+
+
+class ProfileEntry:
+    """Statistics collected for one part of a profiled simulation.
+
+    Attributes
+    ----------
+    kind : :class:`str`
+        :py:`"rtl"` for a part of the design, :py:`"testbench"` or :py:`"process"` for
+        a testbench or a process, or :py:`"trigger"` for the triggers awaited by a testbench or
+        a process (sampling values and waking it up).
+    name : :class:`str`
+        Hierarchical name of the fragment for a part of the design (or of the innermost fragment
+        containing all of the evaluated fragments, if the design is flattened); the name of
+        the function otherwise.
+    domain : :class:`str` or :py:`None`
+        Clock domain of a part of the design (:py:`"comb"` for combinational logic), or
+        :py:`None`.
+    activations : :class:`int`
+        Number of times it was run.
+    time : :class:`float`
+        Wall time spent running it, in seconds, excluding the time spent running the other parts
+        of the simulation that it caused to run (such as the design being evaluated when
+        a testbench calls :meth:`ctx.set() <SimulatorContext.set>`).
+    changes : :class:`int`
+        Number of updates of signals and memories that it scheduled, excluding those scheduled by
+        the other parts of the simulation that it caused to run.
+    """
+    def __init__(self, kind, name, domain=None):
+        self.kind        = kind
+        self.name        = name
+        self.domain      = domain
+        self.activations = 0
+        self.time        = 0.0
+        self.changes     = 0
+
+    @property
+    def label(self):
+        if self.domain is None:
+            return f"{self.kind} {self.name}"
+        return f"{self.kind} {self.name} [{self.domain}]"
+
+    def __repr__(self):
+        return (f"<ProfileEntry {self.label} activations={self.activations} "
+                f"time={self.time:.6f} changes={self.changes}>")
+
+
+class SimulationProfile:
+    """Profile of a simulation, collected by :meth:`Simulator.profile`.
+
+    Attributes
+    ----------
+    time : :class:`float`
+        Wall time spent in the profiled part of the simulation, in seconds. The time that is not
+        accounted for by the entries is spent scheduling and committing changes.
+    delta_cycles : :class:`int`
+        Number of delta cycles that were simulated.
+    """
+
+    _SORT_KEYS = {
+        "time":        lambda entry: -entry.time,
+        "activations": lambda entry: -entry.activations,
+        "changes":     lambda entry: -entry.changes,
+        "name":        lambda entry: (entry.name, entry.kind, entry.domain or ""),
+    }
+
+    def __init__(self):
+        self.time = 0.0
+        self.delta_cycles = 0
+        self._entries = []
+        # Exclusive time spent in each stack of nested entries, for `to_collapsed()`.
+        self._stacks = {}
+
+    def entries(self, *, sort="time"):
+        """Entries of the profile.
+
+        Returns a list of :class:`ProfileEntry` objects for the parts of the simulation that
+        were run at least once, sorted by :py:`sort`: :py:`"time"`, :py:`"activations"`, or
+        :py:`"changes"` (in descending order), or :py:`"name"` (in ascending order).
+
+        Raises
+        ------
+        :exc:`ValueError`
+            If :py:`sort` is not one of the sort keys listed above.
+        """
+        if sort not in self._SORT_KEYS:
+            raise ValueError(f"Sort key must be one of {', '.join(map(repr, self._SORT_KEYS))}, "
+                             f"not {sort!r}")
+        return sorted((entry for entry in self._entries if entry.activations),
+                      key=self._SORT_KEYS[sort])
+
+    def report(self, *, sort="time", limit=None):
+        """Format the profile as a table.
+
+        Returns a human-readable table of the first :py:`limit` (by default, all) entries, sorted
+        as in :meth:`entries`.
+        """
+        lines = [f"{'time':>10} {'%time':>6} {'activations':>12} {'changes':>10}  name"]
+        for entry in self.entries(sort=sort)[:limit]:
+            percent = 100 * entry.time / self.time if self.time else 0.0
+            lines.append(f"{entry.time:>9.6f}s {percent:>5.1f}% {entry.activations:>12} "
+                         f"{entry.changes:>10}  {entry.label}")
+        lines.append(f"total {self.time:.6f}s in {self.delta_cycles} delta cycles")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        """Export the profile as JSON.
+
+        Returns a string containing a JSON object with the :py:`"time"` and
+        :py:`"delta_cycles"` attributes, and a list of :py:`"entries"`, each with the attributes of
+        a :class:`ProfileEntry`.
+        """
+        return json.dumps({
+            "time": self.time,
+            "delta_cycles": self.delta_cycles,
+            "entries": [
+                {
+                    "kind": entry.kind,
+                    "name": entry.name,
+                    "domain": entry.domain,
+                    "activations": entry.activations,
+                    "time": entry.time,
+                    "changes": entry.changes,
+                }
+                for entry in self.entries()
+            ]
+        }, indent=2)
+
+    def to_collapsed(self):
+        """Export the profile in the collapsed stack format.
+
+        Returns a string in the format accepted by flame graph tools (such as
+        :program:`flamegraph.pl`, Speedscope, or Inferno): each line contains a stack of
+        entries separated by :py:`;`, nested in a :py:`simulation` root, and the exclusive time
+        spent in it in microseconds.
+        """
+        lines = []
+        accounted = sum(self._stacks.values())
+        stacks = [((), self.time - accounted), *self._stacks.items()]
+        for stack, stack_time in stacks:
+            microseconds = round(stack_time * 1e6)
+            if microseconds > 0:
+                path = ";".join(("simulation", *(entry.label for entry in stack)))
+                lines.append(f"{path} {microseconds}")
+        return "".join(f"{line}\n" for line in lines)
+
+
+class _CountingSet(set):
+    # Replaces the set of pending signal and memory states while profiling, to count the updates.
+    __slots__ = ("count",)
+
+    def add(self, item):
+        if item not in self:
+            self.count += 1
+            set.add(self, item)
+
+
+class Profiler:
+    """Collects a :class:`SimulationProfile` by instrumenting the parts of a simulation."""
+
+    def __init__(self, state):
+        self.profile = SimulationProfile()
+        self._state = state
+        self._stack = []
+        self._entries = {}
+        self._restore = []
+        self._start = None
+
+    def entry(self, key, kind, name, domain=None):
+        try:
+            return self._entries[key]
+        except KeyError:
+            entry = self._entries[key] = ProfileEntry(kind, name, domain)
+            self.profile._entries.append(entry)
+            return entry
+
+    def measure(self, entry, function, *args):
+        # Time spent (and updates scheduled) in nested entries is subtracted from the outer ones.
+        pending = self._state.pending
+        stack = self._stack
+        frame = [entry, 0.0, 0]
+        stack.append(frame)
+        start_count = pending.count
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            count = pending.count - start_count
+            stack.pop()
+            entry.activations += 1
+            entry.time += elapsed - frame[1]
+            entry.changes += count - frame[2]
+            if stack:
+                stack[-1][1] += elapsed
+                stack[-1][2] += count
+            path = tuple(frame[0] for frame in stack) + (entry,)
+            stacks = self.profile._stacks
+            stacks[path] = stacks.get(path, 0.0) + elapsed - frame[1]
+
+    def instrument(self, process, entry):
+        run = process.run
+        def profiled_run():
+            return self.measure(entry, run)
+        process.run = profiled_run
+        self._restore.append((process, run))
+
+    def begin(self, delta_cycles):
+        state = self._state
+        pending = _CountingSet(state.pending)
+        pending.count = 0
+        for slot in state.slots:
+            slot.pending = pending
+        state.pending = pending
+        self._delta_cycles = delta_cycles
+        self._start = time.perf_counter()
+
+    def end(self, delta_cycles):
+        self.profile.time += time.perf_counter() - self._start
+        self.profile.delta_cycles += delta_cycles - self._delta_cycles
+        state = self._state
+        pending = set(state.pending)
+        for slot in state.slots:
+            slot.pending = pending
+        state.pending = pending
+        for process, run in reversed(self._restore):
+            if "run" in getattr(process, "__dict__", ()):
+                del process.run
+            else:
+                process.run = run
+        self._restore.clear()
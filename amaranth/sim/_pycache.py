@@ -0,0 +1,107 @@
+import os
+import sys
+import marshal
+import hashlib
+import importlib.util
+from collections import OrderedDict
+
+from .. import __version__
+from .. import _cache
+
+
+__all__ = ["design_key", "load_plan", "store_plan", "trim_cache"]
+
+
+# Compiled designs that were stored or loaded by this process, most recently used last.
+_memory_cache = OrderedDict()
+_MEMORY_CACHE_LIMIT = 64
+
+# Total size of the on-disk cache after which the least recently used entries are evicted.
+_DISK_CACHE_LIMIT = 256 << 20
+
+
+def _cache_dir():
+    # The on-disk cache may be disabled with `AMARANTH_pysim_cache=0`, or moved elsewhere by setting
+    # it to a path.
+    return _cache.cache_dir("pysim", default=True)
+
+
+def design_key(*parts):
+    """Compute the cache key of a design described by ``parts``, which must have a stable
+    :func:`repr`."""
+    # Marshalled code objects are only compatible with the exact version of the interpreter that
+    # produced them; the bytecode magic number changes whenever the format does. The code itself
+    # depends on the code generator, which may be edited without changing the version of Amaranth.
+    from . import _pyrtl, pysim
+    digest = hashlib.sha256()
+    digest.update(importlib.util.MAGIC_NUMBER)
+    digest.update(sys.implementation.cache_tag.encode() if sys.implementation.cache_tag else b"")
+    digest.update(__version__.encode())
+    digest.update(_cache.source_digest(_pyrtl, sys.modules[__name__], pysim).encode())
+    digest.update(b"\0")
+    digest.update(repr(parts).encode())
+    return digest.hexdigest()
+
+
+def _load(cache_dir, key):
+    path = os.path.join(cache_dir, f"{key}.marshal")
+    try:
+        with open(path, "rb") as file:
+            plan = marshal.load(file)
+        # Mark the entry as recently used, for eviction.
+        os.utime(path)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    return plan
+
+
+def _store(cache_dir, key, plan):
+    try:
+        with _cache.replace_atomically(cache_dir, f"{key}.marshal") as temp_path:
+            with open(temp_path, "wb") as file:
+                marshal.dump(plan, file)
+    except OSError:
+        pass
+
+
+def trim_cache(limit=_DISK_CACHE_LIMIT):
+    """Evict least recently used entries until the on-disk cache is at most ``limit`` bytes."""
+    cache_dir = _cache_dir()
+    if cache_dir is not None:
+        _cache.trim_cache_dir(cache_dir, limit, suffix=".marshal")
+
+
+def load_plan(key):
+    """Return the compiled processes of the design identified by ``key``, or ``None`` if they
+    are not in the cache."""
+    if key in _memory_cache:
+        _memory_cache.move_to_end(key)
+        return _memory_cache[key]
+
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return None
+    plan = _load(cache_dir, key)
+    if not (isinstance(plan, tuple) and len(plan) == 3):
+        return None
+    _remember(key, plan)
+    return plan
+
+
+def store_plan(key, plan):
+    """Add the compiled processes of the design identified by ``key`` to the cache.
+
+    Returns true if the on-disk cache was updated.
+    """
+    _remember(key, plan)
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return False
+    _store(cache_dir, key, plan)
+    return True
+
+
+def _remember(key, plan):
+    _memory_cache[key] = plan
+    if len(_memory_cache) > _MEMORY_CACHE_LIMIT:
+        _memory_cache.popitem(last=False)
@@ -5,33 +5,39 @@ __all__ = ["PyClockProcess"]
 
 
 class PyClockProcess(BaseProcess):
-    def __init__(self, state, signal, *, phase, period):
+    def __init__(self, state, signal, *, phase, period, high=1):
         assert len(signal) == 1
 
         self.state  = state
         self.slot   = self.state.get_signal(signal)
         self.phase  = phase
         self.period = period
+        # Value of the clock signal while it is high; differs from 1 if several lanes are
+        # simulated in lockstep.
+        self.high   = high
 
         self.reset()
 
     def reset(self):
         self.runnable = True
         self.critical = False
-
-        self.initial = True
+        # Time of the next edge. If it is set before the process runs (when the simulation is
+        # restored from a checkpoint), it is used instead of the phase to schedule the first edge.
+        self.deadline = None
 
     def run(self):
         self.runnable = False
 
+        # This process only runs once, to schedule the first edge; afterwards, the clock is toggled
+        # directly from the timeline, without scheduling this process to run again.
+        timeline  = self.state.timeline
+        clk_state = self.state.slots[self.slot]
+        high      = self.high
         def waker():
-            self.runnable = True
-
-        if self.initial:
-            self.initial = False
-            self.state.set_delay_waker(self.phase, waker)
-
-        else:
-            clk_state = self.state.slots[self.slot]
-            clk_state.update(not clk_state.curr)
+            clk_state.update(0 if clk_state.curr else high)
+            self.deadline = timeline.now + self.period // 2
             self.state.set_delay_waker(self.period // 2, waker)
+
+        if self.deadline is None:
+            self.deadline = timeline.now + self.phase
+        self.state.set_delay_waker(self.deadline - timeline.now, waker)
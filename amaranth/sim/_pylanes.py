@@ -0,0 +1,940 @@
+from ..hdl import *
+from ..hdl._ast import SignalSet, Property
+from ..hdl._xfrm import StatementVisitor
+from ..hdl._mem import MemoryInstance, MemoryData
+from ._pyrtl import (_PythonEmitter, _ValueCompiler, _FragmentCompiler, PyRTLProcess, pin_blame,
+                     edge_waker)
+from ._pyeval import value_to_string
+
+
+__all__ = ["Lanes", "compile_lane_sampler", "compile_lane_getter", "compile_lane_setter"]
+
+
+class _Table(dict):
+    # Constants used by the generated code, computed when they are first looked up.
+    __slots__ = ("_compute",)
+
+    def __init__(self, compute):
+        self._compute = compute
+
+    def __missing__(self, key):
+        value = self[key] = self._compute(key)
+        return value
+
+
+class Lanes:
+    """Representation of the values of several lanes simulated in lockstep.
+
+    A value is stored for all lanes in a single integer, with bit ``b`` of lane ``l`` at position
+    ``b * count + l``; that is, the ``b``-th bits of all lanes form the ``b``-th *plane*, which is
+    ``count`` bits wide. Values are stored in their two's complement representation, without
+    sign extension.
+
+    Bitwise operations, slices, concatenations, and (for values with a single plane) multiplexers
+    are evaluated for all lanes at once using a few operations on integers. Arithmetic and
+    comparisons are evaluated one plane at a time, and division and remainder one lane at a time.
+    """
+    def __init__(self, count):
+        self.count = count
+        self.mask  = (1 << count) - 1
+
+        # Mask of the first `width` planes.
+        self.ones    = _Table(lambda width: (1 << width * count) - 1)
+        # One set bit in each of the first `width` planes; multiplying a single plane by this
+        # constant replicates it `width` times.
+        self.repeat  = _Table(lambda width: self.ones[width] // self.mask)
+        # Planes `start` to `stop`, exclusive, of an integer replicated in every plane.
+        self.fields  = _Table(lambda key: self.ones[key[1]] ^ self.ones[key[0]])
+        self.repeats = _Table(lambda key: self.repeat[key[1]] ^ self.repeat[key[0]])
+        # An unsigned integer, broadcast to every lane.
+        self.consts  = _Table(self._broadcast)
+
+        self.helpers = {
+            "lanes":    self.mask,
+            "ones":     self.ones,
+            "rep":      self.repeat,
+            "fields":   self.fields,
+            "reps":     self.repeats,
+            "bc":       self.consts,
+            "add":      self._add,
+            "sub":      self._sub,
+            "mul":      self._mul,
+            "lt":       self._lt,
+            "any_":     self._any,
+            "parity":   self._parity,
+            "shl":      self._shl,
+            "shr":      self._shr,
+            "lmap":     self._map,
+            "lanes_of": self.lanes_of,
+            "lane_value": self.lane_value,
+            "zdiv":     lambda lhs, rhs: 0 if rhs == 0 else lhs // rhs,
+            "zmod":     lambda lhs, rhs: 0 if rhs == 0 else lhs % rhs,
+            "value_to_string": value_to_string,
+            "pin_blame": pin_blame,
+        }
+
+    def _broadcast(self, value):
+        assert value >= 0
+        result = 0
+        while value:
+            low = value & -value
+            result |= 1 << ((low.bit_length() - 1) * self.count)
+            value ^= low
+        return result * self.mask
+
+    def broadcast(self, value, width):
+        """Pack :py:`value` (an :class:`int`) into every lane."""
+        return self.consts[value & ((1 << width) - 1)]
+
+    def pack(self, values, width):
+        """Pack one :class:`int` per lane."""
+        planes = [0] * width
+        width_mask = (1 << width) - 1
+        for lane, value in enumerate(values):
+            value &= width_mask
+            while value:
+                low = value & -value
+                planes[low.bit_length() - 1] |= 1 << lane
+                value ^= low
+        result = 0
+        for plane in reversed(planes):
+            result = (result << self.count) | plane
+        return result
+
+    def unpack(self, packed, width, signed=False):
+        """Unpack :py:`packed` into a :class:`list` with one :class:`int` per lane."""
+        count, mask = self.count, self.mask
+        values = [0] * count
+        for bit in range(width):
+            plane = (packed >> (bit * count)) & mask
+            while plane:
+                low = plane & -plane
+                values[low.bit_length() - 1] |= 1 << bit
+                plane ^= low
+        if signed and width > 0:
+            sign = 1 << (width - 1)
+            values = [value - (sign << 1) if value & sign else value for value in values]
+        return values
+
+    def uniform(self, packed):
+        """Return the value of :py:`packed` if it is the same in every lane, or :py:`None`."""
+        count = self.count
+        planes = (packed.bit_length() + count - 1) // count
+        first = packed & self.repeat[planes]
+        if first * self.mask != packed:
+            return None
+        value = 0
+        for bit in range(planes):
+            value |= ((first >> (bit * count)) & 1) << bit
+        return value
+
+    def lanes_of(self, mask):
+        """Indices of the lanes whose bit is set in :py:`mask` (a single plane)."""
+        lanes = []
+        while mask:
+            low = mask & -mask
+            lanes.append(low.bit_length() - 1)
+            mask ^= low
+        return lanes
+
+    def lane_value(self, packed, lane, width, signed):
+        value = 0
+        for bit in range(width):
+            value |= ((packed >> (bit * self.count + lane)) & 1) << bit
+        if signed and width > 0 and value & (1 << (width - 1)):
+            value -= 1 << width
+        return value
+
+    # The following operations accept and return packed values with at most `width` planes.
+
+    def _add(self, lhs, rhs, width):
+        # Ripple-carry addition; stops as soon as there is no carry and the rest of `rhs` is zero,
+        # which is common when adding small constants.
+        count, mask = self.count, self.mask
+        result = carry = shift = 0
+        stop = width * count
+        while shift < stop:
+            lhs_plane = (lhs >> shift) & mask
+            rhs_plane = (rhs >> shift) & mask
+            half = lhs_plane ^ rhs_plane
+            result |= (half ^ carry) << shift
+            carry = (lhs_plane & rhs_plane) | (half & carry)
+            shift += count
+            if not carry and not rhs >> shift:
+                return result | ((lhs >> shift) << shift)
+        return result
+
+    def _sub(self, lhs, rhs, width):
+        count, mask = self.count, self.mask
+        result = borrow = shift = 0
+        stop = width * count
+        while shift < stop:
+            lhs_plane = (lhs >> shift) & mask
+            rhs_plane = (rhs >> shift) & mask
+            half = lhs_plane ^ rhs_plane
+            result |= (half ^ borrow) << shift
+            borrow = ((mask ^ lhs_plane) & rhs_plane) | ((mask ^ half) & borrow)
+            shift += count
+            if not borrow and not rhs >> shift:
+                return result | ((lhs >> shift) << shift)
+        return result
+
+    def _mul(self, lhs, rhs, width):
+        # Shift-and-add multiplication; each partial product only includes the lanes in which
+        # the corresponding bit of `rhs` is set.
+        count, mask = self.count, self.mask
+        ones, repeat = self.ones[width], self.repeat[width]
+        result = 0
+        for bit in range(width):
+            plane = (rhs >> (bit * count)) & mask
+            if plane:
+                partial = (lhs << (bit * count)) & ones & (plane * repeat)
+                result = self._add(result, partial, width)
+        return result
+
+    def _lt(self, lhs, rhs, width, signed):
+        # Returns the plane of lanes in which `lhs < rhs`, which is the borrow out of `lhs - rhs`.
+        count, mask = self.count, self.mask
+        if signed and width > 0:
+            sign = mask << ((width - 1) * count)
+            lhs ^= sign
+            rhs ^= sign
+        borrow = 0
+        for shift in range(0, width * count, count):
+            lhs_plane = (lhs >> shift) & mask
+            rhs_plane = (rhs >> shift) & mask
+            borrow = ((mask ^ lhs_plane) & rhs_plane) | ((mask ^ lhs_plane ^ rhs_plane) & borrow)
+        return borrow
+
+    def _any(self, value, width):
+        # Returns the plane of lanes in which any bit of `value` is set, folding it in half until
+        # a single plane is left.
+        count = self.count
+        while width > 1:
+            half = width >> 1
+            width -= half
+            value = (value & self.ones[width]) | (value >> (width * count))
+        return value
+
+    def _parity(self, value, width):
+        count = self.count
+        while width > 1:
+            half = width >> 1
+            width -= half
+            value = (value & self.ones[width]) ^ (value >> (width * count))
+        return value
+
+    def _shl(self, value, amount, amount_width, width, scale=1):
+        # Shifts each lane by a different amount, one bit of the amount at a time.
+        count, mask = self.count, self.mask
+        value &= self.ones[width]
+        for bit in range(amount_width):
+            plane = (amount >> (bit * count)) & mask
+            if plane:
+                distance = scale << bit
+                if distance < width:
+                    shifted = (value << (distance * count)) & self.ones[width]
+                else:
+                    shifted = 0
+                select = plane * self.repeat[width]
+                value = (value & ~select) | (shifted & select)
+        return value
+
+    def _shr(self, value, amount, amount_width, width, signed, scale=1):
+        count, mask = self.count, self.mask
+        if signed and width > 0:
+            sign = (value >> ((width - 1) * count)) & mask
+        else:
+            sign = 0
+        for bit in range(amount_width):
+            plane = (amount >> (bit * count)) & mask
+            if plane:
+                distance = scale << bit
+                if distance < width:
+                    shifted = value >> (distance * count)
+                    if sign:
+                        shifted |= sign * self.repeats[width - distance, width]
+                else:
+                    shifted = sign * self.repeat[width]
+                select = plane * self.repeat[width]
+                value = (value & ~select) | (shifted & select)
+        return value
+
+    def _map(self, function, width, lhs, lhs_width, lhs_signed, rhs, rhs_width, rhs_signed):
+        # Fallback for operations that cannot be evaluated for all lanes at once.
+        return self.pack(map(function,
+                             self.unpack(lhs, lhs_width, lhs_signed),
+                             self.unpack(rhs, rhs_width, rhs_signed)), width)
+
+
+def _match(lanes, test, width, patterns):
+    # Returns an expression for the plane of lanes in which the value of the `test` variable
+    # matches any of the `patterns`.
+    gen_checks = []
+    for pattern in patterns:
+        mask  = int("".join("0" if b == "-" else "1" for b in pattern) or "0", 2)
+        value = int("".join("0" if b == "-" else  b  for b in pattern) or "0", 2)
+        if mask == 0:
+            return "lanes"
+        gen_diff = f"({test} ^ bc[{value}])" if value else test
+        if mask != (1 << width) - 1:
+            gen_diff = f"({gen_diff} & bc[{mask}])"
+        if width == 1:
+            gen_checks.append(f"(lanes ^ {gen_diff})")
+        else:
+            gen_checks.append(f"(lanes ^ any_({gen_diff}, {width}))")
+    return f"({' | '.join(gen_checks)})"
+
+
+class _LaneRHSValueCompiler(_ValueCompiler):
+    # Returns expressions for packed values with exactly as many planes as the width of the value;
+    # values are only sign extended (using `cast()`) where they are used.
+    def __init__(self, state, emitter, *, mode, inputs=None, rrhs=None, local_signals=None):
+        super().__init__(state, emitter)
+        assert mode in ("curr", "next")
+        self.lanes = state.lanes
+        self.mode = mode
+        self.inputs = inputs
+        self.local_signals = local_signals
+        self.rrhs = rrhs or self
+
+    def cast(self, value, width):
+        return self.extend(self(value), len(value), value.shape().signed, width)
+
+    def extend(self, code, code_width, signed, width):
+        if width < code_width:
+            return f"({code} & ones[{width}])"
+        if width == code_width or not signed or code_width == 0:
+            return code
+        gen_value = self.emitter.def_var("ext", code)
+        return (f"({gen_value} | ({gen_value} >> {(code_width - 1) * self.lanes.count}) * "
+                f"reps[{code_width}, {width}])")
+
+    def on_Const(self, value):
+        const = value.value & ((1 << len(value)) - 1)
+        if const == 0:
+            return "0"
+        return f"bc[{const}]"
+
+    def on_Signal(self, value):
+        if self.local_signals is not None and value in self.local_signals:
+            return f"next_{self.state.get_signal(value)}"
+
+        if self.inputs is not None:
+            self.inputs.add(value)
+
+        if self.mode == "curr":
+            return f"slots[{self.state.get_signal(value)}].{self.mode}"
+        else:
+            return f"next_{self.state.get_signal(value)}"
+
+    def on_unknown_value(self, value):
+        if isinstance(value, MemoryData._Row):
+            return f"slots[{self.state.get_memory(value._memory)}].read({value._index})"
+        super().on_unknown_value(value) # :nocov:
+
+    def on_Operator(self, value):
+        width = len(value)
+        if len(value.operands) == 1:
+            arg, = value.operands
+            if value.operator == "~":
+                return f"({self.cast(arg, width)} ^ ones[{width}])"
+            if value.operator == "-":
+                return f"sub(0, {self.cast(arg, width)}, {width})"
+            if value.operator in ("b", "r|"):
+                if len(arg) <= 1:
+                    return self(arg)
+                return f"any_({self(arg)}, {len(arg)})"
+            if value.operator == "r&":
+                if len(arg) == 0:
+                    return "lanes"
+                return f"(lanes ^ any_({self(arg)} ^ ones[{len(arg)}], {len(arg)}))"
+            if value.operator == "r^":
+                if len(arg) <= 1:
+                    return self(arg)
+                return f"parity({self(arg)}, {len(arg)})"
+            if value.operator in ("u", "s"):
+                # These operators don't change the bit pattern, only its interpretation.
+                return self(arg)
+        elif len(value.operands) == 2:
+            lhs, rhs = value.operands
+            if value.operator == "+":
+                return f"add({self.cast(lhs, width)}, {self.cast(rhs, width)}, {width})"
+            if value.operator == "-":
+                return f"sub({self.cast(lhs, width)}, {self.cast(rhs, width)}, {width})"
+            if value.operator == "*":
+                return f"mul({self.cast(lhs, width)}, {self.cast(rhs, width)}, {width})"
+            if value.operator in ("//", "%"):
+                helper = "zdiv" if value.operator == "//" else "zmod"
+                return (f"lmap({helper}, {width}, "
+                        f"{self(lhs)}, {len(lhs)}, {lhs.shape().signed}, "
+                        f"{self(rhs)}, {len(rhs)}, {rhs.shape().signed})")
+            if value.operator in ("&", "|", "^"):
+                return f"({self.cast(lhs, width)} {value.operator} {self.cast(rhs, width)})"
+            if value.operator in ("<<", ">>"):
+                signed = lhs.shape().signed
+                if isinstance(rhs, Const):
+                    amount = rhs.value
+                    if value.operator == "<<":
+                        if amount >= width:
+                            return "0"
+                        return (f"(({self.cast(lhs, width)} << {amount * self.lanes.count}) & "
+                                f"ones[{width}])")
+                    else:
+                        if amount == 0:
+                            return self(lhs)
+                        if amount >= width:
+                            if not signed:
+                                return "0"
+                            return (f"(({self(lhs)} >> {(width - 1) * self.lanes.count}) * "
+                                    f"rep[{width}])")
+                        shifted = f"({self(lhs)} >> {amount * self.lanes.count})"
+                        return self.extend(shifted, width - amount, signed, width)
+                if value.operator == "<<":
+                    return (f"shl({self.cast(lhs, width)}, {self(rhs)}, {len(rhs)}, "
+                            f"{width})")
+                else:
+                    return (f"shr({self(lhs)}, {self(rhs)}, {len(rhs)}, "
+                            f"{width}, {signed})")
+            if value.operator in ("==", "!=", "<", "<=", ">", ">="):
+                lhs_signed = lhs.shape().signed
+                rhs_signed = rhs.shape().signed
+                # Operands are compared as signed integers if either of them is signed; unsigned
+                # operands are then zero extended by one bit to make them non-negative.
+                common = max(len(lhs) + (rhs_signed and not lhs_signed),
+                             len(rhs) + (lhs_signed and not rhs_signed))
+                signed = lhs_signed or rhs_signed
+                gen_lhs = self.cast(lhs, common)
+                gen_rhs = self.cast(rhs, common)
+                if value.operator in ("==", "!="):
+                    if common == 0:
+                        gen_ne = "0"
+                    elif common == 1:
+                        gen_ne = f"({gen_lhs} ^ {gen_rhs})"
+                    else:
+                        gen_ne = f"any_({gen_lhs} ^ {gen_rhs}, {common})"
+                    if value.operator == "==":
+                        return f"(lanes ^ {gen_ne})"
+                    return gen_ne
+                if value.operator == "<":
+                    return f"lt({gen_lhs}, {gen_rhs}, {common}, {signed})"
+                if value.operator == ">":
+                    return f"lt({gen_rhs}, {gen_lhs}, {common}, {signed})"
+                if value.operator == "<=":
+                    return f"(lanes ^ lt({gen_rhs}, {gen_lhs}, {common}, {signed}))"
+                if value.operator == ">=":
+                    return f"(lanes ^ lt({gen_lhs}, {gen_rhs}, {common}, {signed}))"
+        raise NotImplementedError(f"Operator '{value.operator}' not implemented") # :nocov:
+
+    def on_Slice(self, value):
+        if value.start == 0 and value.stop == len(value.value):
+            return self(value.value)
+        return (f"(({self(value.value)} >> {value.start * self.lanes.count}) & "
+                f"ones[{len(value)}])")
+
+    def on_Part(self, value):
+        # The value is sign extended to cover every bit that may be selected, such that the bits
+        # beyond its end are the same as in a single lane simulation.
+        width = len(value.value) + value.width
+        gen_shifted = (f"shr({self.cast(value.value, width)}, {self.rrhs(value.offset)}, "
+                       f"{len(value.offset)}, {width}, {value.value.shape().signed}, "
+                       f"{value.stride})")
+        return f"({gen_shifted} & ones[{value.width}])"
+
+    def on_Concat(self, value):
+        gen_parts = []
+        offset = 0
+        for part in value.parts:
+            if len(part) > 0:
+                gen_part = self(part)
+                if offset:
+                    gen_part = f"({gen_part} << {offset * self.lanes.count})"
+                gen_parts.append(gen_part)
+            offset += len(part)
+        if gen_parts:
+            return f"({' | '.join(gen_parts)})"
+        return f"0"
+
+    def on_SwitchValue(self, value):
+        # Every case that matches in at least one lane is evaluated, and its value is selected in
+        # the lanes where it is the first one to match.
+        width = len(value)
+        gen_test = self.emitter.def_var("test", self.rrhs(value.test))
+        gen_rest = self.emitter.def_var("rest", "lanes")
+        gen_value = self.emitter.def_var("rhs_switch", "0")
+        for patterns, elem in value.cases:
+            if patterns is not None and not patterns:
+                continue
+            if patterns is None:
+                gen_hit = gen_rest
+            else:
+                gen_hit = self.emitter.def_var("hit",
+                    f"{_match(self.lanes, gen_test, len(value.test), patterns)} & {gen_rest}")
+            self.emitter.append(f"if {gen_hit}:")
+            with self.emitter.indent():
+                gen_elem = self.cast(elem, width)
+                if width > 0:
+                    self.emitter.append(f"{gen_value} |= {gen_elem} & {gen_hit} * rep[{width}]")
+                if gen_hit != gen_rest:
+                    self.emitter.append(f"{gen_rest} ^= {gen_hit}")
+            if patterns is None:
+                break
+        return gen_value
+
+
+class _LaneLHSValueCompiler(_ValueCompiler):
+    # Returns functions that emit an assignment of a packed value to the given value. The value
+    # being assigned has exactly as many planes as the width of the value, and it is assigned to
+    # the bits selected by a mask with the same number of planes, or to every bit if the mask is
+    # `None`.
+    def __init__(self, state, emitter, *, rhs, outputs=None):
+        super().__init__(state, emitter)
+        self.lanes = state.lanes
+        self.rrhs = rhs
+        self.outputs = outputs
+
+    def on_Const(self, value):
+        raise TypeError # :nocov:
+
+    def on_Signal(self, value):
+        if self.outputs is not None:
+            self.outputs.add(value)
+
+        def gen(arg, mask):
+            signal_index = self.state.get_signal(value)
+            if mask is None:
+                self.emitter.append(f"next_{signal_index} = {arg}")
+            else:
+                gen_mask = self.emitter.def_var("mask", mask)
+                self.emitter.append(f"next_{signal_index} = "
+                                    f"next_{signal_index} & ~{gen_mask} | {arg} & {gen_mask}")
+        return gen
+
+    def on_unknown_value(self, value):
+        if isinstance(value, MemoryData._Row):
+            def gen(arg, mask):
+                memory_index = self.state.get_memory(value._memory)
+                self.emitter.append(f"slots[{memory_index}].write({value._index}, {arg}, "
+                                    f"{mask})")
+            return gen
+        super().on_unknown_value(value) # :nocov:
+
+    def on_Operator(self, value):
+        if value.operator in ("u", "s"):
+            return self(value.operands[0])
+        raise TypeError # :nocov:
+
+    def on_Slice(self, value):
+        def gen(arg, mask):
+            shift = value.start * self.lanes.count
+            if mask is None:
+                mask = f"fields[{value.start}, {value.stop}]"
+            else:
+                mask = f"({mask} << {shift})"
+            self(value.value)(f"({arg} << {shift})", mask)
+        return gen
+
+    def on_Part(self, value):
+        def gen(arg, mask):
+            width = len(value.value)
+            gen_offset = self.emitter.def_var("offset", self.rrhs(value.offset))
+            if mask is None:
+                mask = f"ones[{value.width}]"
+            shift = f"{gen_offset}, {len(value.offset)}, {width}, {value.stride}"
+            self(value.value)(f"shl({arg}, {shift})", f"shl({mask}, {shift})")
+        return gen
+
+    def on_Concat(self, value):
+        def gen(arg, mask):
+            gen_arg = self.emitter.def_var("cat", arg)
+            if mask is not None:
+                mask = self.emitter.def_var("cat_mask", mask)
+            offset = 0
+            for part in value.parts:
+                if len(part) > 0:
+                    shift = offset * self.lanes.count
+                    self(part)(f"(({gen_arg} >> {shift}) & ones[{len(part)}])",
+                               None if mask is None else
+                               f"(({mask} >> {shift}) & ones[{len(part)}])")
+                offset += len(part)
+        return gen
+
+    def on_SwitchValue(self, value):
+        def gen(arg, mask):
+            gen_test = self.emitter.def_var("test", self.rrhs(value.test))
+            gen_rest = self.emitter.def_var("rest", "lanes")
+            for patterns, elem in value.cases:
+                if patterns is not None and not patterns:
+                    continue
+                if patterns is None:
+                    gen_hit = gen_rest
+                else:
+                    gen_hit = self.emitter.def_var("hit",
+                        f"{_match(self.lanes, gen_test, len(value.test), patterns)} & {gen_rest}")
+                self.emitter.append(f"if {gen_hit}:")
+                with self.emitter.indent():
+                    width = len(elem)
+                    gen_mask = f"{gen_hit} * rep[{width}]"
+                    if mask is not None:
+                        gen_mask = f"({mask} & {gen_mask})"
+                    self(elem)(f"({arg} & ones[{width}])", gen_mask)
+                    if gen_hit != gen_rest:
+                        self.emitter.append(f"{gen_rest} ^= {gen_hit}")
+                if patterns is None:
+                    break
+        return gen
+
+
+class _LaneStatementCompiler(StatementVisitor):
+    # Statements are executed for all lanes at once. Instead of branching, each statement within
+    # a `Switch` only updates the lanes in which its case is the first one to match (which are
+    # tracked in the `enable` variable), and is skipped entirely if there are no such lanes.
+    def __init__(self, state, emitter, *, inputs=None, outputs=None, local_signals=None):
+        self.state = state
+        self.emitter = emitter
+        self.lanes = state.lanes
+        self.rhs = _LaneRHSValueCompiler(state, emitter, mode="curr", inputs=inputs,
+                                         local_signals=local_signals)
+        self.lhs = _LaneLHSValueCompiler(state, emitter, rhs=self.rhs, outputs=outputs)
+        self.enable = None
+
+    def on_statements(self, stmts):
+        for stmt in stmts:
+            self(stmt)
+        if not stmts:
+            self.emitter.append("pass")
+
+    def on_Assign(self, stmt):
+        width = len(stmt.lhs)
+        gen_rhs = self.rhs.cast(stmt.rhs, width)
+        if self.enable is None:
+            gen_mask = None
+        else:
+            gen_mask = f"{self.enable} * rep[{width}]"
+        self.lhs(stmt.lhs)(gen_rhs, gen_mask)
+
+    def on_Switch(self, stmt):
+        gen_test = self.emitter.def_var("test", self.rhs(stmt.test))
+        gen_rest = self.emitter.def_var("rest", self.enable or "lanes")
+        for patterns, stmts, _src_loc in stmt.cases:
+            if patterns is not None and not patterns:
+                continue
+            if patterns is None:
+                gen_hit = gen_rest
+            else:
+                gen_hit = self.emitter.def_var("hit",
+                    f"{_match(self.lanes, gen_test, len(stmt.test), patterns)} & {gen_rest}")
+            self.emitter.append(f"if {gen_hit}:")
+            with self.emitter.indent():
+                if gen_hit != gen_rest:
+                    self.emitter.append(f"{gen_rest} ^= {gen_hit}")
+                outer_enable, self.enable = self.enable, gen_hit
+                self(stmts)
+                self.enable = outer_enable
+            if patterns is None:
+                break
+
+    def emit_format(self, format, gen_lane):
+        format_string = []
+        args = []
+        for chunk in format._chunks:
+            if isinstance(chunk, str):
+                format_string.append(chunk.replace("{", "{{").replace("}", "}}"))
+            else:
+                value, format_desc = chunk
+                gen_value = self.emitter.def_var("format_value", self.rhs(value))
+                gen_value = (f"lane_value({gen_value}, {gen_lane}, {len(value)}, "
+                             f"{value.shape().signed})")
+                if format_desc.endswith("s"):
+                    format_desc = format_desc[:-1]
+                    gen_value = f"value_to_string({gen_value})"
+                format_string.append(f"{{:{format_desc}}}")
+                args.append(gen_value)
+        format_string = "".join(format_string)
+        args = ", ".join(args)
+        return f"{format_string!r}.format({args})"
+
+    def _emit_for_lanes(self, gen_lanes):
+        gen_lane = self.emitter.gen_var("lane")
+        self.emitter.append(f"for {gen_lane} in lanes_of({gen_lanes}):")
+        return gen_lane
+
+    def on_Print(self, stmt):
+        gen_lane = self._emit_for_lanes(self.enable or "lanes")
+        with self.emitter.indent():
+            self.emitter.append(f"print({self.emit_format(stmt.message, gen_lane)}, end='')")
+
+    def on_Property(self, stmt):
+        gen_test = self.rhs(stmt.test)
+        if len(stmt.test) > 1:
+            gen_test = f"any_({gen_test}, {len(stmt.test)})"
+        if stmt.kind == Property.Kind.Cover:
+            gen_lanes = gen_test if self.enable is None else f"{self.enable} & {gen_test}"
+            gen_lane = self._emit_for_lanes(gen_lanes)
+            with self.emitter.indent():
+                filename, line = stmt.src_loc
+                if stmt.message is not None:
+                    self.emitter.append(f"print(\"Coverage hit at \" {filename!r} \":{line}:\", {self.emit_format(stmt.message, gen_lane)})")
+                else:
+                    self.emitter.append(f"print(\"Coverage hit at \" {filename!r} \":{line}:\")")
+        else:
+            gen_failed = f"(lanes ^ {gen_test})"
+            if self.enable is not None:
+                gen_failed = f"{self.enable} & {gen_failed}"
+            gen_lane = self._emit_for_lanes(gen_failed)
+            with self.emitter.indent():
+                if stmt.kind == Property.Kind.Assert:
+                    kind = "Assertion"
+                elif stmt.kind == Property.Kind.Assume:
+                    kind = "Assumption"
+                else:
+                    assert False # :nocov:
+                if stmt.message is not None:
+                    self.emitter.append(f"pin_blame({stmt.src_loc!r}, AssertionError(f\"{kind} violated in lane {{{gen_lane}}}: \" + {self.emit_format(stmt.message, gen_lane)}))")
+                else:
+                    self.emitter.append(f"pin_blame({stmt.src_loc!r}, AssertionError(f\"{kind} violated in lane {{{gen_lane}}}\"))")
+
+
+def lane_edge_waker(process, run_queue, mask):
+    # Wakes up the process if the signal rises in any lane.
+    def waker(curr, next):
+        if next & ~curr & mask and not process.runnable:
+            process.runnable = True
+            run_queue.append(process)
+        return True
+    return waker
+
+
+def lane_clock_waker(process, run_queue, polarity, ticked):
+    # Same as `edge_waker`, but also records that the clock edge has occurred, for domains with
+    # an asynchronous reset (whose processes also run when the reset is asserted in any lane).
+    def waker(curr, next):
+        if next == polarity:
+            ticked[0] = True
+            if not process.runnable:
+                process.runnable = True
+                run_queue.append(process)
+        return True
+    return waker
+
+
+class _LaneFragmentCompiler(_FragmentCompiler):
+    # The wakers of domains with an asynchronous reset share state with the code of the process,
+    # which cannot be stored in the cache.
+    cacheable = False
+
+    def __init__(self, state, *, flatten=False):
+        super().__init__(state, flatten=flatten)
+        self.lanes = state.lanes
+        # Name of the variable indicating whether the clock edge has occurred, when compiling
+        # a process for a domain with an asynchronous reset.
+        self._clocked = None
+
+    def _init_value(self, signal):
+        init = signal.init & ((1 << len(signal)) - 1)
+        return f"bc[{init}]" if init else "0"
+
+    def _helpers(self):
+        return self.lanes.helpers
+
+    def _emit_comb(self, emitter, fragment, domain_stmts, inputs, local_signals=None):
+        _LaneStatementCompiler(self.state, emitter, inputs=inputs,
+                               local_signals=local_signals)(domain_stmts)
+
+        if isinstance(fragment, MemoryInstance):
+            memory_index = self.state.get_memory(fragment._data)
+            rhs = _LaneRHSValueCompiler(self.state, emitter, mode="curr", inputs=inputs,
+                                        local_signals=local_signals)
+            lhs = _LaneLHSValueCompiler(self.state, emitter, rhs=rhs)
+
+            for port in fragment._read_ports:
+                if port._domain != "comb":
+                    continue
+
+                addr = rhs(port._addr)
+                data = emitter.def_var("read_data", f"slots[{memory_index}].read_lanes({addr})")
+                lhs(port._data)(data, None)
+
+    def _emit_sync(self, emitter, fragment, domain_name, domain_stmts, lhs_masks):
+        domain = fragment.domains[domain_name]
+
+        for (signal, _) in lhs_masks.masks():
+            signal_index = self.state.get_signal(signal)
+            emitter.append(f"next_{signal_index} = slots[{signal_index}].next")
+
+        if self._clocked is not None:
+            emitter.append(f"if {self._clocked}:")
+            emitter._level += 1
+            emitter.append("pass")
+        _LaneStatementCompiler(self.state, emitter)(domain_stmts)
+        if self._clocked is not None:
+            emitter._level -= 1
+
+        if domain.rst is not None:
+            rhs = _LaneRHSValueCompiler(self.state, emitter, mode="curr")
+            rst = emitter.def_var("rst", rhs(domain.rst))
+            emitter.append(f"if {rst}:")
+            with emitter.indent():
+                emitter.append("pass")
+                for (signal, _) in lhs_masks.masks():
+                    if not signal.reset_less:
+                        signal_index = self.state.get_signal(signal)
+                        mask = emitter.def_var("mask", f"{rst} * rep[{len(signal)}]")
+                        emitter.append(f"next_{signal_index} = next_{signal_index} & ~{mask} | "
+                                       f"{self._init_value(signal)} & {mask}")
+
+        if isinstance(fragment, MemoryInstance):
+            if self._clocked is not None:
+                emitter.append(f"if {self._clocked}:")
+                emitter._level += 1
+                emitter.append("pass")
+
+            memory_index = self.state.get_memory(fragment._data)
+            rhs = _LaneRHSValueCompiler(self.state, emitter, mode="curr")
+            lhs = _LaneLHSValueCompiler(self.state, emitter, rhs=rhs)
+
+            write_vals = {}
+
+            for idx, port in enumerate(fragment._write_ports):
+                if port._domain != domain_name:
+                    continue
+
+                addr = emitter.def_var("write_addr", rhs(port._addr))
+                data = emitter.def_var("write_data", rhs(port._data))
+                en = rhs(Cat(bit.replicate(port._granularity) for bit in port._en))
+                en = emitter.def_var("write_en", en)
+                emitter.append(f"slots[{memory_index}].write_lanes({addr}, {data}, {en})")
+                write_vals[idx] = addr, data, en
+
+            for port in fragment._read_ports:
+                if port._domain != domain_name:
+                    continue
+
+                en = emitter.def_var("read_en", rhs(port._en))
+                emitter.append(f"if {en}:")
+                with emitter.indent():
+                    addr = emitter.def_var("read_addr", rhs(port._addr))
+                    data = emitter.def_var("read_data", f"slots[{memory_index}].read_lanes({addr})")
+
+                    for idx in port._transparent_for:
+                        waddr, wdata, wen = write_vals[idx]
+                        same = f"lanes ^ any_({addr} ^ {waddr}, {len(port._addr)})"
+                        mask = emitter.def_var("mask",
+                            f"{wen} & ({same}) * rep[{len(port._data)}]")
+                        emitter.append(f"{data} = {data} & ~{mask} | {wdata} & {mask}")
+
+                    lhs(port._data)(data, f"{en} * rep[{len(port._data)}]")
+
+            if self._clocked is not None:
+                emitter._level -= 1
+
+    def _emit_updates(self, emitter, masks):
+        for (signal, mask) in masks:
+            signal_index = self.state.get_signal(signal)
+            mask &= (1 << len(signal)) - 1
+            if mask == (1 << len(signal)) - 1:
+                emitter.append(f"slots[{signal_index}].update(next_{signal_index})")
+            else:
+                emitter.append(f"slots[{signal_index}].update(next_{signal_index}, bc[{mask}])")
+
+    def _compile_sync(self, domain, blocks):
+        domain_process = PyRTLProcess(is_comb=False,
+            fragments=tuple(fragment for fragment, *_ in blocks), domain=domain.name)
+
+        # The clock is expected to be the same in every lane, but the reset may differ.
+        clk_polarity = self.lanes.mask if domain.clk_edge == "pos" else 0
+        ticked = [False]
+        if domain.async_reset and domain.rst is not None:
+            self.state.add_signal_waker(domain.clk,
+                lane_clock_waker(domain_process, self.state.run_queue, clk_polarity, ticked))
+            self.state.add_signal_waker(domain.rst,
+                lane_edge_waker(domain_process, self.state.run_queue, self.lanes.mask))
+            self._clocked = "clocked"
+        else:
+            self.state.add_signal_waker(domain.clk,
+                edge_waker(domain_process, self.state.run_queue, clk_polarity))
+            self._clocked = None
+
+        emitter = _PythonEmitter()
+        emitter.append(f"def run():")
+        emitter._level += 1
+        if self._clocked is not None:
+            emitter.append(f"clocked = ticked[0]")
+            emitter.append(f"ticked[0] = False")
+
+        for fragment, domain_name, domain_stmts, lhs_masks in blocks:
+            self._emit_sync(emitter, fragment, domain_name, domain_stmts, lhs_masks)
+            self._emit_updates(emitter, lhs_masks.masks())
+        self._define_run(domain_process, emitter, ticked=ticked)
+        return domain_process
+
+
+def compile_lane_sampler(state, values):
+    """Compile a function that returns the current values of ``values`` as a tuple, with
+    a :class:`list` of the values in each lane for each of them."""
+    emitter = _PythonEmitter()
+    emitter.append(f"def sample():")
+    emitter._level += 1
+    rhs = _LaneRHSValueCompiler(state, emitter, mode="curr")
+    results = [f"unpack({rhs(value)}, {len(value)}, {value.shape().signed})" for value in values]
+    emitter.append(f"return ({''.join(f'{result}, ' for result in results)})")
+
+    exec_locals = {
+        "slots": state.slots,
+        "unpack": state.lanes.unpack,
+        **state.lanes.helpers,
+    }
+    exec(compile(emitter.flush(), "<string>", "exec"), exec_locals)
+    return exec_locals["sample"]
+
+
+def compile_lane_getter(state, value):
+    """Compile a function that returns the current value of ``value`` in every lane, packed."""
+    emitter = _PythonEmitter()
+    emitter.append(f"def get():")
+    emitter._level += 1
+    rhs = _LaneRHSValueCompiler(state, emitter, mode="curr")
+    emitter.append(f"return {rhs(value)}")
+
+    exec_locals = {
+        "slots": state.slots,
+        **state.lanes.helpers,
+    }
+    exec(compile(emitter.flush(), "<string>", "exec"), exec_locals)
+    return exec_locals["get"]
+
+
+def compile_lane_setter(state, value):
+    """Compile a function that assigns its argument (a packed value) to ``value``.
+
+    Raises :exc:`TypeError` if ``value`` cannot be assigned to, and :exc:`ValueError` if ``value``
+    includes a combinationally driven signal.
+    """
+    emitter = _PythonEmitter()
+    emitter._level += 1
+    rhs = _LaneRHSValueCompiler(state, emitter, mode="curr")
+    outputs = SignalSet()
+    lhs = _LaneLHSValueCompiler(state, emitter, rhs=rhs, outputs=outputs)
+    lhs(value)("value", None)
+    body = emitter.flush()
+
+    indices = [state.get_signal(signal) for signal in outputs]
+    if any(state.slots[index].is_comb for index in indices):
+        raise ValueError(f"Value {value!r} includes a combinationally driven signal")
+
+    prologue = _PythonEmitter()
+    prologue.append(f"def set(value):")
+    prologue._level += 1
+    epilogue = _PythonEmitter()
+    epilogue._level += 1
+    for index in indices:
+        prologue.append(f"next_{index} = slots[{index}].next")
+        epilogue.append(f"slots[{index}].update(next_{index})")
+    code = prologue.flush() + body + epilogue.flush()
+
+    exec_locals = {
+        "slots": state.slots,
+        **state.lanes.helpers,
+    }
+    exec(compile(code, "<string>", "exec"), exec_locals)
+    return exec_locals["set"]
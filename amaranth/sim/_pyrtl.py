@@ -4,10 +4,13 @@ from contextlib import contextmanager
 import sys
 
 from ..hdl import *
-from ..hdl._ast import SignalSet, _StatementList, Property
+from ..hdl._ast import SignalSet, SignalDict, _StatementList, Property, Assign, Switch, Slice, Part
+from ..hdl._ast import Concat, SwitchValue, Operator
 from ..hdl._xfrm import ValueVisitor, StatementVisitor, LHSMaskCollector
 from ..hdl._mem import MemoryInstance
+from .._utils import union
 from ._base import BaseProcess
+from ._pycache import design_key, load_plan, store_plan
 from ._pyeval import value_to_string
 
 
@@ -18,10 +21,19 @@ _USE_PATTERN_MATCHING = (sys.version_info >= (3, 10))
 
 
 class PyRTLProcess(BaseProcess):
-    __slots__ = ("is_comb", "runnable", "critical", "run")
+    __slots__ = ("is_comb", "runnable", "critical", "run", "rank", "outputs",
+                 "fragments", "domain")
 
-    def __init__(self, *, is_comb):
+    def __init__(self, *, is_comb, fragments=(), domain=None):
         self.is_comb  = is_comb
+        # Position of a combinational process in the topological order (if it has been levelized),
+        # and the states of the signals it drives.
+        self.rank     = None
+        self.outputs  = ()
+        # Fragments whose statements for the clock domain named `domain` are evaluated by
+        # the process; used to identify it in profiles.
+        self.fragments = fragments
+        self.domain   = domain
 
         self.reset()
 
@@ -154,12 +166,15 @@ class _ValueCompiler(ValueVisitor, _Compiler):
 
 
 class _RHSValueCompiler(_ValueCompiler):
-    def __init__(self, state, emitter, *, mode, inputs=None, rrhs=None):
+    def __init__(self, state, emitter, *, mode, inputs=None, rrhs=None, local_signals=None):
         super().__init__(state, emitter)
         assert mode in ("curr", "next")
         self.mode = mode
         # If not None, `inputs` gets populated with RHS signals.
         self.inputs = inputs
+        # If not None, the values of `local_signals` are read from `next_*` local variables
+        # instead of the signal states; these signals do not get added to `inputs`.
+        self.local_signals = local_signals
         # When this compiler is used to grab the "next" value from within _LHSValueCompiler,
         # we still need to use "curr" mode for reading part offsets etc. Allow setting a separate
         # _RhsValueCompiler for these contexts.
@@ -178,6 +193,9 @@ class _RHSValueCompiler(_ValueCompiler):
         return f"{value.value}"
 
     def on_Signal(self, value):
+        if self.local_signals is not None and value in self.local_signals:
+            return f"next_{self.state.get_signal(value)}"
+
         if self.inputs is not None:
             self.inputs.add(value)
 
@@ -371,9 +389,10 @@ class _StatementCompiler(StatementVisitor, _Compiler):
         "pin_blame": pin_blame,
     }
 
-    def __init__(self, state, emitter, *, inputs=None, outputs=None):
+    def __init__(self, state, emitter, *, inputs=None, outputs=None, local_signals=None):
         super().__init__(state, emitter)
-        self.rhs = _RHSValueCompiler(state, emitter, mode="curr", inputs=inputs)
+        self.rhs = _RHSValueCompiler(state, emitter, mode="curr", inputs=inputs,
+                                     local_signals=local_signals)
         self.lhs = _LHSValueCompiler(state, emitter, rhs=self.rhs, outputs=outputs)
 
     def on_statements(self, stmts):
@@ -447,35 +466,351 @@ class _StatementCompiler(StatementVisitor, _Compiler):
         return emitter.flush()
 
 
-def comb_waker(process):
+def comb_waker(process, run_queue):
     def waker(curr, next):
-        process.runnable = True
+        if not process.runnable:
+            process.runnable = True
+            run_queue.append(process)
         return True
     return waker
 
 
-def edge_waker(process, polarity):
+def edge_waker(process, run_queue, polarity):
     def waker(curr, next):
-        if next == polarity:
+        if next == polarity and not process.runnable:
             process.runnable = True
+            run_queue.append(process)
         return True
     return waker
 
 
-def memory_waker(process):
+def memory_waker(process, run_queue):
     def waker():
-        process.runnable = True
+        if not process.runnable:
+            process.runnable = True
+            run_queue.append(process)
         return True
     return waker
 
 
-class _FragmentCompiler:
+def compile_sampler(state, values):
+    """Compile a function that returns the current values of ``values`` as a tuple.
+
+    Raises :exc:`TypeError` or :exc:`NotImplementedError` if one of ``values`` cannot be compiled.
+    """
+    emitter = _PythonEmitter()
+    emitter.append(f"def sample():")
+    emitter._level += 1
+    rhs = _RHSValueCompiler(state, emitter, mode="curr")
+    results = [rhs.sign(value) for value in values]
+    emitter.append(f"return ({''.join(f'{result}, ' for result in results)})")
+
+    exec_locals = {
+        "slots": state.slots,
+        **_ValueCompiler.helpers,
+    }
+    exec(compile(emitter.flush(), "<string>", "exec"), exec_locals)
+    return exec_locals["sample"]
+
+
+def compile_getter(state, value):
+    """Compile a function that returns the current value of ``value``.
+
+    Raises :exc:`TypeError` or :exc:`NotImplementedError` if ``value`` cannot be compiled.
+    """
+    emitter = _PythonEmitter()
+    emitter.append(f"def get():")
+    emitter._level += 1
+    rhs = _RHSValueCompiler(state, emitter, mode="curr")
+    emitter.append(f"return {rhs.sign(value)}")
+
+    exec_locals = {
+        "slots": state.slots,
+        **_ValueCompiler.helpers,
+    }
+    exec(compile(emitter.flush(), "<string>", "exec"), exec_locals)
+    return exec_locals["get"]
+
+
+def compile_setter(state, value):
+    """Compile a function that assigns its argument (an :class:`int`) to ``value``.
+
+    Raises :exc:`TypeError` or :exc:`NotImplementedError` if ``value`` cannot be compiled or
+    assigned to, and :exc:`ValueError` if ``value`` includes a combinationally driven signal.
+    """
+    emitter = _PythonEmitter()
+    emitter._level += 1
+    rhs = _RHSValueCompiler(state, emitter, mode="curr")
+    outputs = SignalSet()
+    lhs = _LHSValueCompiler(state, emitter, rhs=rhs, outputs=outputs)
+    lhs(value)("value")
+    body = emitter.flush()
+
+    indices = [state.get_signal(signal) for signal in outputs]
+    if any(state.slots[index].is_comb for index in indices):
+        raise ValueError(f"Value {value!r} includes a combinationally driven signal")
+
+    # The signals being assigned are only known once the assignment has been compiled, so their
+    # read-modify-write prologue and update epilogue are emitted separately.
+    prologue = _PythonEmitter()
+    prologue.append(f"def set(value):")
+    prologue._level += 1
+    epilogue = _PythonEmitter()
+    epilogue._level += 1
+    for index in indices:
+        prologue.append(f"next_{index} = slots[{index}].next")
+        epilogue.append(f"slots[{index}].update(next_{index})")
+    code = prologue.flush() + body + epilogue.flush()
+
+    exec_locals = {
+        "slots": state.slots,
+        **_ValueCompiler.helpers,
+    }
+    exec(compile(code, "<string>", "exec"), exec_locals)
+    return exec_locals["set"]
+
+
+def _rank_comb(comb_inputs, comb_outputs):
+    # Rank combinational nodes (processes or fragments) such that each node is ranked higher than
+    # every node driving its inputs, so that they can be evaluated in a single pass over the ranks.
+    # Nodes that are a part of (or are driven by) a combinational cycle are left unranked.
+    drivers = {}
+    for node, outputs in comb_outputs.items():
+        for signal_index in outputs:
+            drivers.setdefault(signal_index, []).append(node)
+
+    fanout = {node: [] for node in comb_inputs}
+    fanin_count = {}
+    for node, inputs in comb_inputs.items():
+        fanin_count[node] = 0
+        for signal_index in inputs:
+            for driver in drivers.get(signal_index, ()):
+                fanout[driver].append(node)
+                fanin_count[node] += 1
+
+    levels = {node: 0 for node, count in fanin_count.items() if count == 0}
+    ready = list(levels)
+    ranks = {}
+    while ready:
+        node = ready.pop()
+        ranks[node] = levels[node]
+        for consumer in fanout[node]:
+            levels[consumer] = max(levels.get(consumer, 0), ranks[node] + 1)
+            fanin_count[consumer] -= 1
+            if fanin_count[consumer] == 0:
+                ready.append(consumer)
+    return ranks
+
+
+def _lhs_index_signals(value):
+    # Signals that are read to determine which bits of an lvalue are assigned.
+    if isinstance(value, Operator):
+        return union((_lhs_index_signals(operand) for operand in value.operands), start=SignalSet())
+    elif isinstance(value, Slice):
+        return _lhs_index_signals(value.value)
+    elif isinstance(value, Part):
+        return _lhs_index_signals(value.value) | value.offset._rhs_signals()
+    elif isinstance(value, Concat):
+        return union((_lhs_index_signals(part) for part in value.parts), start=SignalSet())
+    elif isinstance(value, SwitchValue):
+        return union((_lhs_index_signals(elem) for _patterns, elem in value.cases),
+                     start=value.test._rhs_signals())
+    else:
+        return SignalSet()
+
+
+def _stmt_inputs(stmt):
+    # Signals that are read by a statement; same as the `inputs` collected by `_StatementCompiler`.
+    if isinstance(stmt, Assign):
+        return _lhs_index_signals(stmt.lhs) | stmt.rhs._rhs_signals()
+    elif isinstance(stmt, Switch):
+        return union((_stmt_inputs(stmts) for _patterns, stmts, _src_loc in stmt.cases),
+                     start=stmt.test._rhs_signals())
+    elif isinstance(stmt, list):
+        return union((_stmt_inputs(s) for s in stmt), start=SignalSet())
+    else:
+        return stmt._rhs_signals()
+
+
+class _DesignKeyBuilder(ValueVisitor, StatementVisitor):
+    # Describes everything that the code generated for a design depends on as a flat list of
+    # tokens. Signals and memories are given their slots in the order in which they are first
+    # encountered here, so the slot layout is fully determined by the design, and is described
+    # by the tokens as well.
     def __init__(self, state):
         self.state = state
+        self.tokens = []
+        self.fragments = []
 
-    def __call__(self, fragment):
-        processes = set()
+    def on_Const(self, value):
+        self.tokens += ("C", value.value, len(value), value.shape().signed)
+
+    def on_Signal(self, value):
+        self.tokens += ("S", self.state.get_signal(value))
+
+    def on_ClockSignal(self, value):
+        self.tokens += ("clk", value.domain)
+
+    def on_ResetSignal(self, value):
+        self.tokens += ("rst", value.domain)
 
+    def on_AnyValue(self, value):
+        self.tokens += ("any", value.kind.value, len(value))
+
+    def on_Initial(self, value):
+        self.tokens.append("init")
+
+    def on_Operator(self, value):
+        self.tokens += ("O", value.operator, len(value.operands))
+        for operand in value.operands:
+            self.on_value(operand)
+
+    def on_Slice(self, value):
+        self.tokens += ("L", value.start, value.stop)
+        self.on_value(value.value)
+
+    def on_Part(self, value):
+        self.tokens += ("P", value.width, value.stride)
+        self.on_value(value.value)
+        self.on_value(value.offset)
+
+    def on_Concat(self, value):
+        self.tokens += ("K", len(value.parts))
+        for part in value.parts:
+            self.on_value(part)
+
+    def on_SwitchValue(self, value):
+        self.tokens += ("W", len(value.cases))
+        self.on_value(value.test)
+        for patterns, elem in value.cases:
+            self.tokens.append(patterns)
+            self.on_value(elem)
+
+    def on_format(self, format):
+        if format is None:
+            self.tokens.append(None)
+            return
+        self.tokens += ("F", len(format._chunks))
+        for chunk in format._chunks:
+            if isinstance(chunk, str):
+                self.tokens.append(chunk)
+            else:
+                value, format_desc = chunk
+                self.tokens += ("f", format_desc)
+                self.on_value(value)
+
+    def on_Assign(self, stmt):
+        self.tokens.append("=")
+        self.on_value(stmt.lhs)
+        self.on_value(stmt.rhs)
+
+    def on_Print(self, stmt):
+        self.tokens.append("print")
+        self.on_format(stmt.message)
+
+    def on_Property(self, stmt):
+        self.tokens += ("prop", stmt.kind.value, stmt.src_loc)
+        self.on_value(stmt.test)
+        self.on_format(stmt.message)
+
+    def on_Switch(self, stmt):
+        self.tokens += ("switch", len(stmt.cases))
+        self.on_value(stmt.test)
+        for patterns, stmts, _src_loc in stmt.cases:
+            self.tokens.append(patterns)
+            self.on_statement(stmts)
+
+    def on_statements(self, stmts):
+        self.tokens += ("[", len(stmts))
+        for stmt in stmts:
+            self.on_statement(stmt)
+
+    def on_fragment(self, fragment, domains):
+        self.fragments.append(fragment)
+        self.tokens += (type(fragment).__name__, len(fragment.subfragments))
+        for domain_name in sorted(domains(fragment)):
+            self.tokens.append(domain_name)
+            if domain_name != "comb":
+                domain = fragment.domains[domain_name]
+                self.tokens += (domain.clk_edge, domain.async_reset)
+                self.on_value(domain.clk)
+                if domain.rst is None:
+                    self.tokens.append(None)
+                else:
+                    self.on_value(domain.rst)
+            self.on_statement(fragment.statements.get(domain_name, _StatementList()))
+        if isinstance(fragment, MemoryInstance):
+            self.tokens += ("M", self.state.get_memory(fragment._data))
+            for port in fragment._read_ports:
+                self.tokens += ("r", port._domain, port._transparent_for)
+                self.on_value(port._addr)
+                self.on_value(port._data)
+                self.on_value(port._en)
+            for port in fragment._write_ports:
+                self.tokens += ("w", port._domain, port._granularity)
+                self.on_value(port._addr)
+                self.on_value(port._data)
+                self.on_value(port._en)
+        for subfragment, _subfragment_name, _src_loc in fragment.subfragments:
+            self.on_fragment(subfragment, domains)
+
+    def slot_layout(self):
+        for slot in self.state.slots:
+            if hasattr(slot, "signal"):
+                signal = slot.signal
+                self.tokens += (type(slot).__name__, len(signal), signal.shape().signed,
+                                signal.init, signal.reset_less)
+            else:
+                memory = slot.memory
+                self.tokens += (type(slot).__name__, memory.depth,
+                                Shape.cast(memory.shape).width, Shape.cast(memory.shape).signed)
+
+
+class _FragmentCompiler:
+    # Functions creating the wakers that `_add_waker` can add, by kind.
+    waker_kinds = {
+        "comb": comb_waker,
+        "edge": edge_waker,
+        "memory": memory_waker,
+    }
+
+    # Whether the processes compiled for a design are stored in the cache. Compilers that make
+    # wakers or code depend on anything other than the design and the slot layout must disable it.
+    cacheable = True
+
+    def __init__(self, state, *, flatten=False):
+        self.state = state
+        self.flatten = flatten
+        # Whether a newly compiled design was added to the on-disk cache.
+        self.cache_updated = False
+        # Slot indices of the signals read by each combinational process, used to levelize them.
+        self.comb_inputs = {}
+        # The processes in the order in which their code was compiled, the code objects, and every
+        # change made to the state, so that they can be stored in the cache.
+        self._processes = []
+        self._code = {}
+        self._wakers = []
+        self._comb_slots = []
+
+    def levelize(self):
+        comb_outputs = {
+            process: [self.state.get_signal(signal_state.signal) for signal_state in process.outputs]
+            for process in self.comb_inputs
+        }
+        for process, rank in _rank_comb(self.comb_inputs, comb_outputs).items():
+            process.rank = rank
+
+    def _add_waker(self, process, kind, slot_index, *args):
+        self._wakers.append((process, kind, slot_index, args))
+        waker = self.waker_kinds[kind](process, self.state.run_queue, *args)
+        self.state.slots[slot_index].add_waker(waker)
+
+    def _set_comb(self, signal):
+        signal_index = self.state.get_signal(signal)
+        self.state.slots[signal_index].is_comb = True
+        self._comb_slots.append(signal_index)
+
+    def _domains(self, fragment):
         domains = set(fragment.statements)
 
         if isinstance(fragment, MemoryInstance):
@@ -484,145 +819,350 @@ class _FragmentCompiler:
             for port in fragment._write_ports:
                 domains.add(port._domain)
 
-        for domain_name in domains:
-            domain_stmts = fragment.statements.get(domain_name, _StatementList())
-            domain_process = PyRTLProcess(is_comb=domain_name == "comb")
-            lhs_masks = LHSMaskCollector()
-            lhs_masks.visit_stmt(domain_stmts)
+        return domains
 
-            if isinstance(fragment, MemoryInstance):
-                for port in fragment._read_ports:
-                    if port._domain == domain_name:
-                        lhs_masks.visit_value(port._data, ~0)
+    def _lhs_masks(self, fragment, domain_name):
+        domain_stmts = fragment.statements.get(domain_name, _StatementList())
+        lhs_masks = LHSMaskCollector()
+        lhs_masks.visit_stmt(domain_stmts)
 
-            emitter = _PythonEmitter()
-            emitter.append(f"def run():")
-            emitter._level += 1
+        if isinstance(fragment, MemoryInstance):
+            for port in fragment._read_ports:
+                if port._domain == domain_name:
+                    lhs_masks.visit_value(port._data, ~0)
 
-            if domain_name == "comb":
-                for (signal, _) in lhs_masks.masks():
-                    signal_index = self.state.get_signal(signal)
-                    self.state.slots[signal_index].is_comb = True
-                    emitter.append(f"next_{signal_index} = {signal.init}")
+        return domain_stmts, lhs_masks
 
-                inputs = SignalSet()
-                _StatementCompiler(self.state, emitter, inputs=inputs)(domain_stmts)
+    def _emit_comb(self, emitter, fragment, domain_stmts, inputs, local_signals=None):
+        _StatementCompiler(self.state, emitter, inputs=inputs,
+                           local_signals=local_signals)(domain_stmts)
 
-                if isinstance(fragment, MemoryInstance):
-                    self.state.add_memory_waker(fragment._data, memory_waker(domain_process))
-                    memory_index = self.state.get_memory(fragment._data)
-                    rhs = _RHSValueCompiler(self.state, emitter, mode="curr", inputs=inputs)
-                    lhs = _LHSValueCompiler(self.state, emitter, rhs=rhs)
+        if isinstance(fragment, MemoryInstance):
+            memory_index = self.state.get_memory(fragment._data)
+            rhs = _RHSValueCompiler(self.state, emitter, mode="curr", inputs=inputs,
+                                    local_signals=local_signals)
+            lhs = _LHSValueCompiler(self.state, emitter, rhs=rhs)
 
-                    for port in fragment._read_ports:
-                        if port._domain != "comb":
-                            continue
+            for port in fragment._read_ports:
+                if port._domain != "comb":
+                    continue
 
-                        addr = rhs(port._addr)
-                        addr = f"({(1 << len(port._addr)) - 1:#x} & {addr})"
-                        data = emitter.def_var("read_data", f"slots[{memory_index}].read({addr})")
-                        lhs(port._data)(data)
+                addr = rhs(port._addr)
+                addr = f"({(1 << len(port._addr)) - 1:#x} & {addr})"
+                data = emitter.def_var("read_data", f"slots[{memory_index}].read({addr})")
+                lhs(port._data)(data)
 
-                waker = comb_waker(domain_process)
-                for input in inputs:
-                    self.state.add_signal_waker(input, waker)
+    def _emit_sync(self, emitter, fragment, domain_name, domain_stmts, lhs_masks):
+        domain = fragment.domains[domain_name]
 
-            else:
-                domain = fragment.domains[domain_name]
-                clk_polarity = 1 if domain.clk_edge == "pos" else 0
-                self.state.add_signal_waker(domain.clk, edge_waker(domain_process, clk_polarity))
-                if domain.async_reset and domain.rst is not None:
-                    self.state.add_signal_waker(domain.rst, edge_waker(domain_process, 1))
+        for (signal, _) in lhs_masks.masks():
+            signal_index = self.state.get_signal(signal)
+            emitter.append(f"next_{signal_index} = slots[{signal_index}].next")
 
+        _StatementCompiler(self.state, emitter)(domain_stmts)
+
+        if domain.rst is not None:
+            rhs = _RHSValueCompiler(self.state, emitter, mode="curr")
+            rst = rhs(domain.rst)
+            rst = f"(1 & {rst})"
+            emitter.append(f"if {rst}:")
+            with emitter.indent():
+                emitter.append("pass")
                 for (signal, _) in lhs_masks.masks():
-                    signal_index = self.state.get_signal(signal)
-                    emitter.append(f"next_{signal_index} = slots[{signal_index}].next")
-
-                _StatementCompiler(self.state, emitter)(domain_stmts)
-
-                if domain.rst is not None:
-                    rhs = _RHSValueCompiler(self.state, emitter, mode="curr")
-                    rst = rhs(domain.rst)
-                    rst = f"(1 & {rst})"
-                    emitter.append(f"if {rst}:")
-                    with emitter.indent():
-                        emitter.append("pass")
-                        for (signal, _) in lhs_masks.masks():
-                            if not signal.reset_less:
-                                signal_index = self.state.get_signal(signal)
-                                emitter.append(f"next_{signal_index} = {signal.init}")
-
-                if isinstance(fragment, MemoryInstance):
-                    memory_index = self.state.get_memory(fragment._data)
-                    rhs = _RHSValueCompiler(self.state, emitter, mode="curr")
-                    lhs = _LHSValueCompiler(self.state, emitter, rhs=rhs)
-
-                    write_vals = {}
-
-                    for idx, port in enumerate(fragment._write_ports):
-                        if port._domain != domain_name:
-                            continue
-
-                        addr = rhs(port._addr)
-                        addr = emitter.def_var("write_addr", f"({(1 << len(port._addr)) - 1:#x} & {addr})")
-                        data = rhs(port._data)
-                        data = emitter.def_var("write_data", f"({(1 << len(port._data)) - 1:#x} & {data})")
-                        en = rhs(Cat(bit.replicate(port._granularity) for bit in port._en))
-                        en = emitter.def_var("write_en", f"({(1 << len(port._data)) - 1:#x} & {en})")
-                        emitter.append(f"slots[{memory_index}].write({addr}, {data}, {en})")
-                        write_vals[idx] = addr, data, en
-
-                    for port in fragment._read_ports:
-                        if port._domain != domain_name:
-                            continue
-
-                        en = rhs(port._en)
-                        en = f"(1 & {en})"
-                        emitter.append(f"if {en}:")
+                    if not signal.reset_less:
+                        signal_index = self.state.get_signal(signal)
+                        emitter.append(f"next_{signal_index} = {signal.init}")
+
+        if isinstance(fragment, MemoryInstance):
+            memory_index = self.state.get_memory(fragment._data)
+            rhs = _RHSValueCompiler(self.state, emitter, mode="curr")
+            lhs = _LHSValueCompiler(self.state, emitter, rhs=rhs)
+
+            write_vals = {}
+
+            for idx, port in enumerate(fragment._write_ports):
+                if port._domain != domain_name:
+                    continue
+
+                addr = rhs(port._addr)
+                addr = emitter.def_var("write_addr", f"({(1 << len(port._addr)) - 1:#x} & {addr})")
+                data = rhs(port._data)
+                data = emitter.def_var("write_data", f"({(1 << len(port._data)) - 1:#x} & {data})")
+                en = rhs(Cat(bit.replicate(port._granularity) for bit in port._en))
+                en = emitter.def_var("write_en", f"({(1 << len(port._data)) - 1:#x} & {en})")
+                emitter.append(f"slots[{memory_index}].write({addr}, {data}, {en})")
+                write_vals[idx] = addr, data, en
+
+            for port in fragment._read_ports:
+                if port._domain != domain_name:
+                    continue
+
+                en = rhs(port._en)
+                en = f"(1 & {en})"
+                emitter.append(f"if {en}:")
+                with emitter.indent():
+                    addr = rhs(port._addr)
+                    addr = emitter.def_var("read_addr", f"({(1 << len(port._addr)) - 1:#x} & {addr})")
+                    data = emitter.def_var("read_data", f"slots[{memory_index}].read({addr})")
+
+                    for idx in port._transparent_for:
+                        waddr, wdata, wen = write_vals[idx]
+                        emitter.append(f"if {addr} == {waddr}:")
                         with emitter.indent():
-                            addr = rhs(port._addr)
-                            addr = emitter.def_var("read_addr", f"({(1 << len(port._addr)) - 1:#x} & {addr})")
-                            data = emitter.def_var("read_data", f"slots[{memory_index}].read({addr})")
-
-                            for idx in port._transparent_for:
-                                waddr, wdata, wen = write_vals[idx]
-                                emitter.append(f"if {addr} == {waddr}:")
-                                with emitter.indent():
-                                    emitter.append(f"{data} &= ~{wen}")
-                                    emitter.append(f"{data} |= {wdata} & {wen}")
-
-                            lhs(port._data)(data)
-
-            for (signal, mask) in lhs_masks.masks():
-                if signal.shape().signed and (mask & 1 << (len(signal) - 1)):
-                    mask |= -1 << len(signal)
-                signal_index = self.state.get_signal(signal)
-                emitter.append(f"slots[{signal_index}].update(next_{signal_index}, {mask})")
-
-            # There shouldn't be any exceptions raised by the generated code, but if there are
-            # (almost certainly due to a bug in the code generator), use this environment variable
-            # to make backtraces useful.
-            code = emitter.flush()
-            if os.getenv("AMARANTH_pysim_dump"):
-                file = tempfile.NamedTemporaryFile("w", prefix="amaranth_pysim_", delete=False)
-                file.write(code)
-                filename = file.name
+                            emitter.append(f"{data} &= ~{wen}")
+                            emitter.append(f"{data} |= {wdata} & {wen}")
+
+                    lhs(port._data)(data)
+
+    def _emit_updates(self, emitter, masks):
+        for (signal, mask) in masks:
+            if signal.shape().signed and (mask & 1 << (len(signal) - 1)):
+                mask |= -1 << len(signal)
+            signal_index = self.state.get_signal(signal)
+            emitter.append(f"slots[{signal_index}].update(next_{signal_index}, {mask})")
+
+    def _init_value(self, signal):
+        return f"{signal.init}"
+
+    def _helpers(self):
+        return {
+            **_ValueCompiler.helpers,
+            **_StatementCompiler.helpers,
+        }
+
+    def _define_run(self, process, emitter, **names):
+        # There shouldn't be any exceptions raised by the generated code, but if there are
+        # (almost certainly due to a bug in the code generator), use this environment variable
+        # to make backtraces useful.
+        code = emitter.flush()
+        if os.getenv("AMARANTH_pysim_dump"):
+            file = tempfile.NamedTemporaryFile("w", prefix="amaranth_pysim_", delete=False)
+            file.write(code)
+            filename = file.name
+        else:
+            filename = "<string>"
+        code_obj = compile(code, filename, "exec")
+        self._processes.append(process)
+        self._code[process] = code_obj
+        self._exec_run(process, code_obj, **names)
+
+    def _exec_run(self, process, code_obj, **names):
+        exec_locals = {
+            "slots": self.state.slots,
+            **self._helpers(),
+            **names,
+        }
+        exec(code_obj, exec_locals)
+        process.run = exec_locals["run"]
+
+    def _compile_comb(self, fragment, domain_stmts, lhs_masks):
+        domain_process = PyRTLProcess(is_comb=True, fragments=(fragment,), domain="comb")
+
+        emitter = _PythonEmitter()
+        emitter.append(f"def run():")
+        emitter._level += 1
+
+        for (signal, _) in lhs_masks.masks():
+            signal_index = self.state.get_signal(signal)
+            self._set_comb(signal)
+            emitter.append(f"next_{signal_index} = {self._init_value(signal)}")
+
+        inputs = SignalSet()
+        self._emit_comb(emitter, fragment, domain_stmts, inputs)
+        self._emit_updates(emitter, lhs_masks.masks())
+        self._define_run(domain_process, emitter)
+
+        if isinstance(fragment, MemoryInstance):
+            self._add_waker(domain_process, "memory", self.state.get_memory(fragment._data))
+        input_indices = [self.state.get_signal(input) for input in inputs]
+        for input_index in input_indices:
+            self._add_waker(domain_process, "comb", input_index)
+
+        domain_process.outputs = tuple(
+            self.state.slots[self.state.get_signal(signal)]
+            for (signal, _) in lhs_masks.masks()
+        )
+        self.comb_inputs[domain_process] = input_indices
+        return domain_process
+
+    def _compile_sync(self, domain, blocks):
+        domain_process = PyRTLProcess(is_comb=False,
+            fragments=tuple(fragment for fragment, *_ in blocks), domain=domain.name)
+
+        clk_polarity = 1 if domain.clk_edge == "pos" else 0
+        self._add_waker(domain_process, "edge", self.state.get_signal(domain.clk), clk_polarity)
+        if domain.async_reset and domain.rst is not None:
+            self._add_waker(domain_process, "edge", self.state.get_signal(domain.rst), 1)
+
+        emitter = _PythonEmitter()
+        emitter.append(f"def run():")
+        emitter._level += 1
+
+        for fragment, domain_name, domain_stmts, lhs_masks in blocks:
+            self._emit_sync(emitter, fragment, domain_name, domain_stmts, lhs_masks)
+            self._emit_updates(emitter, lhs_masks.masks())
+        self._define_run(domain_process, emitter)
+        return domain_process
+
+    def _collect(self, fragment, comb_blocks, sync_blocks):
+        for domain_name in self._domains(fragment):
+            domain_stmts, lhs_masks = self._lhs_masks(fragment, domain_name)
+            if domain_name == "comb":
+                comb_blocks.append((fragment, domain_stmts, lhs_masks))
             else:
-                filename = "<string>"
+                domain = fragment.domains[domain_name]
+                sync_blocks.setdefault(domain, []).append(
+                    (fragment, domain_name, domain_stmts, lhs_masks))
+
+        for subfragment, _subfragment_name, _src_loc in fragment.subfragments:
+            self._collect(subfragment, comb_blocks, sync_blocks)
 
-            exec_locals = {
-                "slots": self.state.slots,
-                **_ValueCompiler.helpers,
-                **_StatementCompiler.helpers,
-            }
-            exec(compile(code, filename, "exec"), exec_locals)
-            domain_process.run = exec_locals["run"]
+    def _compile_flat(self, fragment):
+        # Instead of compiling a process for each fragment and domain, compile a single process for
+        # each clock domain, and a single process that evaluates every combinational fragment that
+        # is not a part of a combinational cycle in topological order, with the intermediate values
+        # kept in local variables.
+        comb_blocks = []
+        sync_blocks = {}
+        self._collect(fragment, comb_blocks, sync_blocks)
+
+        processes = set()
+        for domain, blocks in sync_blocks.items():
+            processes.add(self._compile_sync(domain, blocks))
+
+        comb_inputs = {}
+        comb_outputs = {}
+        for block_index, (block_fragment, domain_stmts, lhs_masks) in enumerate(comb_blocks):
+            inputs = _stmt_inputs(domain_stmts)
+            if isinstance(block_fragment, MemoryInstance):
+                for port in block_fragment._read_ports:
+                    if port._domain == "comb":
+                        inputs |= port._addr._rhs_signals()
+            comb_inputs[block_index] = [self.state.get_signal(signal) for signal in inputs]
+            comb_outputs[block_index] = [self.state.get_signal(signal) for (signal, _) in lhs_masks.masks()]
+        ranks = _rank_comb(comb_inputs, comb_outputs)
+
+        for block_index, block in enumerate(comb_blocks):
+            if block_index not in ranks:
+                processes.add(self._compile_comb(*block))
+
+        if ranks:
+            flat_blocks = [comb_blocks[block_index] for block_index in sorted(ranks, key=ranks.get)]
+            flat_process = PyRTLProcess(is_comb=True,
+                fragments=tuple(fragment for fragment, *_ in flat_blocks), domain="comb")
 
-            processes.add(domain_process)
+            emitter = _PythonEmitter()
+            emitter.append(f"def run():")
+            emitter._level += 1
+
+            local_signals = SignalSet()
+            masks = SignalDict()
+            for (_block_fragment, _domain_stmts, lhs_masks) in flat_blocks:
+                for (signal, mask) in lhs_masks.masks():
+                    if signal not in local_signals:
+                        signal_index = self.state.get_signal(signal)
+                        self._set_comb(signal)
+                        emitter.append(f"next_{signal_index} = {self._init_value(signal)}")
+                        local_signals.add(signal)
+                        masks[signal] = 0
+                    masks[signal] |= mask
+
+            inputs = SignalSet()
+            for (block_fragment, domain_stmts, _lhs_masks) in flat_blocks:
+                self._emit_comb(emitter, block_fragment, domain_stmts, inputs, local_signals)
+                if isinstance(block_fragment, MemoryInstance):
+                    self._add_waker(flat_process, "memory",
+                                    self.state.get_memory(block_fragment._data))
+            self._emit_updates(emitter, masks.items())
+            self._define_run(flat_process, emitter)
+
+            for input in inputs:
+                self._add_waker(flat_process, "comb", self.state.get_signal(input))
+
+            flat_process.rank = 0
+            flat_process.outputs = tuple(
+                self.state.slots[self.state.get_signal(signal)]
+                for signal in local_signals
+            )
+            processes.add(flat_process)
+
+        return processes
+
+    def _compile_tree(self, fragment):
+        processes = set()
+
+        for domain_name in self._domains(fragment):
+            domain_stmts, lhs_masks = self._lhs_masks(fragment, domain_name)
+            if domain_name == "comb":
+                processes.add(self._compile_comb(fragment, domain_stmts, lhs_masks))
+            else:
+                domain = fragment.domains[domain_name]
+                processes.add(self._compile_sync(domain,
+                    [(fragment, domain_name, domain_stmts, lhs_masks)]))
 
         for subfragment_index, (subfragment, subfragment_name, _src_loc) in enumerate(fragment.subfragments):
             if subfragment_name is None:
                 subfragment_name = f"U${subfragment_index}"
-            processes.update(self(subfragment))
+            processes.update(self._compile_tree(subfragment))
+
+        return processes
 
+    def _plan(self, fragments):
+        # Describe the compiled processes, and the changes they made to the state, in terms of
+        # slot indices and positions of fragments in the design, which do not change between
+        # simulations of the same design.
+        fragment_indices = {id(fragment): index for index, fragment in enumerate(fragments)}
+        slot_indices = {id(slot): index for index, slot in enumerate(self.state.slots)}
+        process_indices = {process: index for index, process in enumerate(self._processes)}
+        processes = tuple(
+            (process.is_comb, tuple(fragment_indices[id(fragment)] for fragment in process.fragments),
+             process.domain, process.rank, tuple(slot_indices[id(slot)] for slot in process.outputs),
+             self.comb_inputs.get(process), self._code[process])
+            for process in self._processes
+        )
+        wakers = tuple(
+            (process_indices[process], kind, slot_index, args)
+            for process, kind, slot_index, args in self._wakers
+        )
+        return processes, wakers, tuple(self._comb_slots)
+
+    def _replay(self, plan, fragments):
+        processes, wakers, comb_slots = plan
+        for slot_index in comb_slots:
+            self.state.slots[slot_index].is_comb = True
+        for is_comb, fragment_indices, domain, rank, outputs, comb_inputs, code_obj in processes:
+            process = PyRTLProcess(is_comb=is_comb, domain=domain,
+                fragments=tuple(fragments[index] for index in fragment_indices))
+            process.rank = rank
+            process.outputs = tuple(self.state.slots[slot_index] for slot_index in outputs)
+            if comb_inputs is not None:
+                self.comb_inputs[process] = comb_inputs
+            self._processes.append(process)
+            self._exec_run(process, code_obj)
+        for process_index, kind, slot_index, args in wakers:
+            self._add_waker(self._processes[process_index], kind, slot_index, *args)
+        return set(self._processes)
+
+    def __call__(self, fragment):
+        # The code generated for a design depends only on the design and the slot layout, so it
+        # is looked up in the cache before anything is generated, and replayed if found.
+        key = None
+        if self.cacheable and not os.getenv("AMARANTH_pysim_dump"):
+            key_builder = _DesignKeyBuilder(self.state)
+            key_builder.on_fragment(fragment, self._domains)
+            key_builder.slot_layout()
+            key = design_key(type(self).__qualname__, self.flatten, key_builder.tokens)
+            plan = load_plan(key)
+            if plan is not None:
+                return self._replay(plan, key_builder.fragments)
+
+        slot_count = len(self.state.slots)
+        if self.flatten:
+            processes = self._compile_flat(fragment)
+        else:
+            processes = self._compile_tree(fragment)
+        # A slot that was not allocated by the key builder would have an unknown index in
+        # the cached code, so the design is not cached if code generation had to allocate one.
+        if key is not None and len(self.state.slots) == slot_count:
+            self.cache_updated = store_plan(key, self._plan(key_builder.fragments))
         return processes
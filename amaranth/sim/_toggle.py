@@ -0,0 +1,190 @@
+import io
+import csv
+import json
+
+from ..hdl import Signal
+from ..hdl._ast import SignalDict
+
+
+__all__ = ["ToggleCoverage"]
+
+
+class _ToggleCounter:
+    __slots__ = ("name", "signal", "planes", "initial", "final")
+
+    def __init__(self, name, signal, value):
+        self.name    = name
+        self.signal  = signal
+        # Only the rises are counted; since rises and falls of each bit alternate, the number of
+        # falls follows from the number of rises and the initial and final values of the bit.
+        self.planes  = []
+        self.initial = value & ((1 << len(signal)) - 1)
+        self.final   = self.initial
+
+    @property
+    def rises(self):
+        return [
+            sum(((plane >> bit) & 1) << index for index, plane in enumerate(self.planes))
+            for bit in range(len(self.signal))
+        ]
+
+    @property
+    def falls(self):
+        return [
+            rises - ((self.final >> bit) & 1) + ((self.initial >> bit) & 1)
+            for bit, rises in enumerate(self.rises)
+        ]
+
+    @property
+    def covered(self):
+        # Mask of the bits that have both risen and fallen at least once; a bit that has risen
+        # has also fallen unless it rose exactly once and is now 1 after having been 0.
+        rose = twice = 0
+        for index, plane in enumerate(self.planes):
+            rose |= plane
+            if index > 0:
+                twice |= plane
+        once = rose & ~twice
+        return rose & ~(once & self.final & ~self.initial)
+
+    def waker(self):
+        planes = self.planes
+        mask = (1 << len(self.signal)) - 1
+        def waker(curr, next):
+            self.final = next & mask
+            # Bit `b` of plane `k` is bit `k` of the number of rises of bit `b` of the signal.
+            # This way, the counters for all of the bits that rose are incremented at once by
+            # adding with carry propagation, which takes two steps on average regardless of
+            # the width of the signal.
+            carry = next & ~curr & mask
+            index = 0
+            while carry:
+                if index == len(planes):
+                    planes.append(0)
+                plane = planes[index]
+                planes[index] = plane ^ carry
+                carry &= plane
+                index += 1
+            return True
+        return waker
+
+
+class ToggleCoverage:
+    """Toggle counts collected by :meth:`Simulator.collect_toggles`.
+
+    For each signal and each of its bits (least significant bit first), counts the number of
+    transitions from 0 to 1 (*rises*) and from 1 to 0 (*falls*). A bit is *covered* if it has
+    both risen and fallen at least once.
+
+    Signals may be identified either by their hierarchical name (such as :py:`"top.cpu.pc"`) or
+    by the :class:`~amaranth.hdl.Signal` object.
+    """
+    def __init__(self):
+        self._counters = {}
+        self._signals  = SignalDict()
+
+    def _add(self, name, signal, value):
+        counter = _ToggleCounter(name, signal, value)
+        self._counters[name] = counter
+        self._signals[signal] = counter
+        return counter
+
+    def _lookup(self, signal):
+        if isinstance(signal, Signal):
+            if signal in self._signals:
+                return self._signals[signal]
+        elif signal in self._counters:
+            return self._counters[signal]
+        raise KeyError(f"Toggles of {signal!r} are not being collected")
+
+    @property
+    def names(self):
+        """Hierarchical names of the signals whose toggles are collected."""
+        return list(self._counters)
+
+    def rises(self, signal):
+        """Number of transitions from 0 to 1 of each bit of :py:`signal`.
+
+        Raises
+        ------
+        :exc:`KeyError`
+            If toggles of :py:`signal` are not being collected.
+        """
+        return self._lookup(signal).rises
+
+    def falls(self, signal):
+        """Number of transitions from 1 to 0 of each bit of :py:`signal`.
+
+        Raises
+        ------
+        :exc:`KeyError`
+            If toggles of :py:`signal` are not being collected.
+        """
+        return self._lookup(signal).falls
+
+    def toggles(self, signal):
+        """Total number of transitions of all bits of :py:`signal`.
+
+        Raises
+        ------
+        :exc:`KeyError`
+            If toggles of :py:`signal` are not being collected.
+        """
+        counter = self._lookup(signal)
+        return sum(counter.rises) + sum(counter.falls)
+
+    def uncovered(self):
+        """Bits that have not both risen and fallen.
+
+        Returns a list of :py:`(name, bit)` tuples.
+        """
+        uncovered = []
+        for counter in self._counters.values():
+            covered = counter.covered
+            uncovered.extend((counter.name, bit) for bit in range(len(counter.signal))
+                             if not (covered >> bit) & 1)
+        return uncovered
+
+    def coverage(self):
+        """Fraction of bits that have both risen and fallen.
+
+        Returns :py:`1.0` if no bits are being collected.
+        """
+        total = sum(len(counter.signal) for counter in self._counters.values())
+        if total == 0:
+            return 1.0
+        return 1 - len(self.uncovered()) / total
+
+    def to_json(self):
+        """Export the toggle counts as JSON.
+
+        Returns a string containing a JSON object with the :py:`"coverage"` attribute, and a list
+        of :py:`"signals"`, each with the :py:`"name"`, :py:`"width"`, :py:`"rises"`, and
+        :py:`"falls"` attributes.
+        """
+        return json.dumps({
+            "coverage": self.coverage(),
+            "signals": [
+                {
+                    "name": counter.name,
+                    "width": len(counter.signal),
+                    "rises": counter.rises,
+                    "falls": counter.falls,
+                }
+                for counter in self._counters.values()
+            ]
+        }, indent=2)
+
+    def to_csv(self):
+        """Export the toggle counts as CSV.
+
+        Returns a string containing a header row and a row for each bit of each signal, with
+        the :py:`name`, :py:`bit`, :py:`rises`, and :py:`falls` columns.
+        """
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator="\n")
+        writer.writerow(["name", "bit", "rises", "falls"])
+        for counter in self._counters.values():
+            for bit, (rises, falls) in enumerate(zip(counter.rises, counter.falls)):
+                writer.writerow([counter.name, bit, rises, falls])
+        return output.getvalue()
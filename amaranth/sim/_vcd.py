@@ -0,0 +1,173 @@
+from datetime import datetime
+from itertools import zip_longest
+
+
+__all__ = ["VCDWriter"]
+
+
+# Formatted binary representations of small values, which are by far the most common ones.
+_BINARY_TABLE = tuple(format(value, "b") for value in range(256))
+
+_STRING_ESCAPES = str.maketrans({
+    "\t": "\\t",
+    "\n": "\\n",
+    "\r": "\\r",
+    " ":  "\\x20",
+    "\\": "\\\\",
+})
+
+
+def _encode_identifier(number):
+    # Identifier codes are base-94 numbers made of printable ASCII characters.
+    assert number > 0
+    encoded = ""
+    while number != 0:
+        number -= 1
+        encoded += chr((number % 94) + 33)
+        number //= 94
+    return encoded
+
+
+class VCDVariable:
+    __slots__ = ("ident", "type", "size", "value", "format")
+
+    def __init__(self, ident, var_type, size, init):
+        self.ident = ident
+        self.type  = var_type
+        self.size  = size
+        self.value = init
+
+        if var_type == "string":
+            suffix = f" {ident}\n"
+            def format_value(value):
+                return "s" + value.translate(_STRING_ESCAPES) + suffix
+        elif size == 1:
+            lines = (f"0{ident}\n", f"1{ident}\n")
+            def format_value(value):
+                return lines[1 if value else 0]
+        else:
+            suffix = f" {ident}\n"
+            modulus = 1 << size
+            def format_value(value):
+                if value < 0:
+                    value += modulus
+                if value < 256:
+                    return "b" + _BINARY_TABLE[value] + suffix
+                return "b" + format(value, "b") + suffix
+        self.format = format_value
+
+
+class VCDWriter:
+    """Streaming Value Change Dump writer.
+
+    Produces the same output as :class:`vcd.VCDWriter` (which remains in use for writing GTKWave
+    save files), but formats values using precomputed tables, and writes the changes in large
+    blocks that always end at a timestamp boundary.
+
+    Changes at the :py:`start` timestamp that happen before any later timestamp only update
+    the initial values written in the ``$dumpvars`` section. The ``$date`` section contains
+    :py:`date`, or the current date and time if it is not specified.
+    """
+
+    #: Number of buffered lines after which the buffer is written to the file.
+    BLOCK_LINES = 4096
+
+    def __init__(self, file, *, timescale, comment="", date=None, start=0):
+        if date is None:
+            date = str(datetime.now())
+        self._file = file
+        self._header = {
+            "$comment":   comment,
+            "$date":      date,
+            "$timescale": timescale,
+        }
+        self._scope_vars = {}
+        self._scope_names = {}
+        self._vars = []
+        self._registering = True
+        self._timestamp = start
+        self._last_dumped = None
+        self._buffer = []
+
+    def _declare(self, scope, name, line):
+        scope = tuple(scope)
+        names = self._scope_names.setdefault(scope, set())
+        if name in names:
+            raise KeyError(f"Duplicate var {name} in scope {'.'.join(scope)}")
+        names.add(name)
+        self._scope_vars.setdefault(scope, []).append(line)
+
+    def register_var(self, scope, name, var_type, size, init):
+        assert self._registering
+        var = VCDVariable(_encode_identifier(len(self._vars) + 1), var_type, size, init)
+        self._declare(scope, name, f"$var {var_type} {size} {var.ident} {name} $end")
+        self._vars.append(var)
+        return var
+
+    def register_alias(self, scope, name, var):
+        assert self._registering
+        self._declare(scope, name, f"$var {var.type} {var.size} {var.ident} {name} $end")
+
+    def _finish_registration(self):
+        lines = []
+        for keyword, value in sorted(self._header.items()):
+            if value:
+                lines.append(f"{keyword} {value} $end")
+
+        prev_scope = ()
+        for scope in sorted(self._scope_vars):
+            for index, (prev_name, name) in enumerate(zip_longest(prev_scope, scope)):
+                if prev_name != name:
+                    lines.extend("$upscope $end" for _ in prev_scope[index:])
+                    lines.extend(f"$scope module {name} $end" for name in scope[index:])
+                    break
+            lines.extend(self._scope_vars[scope])
+            prev_scope = scope
+        lines.extend("$upscope $end" for _ in prev_scope)
+        lines.append("$enddefinitions $end")
+
+        if self._vars:
+            self._last_dumped = self._timestamp
+            lines.append(f"#{self._timestamp}")
+            lines.append("$dumpvars")
+            lines.extend(var.format(var.value)[:-1] for var in self._vars)
+            lines.append("$end")
+
+        self._file.write("\n".join(lines) + "\n")
+        self._registering = False
+        self._scope_vars.clear()
+        self._scope_names.clear()
+
+    def _advance(self, timestamp):
+        if timestamp < self._timestamp:
+            raise ValueError(f"Out of order timestamp: {timestamp}")
+        if self._registering:
+            self._finish_registration()
+        elif len(self._buffer) >= self.BLOCK_LINES:
+            self._file.write("".join(self._buffer))
+            self._buffer.clear()
+        self._timestamp = timestamp
+
+    def change(self, var, timestamp, value):
+        if value == var.value:
+            return
+        if timestamp != self._timestamp:
+            self._advance(timestamp)
+        var.value = value
+        if not self._registering:
+            if self._last_dumped != timestamp:
+                self._last_dumped = timestamp
+                self._buffer.append(f"#{timestamp}\n")
+            self._buffer.append(var.format(value))
+
+    def close(self, timestamp):
+        if timestamp != self._timestamp:
+            self._advance(timestamp)
+        if self._registering:
+            self._finish_registration()
+        if self._last_dumped != self._timestamp:
+            self._last_dumped = self._timestamp
+            self._buffer.append(f"#{self._timestamp}\n")
+        self._file.write("".join(self._buffer))
+        self._buffer.clear()
+        self._file.flush()
@@ -1,12 +1,18 @@
+import os
+import mmap
 import inspect
 import warnings
+from contextlib import nullcontext
 
 from .._utils import deprecated
-from ..hdl import Value, ValueLike, MemoryData, ClockDomain, Fragment
+from ..hdl import Shape, Value, ValueLike, MemoryData, ClockDomain, Fragment
 from ..hdl._ir import DriverConflict
+from ..lib import wiring
 from ._base import BaseEngine
 from ._async import DomainReset, BrokenTrigger
 from ._pycoro import Tick, Settle, Delay, Passive, Active, coro_wrapper
+from ._membuf import row_size, unpack_rows, pack_rows
+from ._checkpoint import Checkpoint
 
 
 __all__ = [
@@ -17,13 +23,50 @@ __all__ = [
 ]
 
 
+# Memory images are loaded and saved in chunks of this many rows, to avoid building large lists.
+_MEMORY_IMAGE_CHUNK_ROWS = 1 << 16
+
+
 def _seconds_to_femtos(delay: float):
     return int(delay * 1e15) # seconds to femtoseconds
 
 
+def _normalize_patterns(patterns, argument):
+    if patterns is None:
+        return None
+    if isinstance(patterns, str):
+        return (patterns,)
+    if (isinstance(patterns, (list, tuple)) and
+            all(isinstance(pattern, str) for pattern in patterns)):
+        return tuple(patterns)
+    raise TypeError(f"{argument} must be a string or a list of strings, not {patterns!r}")
+
+
+def _flatten_traces(traces, *, group=None):
+    # Yields the value-like objects and memories in `traces`, which may be nested in lists,
+    # tuples, dicts, and interfaces. If `group` is provided, it is called with the name of every
+    # dict entry and with "interface" for every interface, and returns a context manager that is
+    # entered while the traces within it are yielded.
+    if isinstance(traces, (ValueLike, MemoryData)):
+        yield traces
+    elif hasattr(traces, "signature") and isinstance(traces.signature, wiring.Signature):
+        with nullcontext() if group is None else group("interface"):
+            for _path, _member, trace in traces.signature.flatten(traces):
+                yield from _flatten_traces(trace, group=group)
+    elif isinstance(traces, (list, tuple)):
+        for trace in traces:
+            yield from _flatten_traces(trace, group=group)
+    elif isinstance(traces, dict):
+        for name, trace in traces.items():
+            with nullcontext() if group is None else group(name):
+                yield from _flatten_traces(trace, group=group)
+    else:
+        raise TypeError(f"{traces!r} is not a traceable object")
+
+
 class Simulator:
     # Simulator engines aren't yet a part of the public API.
-    """Simulator(toplevel)
+    """Simulator(toplevel, *, lanes=None)
 
     Simulator for Amaranth designs.
 
@@ -60,23 +103,65 @@ class Simulator:
         Resetting the simulator can also be used to amortize the startup cost of repeatedly
         simulating a large design.
 
+    If :py:`lanes` is provided, the simulator simulates this many independent instances
+    (*lanes*) of the design at once, in lockstep, which is much faster than simulating each of
+    them separately when the design is dominated by control logic. This is useful for exercising
+    the design with many different (for example, randomized) stimuli.
+
+    In this mode, :meth:`ctx.get() <SimulatorContext.get>` returns a :class:`list` with the value
+    in each lane, and :meth:`ctx.set() <SimulatorContext.set>` accepts either a :class:`list` with
+    the value for each lane, or any other value, which is assigned to every lane. (To assign
+    the same value with an array layout to every lane, it must be repeated for each lane.)
+    The values sampled by triggers are also lists with the value in each lane.
+
+    All lanes share the same clocks, which must have the same value in every lane. An edge trigger
+    is activated if the edge occurs in any lane, :py:`rst_active` returned by a
+    :ref:`tick trigger <sim-tick-trigger>` is :py:`True` if the domain is reset in any lane, and
+    :meth:`TickTrigger.until` waits until the condition is true in every lane.
+    :meth:`ctx.memory_write() <SimulatorContext.memory_write>` writes the same rows in every lane.
+    Waveforms, checkpoints, toggle counts, and
+    :meth:`ctx.memory_read() <SimulatorContext.memory_read>` are not available in this mode.
+
     Arguments
     ---------
     toplevel : :class:`~amaranth.hdl.Elaboratable`
         Simulated design.
+    lanes : :class:`int` or :py:`None`
+        Number of lanes to simulate in lockstep, or :py:`None` to simulate a single instance of
+        the design.
+
+    Raises
+    ------
+    :exc:`TypeError`
+        If :py:`lanes` is not a positive integer or :py:`None`.
+    :exc:`ValueError`
+        If :py:`lanes` is provided for a simulation engine that does not support lockstep
+        simulation.
     """
-    def __init__(self, toplevel, *, engine="pysim"):
+    def __init__(self, toplevel, *, engine="pysim", lanes=None):
+        if lanes is not None and not (type(lanes) is int and lanes > 0):
+            raise TypeError(f"Lane count must be a positive integer or None, not {lanes!r}")
+
         if isinstance(engine, type) and issubclass(engine, BaseEngine):
             pass
         elif engine == "pysim":
-            from .pysim import PySimEngine
-            engine = PySimEngine
+            from .pysim import PySimEngine, PyLaneSimEngine
+            engine = PySimEngine if lanes is None else PyLaneSimEngine
+        elif engine == "cxxrtl":
+            from .cxxsim import CxxSimEngine
+            engine = CxxSimEngine
         else:
             raise TypeError(
                 f"Value {engine!r} is not a simulation engine class or a simulation engine name")
 
         self._design  = Fragment.get(toplevel, platform=None).prepare()
-        self._engine  = engine(self._design)
+        if lanes is None:
+            self._engine = engine(self._design)
+        else:
+            if not hasattr(engine, "lanes"):
+                raise ValueError(f"Simulation engine {engine.__name__} does not support lockstep "
+                                 f"simulation")
+            self._engine = engine(self._design, lanes=lanes)
         self._clocked = set()
         self._running = False
 
@@ -321,8 +406,8 @@ class Simulator:
                 DeprecationWarning, stacklevel=1)
         deadline_fs = _seconds_to_femtos(deadline)
         assert self._engine.now <= deadline_fs
-        while self._engine.now < deadline_fs:
-            self.advance()
+        self._running = True
+        self._engine.advance_until(deadline_fs)
 
     def advance(self):
         """Advance the simulation.
@@ -341,11 +426,13 @@ class Simulator:
         self._running = True
         return self._engine.advance()
 
-    def write_vcd(self, vcd_file, gtkw_file=None, *, traces=(), fs_per_delta=0):
+    def write_vcd(self, vcd_file, gtkw_file=None, *, traces=(), fs_per_delta=0,
+                  include=None, exclude=None,
+                  start=None, stop=None, trigger=None, pre_trigger=0, post_trigger=None):
         # `fs_per_delta`` is not currently documented; it is not clear if we want to expose
         # the concept of "delta cycles" in the surface API. Something like `fs_per_step` might be
         # more appropriate.
-        """write_vcd(vcd_file, gtkw_file=None, *, traces=())
+        """write_vcd(vcd_file, gtkw_file=None, *, traces=(), include=None, exclude=None, start=None, stop=None, trigger=None, pre_trigger=0, post_trigger=None)
 
         Capture waveforms to a file.
 
@@ -371,11 +458,102 @@ class Simulator:
         * A :class:`dict` associating :class:`str` names to trace specifications;
         * An :ref:`interface object <wiring>`.
 
+        To reduce the size of the file and the overhead of capturing waveforms for large designs,
+        the signals and memories referenced from :py:`toplevel` can be filtered by their
+        hierarchical name (such as :py:`"top.cpu.pc"`). The :py:`include` and :py:`exclude`
+        arguments accept a glob pattern (as used by :mod:`fnmatch`) or a list of glob patterns.
+        If :py:`include` is provided, only the names that match one of its patterns are captured;
+        if :py:`exclude` is provided, the names that match one of its patterns are not captured.
+        For example, to capture the signals of the CPU without its register file: ::
+
+            with sim.write_vcd("cpu.vcd", include="top.cpu.*",
+                               exclude=["top.cpu.regfile", "top.cpu.regfile.*"]):
+                sim.run()
+
+        Signals and memories specified in :py:`traces` are always captured. Changes of signals and
+        memories that are not captured are not tracked by the simulator at all. Memories with more
+        than 65536 rows are only captured if they are specified in :py:`traces`.
+
+        By default, waveforms are captured for the entire duration of the simulation. To reduce
+        the size of the file, capture can be limited to a window of simulation time, or to
+        an interval around an event of interest:
+
+        * If :py:`start` is provided, changes before :py:`start` seconds of simulation time are
+          not captured; the waveforms begin with the values at that time.
+        * If :py:`stop` is provided, changes at or after :py:`stop` seconds of simulation time are
+          not captured.
+        * If :py:`trigger` (a :class:`~amaranth.hdl.ValueLike` object) is provided, capture begins
+          :py:`pre_trigger` seconds before the first time (after :py:`start`) that the value of
+          :py:`trigger` becomes non-zero, and ends :py:`post_trigger` seconds after it (or at
+          :py:`stop`, whichever is earlier). The changes that happened within the last
+          :py:`pre_trigger` seconds are held in memory until the trigger occurs, and discarded
+          afterwards. If the trigger never occurs, only the values at the end of the simulation
+          are captured.
+
+        For example, to capture 10 µs of waveforms before and 2 µs after an error is signaled: ::
+
+            with sim.write_vcd("failure.vcd", trigger=dut.error, pre_trigger=10e-6,
+                               post_trigger=2e-6):
+                sim.run()
+
         Raises
         ------
         :exc:`TypeError`
             If a trace specification refers to a signal with a private name.
+        :exc:`TypeError`
+            If :py:`include` or :py:`exclude` is not a string or a list of strings.
+        :exc:`ValueError`
+            If :py:`stop` is earlier than :py:`start`, or if :py:`pre_trigger` or
+            :py:`post_trigger` is provided without :py:`trigger`.
         """
+        return self._write_waveforms(vcd_file, gtkw_file, traces=traces,
+                                     fs_per_delta=fs_per_delta, format="vcd",
+                                     include=include, exclude=exclude,
+                                     start=start, stop=stop, trigger=trigger,
+                                     pre_trigger=pre_trigger, post_trigger=post_trigger)
+
+    def write_fst(self, fst_file, gtkw_file=None, *, traces=(), fs_per_delta=0,
+                  include=None, exclude=None,
+                  start=None, stop=None, trigger=None, pre_trigger=0, post_trigger=None):
+        """write_fst(fst_file, gtkw_file=None, *, traces=(), include=None, exclude=None, start=None, stop=None, trigger=None, pre_trigger=0, post_trigger=None)
+
+        Capture waveforms to a file in the Fast Signal Trace format.
+
+        This context manager is equivalent to :meth:`write_vcd`, except that the waveforms are
+        saved to :py:`fst_file` in the FST format used by GTKWave and Surfer. FST files are
+        compressed and indexed by time, which makes them much smaller than VCD files, and makes
+        it possible to view a part of a long simulation without reading the entire file.
+
+        Writing FST files requires the optional ``pylibfst`` package, which can be installed
+        together with Amaranth using the ``amaranth[fst]`` extra.
+
+        Use this context manager to wrap a call to :meth:`run` or :meth:`run_until`: ::
+
+            with sim.write_fst("simulation.fst"):
+                sim.run()
+
+        Unlike with :meth:`write_vcd`, the :py:`fst_file` argument only accepts a filename.
+
+        Raises
+        ------
+        :exc:`TypeError`
+            If :py:`fst_file` is not a filename.
+        :exc:`TypeError`
+            If a trace specification refers to a signal with a private name.
+        :exc:`ValueError`
+            If :py:`stop` is earlier than :py:`start`, or if :py:`pre_trigger` or
+            :py:`post_trigger` is provided without :py:`trigger`.
+        :exc:`ImportError`
+            If the ``pylibfst`` package is not installed.
+        """
+        return self._write_waveforms(fst_file, gtkw_file, traces=traces,
+                                     fs_per_delta=fs_per_delta, format="fst",
+                                     include=include, exclude=exclude,
+                                     start=start, stop=stop, trigger=trigger,
+                                     pre_trigger=pre_trigger, post_trigger=post_trigger)
+
+    def _write_waveforms(self, vcd_file, gtkw_file, *, traces, fs_per_delta, format,
+                         include, exclude, start, stop, trigger, pre_trigger, post_trigger):
         if self._engine.now != 0:
             for file in (vcd_file, gtkw_file):
                 if hasattr(file, "close"):
@@ -384,29 +562,236 @@ class Simulator:
             # FIXME: can this restriction be lifted?
             raise ValueError("Cannot start writing waveforms after advancing simulation time")
 
-        def traverse_traces(traces):
-            if isinstance(traces, ValueLike):
-                trace_cast = Value.cast(traces)
-                if isinstance(trace_cast, MemoryData._Row):
-                    return
-                for trace_signal in trace_cast._rhs_signals():
-                    if trace_signal.name == "":
-                        if trace_signal is traces:
-                            raise TypeError("Cannot trace signal with private name")
-                        else:
-                            raise TypeError(
-                                f"Cannot trace signal with private name (within {traces!r})")
-            elif isinstance(traces, (list, tuple)):
-                for trace in traces:
-                    traverse_traces(trace)
-            elif isinstance(traces, dict):
-                for trace in traces.values():
-                    traverse_traces(trace)
-
-        traverse_traces(traces)
+        for trace in _flatten_traces(traces):
+            if isinstance(trace, MemoryData):
+                continue
+            trace_cast = Value.cast(trace)
+            if isinstance(trace_cast, MemoryData._Row):
+                continue
+            for trace_signal in trace_cast._rhs_signals():
+                if trace_signal.name == "":
+                    if trace_signal is trace:
+                        raise TypeError("Cannot trace signal with private name")
+                    else:
+                        raise TypeError(
+                            f"Cannot trace signal with private name (within {trace!r})")
+
+        include = _normalize_patterns(include, "Include patterns")
+        exclude = _normalize_patterns(exclude, "Exclude patterns")
+
+        if start is not None and stop is not None and stop < start:
+            raise ValueError(f"Capture stop time {stop} is earlier than start time {start}")
+        if trigger is not None:
+            trigger = Value.cast(trigger)
+        elif pre_trigger != 0 or post_trigger is not None:
+            raise ValueError("Pre-trigger and post-trigger intervals require a trigger")
 
         return self._engine.write_vcd(
-            vcd_file=vcd_file, gtkw_file=gtkw_file, traces=traces, fs_per_delta=fs_per_delta)
+            vcd_file=vcd_file, gtkw_file=gtkw_file, traces=traces, fs_per_delta=fs_per_delta,
+            format=format, include=include, exclude=exclude,
+            start=None if start is None else _seconds_to_femtos(start),
+            stop=None if stop is None else _seconds_to_femtos(stop),
+            trigger=trigger,
+            pre_trigger=_seconds_to_femtos(pre_trigger),
+            post_trigger=None if post_trigger is None else _seconds_to_femtos(post_trigger))
+
+    def profile(self):
+        """Profile the simulation.
+
+        While the context manager is active, the simulator measures how many times each part of
+        the simulation runs, how much wall time it takes, and how many updates of signals and
+        memories it schedules. The parts are the combinational logic and each clock domain of each
+        fragment of the design, each testbench and process, and the triggers awaited by each
+        testbench and process. The results are collected in the :class:`SimulationProfile`
+        returned by the context manager, which is complete once the context manager exits: ::
+
+            with sim.profile() as profile:
+                sim.run()
+            print(profile.report(limit=10))
+
+        Profiling slows down the simulation. With the CXXRTL engine, the time spent evaluating
+        the design itself is not measured.
+
+        Raises
+        ------
+        :exc:`RuntimeError`
+            If the simulation is already being profiled.
+        """
+        return self._engine.profile()
+
+    def collect_toggles(self, traces=(), *, include=None, exclude=None):
+        """Count the transitions of signals.
+
+        This context manager counts, for each bit of each signal that is referenced from
+        :py:`toplevel` and each additional signal specified in :py:`traces`, the number of
+        transitions from 0 to 1 and from 1 to 0, for use in power estimation or toggle coverage
+        analysis. The counts are collected in the :class:`ToggleCoverage` object returned by
+        the context manager: ::
+
+            with sim.collect_toggles(include="top.cpu.*") as toggles:
+                sim.run()
+            print(f"toggle coverage: {toggles.coverage():.1%}")
+            with open("toggles.csv", "w") as f:
+                f.write(toggles.to_csv())
+
+        The :py:`traces`, :py:`include`, and :py:`exclude` arguments select the signals in
+        the same way as for :meth:`write_vcd`. Counting the transitions of a signal is much
+        cheaper than capturing its waveform, and the transitions of the signals that are not
+        selected are not tracked at all.
+
+        Raises
+        ------
+        :exc:`TypeError`
+            If :py:`include` or :py:`exclude` is not a string or a list of strings.
+        """
+        include = _normalize_patterns(include, "Include patterns")
+        exclude = _normalize_patterns(exclude, "Exclude patterns")
+        return self._engine.collect_toggles(traces=traces, include=include, exclude=exclude)
+
+    def _memory_state(self, memory):
+        if not isinstance(memory, MemoryData):
+            raise TypeError(f"Memory must be a MemoryData object, not {memory!r}")
+        state = self._engine.state
+        return state.slots[state.get_memory(memory)]
+
+    def load_memory(self, memory, image_file, *, start=0, byteorder="little"):
+        """Load the contents of a memory from a binary file.
+
+        Each row of :py:`memory`, starting at the address :py:`start`, is set to the value of
+        the corresponding element of :py:`image_file`. The file consists of consecutive rows,
+        each of which is :py:`(len(memory.shape) + 7) // 8` bytes long, with the byte order
+        specified by :py:`byteorder`; it may be shorter than the memory.
+
+        The file is accessed using memory-mapped I/O, so that even large images (such as firmware
+        images for a DRAM-backed memory) can be loaded efficiently. The rows are changed once
+        the simulation advances (for example, at the beginning of :meth:`run`), and the changes are
+        captured in waveform files.
+
+        Raises
+        ------
+        :exc:`TypeError`
+            If :py:`memory` is not a :class:`~amaranth.hdl.MemoryData`.
+        :exc:`ValueError`
+            If the image size is not a multiple of the row size, or the image does not fit into
+            the memory.
+        """
+        state = self._memory_state(memory)
+        width = Shape.cast(memory.shape).width
+        size = row_size(width)
+        with open(image_file, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            image_size = f.tell()
+            if image_size % size != 0:
+                raise ValueError(f"Memory image size {image_size} is not a multiple of the row "
+                                 f"size {size}")
+            if start < 0 or start + image_size // size > memory.depth:
+                raise ValueError(f"Memory image with {image_size // size} rows starting at "
+                                 f"address {start} does not fit into a memory with depth "
+                                 f"{memory.depth}")
+            if image_size == 0:
+                return
+            # The rows are unpacked directly from the mapped file one chunk at a time, so that
+            # the image is never held as a single list of integers.
+            count = image_size // size
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image:
+                for chunk_start in range(start, start + count, _MEMORY_IMAGE_CHUNK_ROWS):
+                    chunk_stop = min(chunk_start + _MEMORY_IMAGE_CHUNK_ROWS, start + count)
+                    offset = (chunk_start - start) * size
+                    state.write_rows(chunk_start, unpack_rows(
+                        image[offset:offset + (chunk_stop - chunk_start) * size], width,
+                        byteorder=byteorder))
+
+    def dump_memory(self, memory, image_file, *, start=0, count=None, byteorder="little"):
+        """Save the contents of a memory to a binary file.
+
+        The :py:`count` rows of :py:`memory` starting at the address :py:`start` (by default, all
+        rows until the end of the memory) are written to :py:`image_file` in the format used by
+        :meth:`load_memory`. The file is accessed using memory-mapped I/O.
+
+        Raises
+        ------
+        :exc:`TypeError`
+            If :py:`memory` is not a :class:`~amaranth.hdl.MemoryData`.
+        :exc:`ValueError`
+            If the range of rows is not within the memory.
+        """
+        state = self._memory_state(memory)
+        width = Shape.cast(memory.shape).width
+        size = row_size(width)
+        if count is None:
+            count = memory.depth - start
+        if start < 0 or count < 0 or start + count > memory.depth:
+            raise ValueError(f"Memory range with {count} rows starting at address {start} is not "
+                             f"within a memory with depth {memory.depth}")
+        with open(image_file, "w+b") as f:
+            if count == 0:
+                return
+            f.truncate(count * size)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE) as image:
+                for chunk_start in range(start, start + count, _MEMORY_IMAGE_CHUNK_ROWS):
+                    chunk_stop = min(chunk_start + _MEMORY_IMAGE_CHUNK_ROWS, start + count)
+                    offset = (chunk_start - start) * size
+                    image[offset:offset + (chunk_stop - chunk_start) * size] = pack_rows(
+                        state.read_rows(chunk_start, chunk_stop - chunk_start), width,
+                        byteorder=byteorder)
+
+    def save_state(self):
+        """Save the state of the simulation to a checkpoint.
+
+        Returns a compact binary snapshot (a :class:`bytes` object) of the current simulation
+        time, the values of the signals and the contents of the memories that are a part of
+        the design, and the time of the next edge of each clock added with :meth:`add_clock`.
+        The snapshot may be restored with :meth:`restore_state` into this simulator, or into
+        another simulator (possibly in another Python process) for the same design, to continue
+        the simulation from this point; for example, it can be saved to a file after booting
+        a CPU, and restored at the beginning of each test that runs software on it.
+
+        The state of testbenches and processes (which are Python coroutines) cannot be saved.
+        For this reason, a checkpoint should be saved at a *quiescent point*: after :meth:`run`,
+        :meth:`run_until`, or :meth:`advance` returns, and once the testbenches that prepared
+        the design have finished or reached a point where they no longer drive any signals. This
+        method must not be called from a testbench or a process.
+
+        Raises
+        ------
+        :exc:`NotImplementedError`
+            If the simulation engine does not support checkpoints.
+        """
+        return self._engine.save_state().to_bytes()
+
+    def restore_state(self, checkpoint):
+        """Restore the state of the simulation from a checkpoint.
+
+        The simulation is first reset as if by :meth:`reset`; that is, each clock, testbench,
+        and process is restarted. Then, the simulation time, the values of signals, the contents
+        of memories, and the phases of clocks are changed to the ones saved in
+        :py:`checkpoint`, which is a snapshot returned by :meth:`save_state`. Signals and
+        memories are identified by their hierarchical names; those that are not a part of
+        the checkpoint keep their initial values. Testbenches, processes, and clocks
+        may still be added after the checkpoint is restored, and start running at the restored
+        point in time.
+
+        Since testbenches are restarted, a simulation that forks several tests from one
+        checkpoint is usually set up as a new simulator for each test, with only the testbench
+        for that test added to it. This method must not be called from a testbench or a process.
+
+        Raises
+        ------
+        :exc:`TypeError`
+            If :py:`checkpoint` is not a bytes-like object.
+        :exc:`ValueError`
+            If :py:`checkpoint` is not a valid checkpoint, or it was saved for a different
+            design.
+        :exc:`NotImplementedError`
+            If the simulation engine does not support checkpoints.
+        """
+        try:
+            memoryview(checkpoint)
+        except TypeError:
+            raise TypeError(f"Checkpoint must be a bytes-like object, not {checkpoint!r}") \
+                from None
+        self._engine.restore_state(Checkpoint.from_bytes(checkpoint))
+        self._running = False
 
     def reset(self):
         """Reset the simulation.
@@ -0,0 +1,671 @@
+import os
+import sys
+import copy
+import ctypes
+import hashlib
+import tempfile
+
+from ..hdl._ast import SignalDict
+from ..hdl._ir import _add_name
+from ..hdl._mem import MemoryInstance
+from ..back import rtlil
+from .. import _cache
+from .._toolchain.yosys import find_yosys
+from .._toolchain.cxx import build_cxx, shared_library_suffix
+from ._base import BaseSignalState, BaseMemoryState
+from ._pyrtl import pin_blame
+from ._membuf import pack_rows, unpack_rows
+from .pysim import (PySimEngine, _PyEngineState, _PyMemoryState, _PyMemoryChange,
+                    _PyMemoryBlockChange, _run_wakers)
+
+
+__all__ = ["CxxSimEngine"]
+
+
+# Mirrors the definitions in `cxxrtl/capi/cxxrtl_capi.h`.
+_CXXRTL_VALUE   = 0
+_CXXRTL_WIRE    = 1
+_CXXRTL_MEMORY  = 2
+_CXXRTL_ALIAS   = 3
+_CXXRTL_OUTLINE = 4
+
+_CXXRTL_DRIVEN_COMB = 1 << 3
+
+
+class _cxxrtl_object(ctypes.Structure):
+    _fields_ = [
+        ("type",    ctypes.c_uint32),
+        ("flags",   ctypes.c_uint32),
+        ("width",   ctypes.c_size_t),
+        ("lsb_at",  ctypes.c_size_t),
+        ("depth",   ctypes.c_size_t),
+        ("zero_at", ctypes.c_size_t),
+        ("curr",    ctypes.POINTER(ctypes.c_uint32)),
+        ("next",    ctypes.POINTER(ctypes.c_uint32)),
+        ("outline", ctypes.c_void_p),
+        ("attrs",   ctypes.c_void_p),
+    ]
+
+
+_cxxrtl_enum_callback = ctypes.CFUNCTYPE(None,
+    ctypes.c_void_p, ctypes.c_char_p, ctypes.POINTER(_cxxrtl_object), ctypes.c_size_t)
+_print_callback = ctypes.CFUNCTYPE(None, ctypes.c_char_p)
+_check_callback = ctypes.CFUNCTYPE(None, ctypes.c_int, ctypes.c_char_p, ctypes.c_char_p)
+
+
+# Compiled before the generated code. Every design defines the same C++ symbols, so to keep
+# the designs loaded into the same process apart, it is built with hidden visibility, and only
+# the C API is exported.
+_PROLOGUE_SOURCE = r"""
+#pragma GCC visibility push(default)
+#include <cxxrtl/capi/cxxrtl_capi.h>
+extern "C" cxxrtl_toplevel cxxrtl_design_create();
+extern "C" size_t amaranth_cxxrtl_step(cxxrtl_handle handle, void (*print_fn)(const char *),
+                                       void (*check_fn)(int, const char *, const char *));
+#pragma GCC visibility pop
+"""
+
+# Compiled after the generated code. Runs the design with a performer that reports the output of
+# `Print` statements and the violations of `Assert` and `Assume` statements (as well as `Cover`
+# statements that are hit) back to Python, instead of writing them to the standard streams or
+# aborting the process.
+_STEP_SOURCE = r"""
+#include <cxxrtl/capi/cxxrtl_capi.cc>
+
+extern "C" {
+typedef void (*amaranth_print_fn)(const char *message);
+typedef void (*amaranth_check_fn)(int flavor, const char *message, const char *src);
+}
+
+struct amaranth_performer : public cxxrtl::performer {
+	amaranth_print_fn print_fn;
+	amaranth_check_fn check_fn;
+
+	void on_print(const cxxrtl::lazy_fmt &formatter, const cxxrtl::metadata_map &) override {
+		print_fn(formatter().c_str());
+	}
+
+	void on_check(cxxrtl::flavor type, bool condition, const cxxrtl::lazy_fmt &formatter,
+	              const cxxrtl::metadata_map &attributes) override {
+		if (type == cxxrtl::flavor::COVER ? !condition : condition)
+			return;
+		std::string src;
+		auto it = attributes.find("src");
+		if (it != attributes.end() && it->second.value_type == cxxrtl::metadata::STRING)
+			src = it->second.as_string();
+		check_fn((int)type, formatter().c_str(), src.c_str());
+	}
+};
+
+extern "C" size_t amaranth_cxxrtl_step(cxxrtl_handle handle, amaranth_print_fn print_fn,
+                                       amaranth_check_fn check_fn) {
+	amaranth_performer performer;
+	performer.print_fn = print_fn;
+	performer.check_fn = check_fn;
+	// Unlike `module::step`, keep evaluating the design until nothing changes, even if `eval`
+	// reports convergence: the values written to `next` from the outside only become visible
+	// after a commit, and must be propagated through the combinational logic.
+	size_t deltas = 0;
+	do {
+		handle->module->eval(&performer);
+		deltas++;
+	} while (handle->module->commit());
+	return deltas;
+}
+"""
+
+# Mirrors `enum class cxxrtl::flavor`.
+_FLAVOR_ASSERT  = 0
+_FLAVOR_ASSUME  = 1
+_FLAVOR_COVER   = 4
+
+
+# Total size of the on-disk cache after which the least recently used libraries are evicted.
+_DISK_CACHE_LIMIT = 256 << 20
+
+
+def _cache_dir():
+    # The on-disk cache may be disabled with `AMARANTH_cxxsim_cache=0`, or moved elsewhere by
+    # setting it to a path. Without the cache, the design is rebuilt for every simulator.
+    return _cache.cache_dir("cxxsim", default=True)
+
+
+def _parse_src(src):
+    # Yosys joins the locations of merged cells with `|`; the first one is the most relevant.
+    filename, sep, line = src.split("|")[0].rpartition(":")
+    if not sep or not line.isdigit():
+        return None
+    return filename, int(line)
+
+
+def _build_library(rtlil_text):
+    yosys = find_yosys(lambda ver: ver >= (0, 40))
+    include_dir = yosys.data_dir() / "include" / "backends" / "cxxrtl" / "runtime"
+    suffix = shared_library_suffix()
+
+    digest = hashlib.sha256()
+    for part in (repr(yosys.version()), os.getenv("CXX", ""), os.getenv("CXXFLAGS", ""),
+                 sys.platform, _PROLOGUE_SOURCE, _STEP_SOURCE, rtlil_text):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    key = digest.hexdigest()
+
+    cache_dir = _cache_dir()
+    if cache_dir is not None:
+        library_path = os.path.join(cache_dir, f"{key}{suffix}")
+        if os.path.exists(library_path):
+            # Mark the entry as recently used.
+            os.utime(library_path)
+            return library_path
+
+    script = [
+        f"read_rtlil <<rtlil\n{rtlil_text}\nrtlil",
+        # Memory reads are not evaluated correctly in debug outlines, which are only used
+        # for the wires localized at -O5 and above.
+        "write_cxxrtl -O4",
+    ]
+    cxx_source = yosys.run(["-q", "-"], "\n".join(script))
+
+    def build(output_path):
+        build_cxx(
+            cxx_sources={"design.cc": _PROLOGUE_SOURCE + cxx_source + _STEP_SOURCE},
+            output_path=output_path,
+            include_dirs=[include_dir],
+            flags=["-fvisibility=hidden"],
+        )
+
+    if cache_dir is None:
+        fd, library_path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        try:
+            build(library_path)
+        except BaseException:
+            os.unlink(library_path)
+            raise
+        return library_path
+
+    # Make room for the new library before adding it, so that it is never evicted itself.
+    _cache.trim_cache_dir(cache_dir, _DISK_CACHE_LIMIT, suffix=suffix)
+    with _cache.replace_atomically(cache_dir, f"{key}{suffix}") as temp_path:
+        build(temp_path)
+    return library_path
+
+
+def _name_memory_port_signals(design):
+    # Memories are emitted into the module of their parent fragment, so the signals that are only
+    # connected to their ports (e.g. the ones driven by a testbench) have no names in the netlist,
+    # and cannot be accessed in the compiled design. Name them in the parent fragment; this is
+    # done on a copy of the design to keep the names used for the waveform file unchanged.
+    design = copy.copy(design)
+    design.fragments = dict(design.fragments)
+    copied = set()
+    for fragment, fragment_info in list(design.fragments.items()):
+        if not isinstance(fragment, MemoryInstance):
+            continue
+        parent = fragment_info.parent
+        parent_info = design.fragments[parent]
+        if parent not in copied:
+            parent_info = design.fragments[parent] = copy.copy(parent_info)
+            parent_info.signal_names = SignalDict(parent_info.signal_names.items())
+            parent_info.assigned_names = set(parent_info.assigned_names)
+            copied.add(parent)
+        for signal, name in fragment_info.signal_names.items():
+            if signal not in parent_info.signal_names:
+                parent_info.signal_names[signal] = \
+                    _add_name(parent_info.assigned_names, f"{fragment_info.name[-1]}.{name}")
+    return design
+
+
+class _CxxDesign:
+    def __init__(self, library_path):
+        self._library = library = ctypes.CDLL(library_path)
+        library.cxxrtl_design_create.argtypes = []
+        library.cxxrtl_design_create.restype = ctypes.c_void_p
+        library.cxxrtl_create.argtypes = [ctypes.c_void_p]
+        library.cxxrtl_create.restype = ctypes.c_void_p
+        library.cxxrtl_destroy.argtypes = [ctypes.c_void_p]
+        library.cxxrtl_destroy.restype = None
+        library.cxxrtl_reset.argtypes = [ctypes.c_void_p]
+        library.cxxrtl_reset.restype = None
+        library.cxxrtl_enum.argtypes = [ctypes.c_void_p, ctypes.c_void_p, _cxxrtl_enum_callback]
+        library.cxxrtl_enum.restype = None
+        library.cxxrtl_outline_eval.argtypes = [ctypes.c_void_p]
+        library.cxxrtl_outline_eval.restype = None
+        library.amaranth_cxxrtl_step.argtypes = [ctypes.c_void_p, _print_callback, _check_callback]
+        library.amaranth_cxxrtl_step.restype = ctypes.c_size_t
+
+        self._handle = library.cxxrtl_create(library.cxxrtl_design_create())
+
+        # Objects by their hierarchical name, and the objects that actually hold the bits of
+        # an alias (or any other object), by the address of their bits.
+        self.objects = {}
+        storage = {}
+        def enum_callback(data, name, object, parts):
+            assert parts == 1
+            object = _cxxrtl_object.from_buffer_copy(object.contents)
+            self.objects[name.decode("utf-8")] = object
+            if object.type != _CXXRTL_ALIAS:
+                storage[ctypes.addressof(object.curr.contents)] = object
+        library.cxxrtl_enum(self._handle, None, _cxxrtl_enum_callback(enum_callback))
+        for name, object in self.objects.items():
+            if object.type == _CXXRTL_ALIAS:
+                self.objects[name] = storage.get(ctypes.addressof(object.curr.contents), object)
+
+        self.outline_eval = library.cxxrtl_outline_eval
+        # Errors reported by the design are raised once `step()` returns, since exceptions cannot
+        # propagate through the C code.
+        self._errors = []
+        self._print_callback = _print_callback(self._on_print)
+        self._check_callback = _check_callback(self._on_check)
+
+    def __del__(self):
+        if hasattr(self, "_handle"):
+            self._library.cxxrtl_destroy(self._handle)
+
+    def _on_print(self, message):
+        print(message.decode("utf-8"), end="")
+
+    def _on_check(self, flavor, message, src):
+        message = message.decode("utf-8")
+        src_loc = _parse_src(src.decode("utf-8"))
+        if flavor == _FLAVOR_COVER:
+            if message:
+                filename, line = src_loc or ("<unknown>", 0)
+                print(f"Coverage hit at {filename}:{line}:", message)
+            return
+        if flavor == _FLAVOR_ASSERT:
+            kind = "Assertion"
+        elif flavor == _FLAVOR_ASSUME:
+            kind = "Assumption"
+        else:
+            return # eventually-properties are not checked, as in the Python engine
+        if message:
+            self._errors.append((src_loc, AssertionError(f"{kind} violated: {message}")))
+        else:
+            self._errors.append((src_loc, AssertionError(f"{kind} violated")))
+
+    def step(self):
+        self._library.amaranth_cxxrtl_step(self._handle,
+            self._print_callback, self._check_callback)
+        if self._errors:
+            src_loc, exc = self._errors[0]
+            self._errors.clear()
+            pin_blame(src_loc, exc)
+
+    def reset(self):
+        self._library.cxxrtl_reset(self._handle)
+        self._errors.clear()
+
+    def lookup(self, name):
+        return self.objects.get(" ".join(name))
+
+
+def _chunk_accessors(pointer, width):
+    # Returns functions reading and writing an unsigned integer stored as 32-bit chunks, least
+    # significant first.
+    chunks = (width + 31) // 32
+    if chunks == 0:
+        return (lambda: 0), (lambda value: None)
+    array = ctypes.cast(pointer, ctypes.POINTER(ctypes.c_uint32 * chunks)).contents
+    if chunks == 1:
+        def read():
+            return array[0]
+        def write(value):
+            array[0] = value
+    elif sys.byteorder == "little":
+        # The chunks are laid out in memory the same as the bytes of a little endian integer.
+        def read():
+            return int.from_bytes(array, "little")
+        def write(value):
+            ctypes.memmove(array, value.to_bytes(chunks * 4, "little"), chunks * 4)
+    else:
+        def read():
+            return sum(chunk << (32 * index) for index, chunk in enumerate(array))
+        def write(value):
+            for index in range(chunks):
+                array[index] = (value >> (32 * index)) & 0xffffffff
+    return read, write
+
+
+class _CxxSignalState(BaseSignalState):
+    __slots__ = ("signal", "is_comb", "curr", "next", "wakers", "pending", "outline",
+                 "_read", "_write", "_width_mask", "_sign_bit")
+
+    def __init__(self, signal, pending, object):
+        assert object.width == len(signal) and object.lsb_at == 0
+        self.signal  = signal
+        self.pending = pending
+        self.wakers  = list()
+        # Bits driven by combinational logic (or constants) cannot be overridden; writing to them
+        # would have no effect.
+        self.is_comb = (object.type in (_CXXRTL_OUTLINE, _CXXRTL_ALIAS) or not object.next or
+                        bool(object.flags & _CXXRTL_DRIVEN_COMB))
+        # Outline objects are only valid after their outline has been evaluated.
+        self.outline = object.outline if object.type == _CXXRTL_OUTLINE else None
+
+        self._read, _ = _chunk_accessors(object.curr, object.width)
+        if object.next:
+            _, self._write = _chunk_accessors(object.next, object.width)
+        else:
+            self._write = None
+        self._width_mask = (1 << len(signal)) - 1
+        if signal.shape().signed and len(signal) > 0:
+            self._sign_bit = 1 << (len(signal) - 1)
+        else:
+            self._sign_bit = 0
+        self.reset()
+
+    def read(self):
+        value = self._read()
+        if value & self._sign_bit:
+            value -= self._sign_bit << 1
+        return value
+
+    def reset(self):
+        self.curr = self.next = self.read()
+
+    def add_waker(self, waker):
+        assert waker not in self.wakers
+        self.wakers.append(waker)
+
+    def remove_waker(self, waker):
+        self.wakers.remove(waker)
+
+    def update(self, value, mask=~0):
+        value = (self.next & ~mask) | (value & mask)
+        if self.next != value:
+            self.next = value
+            self.pending.add(self)
+
+    def commit(self):
+        # Transfers a value set by a testbench or process to the design.
+        if self.curr == self.next:
+            return False
+
+        self._write(self.next & self._width_mask)
+        _run_wakers(self.wakers, self.curr, self.next)
+
+        self.curr = self.next
+        return True
+
+    def sync(self):
+        # Observes a change made by the design.
+        value = self.read()
+        if self.curr == value:
+            return False
+
+        _run_wakers(self.wakers, self.curr, value)
+
+        self.curr = self.next = value
+        return True
+
+
+def _decode_rows(image, chunks):
+    # Converts rows stored as 32-bit chunks, least significant first, to a list of integers.
+    if sys.byteorder == "big":
+        # Each chunk is stored in the native byte order; rearrange the bytes of each row to form
+        # a little endian integer.
+        image = pack_rows(unpack_rows(image, 32, byteorder="big"), 32)
+    return unpack_rows(image, chunks * 32)
+
+
+def _encode_rows(values, chunks):
+    # Converts a list of integers to rows stored as 32-bit chunks, least significant first.
+    image = pack_rows(values, chunks * 32)
+    if sys.byteorder == "big":
+        image = pack_rows(unpack_rows(image, 32), 32, byteorder="big")
+    return image
+
+
+class _CxxMemoryState(BaseMemoryState):
+    __slots__ = ("memory", "write_queue", "write_blocks", "wakers", "pending", "data",
+                 "_address", "_row_size", "_width_mask", "_image")
+
+    # Rows are compared with the previous contents of the memory in blocks of this many rows, so
+    # that only the blocks which differ are decoded.
+    _SYNC_BLOCK_ROWS = 256
+
+    def __init__(self, memory, pending, object):
+        self.memory  = memory
+        self.pending = pending
+        self.wakers  = list()
+        self.write_queue = {}
+        self.write_blocks = []
+
+        # The rows are accessed as a single buffer of `depth` rows, each of which consists of
+        # `chunks` 32-bit chunks.
+        self._address    = ctypes.addressof(object.curr.contents)
+        self._row_size   = 4 * ((object.width + 31) // 32)
+        self._width_mask = (1 << object.width) - 1
+        self.reset()
+
+    def _read_image(self):
+        return ctypes.string_at(self._address, self._row_size * self.memory.depth)
+
+    def reset(self):
+        self.write_queue.clear()
+        self.write_blocks.clear()
+        self._image = bytearray(self._read_image())
+        self.data = _decode_rows(self._image, self._row_size // 4)
+
+    def add_waker(self, waker):
+        assert waker not in self.wakers
+        self.wakers.append(waker)
+
+    def read(self, addr):
+        if addr in range(self.memory.depth):
+            return self.data[addr]
+        return 0
+
+    def write(self, addr, value, mask=None):
+        if addr in range(self.memory.depth):
+            if self.write_blocks:
+                self.merge_write_blocks()
+            if addr not in self.write_queue:
+                self.write_queue[addr] = self.data[addr]
+            if mask is not None:
+                value = (value & mask) | (self.write_queue[addr] & ~mask)
+            self.write_queue[addr] = value
+            self.pending.add(self)
+
+    def read_rows(self, start, count):
+        return self.data[start:start + count]
+
+    def write_rows(self, start, values):
+        if values:
+            if self.write_queue:
+                self.write_queue.update(zip(range(start, start + len(values)), values))
+            else:
+                self.write_blocks.append((start, values))
+            self.pending.add(self)
+
+    def merge_write_blocks(self):
+        for start, values in self.write_blocks:
+            self.write_queue.update(zip(range(start, start + len(values)), values))
+        self.write_blocks.clear()
+
+    def _write_image(self, start, values):
+        image = _encode_rows(values, self._row_size // 4)
+        offset = start * self._row_size
+        ctypes.memmove(self._address + offset, image, len(image))
+        self._image[offset:offset + len(image)] = image
+
+    def commit(self):
+        # Transfers the writes made by a testbench or process to the design.
+        # `commit()` is only called if `self` is pending
+        assert self.write_queue or self.write_blocks
+
+        _run_wakers(self.wakers)
+
+        # Blocks are only queued while there are no single row writes, so they come first.
+        changed = False
+        for start, values in self.write_blocks:
+            values = [value & self._width_mask for value in values]
+            if self.data[start:start + len(values)] != values:
+                self.data[start:start + len(values)] = values
+                self._write_image(start, values)
+                changed = True
+        self.write_blocks.clear()
+        for addr, value in self.write_queue.items():
+            value &= self._width_mask
+            if self.data[addr] != value:
+                self.data[addr] = value
+                self._write_image(addr, [value])
+                changed = True
+        self.write_queue.clear()
+        return changed
+
+    def sync(self, changed):
+        # Observes the writes made by the design.
+        image = self._read_image()
+        if image == self._image:
+            return False
+
+        _run_wakers(self.wakers)
+
+        block_size = self._SYNC_BLOCK_ROWS * self._row_size
+        for offset in range(0, len(image), block_size):
+            block = image[offset:offset + block_size]
+            if block == self._image[offset:offset + block_size]:
+                continue
+            rows = _decode_rows(block, self._row_size // 4)
+            for addr, row in enumerate(rows, offset // self._row_size):
+                if self.data[addr] != row:
+                    self.data[addr] = row
+                    if changed is not None:
+                        changed.add(_PyMemoryChange(self, addr))
+        self._image[:] = image
+        return True
+
+
+class _CxxEngineState(_PyEngineState):
+    def __init__(self, design, signal_names, memory_names):
+        super().__init__()
+        self._design = design
+        self._signal_names = signal_names
+        self._memory_names = memory_names
+        # States of the signals and memories that are a part of the compiled design; those that
+        # are not (such as the signals only used by testbenches) are simulated as in pysim.
+        self._cxx_states = []
+        self._outlines = []
+        # Whether the design has been modified by a testbench or process, and must be evaluated.
+        self._dirty = False
+        self._design.step()
+
+    def reset(self):
+        self._design.reset()
+        self._design.step()
+        self._dirty = False
+        super().reset()
+
+    def get_signal(self, signal):
+        try:
+            return self.signals[signal]
+        except KeyError:
+            object = None
+            if signal in self._signal_names:
+                object = self._design.lookup(self._signal_names[signal][1:])
+            if object is None:
+                return super().get_signal(signal)
+            if object.type == _CXXRTL_OUTLINE:
+                if object.outline not in self._outlines:
+                    self._outlines.append(object.outline)
+                self._design.outline_eval(object.outline)
+            index = len(self.slots)
+            state = _CxxSignalState(signal, self.pending, object)
+            self.slots.append(state)
+            self._cxx_states.append(state)
+            self.signals[signal] = index
+            return index
+
+    def get_memory(self, memory):
+        try:
+            return self.memories[memory]
+        except KeyError:
+            object = None
+            if memory in self._memory_names:
+                object = self._design.lookup(self._memory_names[memory][1:])
+            if object is None or object.type != _CXXRTL_MEMORY:
+                return super().get_memory(memory)
+            index = len(self.slots)
+            state = _CxxMemoryState(memory, self.pending, object)
+            self.slots.append(state)
+            self._cxx_states.append(state)
+            self.memories[memory] = index
+            return index
+
+    def commit(self, changed=None):
+        converged = True
+        traced = self.traced
+
+        # Evaluate the design if it was modified during the previous delta cycle, and observe
+        # the changes it made. This happens one delta cycle after the modification, so that
+        # the triggers that it activated sample the values from before the design reacted to it,
+        # like they would if the design was simulated by pysim.
+        if self._dirty:
+            self._dirty = False
+            self._design.step()
+            for outline in self._outlines:
+                self._design.outline_eval(outline)
+            for state in self._cxx_states:
+                if type(state) is _CxxSignalState:
+                    if state.sync():
+                        if changed is not None and state in traced:
+                            changed.add(state)
+                        converged = False
+                elif state.sync(changed if state in traced else None):
+                    converged = False
+
+        for state in self.pending:
+            if changed is not None and state in traced:
+                if isinstance(state, (_PyMemoryState, _CxxMemoryState)):
+                    for addr in state.write_queue:
+                        changed.add(_PyMemoryChange(state, addr))
+                    for start, values in state.write_blocks:
+                        changed.add(_PyMemoryBlockChange(state, start, start + len(values)))
+                else:
+                    changed.add(state)
+            if state.commit():
+                converged = False
+                if type(state) in (_CxxSignalState, _CxxMemoryState):
+                    self._dirty = True
+        self.pending.clear()
+        return converged
+
+
+class CxxSimEngine(PySimEngine):
+    """Simulation engine that compiles the design to C++ using CXXRTL.
+
+    Testbenches, processes, and triggers are handled like in :class:`PySimEngine`; only
+    the design itself is simulated by the compiled code. The compiled design is cached on disk,
+    keyed by the RTLIL representation of the design.
+
+    Since the design is converted to a netlist first, designs that :class:`PySimEngine` accepts
+    but that cannot be synthesized (such as those with combinational cycles or signals driven
+    from several modules) are rejected.
+    """
+    def __init__(self, design):
+        rtlil_text, signal_names = rtlil.convert_fragment(_name_memory_port_signals(design),
+                                                          all_undef_to_ff=True)
+        memory_names = {}
+        for fragment, fragment_info in design.fragments.items():
+            if isinstance(fragment, MemoryInstance):
+                memory_names[fragment._data] = fragment_info.name
+
+        library_path = _build_library(rtlil_text)
+        cxx_design = _CxxDesign(library_path)
+        if _cache_dir() is None:
+            try:
+                os.unlink(library_path)
+            except OSError: # the library may be locked while it is loaded
+                pass
+        state = _CxxEngineState(cxx_design, signal_names, memory_names)
+        self._init_scheduler(design, state, set(), levelized=False)
+
+    # The compiled design has state (such as that of the cells it was synthesized into) that is
+    # not visible through the signals and memories of the design, and could not be restored.
+    def save_state(self):
+        raise NotImplementedError("Checkpoints are not supported by the CXXRTL engine")
+
+    def restore_state(self, checkpoint):
+        raise NotImplementedError("Checkpoints are not supported by the CXXRTL engine")
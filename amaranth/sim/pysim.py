@@ -1,21 +1,50 @@
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 import itertools
+import heapq
+from array import array
 import re
-import os.path
+import os
+from fnmatch import fnmatchcase
 import enum as py_enum
 
 from ..hdl import *
+from ..hdl import _mem
 from ..hdl._mem import MemoryInstance
-from ..hdl._ast import SignalDict
+from ..hdl._ast import SignalDict, SignalSet
 from ..lib import data, wiring
 from ._base import *
 from ._async import *
 from ._pyeval import eval_format, eval_value, eval_assign
-from ._pyrtl import _FragmentCompiler
+from ._pyrtl import PyRTLProcess, _FragmentCompiler, compile_sampler, compile_getter, compile_setter
+from ._pylanes import (Lanes, _LaneFragmentCompiler, compile_lane_sampler, compile_lane_getter,
+                       compile_lane_setter)
+from ._pycache import trim_cache
 from ._pyclock import PyClockProcess
+from ._vcd import VCDWriter
+from ._fst import FSTWriter
+from ._capture import CaptureWriter
+from ._checkpoint import Checkpoint
+from ._profile import Profiler
+from ._toggle import ToggleCoverage
+from ._membuf import pack_rows, unpack_rows, page_typecode
+from .core import _flatten_traces
 
 
-__all__ = ["PySimEngine"]
+__all__ = ["PySimEngine", "PyLaneSimEngine"]
+
+
+# Memories deeper than this are simulated using a sparse representation (like their initial
+# contents), and are only captured in waveform files if they are traced explicitly.
+_SPARSE_MEMORY_DEPTH = _mem._SPARSE_MEMORY_DEPTH
+
+
+def _name_included(name, include, exclude):
+    # Matches a hierarchical name against the `include=` and `exclude=` glob patterns.
+    if include is not None and not any(fnmatchcase(name, pattern) for pattern in include):
+        return False
+    if exclude is not None and any(fnmatchcase(name, pattern) for pattern in exclude):
+        return False
+    return True
 
 
 class _VCDWriter:
@@ -23,17 +52,20 @@ class _VCDWriter:
     def decode_to_vcd(format, value):
         return format.format(value).expandtabs().replace(" ", "_")
 
-    def __init__(self, state, design, *, vcd_file, gtkw_file=None, traces=(), fs_per_delta=0):
+    def __init__(self, state, design, *, vcd_file, gtkw_file=None, traces=(), fs_per_delta=0,
+                 format="vcd", start=None, stop=None, trigger=None, pre_trigger=0,
+                 post_trigger=None, include=None, exclude=None):
         self.state = state
         self.fs_per_delta = fs_per_delta
 
-        # Although pyvcd is a mandatory dependency, be resilient and import it as needed, so that
-        # the simulator is still usable if it's not installed for some reason.
-        import vcd, vcd.gtkw
-
         self.close_vcd = False
         self.close_gtkw = False
-        if isinstance(vcd_file, str):
+        if format == "fst":
+            # The FST writer manages its output file itself, so it needs a path rather than
+            # a file object.
+            if not isinstance(vcd_file, (str, os.PathLike)):
+                raise TypeError(f"FST file must be a path, not {vcd_file!r}")
+        elif isinstance(vcd_file, str):
             vcd_file = open(vcd_file, "w")
             self.close_vcd = True
         if isinstance(gtkw_file, str):
@@ -41,15 +73,43 @@ class _VCDWriter:
             self.close_gtkw = True
 
         self.vcd_signal_vars = SignalDict()
+        self.vcd_signal_updaters = {}
         self.vcd_memory_vars = {}
+        self.vcd_memory_updaters = {}
         self.vcd_file = vcd_file
-        self.vcd_writer = vcd_file and vcd.VCDWriter(self.vcd_file,
-            timescale="1 fs", comment="Generated by Amaranth")
+        if format == "fst":
+            def create_writer(start=0):
+                return FSTWriter(self.vcd_file,
+                    timescale="1 fs", comment="Generated by Amaranth", start=start)
+        else:
+            def create_writer(start=0):
+                return VCDWriter(self.vcd_file,
+                    timescale="1 fs", comment="Generated by Amaranth", start=start)
+        if not vcd_file:
+            self.vcd_writer = None
+        elif start is None and stop is None and trigger is None:
+            self.vcd_writer = create_writer()
+        else:
+            # Only the changes within the capture window (or around the trigger) are written;
+            # the writer is created once capture begins.
+            self.vcd_writer = CaptureWriter(create_writer,
+                start=start or 0, stop=stop,
+                pre_trigger=None if trigger is None else pre_trigger,
+                post_trigger=post_trigger)
+        self.trigger = None
+        # States of the signals and memories whose changes are written to the file.
+        self.traced = set()
 
         self.gtkw_signal_names = SignalDict()
         self.gtkw_memory_names = {}
         self.gtkw_file = gtkw_file
-        self.gtkw_save = gtkw_file and vcd.gtkw.GTKWSave(self.gtkw_file)
+        if gtkw_file:
+            # Although pyvcd is a mandatory dependency, be resilient and import it as needed, so
+            # that the simulator is still usable if it's not installed for some reason.
+            import vcd.gtkw
+            self.gtkw_save = vcd.gtkw.GTKWSave(self.gtkw_file)
+        else:
+            self.gtkw_save = None
 
         self.traces = traces
 
@@ -66,59 +126,69 @@ class _VCDWriter:
 
         trace_names = SignalDict()
         assigned_names = set()
-        def traverse_traces(traces):
-            if isinstance(traces, ValueLike):
-                trace = Value.cast(traces)
-                if isinstance(trace, MemoryData._Row):
-                    memory = trace._memory
-                    if not memory in memories:
-                        if memory.name not in assigned_names:
-                            name = memory.name
-                        else:
-                            name = f"{memory.name}${len(assigned_names)}"
-                            assert name not in assigned_names
-                        memories[memory] = ("bench", name)
-                        assigned_names.add(name)
+        explicit_signals = SignalSet()
+        explicit_memories = set()
+        def add_memory(memory):
+            explicit_memories.add(memory)
+            if not memory in memories:
+                if memory.name not in assigned_names:
+                    name = memory.name
                 else:
-                    for trace_signal in trace._rhs_signals():
-                        if trace_signal not in signal_names:
-                            if trace_signal.name not in assigned_names:
-                                name = trace_signal.name
-                            else:
-                                name = f"{trace_signal.name}${len(assigned_names)}"
-                                assert name not in assigned_names
-                            trace_names[trace_signal] = {("bench", name)}
-                            assigned_names.add(name)
-            elif isinstance(traces, MemoryData):
-                if not traces in memories:
-                    if traces.name not in assigned_names:
-                        name = traces.name
+                    name = f"{memory.name}${len(assigned_names)}"
+                    assert name not in assigned_names
+                memories[memory] = ("bench", name)
+                assigned_names.add(name)
+        for trace in _flatten_traces(traces):
+            if isinstance(trace, MemoryData):
+                add_memory(trace)
+                continue
+            trace = Value.cast(trace)
+            if isinstance(trace, MemoryData._Row):
+                add_memory(trace._memory)
+                continue
+            for trace_signal in trace._rhs_signals():
+                explicit_signals.add(trace_signal)
+                if trace_signal not in signal_names:
+                    if trace_signal.name not in assigned_names:
+                        name = trace_signal.name
                     else:
-                        name = f"{traces.name}${len(assigned_names)}"
+                        name = f"{trace_signal.name}${len(assigned_names)}"
                         assert name not in assigned_names
-                    memories[traces] = ("bench", name)
+                    trace_names[trace_signal] = {("bench", name)}
                     assigned_names.add(name)
-            elif hasattr(traces, "signature") and isinstance(traces.signature, wiring.Signature):
-                for name in traces.signature.members:
-                    traverse_traces(getattr(traces, name))
-            elif isinstance(traces, list) or isinstance(traces, tuple):
-                for trace in traces:
-                    traverse_traces(trace)
-            elif isinstance(traces, dict):
-                for trace in traces.values():
-                    traverse_traces(trace)
-            else:
-                raise TypeError(f"{traces!r} is not a traceable object")
-        traverse_traces(traces)
 
         if self.vcd_writer is None:
             return
 
+        # Registering a variable for every row of a very deep memory takes a long time, and is
+        # rarely useful.
+        memories = {memory: memory_name for memory, memory_name in memories.items()
+                    if memory.depth <= _SPARSE_MEMORY_DEPTH or memory in explicit_memories}
+
+        if include is not None or exclude is not None:
+            # Signals and memories that are explicitly traced are always included; the others
+            # are matched by their hierarchical name, without the "bench" scope.
+            def is_included(name):
+                return _name_included(".".join(name[1:]), include, exclude)
+
+            included_names = SignalDict()
+            for signal, names in signal_names.items():
+                if signal not in explicit_signals:
+                    names = set(filter(is_included, names))
+                if names:
+                    included_names[signal] = names
+            signal_names = included_names
+            memories = {memory: memory_name for memory, memory_name in memories.items()
+                        if memory in explicit_memories or is_included(memory_name)}
+
+        if trigger is not None:
+            self.trigger = self.compile_getter(trigger)
+
         for signal, names in itertools.chain(signal_names.items(), trace_names.items()):
             self.vcd_signal_vars[signal] = []
             self.gtkw_signal_names[signal] = []
 
-            def add_var(path, var_type, var_size, var_init, value):
+            def add_var(path, var_type, var_size, var_init, get):
                 vcd_var = None
                 for (*var_scope, var_name) in names:
                     if re.search(r"[ \t\r\n]", var_name):
@@ -149,13 +219,15 @@ class _VCDWriter:
                             scope=var_scope, name=field_name,
                             var=vcd_var)
 
-                self.vcd_signal_vars[signal].append((vcd_var, value))
+                self.vcd_signal_vars[signal].append((vcd_var, get))
 
             def add_wire_var(path, value):
-                add_var(path, "wire", len(value), eval_value(self.state, value), value)
+                get = self.compile_getter(value)
+                add_var(path, "wire", len(value), get(), get)
 
             def add_format_var(path, fmt):
-                add_var(path, "string", 1, eval_format(self.state, fmt), fmt)
+                get = lambda: eval_format(self.state, fmt)
+                add_var(path, "string", 1, get(), get)
 
             def add_format(path, fmt):
                 if isinstance(fmt, Format.Struct):
@@ -175,10 +247,18 @@ class _VCDWriter:
                     add_format_var(path, fmt)
 
             if signal._decoder is not None and not isinstance(signal._decoder, py_enum.EnumMeta):
-                add_var((), "string", 1, signal._decoder(signal._init), signal._decoder)
+                add_var((), "string", 1, signal._decoder(signal._init),
+                        self.compile_getter(signal, decoder=signal._decoder))
             else:
                 add_format((), signal._format)
 
+            # Updaters are looked up by the signal state, which is what the engine reports as
+            # changed, and which (unlike a signal) is cheap to hash.
+            signal_state = self.state.slots[self.state.get_signal(signal)]
+            self.vcd_signal_updaters[signal_state] = \
+                self.compile_updater(self.vcd_signal_vars[signal])
+            self.traced.add(signal_state)
+
         for memory, memory_name in memories.items():
             self.vcd_memory_vars[memory] = vcd_vars = []
             self.gtkw_memory_names[memory] = gtkw_names = []
@@ -188,7 +268,7 @@ class _VCDWriter:
                 row_gtkw_names = []
                 var_scope = memory_name[:-1]
 
-                def add_mem_var(path, var_type, var_size, var_init, value):
+                def add_mem_var(path, var_type, var_size, var_init, get):
                     field_name = "\\" + memory_name[-1] + f"[{idx}]"
                     for item in path:
                         if isinstance(item, int):
@@ -198,7 +278,7 @@ class _VCDWriter:
                     row_vcd_vars.append((self.vcd_writer.register_var(
                         scope=var_scope, name=field_name, var_type=var_type,
                         size=var_size, init=var_init
-                    ), value))
+                    ), get))
                     if var_size > 1:
                         suffix = f"[{var_size - 1}:0]"
                     else:
@@ -206,10 +286,12 @@ class _VCDWriter:
                     row_gtkw_names.append(".".join((*var_scope, field_name)) + suffix)
 
                 def add_mem_wire_var(path, value):
-                    add_mem_var(path, "wire", len(value), eval_value(self.state, value), value)
+                    get = self.compile_getter(value)
+                    add_mem_var(path, "wire", len(value), get(), get)
 
                 def add_mem_format_var(path, fmt):
-                    add_mem_var(path, "string", 1, eval_format(self.state, fmt), fmt)
+                    get = lambda: eval_format(self.state, fmt)
+                    add_mem_var(path, "string", 1, get(), get)
 
                 def add_mem_format(path, fmt):
                     if isinstance(fmt, Format.Struct):
@@ -237,70 +319,86 @@ class _VCDWriter:
                 vcd_vars.append(row_vcd_vars)
                 gtkw_names.append(row_gtkw_names)
 
-    def update_signal(self, timestamp, signal):
-        for (vcd_var, repr) in self.vcd_signal_vars.get(signal, ()):
-            if isinstance(repr, Value):
-                var_value = eval_value(self.state, repr)
-            elif isinstance(repr, (Format, Format.Enum)):
-                var_value = eval_format(self.state, repr)
-            else:
-                # decoder
-                var_value = repr(eval_value(self.state, signal))
-            self.vcd_writer.change(vcd_var, timestamp, var_value)
-
-    def update_memory(self, timestamp, memory, addr):
-        if memory not in self.vcd_memory_vars:
-            return
-        for vcd_var, repr in self.vcd_memory_vars[memory][addr]:
-            if isinstance(repr, Value):
-                var_value = eval_value(self.state, repr)
+            self.vcd_memory_updaters[memory] = [
+                self.compile_updater(row_vcd_vars) for row_vcd_vars in vcd_vars]
+            self.traced.add(self.state.slots[self.state.get_memory(memory)])
+
+    def compile_getter(self, value, *, decoder=None):
+        # Plain signals are read directly from their state; other values (such as the fields of
+        # aggregate signals) are compiled to avoid interpreting them on every change.
+        if type(value) is Signal:
+            signal_state = self.state.slots[self.state.get_signal(value)]
+            if decoder is not None:
+                return lambda: decoder(signal_state.curr)
+            return lambda: signal_state.curr
+        try:
+            return compile_getter(self.state, value)
+        except (TypeError, NotImplementedError, OverflowError):
+            return lambda: eval_value(self.state, value)
+
+    def compile_updater(self, vcd_vars):
+        change = self.vcd_writer.change
+        if len(vcd_vars) == 1:
+            (vcd_var, get), = vcd_vars
+            def update(timestamp):
+                change(vcd_var, timestamp, get())
+        else:
+            def update(timestamp):
+                for vcd_var, get in vcd_vars:
+                    change(vcd_var, timestamp, get())
+        return update
+
+    def update(self, timestamp, changed):
+        signal_updaters = self.vcd_signal_updaters
+        memory_updaters = self.vcd_memory_updaters
+        for change in changed:
+            if type(change) is _PyMemoryChange:
+                row_updaters = memory_updaters.get(change.state.memory)
+                if row_updaters is not None:
+                    row_updaters[change.addr](timestamp)
+            elif type(change) is _PyMemoryBlockChange:
+                row_updaters = memory_updaters.get(change.state.memory)
+                if row_updaters is not None:
+                    for update in row_updaters[change.start:change.stop]:
+                        update(timestamp)
             else:
-                var_value = eval_format(self.state, repr)
-            self.vcd_writer.change(vcd_var, timestamp, var_value)
+                update = signal_updaters.get(change)
+                if update is not None:
+                    update(timestamp)
+        if self.trigger is not None and self.trigger():
+            if self.vcd_writer.trigger(timestamp):
+                self.trigger = None
 
     def close(self, timestamp):
         if self.vcd_writer is not None:
             self.vcd_writer.close(timestamp)
 
         if self.gtkw_save is not None:
-            self.gtkw_save.dumpfile(self.vcd_file.name)
-            self.gtkw_save.dumpfile_size(self.vcd_file.tell())
+            if isinstance(self.vcd_file, (str, os.PathLike)):
+                self.gtkw_save.dumpfile(os.fspath(self.vcd_file))
+                self.gtkw_save.dumpfile_size(os.path.getsize(self.vcd_file))
+            else:
+                self.gtkw_save.dumpfile(self.vcd_file.name)
+                self.gtkw_save.dumpfile_size(self.vcd_file.tell())
 
             self.gtkw_save.treeopen("top")
 
-            def traverse_traces(traces):
-                if isinstance(traces, Signal):
-                    for name in self.gtkw_signal_names[traces]:
-                        self.gtkw_save.trace(name)
-                elif isinstance(traces, data.View):
-                    with self.gtkw_save.group("view"):
-                        trace = Value.cast(traces)
-                        for trace_signal in trace._rhs_signals():
-                            for name in self.gtkw_signal_names[trace_signal]:
-                                self.gtkw_save.trace(name)
-                elif isinstance(traces, ValueLike):
-                    traverse_traces(Value.cast(traces))
-                elif isinstance(traces, MemoryData):
-                    for row_names in self.gtkw_memory_names[traces]:
+            gtkw_save = self.gtkw_save
+            for trace in _flatten_traces(self.traces, group=gtkw_save.group):
+                if isinstance(trace, MemoryData):
+                    for row_names in self.gtkw_memory_names[trace]:
                         for name in row_names:
-                            self.gtkw_save.trace(name)
-                elif isinstance(traces, MemoryData._Row):
-                    for name in self.gtkw_memory_names[traces._memory][traces._index]:
-                        self.gtkw_save.trace(name)
-                elif hasattr(traces, "signature") and isinstance(traces.signature, wiring.Signature):
-                    with self.gtkw_save.group("interface"):
-                        for _, _, member in traces.signature.flatten(traces):
-                            traverse_traces(member)
-                elif isinstance(traces, list) or isinstance(traces, tuple):
-                    for trace in traces:
-                        traverse_traces(trace)
-                elif isinstance(traces, dict):
-                    for name, trace in traces.items():
-                        with self.gtkw_save.group(name):
-                            traverse_traces(trace)
-                else:
-                    assert False # :nocov:
-            traverse_traces(self.traces)
+                            gtkw_save.trace(name)
+                    continue
+                trace_cast = Value.cast(trace)
+                if isinstance(trace_cast, MemoryData._Row):
+                    for name in self.gtkw_memory_names[trace_cast._memory][trace_cast._index]:
+                        gtkw_save.trace(name)
+                    continue
+                with gtkw_save.group("view") if isinstance(trace, data.View) else nullcontext():
+                    for trace_signal in trace_cast._rhs_signals():
+                        for name in self.gtkw_signal_names[trace_signal]:
+                            gtkw_save.trace(name)
 
         if self.close_vcd:
             self.vcd_file.close()
@@ -311,34 +409,47 @@ class _VCDWriter:
 class _PyTimeline:
     def __init__(self):
         self.now = 0
+        # Wakers are kept in a heap ordered by their deadline and the order in which they were set;
+        # `wakers` maps each waker to the sequence number of its only valid heap entry. Entries
+        # that were superseded by another call to `set_waker` are discarded once they surface.
         self.wakers = {}
+        self._heap = []
+        self._seq = 0
 
     def reset(self):
         self.now = 0
         self.wakers.clear()
+        self._heap.clear()
 
     def set_waker(self, interval, waker):
-        self.wakers[waker] = self.now + interval
+        self._seq += 1
+        self.wakers[waker] = self._seq
+        heapq.heappush(self._heap, (self.now + interval, self._seq, waker))
+        if len(self._heap) > 2 * len(self.wakers) + 64:
+            self._heap = [entry for entry in self._heap if self.wakers.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
 
     def advance(self):
-        nearest_wakers = set()
-        nearest_deadline = None
-        for waker, deadline in self.wakers.items():
-            if nearest_deadline is None or deadline <= nearest_deadline:
-                assert deadline >= self.now
-                if nearest_deadline is not None and deadline < nearest_deadline:
-                    nearest_wakers.clear()
-                nearest_wakers.add(waker)
-                nearest_deadline = deadline
-
-        if not nearest_wakers:
+        heap = self._heap
+        wakers = self.wakers
+        while heap and wakers.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+        if not heap:
             return False
 
-        for waker in nearest_wakers:
-            waker()
-            del self.wakers[waker]
+        nearest_deadline = heap[0][0]
+        assert nearest_deadline >= self.now
+        nearest_wakers = []
+        while heap and heap[0][0] == nearest_deadline:
+            _deadline, seq, waker = heapq.heappop(heap)
+            if wakers.get(waker) == seq:
+                del wakers[waker]
+                nearest_wakers.append(waker)
 
+        # Wakers may set further wakers relative to the time at which they fire.
         self.now = nearest_deadline
+        for waker in nearest_wakers:
+            waker()
         return True
 
 
@@ -369,6 +480,9 @@ class _PySignalState(BaseSignalState):
         assert waker not in self.wakers
         self.wakers.append(waker)
 
+    def remove_waker(self, waker):
+        self.wakers.remove(waker)
+
     def update(self, value, mask=~0):
         value = (self.next & ~mask) | (value & mask)
         if self.next != value:
@@ -393,8 +507,17 @@ class _PyMemoryChange:
         self.addr  = addr
 
 
+class _PyMemoryBlockChange:
+    __slots__ = ("state", "start", "stop")
+
+    def __init__(self, state, start, stop):
+        self.state = state
+        self.start = start
+        self.stop  = stop
+
+
 class _PyMemoryState(BaseMemoryState):
-    __slots__ = ("memory", "data", "write_queue", "wakers", "pending")
+    __slots__ = ("memory", "data", "write_queue", "write_blocks", "wakers", "pending")
 
     def __init__(self, memory, pending):
         self.memory  = memory
@@ -405,6 +528,7 @@ class _PyMemoryState(BaseMemoryState):
     def reset(self):
         self.data = list(self.memory._init._raw)
         self.write_queue = {}
+        self.write_blocks = []
 
     def add_waker(self, waker):
         assert waker not in self.wakers
@@ -417,6 +541,8 @@ class _PyMemoryState(BaseMemoryState):
 
     def write(self, addr, value, mask=None):
         if addr in range(self.memory.depth):
+            if self.write_blocks:
+                self.merge_write_blocks()
             if addr not in self.write_queue:
                 self.write_queue[addr] = self.data[addr]
             if mask is not None:
@@ -424,12 +550,56 @@ class _PyMemoryState(BaseMemoryState):
             self.write_queue[addr] = value
             self.pending.add(self)
 
+    def read_rows(self, start, count):
+        return self.data[start:start + count]
+
+    def write_rows(self, start, values):
+        # Rows written in bulk are queued as a block, which is committed (and captured in waveform
+        # files) at once. If individual rows are also written during the same delta cycle, which
+        # is rare, the blocks are merged with them to keep the writes in order.
+        shape = Shape.cast(self.memory.shape)
+        if shape.signed:
+            # Rows of signed memories are stored sign-extended, like the initial contents and
+            # the rows written by write ports.
+            sign_bit = 1 << (shape.width - 1)
+            values = [(value ^ sign_bit) - sign_bit for value in values]
+        if values:
+            if self.write_queue:
+                self.write_queue.update(zip(range(start, start + len(values)), values))
+            else:
+                self.write_blocks.append((start, values))
+            self.pending.add(self)
+
+    def merge_write_blocks(self):
+        for start, values in self.write_blocks:
+            self.write_queue.update(zip(range(start, start + len(values)), values))
+        self.write_blocks.clear()
+
+    def changed_rows(self):
+        # Used when saving a checkpoint; returns runs of rows, as `(start, rows)`, that include
+        # every row which differs from the initial contents.
+        return [(0, self.data)]
+
+    def replace_rows(self, runs):
+        # Used when restoring a checkpoint; rows that are not within any of the runs are set to
+        # the initial contents. Does not wake up any processes.
+        self.data = list(self.memory._init._raw)
+        for start, values in runs:
+            self.data[start:start + len(values)] = values
+
     def commit(self):
-        assert self.write_queue # `commit()` is only called if `self` is pending
+        # `commit()` is only called if `self` is pending
+        assert self.write_queue or self.write_blocks
 
         _run_wakers(self.wakers)
 
         changed = False
+        for start, values in self.write_blocks:
+            stop = start + len(values)
+            if self.data[start:stop] != values:
+                self.data[start:stop] = values
+                changed = True
+        self.write_blocks.clear()
         for addr, value in self.write_queue.items():
             if self.data[addr] != value:
                 self.data[addr] = value
@@ -438,6 +608,159 @@ class _PyMemoryState(BaseMemoryState):
         return changed
 
 
+class _PySparseMemoryState(_PyMemoryState):
+    # Stores the rows in pages, which are only allocated once a row within them changes, and reads
+    # the others from the initial contents of the memory; used for memories that are too deep to
+    # be copied on every reset. Pages are arrays of machine integers if the rows are narrow enough,
+    # so that large memory images take about as much space as they do in a file. The rows are
+    # always stored sign-extended (for signed memories) or masked (for unsigned ones).
+    __slots__ = ("init", "typecode", "width_mask", "sign_bit")
+
+    PAGE_BITS = 12
+    PAGE_ROWS = 1 << PAGE_BITS
+
+    def __init__(self, memory, pending):
+        shape = Shape.cast(memory.shape)
+        self.typecode   = page_typecode(shape.width, shape.signed)
+        self.width_mask = (1 << shape.width) - 1
+        self.sign_bit   = 1 << (shape.width - 1) if shape.signed else 0
+        super().__init__(memory, pending)
+
+    def reset(self):
+        self.init = self.memory._init._raw
+        self.data = {} # page index -> rows
+        self.write_queue = {}
+        self.write_blocks = []
+
+    def _canonical(self, value):
+        return ((value & self.width_mask) ^ self.sign_bit) - self.sign_bit
+
+    def _make_page(self, rows):
+        if self.typecode is None:
+            return list(rows)
+        return array(self.typecode, rows)
+
+    def _init_page(self, index):
+        start = index << self.PAGE_BITS
+        return self._make_page(map(self._canonical,
+                                   self.init[start:min(start + self.PAGE_ROWS, self.memory.depth)]))
+
+    def read(self, addr):
+        if addr in range(self.memory.depth):
+            page = self.data.get(addr >> self.PAGE_BITS)
+            if page is None:
+                return self._canonical(self.init[addr])
+            return page[addr & (self.PAGE_ROWS - 1)]
+        return 0
+
+    def write(self, addr, value, mask=None):
+        if addr in range(self.memory.depth):
+            if self.write_blocks:
+                self.merge_write_blocks()
+            if addr not in self.write_queue:
+                self.write_queue[addr] = self.read(addr)
+            if mask is not None:
+                value = (value & mask) | (self.write_queue[addr] & ~mask)
+            self.write_queue[addr] = self._canonical(value)
+            self.pending.add(self)
+
+    def read_rows(self, start, count):
+        # Consecutive rows that are not in any page are read from the initial contents at once.
+        data, init = self.data, self.init
+        stop = start + count
+        rows = []
+        run_start = addr = start
+        while addr < stop:
+            index = addr >> self.PAGE_BITS
+            page_start = index << self.PAGE_BITS
+            page_stop = min(page_start + self.PAGE_ROWS, stop)
+            page = data.get(index)
+            if page is not None:
+                rows += map(self._canonical, init[run_start:addr])
+                rows += page[addr - page_start:page_stop - page_start]
+                run_start = page_stop
+            addr = page_stop
+        rows += map(self._canonical, init[run_start:stop])
+        return rows
+
+    def _page_blocks(self, start, values):
+        # Splits the rows into blocks that are each within a single page.
+        offset = 0
+        while offset < len(values):
+            block_start = start + offset
+            block_stop = min((block_start | (self.PAGE_ROWS - 1)) + 1, start + len(values))
+            block = values[offset:offset + block_stop - block_start]
+            yield block_start, self._make_page(map(self._canonical, block))
+            offset += len(block)
+
+    def write_rows(self, start, values):
+        # A queued block that covers an entire page becomes that page once it is committed.
+        if not values:
+            return
+        if self.write_queue:
+            self.write_queue.update(zip(range(start, start + len(values)),
+                                        map(self._canonical, values)))
+        else:
+            self.write_blocks.extend(self._page_blocks(start, values))
+        self.pending.add(self)
+
+    def changed_rows(self):
+        return [(index << self.PAGE_BITS, page) for index, page in sorted(self.data.items())]
+
+    def replace_rows(self, runs):
+        # Pages are only allocated where the rows in the runs differ from the initial contents.
+        self.data = {}
+        for start, values in runs:
+            for block_start, block in self._page_blocks(start, values):
+                self._commit_block(block_start, block)
+
+    def _commit_block(self, start, values):
+        data = self.data
+        index = start >> self.PAGE_BITS
+        offset = start - (index << self.PAGE_BITS)
+        page = data.get(index)
+        if page is None:
+            page = self._init_page(index)
+            if offset == 0 and len(values) == len(page):
+                if values == page:
+                    return False
+                data[index] = values
+                return True
+            if page[offset:offset + len(values)] == values:
+                return False
+            data[index] = page
+        elif page[offset:offset + len(values)] == values:
+            return False
+        page[offset:offset + len(values)] = values
+        return True
+
+    def commit(self):
+        # `commit()` is only called if `self` is pending
+        assert self.write_queue or self.write_blocks
+
+        _run_wakers(self.wakers)
+
+        changed = False
+        for start, values in self.write_blocks:
+            if self._commit_block(start, values):
+                changed = True
+        self.write_blocks.clear()
+        data, init = self.data, self.init
+        for addr, value in self.write_queue.items():
+            index = addr >> self.PAGE_BITS
+            page = data.get(index)
+            if page is None:
+                if self._canonical(init[addr]) == value:
+                    continue
+                page = data[index] = self._init_page(index)
+            offset = addr & (self.PAGE_ROWS - 1)
+            if page[offset] != value:
+                page[offset] = value
+                changed = True
+        self.write_queue.clear()
+        return changed
+
+
 class _PyEngineState(BaseEngineState):
     def __init__(self):
         self.timeline = _PyTimeline()
@@ -445,12 +768,17 @@ class _PyEngineState(BaseEngineState):
         self.memories = dict()
         self.slots    = list()
         self.pending  = set()
+        # States whose changes are collected for waveform files.
+        self.traced   = set()
+        # Processes that have been woken up and will run during the next delta cycle.
+        self.run_queue = list()
 
     def reset(self):
         self.timeline.reset()
         for state in self.slots:
             state.reset()
         self.pending.clear()
+        self.run_queue.clear()
 
     def get_signal(self, signal):
         try:
@@ -466,7 +794,10 @@ class _PyEngineState(BaseEngineState):
             return self.memories[memory]
         except KeyError:
             index = len(self.slots)
-            self.slots.append(_PyMemoryState(memory, self.pending))
+            if memory.depth > _SPARSE_MEMORY_DEPTH:
+                self.slots.append(_PySparseMemoryState(memory, self.pending))
+            else:
+                self.slots.append(_PyMemoryState(memory, self.pending))
             self.memories[memory] = index
             return index
 
@@ -481,11 +812,14 @@ class _PyEngineState(BaseEngineState):
 
     def commit(self, changed=None):
         converged = True
+        traced = self.traced
         for state in self.pending:
-            if changed is not None:
+            if changed is not None and state in traced:
                 if isinstance(state, _PyMemoryState):
                     for addr in state.write_queue:
                         changed.add(_PyMemoryChange(state, addr))
+                    for start, values in state.write_blocks:
+                        changed.add(_PyMemoryBlockChange(state, start, start + len(values)))
                 elif isinstance(state, _PySignalState):
                     changed.add(state)
                 else:
@@ -496,6 +830,89 @@ class _PyEngineState(BaseEngineState):
         return converged
 
 
+class _PyValueAccessor:
+    # Reads and writes a value-like expression for testbenches and processes, converting between
+    # its numeric representation and its shape (if it is a shape-castable). Plain signals are
+    # accessed directly; other values are evaluated until `compile()` is called.
+    __slots__ = ("expr", "get", "set", "_state", "_value", "_compiled")
+
+    def __init__(self, state, expr):
+        self.expr   = expr
+        self._state = state
+        self._value = value = Value.cast(expr)
+        self._compiled = False
+
+        if type(value) is Signal:
+            signal_state = state.slots[state.get_signal(value)]
+            get_raw = lambda: signal_state.curr
+            if signal_state.is_comb:
+                set_raw = lambda raw: eval_assign(state, value, raw)
+            else:
+                set_raw = self._signal_setter(signal_state)
+            self._compiled = True
+        else:
+            get_raw = lambda: eval_value(state, value)
+            set_raw = lambda raw: eval_assign(state, value, raw)
+        self._define(get_raw, set_raw)
+
+    @staticmethod
+    def _signal_setter(signal_state):
+        width_mask = (1 << len(signal_state.signal)) - 1
+        sign_bit = 0
+        if signal_state.signal.shape().signed and len(signal_state.signal) > 0:
+            sign_bit = 1 << (len(signal_state.signal) - 1)
+        def set_raw(raw):
+            raw &= width_mask
+            if raw & sign_bit:
+                raw |= -sign_bit
+            signal_state.update(raw)
+        return set_raw
+
+    def _define(self, get_raw, set_raw):
+        shape = self.expr.shape() if isinstance(self.expr, ValueCastable) else None
+        if not isinstance(shape, ShapeCastable):
+            def set(value):
+                if type(value) is not int:
+                    value = Const.cast(value).value
+                set_raw(value)
+            self.get = get_raw
+            self.set = set
+            return
+
+        from_bits = shape.from_bits
+        to_bits = shape.const
+        if isinstance(self.expr, data.View):
+            # Constructing a `data.Const` is costly, and it is immutable, so the last one is reused
+            # for as long as the underlying value stays the same.
+            last = [None, None]
+            def get():
+                raw = get_raw()
+                if raw != last[0]:
+                    last[0], last[1] = raw, from_bits(raw)
+                return last[1]
+        else:
+            def get():
+                return from_bits(get_raw())
+        def set(value):
+            set_raw(Const.cast(to_bits(value)).value)
+        self.get = get
+        self.set = set
+
+    def compile(self):
+        if self._compiled:
+            return
+        self._compiled = True
+        try:
+            get_raw = compile_getter(self._state, self._value)
+        except (TypeError, NotImplementedError, OverflowError):
+            get_raw = lambda: eval_value(self._state, self._value)
+        try:
+            set_raw = compile_setter(self._state, self._value)
+        except (TypeError, NotImplementedError, OverflowError, ValueError):
+            set_raw = lambda raw: eval_assign(self._state, self._value, raw)
+        self._define(get_raw, set_raw)
+
+
 class _PyTriggerState:
     def __init__(self, engine, combination, pending, *, oneshot):
         self._engine = engine
@@ -507,6 +924,11 @@ class _PyTriggerState:
         self._broken = False
         self._triggers_hit = set()
         self._delay_wakers = dict()
+        # Values sampled by the sample and change triggers, and the function that samples them
+        # (once it has been compiled), or `False` if they must be evaluated one by one instead.
+        self._sampled = tuple(trigger.value for trigger in combination._triggers
+                              if isinstance(trigger, (SampleTrigger, ChangedTrigger)))
+        self._sampler = None
 
         for trigger in combination._triggers:
             if isinstance(trigger, SampleTrigger):
@@ -557,12 +979,19 @@ class _PyTriggerState:
             self._broken = True
 
     def compute_result(self):
+        if self._sampler is None:
+            self._sampler = self._engine._get_sampler(self._sampled)
+        if self._sampler:
+            values = iter(self._sampler())
+        else:
+            values = (self._engine.get_value(value) for value in self._sampled)
+
         result = []
         for trigger in self._combination._triggers:
             if isinstance(trigger, (SampleTrigger, ChangedTrigger)):
-                value = self._engine.get_value(trigger.value)
+                value = next(values)
                 if isinstance(trigger.shape, ShapeCastable):
-                    result.append(trigger.shape.from_bits(value))
+                    result.append(self._from_bits(trigger.shape, value))
                 else:
                     result.append(value)
             elif isinstance(trigger, (EdgeTrigger, DelayTrigger)):
@@ -571,13 +1000,27 @@ class _PyTriggerState:
                 assert False # :nocov:
         self._result = tuple(result)
 
+    @staticmethod
+    def _from_bits(shape, value):
+        return shape.from_bits(value)
+
     def run(self):
         self.compute_result()
-        self._combination._process.runnable = True
-        self._combination._process.waits_on = None
+        process = self._combination._process
+        process.waits_on = None
+        if not process.runnable:
+            process.runnable = True
+            if process.testbench:
+                # Testbenches are scheduled by `PySimEngine.advance()` instead.
+                self._engine._testbench_queue.append(process)
+            else:
+                self._engine.state.run_queue.append(process)
         self._triggers_hit.clear()
-        for waker, interval_fs in self._delay_wakers.items():
-            self._engine.state.set_delay_waker(interval_fs, waker)
+        if not self._oneshot:
+            # A one-shot trigger state is never waited on again, so re-arming its delay wakers
+            # would only add timeline entries (and empty timesteps) that wake up nothing.
+            for waker, interval_fs in self._delay_wakers.items():
+                self._engine.state.set_delay_waker(interval_fs, waker)
 
     def initial_eligible(self):
         return not self._oneshot and any(
@@ -596,15 +1039,51 @@ class _PyTriggerState:
 
 
 class PySimEngine(BaseEngine):
-    def __init__(self, design):
+    def __init__(self, design, *, levelize=None, flatten=None):
+        if flatten is None:
+            flatten = bool(os.getenv("AMARANTH_pysim_flatten"))
+        if levelize is None:
+            levelize = flatten or bool(os.getenv("AMARANTH_pysim_levelize"))
+
+        state = _PyEngineState()
+        # When flattening, the entire design is compiled into one process per clock domain and one
+        # process evaluating the acyclic part of the combinational logic, which is always ranked.
+        compiler = _FragmentCompiler(state, flatten=flatten)
+        processes = compiler(design.fragment)
+        if compiler.cache_updated:
+            trim_cache()
+        if levelize:
+            compiler.levelize()
+        self._init_scheduler(design, state, processes, levelized=levelize)
+
+    def _init_scheduler(self, design, state, processes, *, levelized):
+        # Shared with engines that simulate the design itself by other means, but schedule
+        # testbenches, processes, and triggers in the same way.
         self._design = design
-
-        self._state = _PyEngineState()
-        self._processes = _FragmentCompiler(self._state)(self._design.fragment)
+        self._state = state
+        self._processes = processes
+        self._levelized = levelized
         self._testbenches = []
+        # Position of each testbench in `_testbenches`, and the testbenches that have been woken up
+        # since they were last run.
+        self._testbench_order = {}
+        self._testbench_queue = []
+        # Only asynchronous processes may become critical.
+        self._async_processes = []
         self._delta_cycles = 0
         self._vcd_writers = []
         self._active_triggers = set()
+        # Functions sampling a tuple of values, keyed by the identities of these values (which are
+        # kept alive by the entries). See `_get_sampler()`.
+        self._samplers = {}
+        # Accessors for values read and written by testbenches and processes, keyed by
+        # the identities of these values. See `get_accessor()`.
+        self._accessors = {}
+        # Times of the next edges of clocks, if the simulation was restored from a checkpoint.
+        self._clock_deadlines = SignalDict()
+        # Active profiler, if any. See `profile()`.
+        self._profiler = None
+        self._schedule_runnable()
 
     @property
     def state(self) -> BaseEngineState:
@@ -617,28 +1096,47 @@ class PySimEngine(BaseEngine):
     def _now_plus_deltas(self, fs_per_delta):
         return self._state.timeline.now + self._delta_cycles * fs_per_delta
 
+    def _schedule_runnable(self):
+        for process in self._processes:
+            if process.runnable:
+                self._state.run_queue.append(process)
+
     def reset(self):
         self._state.reset()
+        self._clock_deadlines.clear()
         for process in self._processes:
             process.reset()
         for testbench in self._testbenches:
             testbench.reset()
+        self._testbench_queue[:] = self._testbenches
+        self._schedule_runnable()
 
     def add_clock_process(self, clock, *, phase, period):
         slot = self.state.get_signal(clock)
         if self.state.slots[slot].is_comb:
             raise DriverConflict("Clock signal is already driven by combinational logic")
 
-        self._processes.add(PyClockProcess(self._state, clock,
-                                           phase=phase, period=period))
+        process = PyClockProcess(self._state, clock, phase=phase, period=period)
+        process.deadline = self._clock_deadlines.get(clock)
+        self._processes.add(process)
+        self._state.run_queue.append(process)
 
     def add_async_process(self, simulator, process):
-        self._processes.add(AsyncProcess(self._design, self, process,
-                                         testbench=False, background=True))
+        process = AsyncProcess(self._design, self, process, testbench=False, background=True)
+        self._processes.add(process)
+        self._async_processes.append(process)
+        self._state.run_queue.append(process)
+        if self._profiler is not None:
+            self._profile_process(self._profiler, process)
 
     def add_async_testbench(self, simulator, process, *, background):
-        self._testbenches.append(AsyncProcess(self._design, self, process,
-                                              testbench=True, background=background))
+        testbench = AsyncProcess(self._design, self, process,
+                                 testbench=True, background=background)
+        self._testbench_order[testbench] = len(self._testbenches)
+        self._testbenches.append(testbench)
+        self._testbench_queue.append(testbench)
+        if self._profiler is not None:
+            self._profile_process(self._profiler, testbench)
 
     def add_trigger_combination(self, combination, *, oneshot):
         return _PyTriggerState(self, combination, self._active_triggers, oneshot=oneshot)
@@ -646,83 +1144,694 @@ class PySimEngine(BaseEngine):
     def get_value(self, expr):
         return eval_value(self._state, Value.cast(expr))
 
+    _SAMPLER_CACHE_LIMIT = 1024
+
+    def _get_sampler(self, values):
+        # Trigger combinations are usually created anew each time they are awaited, but with
+        # the same sampled values. To avoid compiling values that are only ever sampled once (such
+        # as newly created slices), a sampler is only compiled the second time the same values are
+        # requested; `None` is returned the first time, and `False` if the values cannot be
+        # compiled.
+        if not values:
+            return False
+        key = tuple(map(id, values))
+        entry = self._samplers.get(key)
+        if entry is None:
+            if len(self._samplers) >= self._SAMPLER_CACHE_LIMIT:
+                del self._samplers[next(iter(self._samplers))]
+            self._samplers[key] = [values, None]
+            return None
+        if entry[1] is None:
+            try:
+                entry[1] = self._compile_sampler(values)
+            except (TypeError, NotImplementedError, OverflowError):
+                entry[1] = False
+        return entry[1]
+
+    def _compile_sampler(self, values):
+        return compile_sampler(self._state, values)
+
     def set_value(self, expr, value):
         assert isinstance(value, int)
         return eval_assign(self._state, Value.cast(expr), value)
 
+    _ACCESSOR_CACHE_LIMIT = 1024
+
+    def get_accessor(self, expr):
+        # As with samplers, values other than plain signals are only compiled the second time
+        # they are accessed, since many (such as newly created slices) are only accessed once.
+        accessor = self._accessors.get(id(expr))
+        if accessor is None:
+            accessor = _PyValueAccessor(self._state, expr)
+            if len(self._accessors) >= self._ACCESSOR_CACHE_LIMIT:
+                del self._accessors[next(iter(self._accessors))]
+            self._accessors[id(expr)] = accessor
+        else:
+            accessor.compile()
+        return accessor
+
     def step_design(self):
+        run_queue = self._state.run_queue
+
         # Performs the three phases of a delta cycle in a loop:
         converged = False
         while not converged:
             changed = set() if self._vcd_writers else None
 
             # 1a. trigger: run every active trigger, sampling values and waking up processes;
-            for trigger_state in self._active_triggers:
-                trigger_state.run()
+            if self._profiler is None:
+                for trigger_state in self._active_triggers:
+                    trigger_state.run()
+            else:
+                for trigger_state in self._active_triggers:
+                    process = trigger_state._combination._process
+                    entry = self._profiler.entry(("trigger", process), "trigger",
+                                                 self._async_process_name(process))
+                    self._profiler.measure(entry, trigger_state.run)
             self._active_triggers.clear()
 
-            # 1b. eval: run every runnable processes once, queueing signal changes;
-            for process in self._processes:
-                if process.runnable:
-                    process.runnable = False
-                    process.run()
-                    if type(process) is AsyncProcess and process.waits_on is not None:
-                        assert type(process.waits_on) is _PyTriggerState, \
-                            "Async processes may only await simulation triggers"
+            # 1b. eval: run every process woken up since the last delta cycle once, queueing signal
+            #     changes; processes are only woken up during the commit phase, so the run queue
+            #     does not grow while it is being drained;
+            if self._levelized:
+                converged = self._eval_levelized(changed)
+            else:
+                converged = True
+                for process in run_queue:
+                    if process.runnable:
+                        process.runnable = False
+                        process.run()
+                        if type(process) is AsyncProcess and process.waits_on is not None:
+                            assert isinstance(process.waits_on, _PyTriggerState), \
+                                "Async processes may only await simulation triggers"
+                run_queue.clear()
 
             # 2. commit: apply queued signal changes, activating any awaited triggers.
-            converged = self._state.commit(changed)
+            converged = self._state.commit(changed) and converged
 
             for vcd_writer in self._vcd_writers:
-                now_plus_deltas = self._now_plus_deltas(vcd_writer.fs_per_delta)
-                for change in changed:
-                    if type(change) is _PySignalState:
-                        signal_state = change
-                        vcd_writer.update_signal(now_plus_deltas,
-                            signal_state.signal)
-                    elif type(change) is _PyMemoryChange:
-                        vcd_writer.update_memory(now_plus_deltas, change.state.memory,
-                            change.addr)
-                    else:
-                        assert False # :nocov:
+                vcd_writer.update(self._now_plus_deltas(vcd_writer.fs_per_delta), changed)
 
             self._delta_cycles += 1
 
+    def _eval_levelized(self, changed):
+        # Unranked processes run first, and observe the values from the previous delta cycle.
+        # Ranked combinational processes then run in the order of their rank, with the signals they
+        # drive committed immediately, such that an acyclic combinational network settles within
+        # a single delta cycle. If a ranked process is woken up by a process with the same or
+        # higher rank (which can only happen if it is driven by a synchronous process or a clock),
+        # it is deferred to the next delta cycle.
+        run_queue = self._state.run_queue
+        pending = self._state.pending
+        traced = self._state.traced
+        converged = True
+
+        comb_queue = []
+        for process in run_queue:
+            if not process.runnable:
+                continue
+            rank = getattr(process, "rank", None)
+            if rank is None:
+                process.runnable = False
+                process.run()
+                if type(process) is AsyncProcess and process.waits_on is not None:
+                    assert isinstance(process.waits_on, _PyTriggerState), \
+                        "Async processes may only await simulation triggers"
+            else:
+                heapq.heappush(comb_queue, (rank, id(process), process))
+        run_queue.clear()
+
+        deferred = []
+        while comb_queue:
+            rank, _, process = heapq.heappop(comb_queue)
+            if not process.runnable:
+                continue
+            process.runnable = False
+            process.run()
+            for signal_state in process.outputs:
+                if signal_state in pending:
+                    pending.remove(signal_state)
+                    if changed is not None and signal_state in traced:
+                        changed.add(signal_state)
+                    if signal_state.commit():
+                        converged = False
+            for woken in run_queue:
+                woken_rank = getattr(woken, "rank", None)
+                if woken_rank is not None and woken_rank > rank:
+                    heapq.heappush(comb_queue, (woken_rank, id(woken), woken))
+                else:
+                    deferred.append(woken)
+            run_queue.clear()
+        run_queue.extend(deferred)
+        return converged
+
+    def _run_testbenches(self):
+        # Testbenches are run in passes, each running the woken up testbenches in a deterministic
+        # order (the one in which they were added). A testbench woken up by another testbench that
+        # precedes it in this order runs later in the same pass; otherwise, in the next pass.
+        queue = self._testbench_queue
+        order = self._testbench_order
+        while queue:
+            current = [(order[testbench], testbench) for testbench in queue]
+            heapq.heapify(current)
+            queue.clear()
+            deferred = []
+            while current:
+                index, testbench = heapq.heappop(current)
+                if not testbench.runnable:
+                    continue
+                testbench.runnable = False
+                testbench.run()
+                if type(testbench) is AsyncProcess and testbench.waits_on is not None:
+                    assert isinstance(testbench.waits_on, _PyTriggerState), \
+                        "Async testbenches may only await simulation triggers"
+                for woken in queue:
+                    if order[woken] > index:
+                        heapq.heappush(current, (order[woken], woken))
+                    else:
+                        deferred.append(woken)
+                queue.clear()
+            queue.extend(deferred)
+
+    def _has_critical(self):
+        for runnables in (self._async_processes, self._testbenches):
+            for runnable in runnables:
+                if runnable.critical:
+                    return True
+        return False
+
     def advance(self):
         # Run triggers and processes until the simulation converges.
         self.step_design()
 
         # Run testbenches that have been awoken in `step_design()` by active triggers.
-        converged = False
-        while not converged:
-            converged = True
-            # Schedule testbenches in a deterministic order (the one in which they were added).
-            for testbench in self._testbenches:
-                if testbench.runnable:
-                    testbench.runnable = False
-                    testbench.run()
-                    if type(testbench) is AsyncProcess and testbench.waits_on is not None:
-                        assert type(testbench.waits_on) is _PyTriggerState, \
-                            "Async testbenches may only await simulation triggers"
-                    converged = False
+        self._run_testbenches()
 
         # Now that the simulation has converged for the current time, advance the timeline.
         self._state.timeline.advance()
 
         # Check if the simulation has any critical processes or testbenches.
-        for runnables in (self._processes, self._testbenches):
-            for runnable in runnables:
-                if runnable.critical:
-                    return True
-        return False
+        return self._has_critical()
+
+    def advance_until(self, deadline):
+        # Same as calling `advance()` until the deadline is reached, but without checking for
+        # critical processes after each timestep, since the result would be discarded anyway.
+        timeline = self._state.timeline
+        while timeline.now < deadline:
+            self.step_design()
+            if self._testbench_queue:
+                self._run_testbenches()
+            timeline.advance()
+
+    def _state_names(self):
+        # Hierarchical names of the signals and memories that are a part of the design, used to
+        # identify them in checkpoints. A signal that has several names (such as a port) is
+        # identified by the first one, in the order in which fragments are enumerated.
+        signal_names = SignalDict()
+        memory_names = {}
+        for fragment, fragment_info in self._design.fragments.items():
+            for signal, signal_name in fragment_info.signal_names.items():
+                if signal not in signal_names:
+                    signal_names[signal] = ".".join((*fragment_info.name, signal_name))
+            if isinstance(fragment, MemoryInstance):
+                memory_names[fragment._data] = ".".join(fragment_info.name)
+        return signal_names, memory_names
+
+    def save_state(self):
+        state = self._state
+        signal_names, memory_names = self._state_names()
+        checkpoint = Checkpoint(state.timeline.now)
+        for signal, name in signal_names.items():
+            if signal in state.signals:
+                signal_state = state.slots[state.signals[signal]]
+                mask = (1 << len(signal)) - 1
+                checkpoint.signals[name] = \
+                    (len(signal), signal_state.curr & mask, signal_state.next & mask)
+        for memory, name in memory_names.items():
+            if memory in state.memories:
+                width = Shape.cast(memory.shape).width
+                runs = [(start, pack_rows(rows, width)) for start, rows
+                        in state.slots[state.memories[memory]].changed_rows()]
+                checkpoint.memories[name] = (width, memory.depth, runs)
+        for process in self._processes:
+            if type(process) is PyClockProcess:
+                deadline = process.deadline
+                if deadline is None:
+                    deadline = state.timeline.now + process.phase
+                clock = state.slots[process.slot].signal
+                if clock in signal_names:
+                    checkpoint.clocks[signal_names[clock]] = deadline
+        return checkpoint
+
+    def restore_state(self, checkpoint):
+        state = self._state
+        signal_names, memory_names = self._state_names()
+        signals = {name: signal for signal, name in signal_names.items()}
+        memories = {name: memory for memory, name in memory_names.items()}
+
+        # The entire checkpoint is checked before the simulation is changed.
+        restored_signals = []
+        for name, (width, curr, next) in checkpoint.signals.items():
+            if name not in signals:
+                raise ValueError(f"Checkpoint contains signal '{name}', which is not a part of "
+                                 f"the design")
+            signal = signals[name]
+            if len(signal) != width:
+                raise ValueError(f"Checkpoint contains signal '{name}' with width {width}, but "
+                                 f"it has width {len(signal)} in the design")
+            restored_signals.append((signal, curr, next))
+        restored_memories = []
+        for name, (width, depth, runs) in checkpoint.memories.items():
+            if name not in memories:
+                raise ValueError(f"Checkpoint contains memory '{name}', which is not a part of "
+                                 f"the design")
+            memory = memories[name]
+            if (Shape.cast(memory.shape).width, memory.depth) != (width, depth):
+                raise ValueError(f"Checkpoint contains memory '{name}' with width {width} and "
+                                 f"depth {depth}, but it has width "
+                                 f"{Shape.cast(memory.shape).width} and depth {memory.depth} in "
+                                 f"the design")
+            restored_memories.append((memory, width, runs))
+
+        self.reset()
+        state.timeline.now = checkpoint.now
+        for signal, curr, next in restored_signals:
+            signal_state = state.slots[state.get_signal(signal)]
+            if signal.shape().signed and len(signal) > 0:
+                sign_bit = 1 << (len(signal) - 1)
+                curr = (curr ^ sign_bit) - sign_bit
+                next = (next ^ sign_bit) - sign_bit
+            signal_state.curr = curr
+            signal_state.next = next
+            if curr != next:
+                # A clock edge that has been scheduled, but not yet committed.
+                state.pending.add(signal_state)
+        for memory, width, runs in restored_memories:
+            restored_runs = []
+            for start, rows in runs:
+                rows = unpack_rows(rows, width)
+                if Shape.cast(memory.shape).signed and width > 0:
+                    sign_bit = 1 << (width - 1)
+                    rows = [(row ^ sign_bit) - sign_bit for row in rows]
+                restored_runs.append((start, rows))
+            state.slots[state.get_memory(memory)].replace_rows(restored_runs)
+        # Clocks that are added after the checkpoint is restored also continue from it.
+        for name, deadline in checkpoint.clocks.items():
+            if name in signals:
+                self._clock_deadlines[signals[name]] = deadline
+        for process in self._processes:
+            if type(process) is PyClockProcess:
+                process.deadline = self._clock_deadlines.get(state.slots[process.slot].signal)
+
+    @staticmethod
+    def _async_process_name(process):
+        constructor = process.constructor
+        return getattr(constructor, "__qualname__", None) or repr(constructor)
+
+    def _profile_process(self, profiler, process):
+        if type(process) is PyRTLProcess:
+            fragment_names = [self._design.fragments[fragment].name
+                              for fragment in process.fragments]
+            # Processes evaluating several fragments (if the design is flattened) are identified
+            # by the innermost fragment that contains all of them.
+            name = fragment_names[0]
+            for fragment_name in fragment_names[1:]:
+                while fragment_name[:len(name)] != name:
+                    name = name[:-1]
+            entry = profiler.entry(process, "rtl", ".".join(name), process.domain)
+        elif type(process) is AsyncProcess:
+            entry = profiler.entry(process, "testbench" if process.testbench else "process",
+                                   self._async_process_name(process))
+        else:
+            return # clocks are toggled directly from the timeline
+        profiler.instrument(process, entry)
 
     @contextmanager
-    def write_vcd(self, *, vcd_file, gtkw_file, traces, fs_per_delta):
+    def profile(self):
+        if self._profiler is not None:
+            raise RuntimeError("Simulation is already being profiled")
+        self._profiler = profiler = Profiler(self._state)
+        for process in (*self._processes, *self._testbenches):
+            self._profile_process(profiler, process)
+        profiler.begin(self._delta_cycles)
+        try:
+            yield profiler.profile
+        finally:
+            profiler.end(self._delta_cycles)
+            self._profiler = None
+
+    @contextmanager
+    def collect_toggles(self, *, traces, include, exclude):
+        coverage = ToggleCoverage()
+        traced = SignalSet()
+        for trace in _flatten_traces(traces):
+            if not isinstance(trace, MemoryData):
+                trace = Value.cast(trace)
+                if not isinstance(trace, MemoryData._Row):
+                    traced.update(trace._rhs_signals())
+
+        # Signals that are a part of the design are identified by their first hierarchical name
+        # that is included; signals that are explicitly traced are always included.
+        selected = SignalDict()
+        for fragment, fragment_info in self._design.fragments.items():
+            for signal, signal_name in fragment_info.signal_names.items():
+                name = ".".join((*fragment_info.name, signal_name))
+                if signal not in selected and (signal in traced or
+                                               _name_included(name, include, exclude)):
+                    selected[signal] = name
+        for signal in traced:
+            if signal not in selected:
+                name = signal.name
+                if name in selected.values():
+                    name = f"{signal.name}${len(selected)}"
+                selected[signal] = name
+
+        state = self._state
+        wakers = []
+        for signal, name in selected.items():
+            signal_state = state.slots[state.get_signal(signal)]
+            counter = coverage._add(name, signal, signal_state.curr)
+            waker = counter.waker()
+            signal_state.add_waker(waker)
+            wakers.append((signal_state, waker))
+        try:
+            yield coverage
+        finally:
+            for signal_state, waker in wakers:
+                signal_state.remove_waker(waker)
+
+    @contextmanager
+    def write_vcd(self, *, vcd_file, gtkw_file, traces, fs_per_delta, format="vcd",
+                  start=None, stop=None, trigger=None, pre_trigger=0, post_trigger=None,
+                  include=None, exclude=None):
         vcd_writer = _VCDWriter(self._state, self._design,
-            vcd_file=vcd_file, gtkw_file=gtkw_file, traces=traces, fs_per_delta=fs_per_delta)
+            vcd_file=vcd_file, gtkw_file=gtkw_file, traces=traces, fs_per_delta=fs_per_delta,
+            format=format, start=start, stop=stop, trigger=trigger, pre_trigger=pre_trigger,
+            post_trigger=post_trigger, include=include, exclude=exclude)
         try:
             self._vcd_writers.append(vcd_writer)
+            self._state.traced |= vcd_writer.traced
             yield
         finally:
             vcd_writer.close(self._now_plus_deltas(vcd_writer.fs_per_delta))
             self._vcd_writers.remove(vcd_writer)
+            self._state.traced = set().union(*(vcd_writer.traced
+                                               for vcd_writer in self._vcd_writers))
+
+
+class _PyLaneSignalState(_PySignalState):
+    __slots__ = ("init",)
+
+    def __init__(self, signal, pending, init):
+        self.init = init
+        super().__init__(signal, pending)
+
+    def reset(self):
+        self.curr = self.next = self.init
+
+
+class _PyLaneMemoryRows:
+    # Initial contents of a memory, broadcast to every lane once they are read.
+    __slots__ = ("lanes", "width", "raw", "rows")
+
+    def __init__(self, lanes, width, raw):
+        self.lanes = lanes
+        self.width = width
+        self.raw   = raw
+        self.rows  = {}
+
+    def __getitem__(self, addr):
+        row = self.rows.get(addr)
+        if row is None:
+            row = self.rows[addr] = self.lanes.broadcast(self.raw[addr], self.width)
+        return row
+
+
+class _PyLaneMemoryState(_PyMemoryState):
+    # Rows are stored as packed values, and addressed either by an integer (`read()`, `write()`)
+    # or by a packed value, which may select a different row in each lane (`read_lanes()`,
+    # `write_lanes()`). Only the rows that have been written to are stored; the others are read
+    # from the initial contents of the memory.
+    __slots__ = ("lanes", "rows")
+
+    def __init__(self, memory, pending, lanes):
+        self.lanes = lanes
+        self.rows  = _PyLaneMemoryRows(lanes, Shape.cast(memory.shape).width, memory._init._raw)
+        super().__init__(memory, pending)
+
+    def reset(self):
+        self.data = {}
+        self.write_queue = {}
+        self.write_blocks = []
+
+    def read(self, addr):
+        if addr in range(self.memory.depth):
+            value = self.data.get(addr)
+            if value is None:
+                value = self.rows[addr]
+            return value
+        return 0
+
+    def write(self, addr, value, mask=None):
+        if addr in range(self.memory.depth):
+            if addr not in self.write_queue:
+                self.write_queue[addr] = self.read(addr)
+            if mask is not None:
+                value = (value & mask) | (self.write_queue[addr] & ~mask)
+            self.write_queue[addr] = value
+            self.pending.add(self)
+
+    def commit(self):
+        # `commit()` is only called if `self` is pending
+        assert self.write_queue
+
+        _run_wakers(self.wakers)
+
+        changed = False
+        for addr, value in self.write_queue.items():
+            if self.read(addr) != value:
+                self.data[addr] = value
+                changed = True
+        self.write_queue.clear()
+        return changed
+
+    def _lanes_by_addr(self, addr):
+        lanes = self.lanes
+        row_addr = lanes.uniform(addr)
+        if row_addr is not None:
+            return {row_addr: lanes.mask}
+        by_addr = {}
+        planes = (addr.bit_length() + lanes.count - 1) // lanes.count
+        for lane, row_addr in enumerate(lanes.unpack(addr, planes)):
+            by_addr[row_addr] = by_addr.get(row_addr, 0) | (1 << lane)
+        return by_addr
+
+    def read_lanes(self, addr):
+        by_addr = self._lanes_by_addr(addr)
+        if len(by_addr) == 1:
+            row_addr, = by_addr
+            return self.read(row_addr)
+        repeat = self.lanes.repeat[self.rows.width]
+        result = 0
+        for row_addr, lane_mask in by_addr.items():
+            result |= self.read(row_addr) & (lane_mask * repeat)
+        return result
+
+    def write_lanes(self, addr, value, mask):
+        if not mask:
+            return
+        repeat = self.lanes.repeat[self.rows.width]
+        for row_addr, lane_mask in self._lanes_by_addr(addr).items():
+            row_mask = mask & (lane_mask * repeat)
+            if row_mask:
+                self.write(row_addr, value, row_mask)
+
+    def read_rows(self, start, count):
+        raise NotImplementedError("Memories cannot be read in bulk when simulating several lanes")
+
+    def write_rows(self, start, values):
+        # The same rows are written in every lane.
+        for addr, value in enumerate(values, start):
+            self.write(addr, self.lanes.broadcast(value, self.rows.width))
+
+
+class _PyLaneEngineState(_PyEngineState):
+    def __init__(self, lanes):
+        super().__init__()
+        self.lanes = lanes
+
+    def get_signal(self, signal):
+        try:
+            return self.signals[signal]
+        except KeyError:
+            index = len(self.slots)
+            init = self.lanes.broadcast(signal.init, len(signal))
+            self.slots.append(_PyLaneSignalState(signal, self.pending, init))
+            self.signals[signal] = index
+            return index
+
+    def get_memory(self, memory):
+        try:
+            return self.memories[memory]
+        except KeyError:
+            index = len(self.slots)
+            self.slots.append(_PyLaneMemoryState(memory, self.pending, self.lanes))
+            self.memories[memory] = index
+            return index
+
+
+class _PyLaneValueAccessor:
+    # Same as `_PyValueAccessor`, but reads a list with the value in each lane, and writes either
+    # a list with the value in each lane or the same value in every lane.
+    __slots__ = ("expr", "get", "set")
+
+    def __init__(self, state, expr):
+        self.expr = expr
+        value = Value.cast(expr)
+        lanes = state.lanes
+        width, signed = len(value), value.shape().signed
+        get_raw = compile_lane_getter(state, value)
+        set_raw = None
+
+        shape = expr.shape() if isinstance(expr, ValueCastable) else None
+        if isinstance(shape, ShapeCastable):
+            from_bits = shape.from_bits
+            to_raw = lambda value: Const.cast(shape.const(value)).value
+        else:
+            from_bits = None
+            to_raw = lambda value: value if type(value) is int else Const.cast(value).value
+
+        def get():
+            values = lanes.unpack(get_raw(), width, signed)
+            if from_bits is not None:
+                values = [from_bits(value) for value in values]
+            return values
+
+        def set(values):
+            nonlocal set_raw
+            if set_raw is None:
+                set_raw = _compile_lane_setter(state, value)
+            if type(values) is list:
+                if len(values) != lanes.count:
+                    raise ValueError(f"Expected a list of {lanes.count} values, one for each "
+                                     f"lane, not {len(values)}")
+                set_raw(lanes.pack([to_raw(value) for value in values], width))
+            else:
+                set_raw(lanes.broadcast(to_raw(values), width))
+
+        self.get = get
+        self.set = set
+
+
+def _compile_lane_setter(state, value):
+    try:
+        return compile_lane_setter(state, value)
+    except ValueError:
+        raise DriverConflict("Combinationally driven signals cannot be overriden by "
+                             "testbenches") from None
+    except (TypeError, NotImplementedError):
+        raise ValueError(f"Value {value!r} cannot be assigned") from None
+
+
+class _PyLaneTriggerState(_PyTriggerState):
+    # Sampled values are lists with the value in each lane, and an edge trigger is activated if
+    # the edge occurs in any lane.
+    def add_edge_waker(self, trigger):
+        lanes = self._engine.state.lanes
+        shift = trigger.bit * lanes.count
+        mask = lanes.mask
+        def waker(curr, next):
+            if self._broken:
+                return False
+            curr_bits = (curr >> shift) & mask
+            next_bits = (next >> shift) & mask
+            if trigger.polarity:
+                edges = next_bits & ~curr_bits
+            else:
+                edges = curr_bits & ~next_bits
+            if not edges:
+                return True # wait until next edge
+            self._triggers_hit.add(trigger)
+            self.activate()
+            return not self._oneshot
+        self._engine.state.add_signal_waker(trigger.signal, waker)
+
+    @staticmethod
+    def _from_bits(shape, values):
+        return [shape.from_bits(value) for value in values]
+
+
+class PyLaneSimEngine(PySimEngine):
+    """Simulates several instances (*lanes*) of the design in lockstep.
+
+    Each signal and memory row is stored as a single integer holding its value in every lane (see
+    :class:`Lanes`), and the design is compiled into code that evaluates every lane at once.
+    """
+    def __init__(self, design, *, lanes, levelize=None, flatten=None):
+        if flatten is None:
+            flatten = bool(os.getenv("AMARANTH_pysim_flatten"))
+        if levelize is None:
+            levelize = flatten or bool(os.getenv("AMARANTH_pysim_levelize"))
+
+        state = _PyLaneEngineState(Lanes(lanes))
+        compiler = _LaneFragmentCompiler(state, flatten=flatten)
+        processes = compiler(design.fragment)
+        if compiler.cache_updated:
+            trim_cache()
+        if levelize:
+            compiler.levelize()
+        self._init_scheduler(design, state, processes, levelized=levelize)
+
+    @property
+    def lanes(self):
+        return self._state.lanes.count
+
+    def add_clock_process(self, clock, *, phase, period):
+        slot = self.state.get_signal(clock)
+        if self.state.slots[slot].is_comb:
+            raise DriverConflict("Clock signal is already driven by combinational logic")
+
+        process = PyClockProcess(self._state, clock, phase=phase, period=period,
+                                 high=self._state.lanes.mask)
+        self._processes.add(process)
+        self._state.run_queue.append(process)
+
+    def add_trigger_combination(self, combination, *, oneshot):
+        return _PyLaneTriggerState(self, combination, self._active_triggers, oneshot=oneshot)
+
+    def get_value(self, expr):
+        value = Value.cast(expr)
+        packed = compile_lane_getter(self._state, value)()
+        return self._state.lanes.unpack(packed, len(value), value.shape().signed)
+
+    def _compile_sampler(self, values):
+        return compile_lane_sampler(self._state, values)
+
+    def set_value(self, expr, value):
+        assert isinstance(value, int)
+        expr = Value.cast(expr)
+        packed = self._state.lanes.broadcast(value, len(expr))
+        _compile_lane_setter(self._state, expr)(packed)
+
+    def get_accessor(self, expr):
+        accessor = self._accessors.get(id(expr))
+        if accessor is None:
+            accessor = _PyLaneValueAccessor(self._state, expr)
+            if len(self._accessors) >= self._ACCESSOR_CACHE_LIMIT:
+                del self._accessors[next(iter(self._accessors))]
+            self._accessors[id(expr)] = accessor
+        return accessor
+
+    def save_state(self):
+        raise NotImplementedError("Checkpoints are not supported when simulating several lanes")
+
+    def restore_state(self, checkpoint):
+        raise NotImplementedError("Checkpoints are not supported when simulating several lanes")
+
+    def collect_toggles(self, *, traces, include, exclude):
+        raise NotImplementedError("Toggles cannot be collected when simulating several lanes")
+
+    def write_vcd(self, *, vcd_file, gtkw_file, traces, fs_per_delta, format="vcd",
+                  start=None, stop=None, trigger=None, pre_trigger=0, post_trigger=None,
+                  include=None, exclude=None):
+        raise NotImplementedError("Waveforms cannot be captured when simulating several lanes")
@@ -0,0 +1,65 @@
+"""Measure the memory used to build the netlist of a generated design.
+
+The design is a chain of ``--stages`` registers of ``--width`` bits. Each register is loaded with
+the sum of the previous register and a rotated copy of it, so that every stage adds ``2 * width``
+nets (the outputs of an adder and of a flip-flop) to the netlist. With the default arguments,
+the netlist contains about 1M nets.
+
+The memory is measured with :mod:`tracemalloc`, which slows down the build considerably (with
+the default arguments, it takes about ten minutes); the reported time is only useful for comparing
+runs of this script.
+
+Usage: ``python benchmarks/netlist_memory.py [--stages N] [--width N]``
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from amaranth.hdl import *
+from amaranth.hdl._ir import build_netlist
+
+
+def make_design(stages, width):
+    m = Module()
+    i = Signal(width)
+    prev = i
+    for index in range(stages):
+        stage = Signal(width, name=f"stage{index}")
+        m.d.sync += stage.eq(prev + prev.rotate_left(1))
+        prev = stage
+    o = Signal(width)
+    m.d.comb += o.eq(prev)
+    return m, [i, o]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--stages", type=int, default=8192,
+        help="number of registers in the chain (default: %(default)s)")
+    parser.add_argument("--width", type=int, default=64,
+        help="width of each register (default: %(default)s)")
+    args = parser.parse_args()
+
+    m, ports = make_design(args.stages, args.width)
+    fragment = Fragment.get(m, platform=None)
+
+    gc.collect()
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    netlist = build_netlist(fragment, ports=ports)
+    elapsed = time.perf_counter() - start_time
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"nets:     {2 * args.stages * args.width}")
+    print(f"cells:    {len(netlist.cells)}")
+    print(f"retained: {retained / 2**20:.1f} MiB")
+    print(f"peak:     {peak / 2**20:.1f} MiB")
+    print(f"time:     {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
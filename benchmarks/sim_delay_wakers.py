@@ -0,0 +1,50 @@
+"""Measure the cost of many testbenches waiting on delays at the same time.
+
+``N`` testbenches each await ``ctx.delay()`` repeatedly, so that ``N`` delay wakers are pending
+in the timeline at every timestep. In the ``distinct`` scenario, every testbench uses a different
+delay, so that most timesteps wake up a single testbench; in the ``shared`` scenario, the
+testbenches use one of a few delays, so that many of them wake up in the same timestep.
+
+Usage: ``python benchmarks/sim_delay_wakers.py [--testbenches N] [--delays N]``
+"""
+
+import argparse
+import time
+
+from amaranth.hdl import *
+from amaranth.sim import Simulator
+
+
+def measure(testbenches, delays, period):
+    sim = Simulator(Module())
+
+    def make_testbench(index):
+        interval = (index % period + 1) * 1e-9
+        async def testbench(ctx):
+            for _ in range(delays):
+                await ctx.delay(interval)
+        return testbench
+
+    for index in range(testbenches):
+        sim.add_testbench(make_testbench(index))
+    start_time = time.perf_counter()
+    sim.run()
+    return time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--testbenches", type=int, default=1000,
+        help="number of concurrent testbenches (default: %(default)s)")
+    parser.add_argument("--delays", type=int, default=100,
+        help="number of delays awaited by each testbench (default: %(default)s)")
+    args = parser.parse_args()
+
+    for scenario, period in (("distinct", args.testbenches), ("shared", 10)):
+        elapsed = measure(args.testbenches, args.delays, period)
+        wakeups = args.testbenches * args.delays
+        print(f"{scenario:>8}: {elapsed:.2f} s, {elapsed / wakeups * 1e6:.2f} us/wakeup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Measure the time per delta cycle of the Python simulator against the size of the design.
+
+The design consists of ``N`` independent fragments, each with a combinational and a synchronous
+process. The testbench repeatedly changes the input of one fragment, which takes one delta cycle
+that runs only the combinational process of that fragment. The time per delta cycle should not
+depend on the number of fragments that are not woken up.
+
+Usage: ``python benchmarks/sim_delta_cycles.py [--sizes N,N,...] [--iterations N]``
+"""
+
+import argparse
+import time
+
+from amaranth.hdl import *
+from amaranth.sim import Simulator
+
+
+def make_design(size):
+    m = Module()
+    inputs = []
+    for index in range(size):
+        stage = Module()
+        i = Signal(8, name=f"i{index}")
+        o = Signal(8, name=f"o{index}")
+        r = Signal(8, name=f"r{index}")
+        stage.d.comb += o.eq(i + r)
+        stage.d.sync += r.eq(o)
+        m.submodules[f"stage{index}"] = stage
+        inputs.append(i)
+    return m, inputs
+
+
+def measure(size, iterations):
+    m, inputs = make_design(size)
+    sim = Simulator(m)
+    elapsed = None
+
+    async def testbench(ctx):
+        nonlocal elapsed
+        i = inputs[0]
+        start_time = time.perf_counter()
+        for value in range(iterations):
+            ctx.set(i, value)
+        elapsed = time.perf_counter() - start_time
+
+    sim.add_testbench(testbench)
+    sim.run()
+    return elapsed / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=lambda arg: [int(size) for size in arg.split(",")],
+        default=[100, 1000, 10000],
+        help="comma-separated numbers of fragments (default: 100,1000,10000)")
+    parser.add_argument("--iterations", type=int, default=10000,
+        help="number of delta cycles to measure (default: %(default)s)")
+    args = parser.parse_args()
+
+    print(f"{'fragments':>10} {'us/delta':>10}")
+    for size in args.sizes:
+        print(f"{size:>10} {measure(size, args.iterations) * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 import operator
+import os
 import re
+import tempfile
+import unittest.mock
 
 from amaranth.back import rtlil
 from amaranth.hdl import *
 from amaranth.hdl._ast import *
+from amaranth.hdl import _ir
+from amaranth.hdl._nir import CombinationalCycle
 from amaranth.lib import memory, wiring, data, enum
 
 from .utils import *
@@ -2089,3 +2094,408 @@ class ComponentTestCase(RTLILTestCase):
         connect \o 8'00000000
         end
         """)
+
+
+class MemoizedElaborationTestCase(RTLILTestCase):
+    class Adder(wiring.Component):
+        def __init__(self, width):
+            self.width = width
+            self.elaborated = 0
+            super().__init__({
+                "a": wiring.In(width),
+                "b": wiring.In(width),
+                "o": wiring.Out(width + 1),
+            })
+
+        def elaboration_key(self):
+            return self.width
+
+        def elaborate(self, platform):
+            self.elaborated += 1
+            m = Module()
+            m.d.comb += self.o.eq(self.a + self.b)
+            return m
+
+    class Counter(wiring.Component):
+        en: wiring.In(1)
+        count: wiring.Out(4)
+
+        def elaboration_key(self):
+            return ()
+
+        def elaborate(self, platform):
+            m = Module()
+            with m.If(self.en):
+                m.d.sync += self.count.eq(self.count + 1)
+            return m
+
+    def test_memoized(self):
+        a = Signal(4)
+        b = Signal(4)
+        o1 = Signal(5)
+        o2 = Signal(5)
+        o3 = Signal(9)
+        m = Module()
+        m.submodules.u1 = u1 = self.Adder(4)
+        m.submodules.u2 = u2 = self.Adder(4)
+        m.submodules.u3 = u3 = self.Adder(8)
+        m.d.comb += [
+            u1.a.eq(a), u1.b.eq(b), o1.eq(u1.o),
+            u2.a.eq(a), u2.b.eq(1), o2.eq(u2.o),
+            u3.a.eq(Cat(a, b)), o3.eq(u3.o),
+        ]
+        self.assertRTLIL(m, [a, b, o1, o2, o3], R"""
+        attribute \generator "Amaranth"
+        attribute \top 1
+        module \top
+            wire width 4 \a$5
+            wire width 4 \b$6
+            wire width 5 \o
+            wire width 4 \a$8
+            wire width 4 \b$9
+            wire width 5 \o$10
+            wire width 8 \a$11
+            wire width 9 \o$12
+            wire width 4 input 0 \a
+            wire width 4 input 1 \b
+            wire width 5 output 2 \o1
+            wire width 5 output 3 \o2
+            wire width 9 output 4 \o3
+            cell \top.u1 \u1
+                connect \a \a [3:0]
+                connect \b \b [3:0]
+                connect \o \o1
+            end
+            cell \top.u1 \u2
+                connect \a \a [3:0]
+                connect \b 4'0001
+                connect \o \o2
+            end
+            cell \top.u3 \u3
+                connect \a { \b [3:0] \a [3:0] }
+                connect \b 8'00000000
+                connect \o \o3
+            end
+            connect \a$5 \a [3:0]
+            connect \b$6 \b [3:0]
+            connect \o \o1 [4:0]
+            connect \a$8 \a [3:0]
+            connect \b$9 4'0001
+            connect \o$10 \o2 [4:0]
+            connect \a$11 { \b [3:0] \a [3:0] }
+            connect \o$12 \o3 [8:0]
+        end
+        attribute \generator "Amaranth"
+        module \top.u1
+            wire width 4 input 0 \a
+            wire width 4 input 1 \b
+            wire width 5 output 2 \o
+            cell $add $1
+                parameter \A_SIGNED 0
+                parameter \B_SIGNED 0
+                parameter \A_WIDTH 4
+                parameter \B_WIDTH 4
+                parameter \Y_WIDTH 5
+                connect \A \a [3:0]
+                connect \B \b [3:0]
+                connect \Y \o
+            end
+        end
+        attribute \generator "Amaranth"
+        module \top.u3
+            wire width 8 input 0 \a
+            wire width 8 input 1 \b
+            wire width 9 output 2 \o
+            cell $add $1
+                parameter \A_SIGNED 0
+                parameter \B_SIGNED 0
+                parameter \A_WIDTH 8
+                parameter \B_WIDTH 8
+                parameter \Y_WIDTH 9
+                connect \A \a [7:0]
+                connect \B \b [7:0]
+                connect \Y \o
+            end
+        end
+        """)
+        self.assertEqual((u1.elaborated, u2.elaborated, u3.elaborated), (1, 0, 1))
+
+    def test_domain_variants(self):
+        m = Module()
+        m.domains.sync = ClockDomain()
+        m.domains.slow = ClockDomain(reset_less=True)
+        m.submodules.u1 = u1 = self.Counter()
+        m.submodules.u2 = u2 = self.Counter()
+        m.submodules.u3 = u3 = DomainRenamer("slow")(self.Counter())
+        rtlil_text = rtlil.convert(m, ports=[
+            u1.en, u2.en, u3.en, u1.count, u2.count, u3.count,
+            ClockSignal(), ResetSignal(), ClockSignal("slow"),
+        ], emit_src=False)
+        self.assertEqual(re.findall(r"(?:module|cell) \\top\S*", rtlil_text), [
+            R"module \top", R"cell \top.u1", R"cell \top.u1", R"cell \top.u3",
+            R"module \top.u1", R"module \top.u3",
+        ])
+        self.assertIn("connect \\clk \\slow_clk [0]\n    connect \\rst 1'0", rtlil_text)
+        # Only the variant with a reset resets the counter.
+        self.assertEqual(rtlil_text.count("switch \\rst"), 1)
+
+    def test_toplevel(self):
+        self.assertRTLIL(self.Adder(2), None, R"""
+        attribute \generator "Amaranth"
+        attribute \top 1
+        module \top
+            wire width 2 input 0 \a
+            wire width 2 input 1 \b
+            wire width 3 output 2 \o
+            cell \top.U$0 \U$0
+                connect \a \a [1:0]
+                connect \b \b [1:0]
+                connect \o \o
+            end
+        end
+        attribute \generator "Amaranth"
+        module \top.U$0
+            wire width 2 input 0 \a
+            wire width 2 input 1 \b
+            wire width 3 output 2 \o
+            cell $add $1
+                parameter \A_SIGNED 0
+                parameter \B_SIGNED 0
+                parameter \A_WIDTH 2
+                parameter \B_WIDTH 2
+                parameter \Y_WIDTH 3
+                connect \A \a [1:0]
+                connect \B \b [1:0]
+                connect \Y \o
+            end
+        end
+        """)
+
+    def test_simulation_unaffected(self):
+        m = Module()
+        m.submodules.u1 = u1 = self.Adder(4)
+        m.submodules.u2 = u2 = self.Adder(4)
+        Fragment.get(m, None)
+        self.assertEqual((u1.elaborated, u2.elaborated), (1, 1))
+
+    def test_wrong_interface(self):
+        class Adder(self.Adder):
+            def __init__(self, width, key):
+                super().__init__(width)
+                self.key = key
+
+            def elaboration_key(self):
+                return self.key
+
+        m = Module()
+        m.submodules.u1 = Adder(4, "k")
+        m.submodules.u2 = u2 = Adder(8, "k")
+        with self.assertRaisesRegex(ValueError,
+                r"^Elaboratable <.+> has the same elaboration key as <.+>, "
+                r"but a different interface$"):
+            rtlil.convert(m, ports=[u2.o])
+
+    def test_wrong_key(self):
+        class Adder(self.Adder):
+            def elaboration_key(self):
+                return [self.width]
+
+        m = Module()
+        m.submodules.u = u = Adder(4)
+        with self.assertRaisesRegex(TypeError,
+                r"^Elaboration key of <.+> must be hashable, not \[4\]$"):
+            rtlil.convert(m, ports=[u.o])
+
+    def test_no_signature(self):
+        class Adder(Elaboratable):
+            def elaboration_key(self):
+                return ()
+
+            def elaborate(self, platform):
+                return Module()
+
+        m = Module()
+        m.submodules.u = Adder()
+        with self.assertRaisesRegex(TypeError,
+                r"^Elaboratable <.+> has an elaboration key, but does not have a signature$"):
+            rtlil.convert(m, ports=[])
+
+    def make_nested(self):
+        class Pair(wiring.Component):
+            def __init__(self, width):
+                self.width = width
+                super().__init__({
+                    "a": wiring.In(width),
+                    "o": wiring.Out(width + 2),
+                })
+
+            def elaboration_key(self):
+                return self.width
+
+            def elaborate(this, platform):
+                m = Module()
+                m.submodules.lo = lo = self.Adder(this.width)
+                m.submodules.hi = hi = self.Adder(this.width + 1)
+                m.submodules.counter = counter = self.Counter()
+                m.d.comb += [
+                    lo.a.eq(this.a), lo.b.eq(this.a),
+                    hi.a.eq(lo.o), hi.b.eq(counter.count),
+                    counter.en.eq(this.a[0]),
+                    this.o.eq(hi.o),
+                ]
+                return m
+
+        m = Module()
+        m.domains.sync = ClockDomain()
+        m.domains.slow = ClockDomain(async_reset=True)
+        ports = [ClockSignal(), ResetSignal(), ClockSignal("slow"), ResetSignal("slow")]
+        for index, width in enumerate([4, 5, 4, 6, 5, 4]):
+            pair = Pair(width)
+            if index % 2:
+                pair = DomainRenamer("slow")(pair)
+            m.submodules[f"p{index}"] = pair
+            ports += [pair.a, pair.o]
+        return m, ports
+
+    def test_workers(self):
+        m, ports = self.make_nested()
+        serial = rtlil.convert(m, ports=ports)
+        self.assertEqual(len(re.findall(r"^module ", serial, re.M)), 12)
+        for workers in (2, 3, None):
+            m, ports = self.make_nested()
+            self.assertEqual(rtlil.convert(m, ports=ports, workers=workers), serial)
+
+    def test_workers_name_map(self):
+        def convert(workers):
+            m, ports = self.make_nested()
+            with _ir.memoize_elaboration():
+                fragment = Fragment.get(m, None)
+            _rtlil_text, name_map = rtlil.convert_fragment(fragment, ports, workers=workers)
+            return sorted((signal.name, name) for signal, name in name_map.items())
+
+        serial = convert(1)
+        self.assertIn(("count", ("top.p1.counter", "count")), serial)
+        self.assertEqual(convert(2), serial)
+
+    def test_workers_error(self):
+        class Loop(self.Adder):
+            def elaborate(self, platform):
+                m = super().elaborate(platform)
+                x = Signal()
+                m.d.comb += x.eq(~x)
+                return m
+
+        m = Module()
+        m.submodules.u1 = self.Adder(4)
+        m.submodules.u2 = u2 = Loop(4)
+        with self.assertRaisesRegex(CombinationalCycle,
+                r"^Combinational cycle detected, path:\n"):
+            rtlil.convert(m, ports=[u2.o], workers=2)
+
+    def test_wrong_workers(self):
+        m = Module()
+        with self.assertRaisesRegex(TypeError,
+                r"^Number of workers must be a positive integer, not 0$"):
+            rtlil.convert(m, ports=[], workers=0)
+
+
+class ModuleCacheTestCase(FHDLTestCase):
+    def make_design(self, *, stages=(1, 2, 3), prints=False):
+        m = Module()
+        a = Signal(8)
+        ports = [a]
+        for index, count in enumerate(stages):
+            sub = Module()
+            x = a
+            for stage in range(count):
+                y = Signal(8, name=f"y{stage}")
+                sub.d.sync += y.eq(x + stage + 1)
+                x = y
+            o = Signal(8, name=f"o{index}")
+            sub.d.comb += o.eq(x)
+            if prints:
+                sub.d.sync += [Print(o), Assert(o != 0)]
+            m.submodules[f"s{index}"] = sub
+            ports.append(o)
+        return Fragment.get(m, None), ports
+
+    def convert(self, cache=None, **kwargs):
+        fragment, ports = self.make_design(**kwargs)
+        rtlil_text, name_map = rtlil.convert_fragment(fragment, ports, cache=cache)
+        return rtlil_text, {signal.name: name for signal, name in name_map.items()}
+
+    def test_cached(self):
+        cache = rtlil.ModuleCache()
+        expected = self.convert()
+        self.assertEqual(self.convert(cache), expected)
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
+        self.assertEqual(self.convert(cache), expected)
+        self.assertEqual((cache.hits, cache.misses), (4, 4))
+
+    def test_changed(self):
+        cache = rtlil.ModuleCache()
+        self.convert(cache)
+        # Changing the first submodule renumbers every cell and net after it, but the other
+        # submodules are still found in the cache. (The toplevel module, which connects to
+        # the ports of the first submodule, is not.)
+        self.assertEqual(self.convert(cache, stages=(2, 2, 3)), self.convert(stages=(2, 2, 3)))
+        self.assertEqual((cache.hits, cache.misses), (2, 6))
+
+    def test_changed_priority(self):
+        cache = rtlil.ModuleCache()
+        self.convert(cache, prints=True)
+        # The priority of print and assertion cells depends on their global cell index, which
+        # changes together with the cells before them.
+        self.assertEqual(self.convert(cache, stages=(2, 2, 3), prints=True),
+                         self.convert(stages=(2, 2, 3), prints=True))
+        self.assertEqual(self.convert(cache, stages=(2, 2, 3), prints=True),
+                         self.convert(stages=(2, 2, 3), prints=True))
+        self.assertEqual(cache.hits, 4)
+
+    def test_changed_emitter(self):
+        from amaranth import _cache
+        cache = rtlil.ModuleCache()
+        self.convert(cache)
+        # Modules emitted by an edited emitter are not reused.
+        with unittest.mock.patch.object(_cache, "source_digest", return_value="edited"):
+            self.convert(cache)
+        self.assertEqual((cache.hits, cache.misses), (0, 8))
+
+    def test_path(self):
+        with tempfile.TemporaryDirectory() as path:
+            expected = self.convert(rtlil.ModuleCache(path))
+            self.assertEqual(len(os.listdir(path)), 4)
+            cache = rtlil.ModuleCache(path)
+            self.assertEqual(self.convert(cache), expected)
+            self.assertEqual((cache.hits, cache.misses), (4, 0))
+
+    def test_trim(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache = rtlil.ModuleCache(path)
+            self.convert(cache)
+            for entry in os.listdir(path):
+                os.utime(os.path.join(path, entry), (0, 0))
+            # The unchanged modules that are loaded are marked as recently used.
+            self.convert(cache, stages=(2, 2, 3))
+            self.assertEqual((cache.hits, cache.misses), (2, 6))
+            used = {entry for entry in os.listdir(path)
+                    if os.path.getmtime(os.path.join(path, entry)) != 0}
+            self.assertEqual(len(used), 4)
+            cache._trim(sum(os.path.getsize(os.path.join(path, entry)) for entry in used))
+            self.assertEqual(set(os.listdir(path)), used)
+            with unittest.mock.patch.object(rtlil, "_DISK_CACHE_LIMIT", 0):
+                self.convert(cache)
+            self.assertEqual(os.listdir(path), [])
+
+    def test_environment(self):
+        with tempfile.TemporaryDirectory() as path:
+            with unittest.mock.patch.dict(os.environ, {"AMARANTH_rtlil_cache": path}):
+                expected = self.convert()
+            self.assertEqual(len(os.listdir(path)), 4)
+            self.assertEqual(self.convert(rtlil.ModuleCache(path)), expected)
+
+    def test_wrong_cache(self):
+        fragment, ports = self.make_design()
+        with self.assertRaisesRegex(TypeError,
+                r"^Cache must be a ModuleCache or None, not 'cache'$"):
+            rtlil.convert_fragment(fragment, ports, cache="cache")
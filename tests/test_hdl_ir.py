@@ -7,6 +7,7 @@ from amaranth.hdl._cd import *
 from amaranth.hdl._dsl import *
 from amaranth.hdl._ir import *
 from amaranth.hdl._mem import *
+from amaranth.hdl import _nir
 from amaranth.hdl._nir import SignalField, CombinationalCycle
 from amaranth.hdl._xfrm import *
 
@@ -3456,6 +3457,52 @@ class CycleTestCase(FHDLTestCase):
                 r"$"):
             build_netlist(Fragment.get(m, None), [])
 
+    def test_cycle_wide(self):
+        a = Signal(8)
+        m = Module()
+        m.d.comb += a.eq(a + 1)
+        with self.assertRaisesRegex(CombinationalCycle,
+                r"^Combinational cycle detected, path:\n"
+                r".*test_hdl_ir.py:\d+: operator \+ bit 0\n"
+                r".*test_hdl_ir.py:\d+: signal a bit 0\n"
+                r"$"):
+            build_netlist(Fragment.get(m, None), [])
+
+    def test_cycles_all(self):
+        a = Signal()
+        b = Signal(2)
+        c = Signal()
+        m = Module()
+        m.d.comb += [
+            a.eq(~a),
+            b.eq(b[::-1]),
+        ]
+        m.d.sync += c.eq(~c)
+        with self.assertRaisesRegex(CombinationalCycle,
+                r"^Combinational cycle detected, path:\n"
+                r".*test_hdl_ir.py:\d+: operator ~ bit 0\n"
+                r".*test_hdl_ir.py:\d+: signal a bit 0\n"
+                r"Combinational cycle detected, path:\n"
+                r".*test_hdl_ir.py:\d+: signal b bit 1\n"
+                r".*test_hdl_ir.py:\d+: signal b bit 0\n"
+                r"$"):
+            build_netlist(Fragment.get(m, None), [])
+
+    def test_deep(self):
+        m = Module()
+        sigs = [Signal(name=f"s{i}") for i in range(5000)]
+        for x, y in zip(sigs, sigs[1:]):
+            m.d.comb += y.eq(~x)
+        build_netlist(Fragment.get(m, None), [sigs[0], sigs[-1]])
+        m = Module()
+        for x, y in zip(sigs, sigs[1:]):
+            m.d.comb += y.eq(~x)
+        m.d.comb += sigs[0].eq(sigs[-1])
+        with self.assertRaisesRegex(CombinationalCycle,
+                r"^Combinational cycle detected, path:\n"
+                r"(.*: (operator ~|signal s\d+) bit 0\n){9999}$"):
+            build_netlist(Fragment.get(m, None), [])
+
 
 class DomainLookupTestCase(FHDLTestCase):
     def test_domain_lookup(self):
@@ -3516,3 +3563,34 @@ class RequirePosedgeTestCase(FHDLTestCase):
         with self.assertRaisesRegex(DomainRequirementFailed,
                 r"^Domain test has a negedge clock, but posedge clock is required by top.U\$0 at .*$"):
             Fragment.get(m, None).prepare()
+
+
+class NetlistValueTestCase(FHDLTestCase):
+    def test_value(self):
+        value = _nir.Value(_nir.Net.from_cell(3, bit) for bit in range(4))
+        self.assertEqual(len(value), 4)
+        self.assertIsInstance(value[1], _nir.Net)
+        self.assertEqual((value[1].cell, value[1].bit), (3, 1))
+        self.assertEqual([net.bit for net in value], [0, 1, 2, 3])
+        self.assertEqual(value[1:3], _nir.Value.from_cell(3, 3)[1:])
+        self.assertEqual(value[::-1][0], value[-1])
+        self.assertIn(_nir.Net.from_cell(3, 2), value)
+        self.assertNotIn(_nir.Net.from_cell(4, 2), value)
+        self.assertEqual(repr(value), "3.0:4")
+        self.assertEqual(repr(value[:2] + _nir.Value.ones(2)), "(cat 3.0:2 2'd3)")
+
+    def test_value_hash(self):
+        value = _nir.Value.from_cell(2, 8)
+        self.assertEqual(hash(value), hash(_nir.Value(list(value))))
+        self.assertEqual({value: 1}[_nir.Value(value)], 1)
+        self.assertNotEqual(value, _nir.Value.from_cell(2, 7))
+
+    def test_value_const(self):
+        self.assertTrue(_nir.Value.from_const(5, 4).is_const)
+        self.assertFalse(_nir.Value.from_cell(1, 1).is_const)
+        self.assertIs(_nir.Net.from_const(1), _nir.Net.from_const(1))
+
+    def test_slots(self):
+        cell = _nir.Operator(0, operator="~", inputs=[_nir.Value.zeros(2)], src_loc=None)
+        with self.assertRaises(AttributeError):
+            cell.extra = None
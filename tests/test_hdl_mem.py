@@ -21,6 +21,24 @@ class MemoryDataTestCase(FHDLTestCase):
                 r"^Index 4 is out of bounds \(memory has 4 rows\)$"):
             data[4]
 
+    def test_init_sparse(self):
+        from amaranth.hdl import _mem
+        depth = _mem._SPARSE_MEMORY_DEPTH + 1
+        data = MemoryData(shape=8, depth=depth, init=[1, 2])
+        self.assertIsInstance(data.init._elems, _mem._SparseRows)
+        data.init[-1] = 3
+        self.assertEqual(len(data.init), depth)
+        self.assertEqual(data.init[1], 2)
+        self.assertEqual(data.init[2], 0)
+        self.assertEqual(data.init[depth - 1], 3)
+        self.assertEqual(data.init[:3], [1, 2, 0])
+        self.assertEqual(data.init[-2:], [0, 3])
+        self.assertEqual(data.init[1::depth - 2], [2, 3])
+        self.assertEqual(list(data.init), [1, 2] + [0] * (depth - 3) + [3])
+        self.assertEqual(data.init._raw[depth - 1], 3)
+        with self.assertRaises(IndexError):
+            data.init[depth]
+
     def test_row_elab(self):
         data = MemoryData(shape=8, depth=4, init=[])
         m = Module()
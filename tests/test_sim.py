@@ -1,5 +1,9 @@
 import os
+import json
+from random import Random
+import tempfile
 import warnings
+import unittest.mock
 from contextlib import contextmanager, redirect_stdout
 from io import StringIO
 from textwrap import dedent
@@ -12,6 +16,7 @@ from amaranth.hdl._mem import MemoryData
 from amaranth.hdl._ir import *
 from amaranth.sim import *
 from amaranth.sim._pyeval import eval_format
+from amaranth.sim.pysim import PySimEngine
 from amaranth.lib.memory import Memory
 from amaranth.lib import enum, data, wiring
 
@@ -1122,6 +1127,519 @@ class SimulatorIntegrationTestCase(FHDLTestCase):
             with _ignore_deprecated():
                 sim.add_process(process)
 
+    def test_memory_sparse(self):
+        m = Module()
+        m.submodules.memory = memory = Memory(shape=8, depth=1 << 20, init=[0xaa, 0x55])
+        wrport = memory.write_port()
+        rdport = memory.read_port(domain="comb")
+        with self.assertSimulation(m) as sim:
+            async def testbench(ctx):
+                state = sim._engine.state
+                self.assertEqual(
+                    type(state.slots[state.get_memory(memory.data)]).__name__,
+                    "_PySparseMemoryState")
+                ctx.set(rdport.addr, 1)
+                self.assertEqual(ctx.get(rdport.data), 0x55)
+                ctx.set(wrport.addr, 0xfffff)
+                ctx.set(wrport.data, 0x33)
+                ctx.set(wrport.en, 1)
+                await ctx.tick()
+                ctx.set(wrport.en, 0)
+                ctx.set(rdport.addr, 0xfffff)
+                self.assertEqual(ctx.get(rdport.data), 0x33)
+                ctx.set(memory.data[0][0:4], 0x5)
+                self.assertEqual(ctx.get(memory.data[0]), 0xa5)
+                self.assertEqual(ctx.get(memory.data[2]), 0x00)
+            sim.add_clock(1e-6)
+            sim.add_testbench(testbench)
+
+    def test_memory_sparse_vcd(self):
+        from amaranth.sim import pysim
+
+        m = Module()
+        m.submodules.small = small = Memory(shape=8, depth=2, init=[])
+        m.submodules.large = large = Memory(shape=8, depth=4, init=[])
+        sparse_memory_depth = pysim._SPARSE_MEMORY_DEPTH
+        try:
+            pysim._SPARSE_MEMORY_DEPTH = 2
+            for traces, large_rows in (((), 0), ((large.data,), 4)):
+                sim = Simulator(m)
+                output = StringIO()
+                with sim.write_vcd(output, traces=traces):
+                    sim.run()
+                names = [line.split()[4] for line in output.getvalue().split("\n")
+                         if line.startswith("$var")]
+                self.assertEqual(sum(name.startswith("\\small[") for name in names), 2)
+                self.assertEqual(sum(name.startswith("\\large[") for name in names), large_rows)
+        finally:
+            pysim._SPARSE_MEMORY_DEPTH = sparse_memory_depth
+
+    def test_memory_image(self):
+        m = Module()
+        m.submodules.memory = memory = Memory(shape=12, depth=6, init=[1, 2, 3, 4, 5, 6])
+        sim = Simulator(m)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "memory.bin")
+            with open(path, "wb") as f:
+                f.write(bytes([0x11, 0xf2, 0x33, 0x04]))
+            sim.load_memory(memory.data, path, start=1)
+            sim.run()
+            sim.dump_memory(memory.data, path)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), bytes([
+                    0x01, 0x00, 0x11, 0x02, 0x33, 0x04, 0x04, 0x00, 0x05, 0x00, 0x06, 0x00
+                ]))
+            sim.dump_memory(memory.data, path, start=1, count=2, byteorder="big")
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), bytes([0x02, 0x11, 0x04, 0x33]))
+            sim.dump_memory(memory.data, path, start=6)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"")
+
+            with open(path, "wb") as f:
+                f.write(bytes(3))
+            with self.assertRaisesRegex(ValueError,
+                    r"^Memory image size 3 is not a multiple of the row size 2$"):
+                sim.load_memory(memory.data, path)
+            with open(path, "wb") as f:
+                f.write(bytes(4))
+            with self.assertRaisesRegex(ValueError,
+                    r"^Memory image with 2 rows starting at address 5 does not fit into a memory "
+                    r"with depth 6$"):
+                sim.load_memory(memory.data, path, start=5)
+            with self.assertRaisesRegex(ValueError,
+                    r"^Memory range with 2 rows starting at address 5 is not within a memory "
+                    r"with depth 6$"):
+                sim.dump_memory(memory.data, path, start=5, count=2)
+            with self.assertRaisesRegex(TypeError,
+                    r"^Memory must be a MemoryData object, not 1$"):
+                sim.dump_memory(1, path)
+
+    def test_memory_image_large(self):
+        import tracemalloc
+
+        m = Module()
+        m.submodules.memory = memory = Memory(shape=8, depth=1 << 22, init=[1, 2])
+        sim = Simulator(m)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "memory.bin")
+            with open(path, "wb") as f:
+                f.write(bytes([1, 2]) + bytes(1 << 20) + bytes(range(256)) * (1 << 12))
+            tracemalloc.start()
+            try:
+                sim.load_memory(memory.data, path)
+                sim.advance()
+                _size, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            # The image is 2 MiB long, and its first half is the same as the initial contents.
+            self.assertLess(peak, 4 << 20)
+            sim.dump_memory(memory.data, path, start=(1 << 20) + 2, count=4)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), bytes([0, 1, 2, 3]))
+            sim.dump_memory(memory.data, path, start=0, count=3)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), bytes([1, 2, 0]))
+
+    def test_memory_bulk_access(self):
+        from array import array
+
+        for depth in (16, 1 << 20):
+            m = Module()
+            m.submodules.memory = memory = Memory(shape=12, depth=depth, init=[1, 2, 3])
+            rdport = memory.read_port(domain="comb")
+            with self.assertSimulation(m) as sim:
+                async def testbench(ctx):
+                    self.assertEqual(ctx.memory_read(memory.data, 0, 4),
+                                     bytes([1, 0, 2, 0, 3, 0, 0, 0]))
+                    ctx.memory_write(memory.data, 1, bytes([0x11, 0xf2, 0x33, 0x04]))
+                    self.assertEqual(ctx.memory_read(memory.data, 0, 4, byteorder="big"),
+                                     bytes([0, 1, 2, 0x11, 4, 0x33, 0, 0]))
+                    ctx.memory_write(memory.data, 3, array("H", [0xfff, 0x1234]))
+                    ctx.memory_write(memory.data, 5, [-1])
+                    self.assertEqual(ctx.memory_read(memory.data, 3, 3),
+                                     bytes([0xff, 0x0f, 0x34, 0x02, 0xff, 0x0f]))
+                    ctx.set(rdport.addr, 4)
+                    self.assertEqual(ctx.get(rdport.data), 0x234)
+                    ctx.memory_write(memory.data, 4, [0x567])
+                    self.assertEqual(ctx.get(rdport.data), 0x567)
+                    self.assertEqual(ctx.get(memory.data[4]), 0x567)
+                    self.assertEqual(ctx.memory_read(memory.data, depth, 0), b"")
+
+                    with self.assertRaisesRegex(ValueError,
+                            r"^Memory range with 2 rows starting at address \d+ is not within "
+                            r"a memory with depth \d+$"):
+                        ctx.memory_write(memory.data, depth - 1, [1, 2])
+                    with self.assertRaisesRegex(ValueError,
+                            r"^Memory range with 2 rows starting at address -1 is not within "
+                            r"a memory with depth \d+$"):
+                        ctx.memory_read(memory.data, -1, 2)
+                    with self.assertRaisesRegex(TypeError,
+                            r"^Memory must be a MemoryData object, not \(sig rdport__data\)$"):
+                        ctx.memory_read(rdport.data, 0, 1)
+                sim.add_testbench(testbench)
+
+    def test_memory_bulk_access_signed(self):
+        for depth in (16, 1 << 20):
+            m = Module()
+            m.submodules.memory = memory = Memory(shape=signed(8), depth=depth, init=[-1, 2])
+            rdport = memory.read_port(domain="comb")
+            with self.assertSimulation(m) as sim:
+                async def testbench(ctx):
+                    ctx.memory_write(memory.data, 1, [-5, 0xfd, 7])
+                    self.assertEqual(ctx.get(memory.data[1]), -5)
+                    self.assertEqual(ctx.get(memory.data[2]), -3)
+                    self.assertEqual(ctx.get(memory.data[3]), 7)
+                    ctx.set(rdport.addr, 2)
+                    self.assertEqual(ctx.get(rdport.data), -3)
+                    self.assertEqual(ctx.memory_read(memory.data, 0, 4),
+                                     bytes([0xff, 0xfb, 0xfd, 0x07]))
+                sim.add_testbench(testbench)
+
+    def test_memory_bulk_access_process(self):
+        m = Module()
+        m.submodules.memory = memory = Memory(shape=8, depth=4, init=[])
+        with self.assertSimulation(m) as sim:
+            async def process(ctx):
+                ctx.memory_write(memory.data, 0, b"\x01\x02")
+                with self.assertRaisesRegex(TypeError,
+                        r"^`.memory_read\(\)` cannot be used to sample memories in simulator "
+                        r"processes$"):
+                    ctx.memory_read(memory.data, 0, 2)
+                await ctx.delay(1e-6)
+            async def testbench(ctx):
+                await ctx.delay(1e-6)
+                self.assertEqual(ctx.memory_read(memory.data, 0, 4), b"\x01\x02\x00\x00")
+            sim.add_process(process)
+            sim.add_testbench(testbench)
+
+    def test_memory_bulk_access_vcd(self):
+        m = Module()
+        m.submodules.memory = memory = Memory(shape=8, depth=4, init=[])
+        sim = Simulator(m)
+        async def testbench(ctx):
+            await ctx.delay(1e-6)
+            ctx.memory_write(memory.data, 1, b"\x01\x02")
+            ctx.set(memory.data[0], 3)
+            ctx.memory_write(memory.data, 3, b"\x04")
+        sim.add_testbench(testbench)
+        output = StringIO()
+        with sim.write_vcd(output):
+            sim.run()
+        self.assertEqual(output.getvalue().split("#1000000000\n")[1], dedent("""\
+            b1 "
+            b10 #
+            b11 !
+            b100 $
+        """))
+
+    def setUp_checkpoint(self):
+        m = Module()
+        count = Signal(8)
+        delta = Signal(signed(6))
+        m.submodules.memory = memory = Memory(shape=signed(8), depth=16, init=[1, 2, 3])
+        wrport = memory.write_port()
+        rdport = memory.read_port(domain="comb")
+        m.d.sync += [count.eq(count + 1), delta.eq(delta - 1)]
+        m.d.comb += [
+            wrport.addr.eq(count),
+            wrport.data.eq(-count),
+            wrport.en.eq(1),
+            rdport.addr.eq(count - 3),
+        ]
+
+        samples = []
+        async def testbench(ctx):
+            for _ in range(5):
+                await ctx.tick()
+                samples.append((ctx.get(count), ctx.get(delta), ctx.get(rdport.data)))
+        return m, testbench, samples
+
+    def test_checkpoint(self):
+        m, testbench, samples = self.setUp_checkpoint()
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6, phase=0.3e-6)
+        sim.run_until(7.7e-6)
+        checkpoint = sim.save_state()
+        self.assertIsInstance(checkpoint, bytes)
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6, phase=0.3e-6)
+        async def reference(ctx):
+            await ctx.delay(7.7e-6)
+            await testbench(ctx)
+        sim.add_testbench(reference)
+        sim.run()
+        expected = samples[:]
+        self.assertEqual(expected[0], (9, -9, -6))
+
+        # The clock may be added before or after the checkpoint is restored.
+        for clock_first in (True, False):
+            with self.subTest(clock_first=clock_first):
+                samples.clear()
+                sim = Simulator(m)
+                if clock_first:
+                    sim.add_clock(1e-6, phase=0.3e-6)
+                sim.restore_state(checkpoint)
+                if not clock_first:
+                    sim.add_clock(1e-6, phase=0.3e-6)
+                sim.add_testbench(testbench)
+                sim.run()
+                self.assertEqual(samples, expected)
+
+        # Restoring the same simulator repeatedly restarts its testbenches from the checkpoint.
+        samples.clear()
+        sim.restore_state(bytearray(checkpoint))
+        sim.run()
+        self.assertEqual(samples, expected)
+
+    def test_checkpoint_sparse_memory(self):
+        import tracemalloc
+
+        m = Module()
+        m.submodules.memory = memory = Memory(shape=16, depth=1 << 22, init=[1, 2])
+        sim = Simulator(m)
+        async def testbench(ctx):
+            ctx.memory_write(memory.data, 0x1234, [5, 6])
+            await ctx.delay(1e-6)
+        sim.add_testbench(testbench)
+        sim.run()
+        tracemalloc.start()
+        try:
+            checkpoint = sim.save_state()
+            sim = Simulator(m)
+            sim.restore_state(checkpoint)
+            _size, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(len(checkpoint), 1 << 12)
+        # Neither saving nor restoring the checkpoint materializes all 4M rows.
+        self.assertLess(peak, 4 << 20)
+
+        async def testbench(ctx):
+            self.assertEqual(ctx.memory_read(memory.data, 0, 3), b"\x01\x00\x02\x00\x00\x00")
+            self.assertEqual(ctx.memory_read(memory.data, 0x1234, 2), b"\x05\x00\x06\x00")
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_checkpoint_signed_memory(self):
+        for depth in (16, 1 << 20):
+            with self.subTest(depth=depth):
+                m = Module()
+                m.submodules.memory = memory = Memory(shape=signed(8), depth=depth, init=[-1, 2])
+                sim = Simulator(m)
+                async def testbench(ctx):
+                    ctx.memory_write(memory.data, 2, [-3])
+                    await ctx.delay(1e-6)
+                sim.add_testbench(testbench)
+                sim.run()
+                checkpoint = sim.save_state()
+
+                sim = Simulator(m)
+                sim.restore_state(checkpoint)
+                async def testbench(ctx):
+                    self.assertEqual(ctx.get(memory.data[0]), -1)
+                    self.assertEqual(ctx.get(memory.data[1]), 2)
+                    self.assertEqual(ctx.get(memory.data[2]), -3)
+                    self.assertEqual(ctx.memory_read(memory.data, 0, 4), b"\xff\x02\xfd\x00")
+                sim.add_testbench(testbench)
+                sim.run()
+
+    def test_checkpoint_wrong(self):
+        m, _, _ = self.setUp_checkpoint()
+        sim = Simulator(m)
+        with self.assertRaisesRegex(TypeError,
+                r"^Checkpoint must be a bytes-like object, not 'foo'$"):
+            sim.restore_state("foo")
+        with self.assertRaisesRegex(ValueError,
+                r"^Data is not a simulation checkpoint$"):
+            sim.restore_state(b"foo")
+        checkpoint = sim.save_state()
+        with self.assertRaisesRegex(ValueError,
+                r"^Simulation checkpoint is corrupted$"):
+            sim.restore_state(checkpoint[:-1])
+
+        def counter(width):
+            m = Module()
+            count = Signal(width)
+            m.d.comb += count.eq(1)
+            return m
+        checkpoint_8 = Simulator(counter(8)).save_state()
+        sim = Simulator(counter(4))
+        with self.assertRaisesRegex(ValueError,
+                r"^Checkpoint contains signal 'top.count' with width 8, but it has width 4 in "
+                r"the design$"):
+            sim.restore_state(checkpoint_8)
+
+        sim = Simulator(Module())
+        with self.assertRaisesRegex(ValueError,
+                r"^Checkpoint contains signal 'top\.\w+', which is not a part of the design$"):
+            sim.restore_state(checkpoint)
+
+    def test_profile(self):
+        class Counter(Elaboratable):
+            def __init__(self):
+                self.en = Signal()
+                self.count = Signal(8)
+            def elaborate(self, platform):
+                m = Module()
+                with m.If(self.en):
+                    m.d.sync += self.count.eq(self.count + 1)
+                return m
+
+        m = Module()
+        m.submodules.counter = counter = Counter()
+        en = Signal()
+        m.d.comb += counter.en.eq(en)
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        async def testbench(ctx):
+            ctx.set(en, 1)
+            await ctx.tick().repeat(10)
+        async def process(ctx):
+            async for count, in ctx.changed(counter.count):
+                pass
+        sim.add_process(process)
+        with sim.profile() as profile:
+            sim.add_testbench(testbench)
+            with self.assertRaisesRegex(RuntimeError,
+                    r"^Simulation is already being profiled$"):
+                with sim.profile():
+                    pass
+            sim.run()
+
+        entries = {(entry.kind, entry.name, entry.domain): entry
+                   for entry in profile.entries(sort="name")}
+        self.assertEqual(list(entries), [
+            ("process", f"{self.test_profile.__qualname__}.<locals>.process", None),
+            ("trigger", f"{self.test_profile.__qualname__}.<locals>.process", None),
+            ("testbench", f"{self.test_profile.__qualname__}.<locals>.testbench", None),
+            ("trigger", f"{self.test_profile.__qualname__}.<locals>.testbench", None),
+            ("rtl", "top", "comb"),
+            ("rtl", "top.counter", "sync"),
+        ])
+        self.assertEqual(entries["rtl", "top.counter", "sync"].activations, 10)
+        self.assertEqual(entries["rtl", "top.counter", "sync"].changes, 10)
+        self.assertEqual(entries["testbench",
+                                 f"{self.test_profile.__qualname__}.<locals>.testbench",
+                                 None].changes, 1)
+        self.assertGreater(profile.time, 0)
+        self.assertGreater(profile.delta_cycles, 0)
+        self.assertGreaterEqual(profile.time, sum(entry.time for entry in entries.values()))
+        self.assertEqual([entry.activations for entry in profile.entries(sort="activations")],
+                         sorted((entry.activations for entry in entries.values()), reverse=True))
+
+        report = profile.report(limit=2)
+        self.assertEqual(len(report.splitlines()), 4)
+        self.assertRegex(report.splitlines()[-1], r"^total \d+\.\d+s in \d+ delta cycles$")
+
+        exported = json.loads(profile.to_json())
+        self.assertEqual(exported["delta_cycles"], profile.delta_cycles)
+        self.assertEqual(len(exported["entries"]), 6)
+        self.assertEqual(set(exported["entries"][0]),
+                         {"kind", "name", "domain", "activations", "time", "changes"})
+
+        for line in profile.to_collapsed().splitlines():
+            self.assertRegex(line, r"^simulation(;[^;]+)* \d+$")
+
+        with self.assertRaisesRegex(ValueError,
+                r"^Sort key must be one of 'time', 'activations', 'changes', 'name', not 'foo'$"):
+            profile.entries(sort="foo")
+
+        # Once profiling ends, the processes are no longer instrumented.
+        sim.reset()
+        sim.run()
+        self.assertEqual(entries["rtl", "top.counter", "sync"].activations, 10)
+
+    def test_collect_toggles(self):
+        m = Module()
+        count = Signal(4)
+        value = Signal(signed(7), init=-3)
+        bit = Signal()
+        m.d.sync += count.eq(count + 1)
+        m.d.comb += bit.eq(count[0] ^ (value == 0))
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+
+        random = Random(0)
+        values = [random.randrange(1, 64) * random.choice([-1, 1]) for _ in range(50)]
+        async def testbench(ctx):
+            for value_next in values:
+                ctx.set(value, value_next)
+                await ctx.tick()
+        sim.add_testbench(testbench)
+
+        tb_only = Signal(3)
+        with sim.collect_toggles(traces=[tb_only], exclude="top.rst") as toggles:
+            sim.run()
+        self.assertEqual(toggles.names, ["top.clk", "top.count", "top.bit", "top.value", "tb_only"])
+        self.assertEqual(toggles.rises("top.count"), [25, 13, 6, 3])
+        self.assertEqual(toggles.falls(count), [25, 12, 6, 3])
+        self.assertEqual(toggles.toggles(bit), 50)
+        self.assertEqual(toggles.rises(tb_only), [0, 0, 0])
+
+        expected_rises = [0] * 7
+        expected_falls = [0] * 7
+        for curr, next in zip([-3, *values], values):
+            for index in range(7):
+                curr_bit, next_bit = (curr >> index) & 1, (next >> index) & 1
+                expected_rises[index] += curr_bit < next_bit
+                expected_falls[index] += curr_bit > next_bit
+        self.assertEqual(toggles.rises(value), expected_rises)
+        self.assertEqual(toggles.falls(value), expected_falls)
+
+        self.assertEqual(toggles.uncovered(), [("tb_only", 0), ("tb_only", 1), ("tb_only", 2)])
+        self.assertEqual(toggles.coverage(), 1 - 3 / 16)
+        exported = json.loads(toggles.to_json())
+        self.assertEqual(exported["signals"][1],
+                         {"name": "top.count", "width": 4,
+                          "rises": [25, 13, 6, 3], "falls": [25, 12, 6, 3]})
+        self.assertEqual(toggles.to_csv().splitlines()[:3],
+                         ["name,bit,rises,falls", "top.clk,0,50,49", "top.count,0,25,25"])
+
+        with self.assertRaisesRegex(KeyError,
+                r"^\"Toggles of 'top.rst' are not being collected\"$"):
+            toggles.rises("top.rst")
+
+        # Transitions are no longer counted once collection ends.
+        sim.reset()
+        sim.run()
+        self.assertEqual(toggles.rises(count), [25, 13, 6, 3])
+
+    def test_collect_toggles_coverage(self):
+        m = Module()
+        a = Signal(2)
+        sim = Simulator(m)
+        async def testbench(ctx):
+            ctx.set(a, 0b01)
+            await ctx.delay(1e-6)
+            ctx.set(a, 0b10)
+            await ctx.delay(1e-6)
+            ctx.set(a, 0b11)
+        sim.add_testbench(testbench)
+        state = sim._engine._state
+        a_state = state.slots[state.get_signal(a)]
+        wakers = list(a_state.wakers)
+        with sim.collect_toggles(a) as toggles:
+            sim.run()
+        # The counters stop waking up once collection ends.
+        self.assertEqual(a_state.wakers, wakers)
+        self.assertEqual(toggles.rises(a), [2, 1])
+        self.assertEqual(toggles.falls(a), [1, 0])
+        self.assertEqual(toggles.uncovered(), [("a", 1)])
+        self.assertEqual(toggles.coverage(), 0.5)
+
+    def test_collect_toggles_wrong(self):
+        sim = Simulator(Module())
+        with self.assertRaisesRegex(TypeError,
+                r"^Include patterns must be a string or a list of strings, not 1$"):
+            sim.collect_toggles(include=1)
+        with self.assertRaisesRegex(TypeError,
+                r"^'foo' is not a traceable object$"):
+            with sim.collect_toggles(traces=["foo"]):
+                pass
+
     def test_vcd_wrong_nonzero_time(self):
         s = Signal()
         m = Module()
@@ -1150,6 +1668,108 @@ class SimulatorIntegrationTestCase(FHDLTestCase):
                 with sim.write_vcd(f, traces=(Cat(Signal(name="x"), Signal(name="")),)):
                     pass
 
+    def capture_vcd(self, capture):
+        count = Signal(8)
+        m = Module()
+        m.d.sync += count.eq(count + 1)
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        output = StringIO()
+        with sim.write_vcd(output, **capture(count)):
+            sim.run_until(50e-6)
+        return output.getvalue().split("$enddefinitions $end\n")[1].split("\n")
+
+    def test_vcd_window(self):
+        self.assertEqual(self.capture_vcd(lambda count: dict(start=5e-6, stop=7e-6)), [
+            "#5000000000", "$dumpvars", "0!", "0\"", "b101 #", "$end",
+            "#5500000000", "1!", "b110 #",
+            "#6000000000", "0!",
+            "#6500000000", "1!", "b111 #",
+            "#7000000000", "",
+        ])
+
+    def test_vcd_trigger(self):
+        self.assertEqual(self.capture_vcd(lambda count: dict(
+                trigger=count == 20, pre_trigger=1.5e-6, post_trigger=1e-6)), [
+            "#18000000000", "$dumpvars", "0!", "0\"", "b10010 #", "$end",
+            "#18500000000", "1!", "b10011 #",
+            "#19000000000", "0!",
+            "#19500000000", "1!", "b10100 #",
+            "#20000000000", "0!",
+            "#20500000000", "",
+        ])
+        self.assertEqual(self.capture_vcd(lambda count: dict(trigger=count == 100)), [
+            "#50000000000", "$dumpvars", "1!", "0\"", "b110010 #", "$end", "",
+        ])
+
+    def test_vcd_capture_wrong(self):
+        sim = Simulator(Module())
+        with self.assertRaisesRegex(ValueError,
+                r"^Capture stop time 1e-06 is earlier than start time 2e-06$"):
+            with open(os.path.devnull, "w") as f:
+                with sim.write_vcd(f, start=2e-6, stop=1e-6):
+                    pass
+        with self.assertRaisesRegex(ValueError,
+                r"^Pre-trigger and post-trigger intervals require a trigger$"):
+            with open(os.path.devnull, "w") as f:
+                with sim.write_vcd(f, pre_trigger=1e-6):
+                    pass
+
+    def filter_vcd(self, **kwargs):
+        m = Module()
+        m.submodules.cpu = cpu = Module()
+        pc = Signal(8)
+        cpu.d.sync += pc.eq(pc + 1)
+        count = Signal(4)
+        m.d.sync += count.eq(count + 1)
+        cpu.submodules.regfile = regfile = Memory(shape=8, depth=2, init=[])
+        write_port = regfile.write_port()
+        cpu.d.comb += [
+            write_port.addr.eq(pc[0]),
+            write_port.data.eq(pc),
+            write_port.en.eq(1),
+        ]
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        traced = []
+        async def testbench(ctx):
+            await ctx.tick()
+            traced.append({state.memory.name if hasattr(state, "memory") else state.signal.name
+                           for state in sim._engine._state.traced})
+        sim.add_testbench(testbench)
+        output = StringIO()
+        with sim.write_vcd(output, traces=kwargs.pop("traces", ()), **kwargs):
+            sim.run()
+        names = [line.split()[4] for line in output.getvalue().split("\n")
+                 if line.startswith("$var")]
+        return names, traced[0]
+
+    def test_vcd_filter(self):
+        self.assertEqual(self.filter_vcd(include="top.cpu.*", exclude="*.write_port__*"), (
+            ["clk", "rst", "pc", "\\regfile[0]", "\\regfile[1]", "clk", "rst"],
+            {"clk", "rst", "pc", "regfile"}
+        ))
+        self.assertEqual(self.filter_vcd(include=["top.count", "top.cpu.regfile"]), (
+            ["count", "\\regfile[0]", "\\regfile[1]"],
+            {"count", "regfile"}
+        ))
+        names, traced = self.filter_vcd(exclude="top.cpu.*", traces=[Signal(name="extra")])
+        self.assertEqual(names, ["extra", "clk", "rst", "count"])
+        self.assertEqual(traced, {"extra", "clk", "rst", "count"})
+
+    def test_vcd_filter_wrong(self):
+        sim = Simulator(Module())
+        with self.assertRaisesRegex(TypeError,
+                r"^Include patterns must be a string or a list of strings, not 1$"):
+            with open(os.path.devnull, "w") as f:
+                with sim.write_vcd(f, include=1):
+                    pass
+        with self.assertRaisesRegex(TypeError,
+                r"^Exclude patterns must be a string or a list of strings, not \[1\]$"):
+            with open(os.path.devnull, "w") as f:
+                with sim.write_vcd(f, exclude=[1]):
+                    pass
+
     def test_no_negated_boolean_warning(self):
         m = Module()
         a = Signal()
@@ -1424,6 +2044,245 @@ class SimulatorIntegrationTestCase(FHDLTestCase):
                 self.assertEqual(ctx.get(b), 0xdb)
             sim.add_testbench(testbench)
 
+    def test_many_delay_wakers(self):
+        sim = Simulator(Module())
+        wakeups = []
+        def make_testbench(n):
+            async def testbench(ctx):
+                for _ in range(3):
+                    await ctx.delay((n % 10 + 1) * 1e-9)
+                    wakeups.append((round(sim._engine.now / 1e6), n))
+            return testbench
+        for n in range(1000):
+            sim.add_testbench(make_testbench(n))
+        sim.run()
+        self.assertEqual(len(wakeups), 3000)
+        # Wakers with equal deadlines fire in the same timestep.
+        self.assertEqual(len({time for time, _n in wakeups}), 20)
+        for time, n in wakeups:
+            self.assertEqual(time % (n % 10 + 1), 0)
+        self.assertEqual(wakeups, sorted(wakeups, key=lambda wakeup: wakeup[0]))
+
+    def test_timeline(self):
+        from amaranth.sim.pysim import _PyTimeline
+        timeline = _PyTimeline()
+        fired = []
+        def make_waker(name):
+            return lambda: fired.append((timeline.now, name))
+        a, b, c = make_waker("a"), make_waker("b"), make_waker("c")
+        timeline.set_waker(10, a)
+        timeline.set_waker(20, b)
+        timeline.set_waker(10, c)
+        timeline.set_waker(30, a) # replaces the earlier deadline
+        self.assertTrue(timeline.advance())
+        self.assertEqual(timeline.now, 10)
+        self.assertTrue(timeline.advance())
+        self.assertEqual(timeline.now, 20)
+        timeline.set_waker(10, b)
+        self.assertTrue(timeline.advance())
+        self.assertEqual(timeline.now, 30)
+        self.assertFalse(timeline.advance())
+        self.assertEqual(fired, [(10, "c"), (20, "b"), (30, "a"), (30, "b")])
+        timeline.set_waker(5, c)
+        timeline.reset()
+        self.assertEqual(timeline.now, 0)
+        self.assertFalse(timeline.advance())
+
+    def test_run_until_clock(self):
+        m = Module()
+        count = Signal(8)
+        m.d.sync += count.eq(count + 1)
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        seen = []
+        async def testbench(ctx):
+            await ctx.delay(3.2e-6)
+            seen.append(ctx.get(count))
+        sim.add_testbench(testbench)
+        sim.run_until(10e-6)
+        self.assertEqual(seen, [3])
+        self.assertEqual(sim._engine.now, 10_000_000_000)
+        self.assertEqual(sim._engine.get_value(count), 10)
+
+    def test_testbench_order(self):
+        m = Module()
+        a = Signal()
+        b = Signal()
+        sim = Simulator(m)
+        order = []
+        async def testbench_b(ctx):
+            await ctx.changed(b)
+            order.append("b")
+        async def testbench_set(ctx):
+            await ctx.delay(1e-6)
+            ctx.set(a, 1)
+            order.append("set")
+        async def testbench_a(ctx):
+            await ctx.changed(a)
+            order.append("a")
+            ctx.set(b, 1)
+        sim.add_testbench(testbench_b)
+        sim.add_testbench(testbench_set)
+        sim.add_testbench(testbench_a)
+        sim.run()
+        self.assertEqual(order, ["set", "a", "b"])
+
+    def test_compiled_sampler(self):
+        m = Module()
+        a = Signal(signed(8), init=-3)
+        b = Signal(data.StructLayout({"x": 4, "y": signed(4)}))
+        mem = MemoryData(shape=8, depth=4, init=[1, 2, 3, 4])
+        m.d.sync += [a.eq(a + 1), b.y.eq(b.y - 1)]
+        a_slice = a[4:8]
+        mem_row = mem[1]
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        results = []
+        async def testbench(ctx):
+            for _ in range(3):
+                clk, rst, a_value, b_value, a_slice_value = \
+                    await ctx.tick().sample(a, b, a_slice)
+                _, _, row_value = await ctx.tick().sample(mem_row)
+                results.append((a_value, b_value.y, a_slice_value, row_value))
+        sim.add_testbench(testbench)
+        sim.run()
+        self.assertEqual(results, [(-3, 0, 15, 2), (-1, -2, 15, 2), (1, -4, 0, 2)])
+        # The values are compiled once they have been sampled twice; the memory row cannot be
+        # compiled, so it is evaluated instead.
+        self.assertEqual([callable(sampler) for _values, sampler in sim._engine._samplers.values()],
+                         [True, False])
+
+    def test_compiled_accessor(self):
+        m = Module()
+        a = Signal(signed(8))
+        b = Signal(data.StructLayout({"x": 4, "y": signed(4)}))
+        c = Signal(8)
+        d = Signal(8)
+        m.d.comb += d.eq(c + 1)
+        a_slice = a[4:8]
+        c_cat = Cat(c[4:8], c[0:4])
+        mem = MemoryData(shape=8, depth=4, init=[1, 2, 3, 4])
+        mem_row = mem[1]
+        sim = Simulator(m)
+        results = []
+        async def testbench(ctx):
+            for n in range(3):
+                ctx.set(a, -n)
+                ctx.set(b, {"x": n, "y": -n})
+                ctx.set(a_slice, n)
+                ctx.set(c_cat, 0x12 + n)
+                ctx.set(mem_row, ctx.get(mem_row) + 1)
+                results.append((ctx.get(a), ctx.get(b).x, ctx.get(b).y, ctx.get(a_slice),
+                                ctx.get(c), ctx.get(d), ctx.get(mem_row)))
+            with self.assertRaisesRegex(DriverConflict,
+                    r"^Combinationally driven signals cannot be overriden by testbenches$"):
+                ctx.set(d, 1)
+        sim.add_testbench(testbench)
+        sim.run()
+        self.assertEqual(results, [
+            (0,   0,  0, 0, 0x21, 0x22, 3),
+            (31,  1, -1, 1, 0x31, 0x32, 4),
+            (46,  2, -2, 2, 0x41, 0x42, 5),
+        ])
+        # A decoded view is reused while its value stays the same.
+        self.assertIs(sim._engine.get_accessor(b).get(), sim._engine.get_accessor(b).get())
+
+    def test_wake_only_affected_processes(self):
+        m = Module()
+        a = Array(Signal(8, name=f"a{n}") for n in range(8))
+        b = Array(Signal(8, name=f"b{n}") for n in range(8))
+        for n in range(8):
+            m.submodules[f"m{n}"] = sub = Module()
+            sub.d.comb += b[n].eq(a[n] + 1)
+        sim = Simulator(m)
+        runs = 0
+        for process in sim._engine._processes:
+            def counting_run(run=process.run):
+                nonlocal runs
+                runs += 1
+                run()
+            process.run = counting_run
+        async def testbench(ctx):
+            nonlocal runs
+            self.assertEqual(ctx.get(b[3]), 1)
+            runs = 0
+            ctx.set(a[3], 5)
+            self.assertEqual(ctx.get(b[3]), 6)
+            self.assertEqual(runs, 1)
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_levelized_comb(self):
+        from amaranth.sim.pysim import PySimEngine
+
+        class LevelizedPySimEngine(PySimEngine):
+            def __init__(self, design):
+                super().__init__(design, levelize=True)
+
+        m = Module()
+        a = Signal(8)
+        chain = [a]
+        for n in range(16):
+            m.submodules[f"chain{n}"] = sub = Module()
+            chain.append(Signal(8, name=f"s{n}"))
+            sub.d.comb += chain[-1].eq(chain[-2] + 1)
+        # `m1` and `m2` form a combinational cycle at the process level, but not at the signal level.
+        m.submodules.m1 = m1 = Module()
+        m.submodules.m2 = m2 = Module()
+        b = Signal(8)
+        c = Signal(8)
+        d = Signal(8)
+        m1.d.comb += b.eq(chain[-1])
+        m2.d.comb += c.eq(b + 1)
+        m1.d.comb += d.eq(c + 1)
+        sim = Simulator(m, engine=LevelizedPySimEngine)
+        async def testbench(ctx):
+            self.assertEqual(ctx.get(chain[-1]), 16)
+            self.assertEqual(ctx.get(d), 18)
+            delta_cycles = sim._engine._delta_cycles
+            ctx.set(a, 10)
+            self.assertEqual(sim._engine._delta_cycles - delta_cycles, 6)
+            self.assertEqual(ctx.get(chain[-1]), 26)
+            self.assertEqual(ctx.get(d), 28)
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_flattened(self):
+        from amaranth.sim.pysim import PySimEngine
+
+        class FlatPySimEngine(PySimEngine):
+            def __init__(self, design):
+                super().__init__(design, flatten=True)
+
+        m = Module()
+        a = Signal(8)
+        chain = [a]
+        for n in range(4):
+            m.submodules[f"chain{n}"] = sub = Module()
+            chain.append(Signal(8, name=f"s{n}"))
+            sub.d.comb += chain[-1].eq(chain[-2] + 1)
+            sub.d.sync += Signal(8, name=f"r{n}").eq(chain[-1])
+        m.submodules.mem = mem = Memory(shape=8, depth=4, init=[1, 2, 3, 4])
+        rd_comb = mem.read_port(domain="comb")
+        rd_sync = mem.read_port()
+        m.d.comb += [
+            rd_comb.addr.eq(chain[-1]),
+            rd_sync.addr.eq(chain[-1]),
+        ]
+        sim = Simulator(m, engine=FlatPySimEngine)
+        sim.add_clock(1e-6)
+        self.assertEqual(len(sim._engine._processes), 3)
+        async def testbench(ctx):
+            self.assertEqual(ctx.get(chain[-1]), 4)
+            self.assertEqual(ctx.get(rd_comb.data), 1)
+            ctx.set(a, 1)
+            self.assertEqual(ctx.get(chain[-1]), 5)
+            self.assertEqual(ctx.get(rd_comb.data), 2)
+            await ctx.tick()
+            self.assertEqual(ctx.get(rd_sync.data), 2)
+        sim.add_testbench(testbench)
+        sim.run()
+
 
 class SimulatorTracesTestCase(FHDLTestCase):
     def assertDef(self, traces, flat_traces):
@@ -1467,6 +2326,148 @@ class SimulatorTracesTestCase(FHDLTestCase):
         a = sig.create()
         self.assertDef(a, [a])
 
+    def test_value(self):
+        a = Signal(4)
+        b = Signal(4)
+        self.assertDef([a[1:3], Cat(a, b)], [a, b])
+
+    def test_memory(self):
+        mem = MemoryData(shape=8, depth=4, init=[])
+        self.assertDef([mem, mem[1]], [mem])
+
+
+class VCDWriterTestCase(FHDLTestCase):
+    def write(self, writer):
+        a = writer.register_var(("bench", "top"), "a", "wire", 1, 0)
+        b = writer.register_var(("bench", "top"), "b", "wire", 12, -1)
+        c = writer.register_var(("bench", "top", "sub"), "c", "wire", 300, 0)
+        d = writer.register_var(("bench",), "d", "string", 1, "x y")
+        writer.register_alias(("bench", "top", "sub"), "a", a)
+        writer.change(b, 0, 5)
+        for timestamp in range(1, 50):
+            writer.change(a, timestamp, timestamp & 1)
+            writer.change(b, timestamp, -timestamp)
+            writer.change(b, timestamp, -timestamp)
+            writer.change(c, timestamp, timestamp ** 50)
+            writer.change(d, timestamp, f"\\{timestamp % 3}\t\n ")
+        writer.close(100)
+
+    def test_compatible(self):
+        from vcd import VCDWriter as PyVCDWriter
+        from amaranth.sim._vcd import VCDWriter
+
+        expected = StringIO()
+        self.write(PyVCDWriter(expected, timescale="1 fs", date="today", comment="test"))
+        output = StringIO()
+        writer = VCDWriter(output, timescale="1 fs", comment="test", date="today")
+        writer.BLOCK_LINES = 4
+        self.write(writer)
+        self.assertEqual(output.getvalue(), expected.getvalue())
+
+    def test_empty(self):
+        from vcd import VCDWriter as PyVCDWriter
+        from amaranth.sim._vcd import VCDWriter
+
+        expected = StringIO()
+        PyVCDWriter(expected, timescale="1 fs", date="today").close(10)
+        output = StringIO()
+        writer = VCDWriter(output, timescale="1 fs", date="today")
+        writer.close(10)
+        self.assertEqual(output.getvalue(), expected.getvalue())
+
+
+class FSTWriterTestCase(FHDLTestCase):
+    def setUp(self):
+        try:
+            import pylibfst
+        except ImportError:
+            self.skipTest("pylibfst is not installed")
+
+    def read(self, path):
+        import pylibfst
+        from pylibfst import ffi, lib
+
+        reader = lib.fstReaderOpen(os.fsencode(path))
+        self.assertNotEqual(reader, ffi.NULL)
+        try:
+            _scopes, signals = pylibfst.get_scopes_signals2(reader)
+            names = {}
+            for name, signal in signals.by_name.items():
+                names.setdefault(signal.handle, []).append(name)
+            changes = {name: [] for name in signals.by_name}
+            def on_change(data, time, handle, value):
+                for name in names[handle]:
+                    changes[name].append((time, ffi.string(value).decode()))
+            def on_change_varlen(data, time, handle, value, length):
+                for name in names[handle]:
+                    changes[name].append((time, bytes(ffi.buffer(value, length)).decode()))
+            lib.fstReaderSetFacProcessMaskAll(reader)
+            pylibfst.fstReaderIterBlocks2(reader, on_change, on_change_varlen)
+            return lib.fstReaderGetTimescale(reader), changes
+        finally:
+            lib.fstReaderClose(reader)
+
+    def test_writer(self):
+        from amaranth.sim._fst import FSTWriter
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "test.fst")
+            writer = FSTWriter(path, timescale="1 fs", comment="test")
+            a = writer.register_var(("bench", "top"), "a", "wire", 1, 0)
+            b = writer.register_var(("bench", "top"), "b", "wire", 12, -1)
+            c = writer.register_var(("bench", "top", "sub"), "c", "wire", 100, 5)
+            d = writer.register_var(("bench",), "d", "string", 1, "x y")
+            writer.register_alias(("bench", "top", "sub"), "a", a)
+            writer.change(b, 0, 5)
+            for timestamp in (10, 20):
+                writer.change(a, timestamp, timestamp // 10 & 1)
+                writer.change(b, timestamp, -timestamp)
+                writer.change(b, timestamp, -timestamp)
+                writer.change(c, timestamp, 3 ** timestamp)
+                writer.change(d, timestamp, f"s{timestamp}")
+            writer.close(100)
+
+            timescale, changes = self.read(path)
+        self.assertEqual(timescale, -15)
+        self.assertEqual(changes, {
+            "bench.top.a": [(0, "0"), (10, "1"), (20, "0")],
+            "bench.top.sub.a": [(0, "0"), (10, "1"), (20, "0")],
+            "bench.top.b": [(0, "000000000101"), (10, "111111110110"), (20, "111111101100")],
+            "bench.top.sub.c": [
+                (0, format(5, "0100b")),
+                (10, format(3 ** 10, "0100b")),
+                (20, format(3 ** 20, "0100b")),
+            ],
+            "bench.d": [(0, "x y"), (10, "s10"), (20, "s20")],
+        })
+
+    def test_simulator(self):
+        m = Module()
+        count = Signal(4)
+        m.d.sync += count.eq(count + 1)
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "test.fst")
+            with sim.write_fst(path, traces=[count]):
+                sim.run_until(5e-6)
+            _timescale, changes = self.read(path)
+        self.assertEqual(changes["bench.top.count"], [
+            (0, "0000"),
+            (500_000_000, "0001"),
+            (1_500_000_000, "0010"),
+            (2_500_000_000, "0011"),
+            (3_500_000_000, "0100"),
+            (4_500_000_000, "0101"),
+        ])
+
+    def test_file_object(self):
+        sim = Simulator(Module())
+        with self.assertRaisesRegex(TypeError,
+                r"^FST file must be a path, not <_io\.StringIO object at .+>$"):
+            with sim.write_fst(StringIO()):
+                sim.run()
+
 
 class SimulatorRegressionTestCase(FHDLTestCase):
     def test_bug_325(self):
@@ -1505,6 +2506,18 @@ class SimulatorRegressionTestCase(FHDLTestCase):
                 r"which is unlikely to simulate in reasonable time$"):
             Simulator(dut)
 
+    def test_vcd_wide_field(self):
+        s = Signal(data.StructLayout({"a": 1 << 17, "b": 1}))
+        sim = Simulator(Module())
+        async def testbench(ctx):
+            ctx.set(s.a, 5)
+            await ctx.delay(1e-6)
+        sim.add_testbench(testbench)
+        output = StringIO()
+        with sim.write_vcd(output, traces=[s]):
+            sim.run()
+        self.assertIn("b101 ", output.getvalue())
+
     def test_bug_566(self):
         dut = Module()
         dut.d.sync += Signal().eq(0)
@@ -2100,3 +3113,586 @@ class SimulatorRegressionTestCase(FHDLTestCase):
         sim.reset()
         sim.add_process(process_empty) # should succeed
         sim.run() # suppress 'coroutine was never awaited' warning
+
+
+class PySimCodeCacheTestCase(FHDLTestCase):
+    def setUp(self):
+        from amaranth.sim import _pycache
+        self.cache = _pycache
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.env = os.environ.get("AMARANTH_pysim_cache")
+        os.environ["AMARANTH_pysim_cache"] = self.cache_dir.name
+        _pycache._memory_cache.clear()
+
+    def tearDown(self):
+        if self.env is None:
+            del os.environ["AMARANTH_pysim_cache"]
+        else:
+            os.environ["AMARANTH_pysim_cache"] = self.env
+        self.cache._memory_cache.clear()
+        self.cache_dir.cleanup()
+
+    def make_design(self, width=8):
+        m = Module()
+        a = Signal(width)
+        b = Signal(width)
+        mem = Memory(shape=width, depth=4, init=[1, 2])
+        m.submodules.mem = mem
+        rd = mem.read_port(domain="comb")
+        m.d.comb += [
+            rd.addr.eq(a),
+            b.eq(a + rd.data),
+        ]
+        with m.If(b < 20):
+            m.d.sync += a.eq(b)
+        m.d.sync += Assert(a < 20)
+        return m, b
+
+    def simulate(self, width=8, *, flatten=False):
+        m, b = self.make_design(width)
+        with unittest.mock.patch.dict(os.environ,
+                                      {"AMARANTH_pysim_flatten": "1" if flatten else ""}):
+            sim = Simulator(m)
+        sim.add_clock(1e-6)
+        async def testbench(ctx):
+            await ctx.tick().repeat(3)
+            self.assertEqual(ctx.get(b), 3)
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_reuse(self):
+        self.simulate()
+        entries = os.listdir(self.cache_dir.name)
+        self.assertEqual(len(entries), 1)
+
+        inodes = {entry: os.stat(os.path.join(self.cache_dir.name, entry)).st_ino
+                  for entry in entries}
+
+        self.cache._memory_cache.clear()
+        self.simulate()
+        # Entries are loaded from the disk rather than recompiled and replaced.
+        self.assertEqual({entry: os.stat(os.path.join(self.cache_dir.name, entry)).st_ino
+                          for entry in os.listdir(self.cache_dir.name)}, inodes)
+
+    def test_no_codegen(self):
+        from amaranth.sim._pyrtl import _FragmentCompiler
+        for flatten in (False, True):
+            with self.subTest(flatten=flatten):
+                self.simulate(flatten=flatten)
+                self.cache._memory_cache.clear()
+                # An unchanged design is simulated without generating any code.
+                with unittest.mock.patch.object(_FragmentCompiler, "_define_run",
+                                                side_effect=AssertionError):
+                    self.simulate(flatten=flatten)
+
+    def test_changed(self):
+        self.simulate()
+        self.simulate(width=6)
+        self.simulate(flatten=True)
+        self.assertEqual(len(os.listdir(self.cache_dir.name)), 3)
+
+    def test_changed_generator(self):
+        from amaranth import _cache
+        self.simulate()
+        self.cache._memory_cache.clear()
+        # Code generated by an edited code generator is not reused.
+        with unittest.mock.patch.object(_cache, "source_digest", return_value="edited"):
+            self.simulate()
+        self.assertEqual(len(os.listdir(self.cache_dir.name)), 2)
+
+    def test_corrupt(self):
+        self.simulate()
+        for entry in os.listdir(self.cache_dir.name):
+            with open(os.path.join(self.cache_dir.name, entry), "wb") as file:
+                file.write(b"\xff")
+        self.cache._memory_cache.clear()
+        self.simulate()
+
+    def test_disabled(self):
+        os.environ["AMARANTH_pysim_cache"] = "0"
+        self.simulate()
+        self.assertEqual(os.listdir(self.cache_dir.name), [])
+
+    def test_trim(self):
+        self.simulate()
+        self.simulate(width=6)
+        entries = sorted(os.listdir(self.cache_dir.name),
+            key=lambda entry: os.path.getmtime(os.path.join(self.cache_dir.name, entry)))
+        os.utime(os.path.join(self.cache_dir.name, entries[0]), (0, 0))
+        size = os.path.getsize(os.path.join(self.cache_dir.name, entries[1]))
+        self.cache.trim_cache(size)
+        self.assertEqual(os.listdir(self.cache_dir.name), [entries[1]])
+
+
+class LaneSimulatorTestCase(FHDLTestCase):
+    def simulate(self, dut, testbench, *, lanes, domains=("sync",)):
+        sim = Simulator(dut, lanes=lanes)
+        for domain in domains:
+            sim.add_clock(1e-6, domain=domain)
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_counter(self):
+        m = Module()
+        en = Signal()
+        count = Signal(8)
+        with m.If(en):
+            m.d.sync += count.eq(count + 1)
+        async def testbench(ctx):
+            ctx.set(en, [1, 0, 1, 1])
+            await ctx.tick().repeat(3)
+            self.assertEqual(ctx.get(count), [3, 0, 3, 3])
+            ctx.set(en, 1)
+            await ctx.tick().repeat(2)
+            self.assertEqual(ctx.get(count), [5, 2, 5, 5])
+        self.simulate(m, testbench, lanes=4)
+
+    def make_differential(self):
+        m = Module()
+        a = Signal(8)
+        b = Signal(signed(6))
+        c = Signal(3)
+        op = Signal(4)
+        exprs = [
+            a + b, a - b, a * b, a // c, b // 3, a % c, b % 5, a & b, a | b, a ^ b, ~a, -b,
+            a << c, b << c, a >> c, b >> c, b >> 9, a.shift_left(3), b.shift_right(2),
+            a.rotate_left(3), b.rotate_right(2), abs(b), b.replicate(2),
+            a == b, a != b, a < b, a <= b, a > b, a >= b, b < -3,
+            a.bool(), a.any(), a.all(), a.xor(), a.matches("1-0-1--0", "0000----"),
+            a.bit_select(c, 3), b.bit_select(c, 2), a.word_select(c, 2), Cat(a, b)[3:9],
+            Mux(c[0], a, b), Array([a, b, c])[c],
+        ]
+        outputs = []
+        for expr in exprs:
+            output = Signal.like(expr)
+            m.d.comb += output.eq(expr)
+            outputs.append(output)
+        r = Signal(8)
+        with m.Switch(op):
+            with m.Case(0, 1):
+                m.d.sync += r.eq(a)
+            with m.Case("1-1-"):
+                m.d.sync += r.eq(b)
+                with m.If(c > 3):
+                    m.d.sync += r.eq(c)
+            with m.Default():
+                m.d.sync += r[2:5].eq(c)
+        lhs = Signal(12)
+        m.d.sync += lhs.bit_select(c, 4).eq(a)
+        m.d.sync += Cat(lhs[10:], r[7]).eq(b)
+        m.submodules.mem = mem = Memory(shape=8, depth=8, init=[i * 3 for i in range(8)])
+        wr = mem.write_port(granularity=4)
+        rd_sync = mem.read_port(transparent_for=(wr,))
+        rd_comb = mem.read_port(domain="comb")
+        m.d.comb += [
+            wr.addr.eq(c), wr.data.eq(a), wr.en.eq(op[:2]),
+            rd_sync.addr.eq(b[:3]), rd_sync.en.eq(op[3]),
+            rd_comb.addr.eq(a[:3]),
+        ]
+        m.domains.ar = cd_ar = ClockDomain(async_reset=True)
+        count = Signal(4)
+        m.d.ar += count.eq(count + 1)
+        outputs += [r, lhs, rd_sync.data, rd_comb.data, count]
+        return m, [a, b, c, op, cd_ar.rst], outputs
+
+    def test_differential(self):
+        # Every lane must behave exactly like a separate simulation with the same stimuli.
+        lanes, cycles = 5, 20
+        rng = Random(0)
+        stimuli = [
+            [(rng.randrange(256), rng.randrange(-32, 32), rng.randrange(8), rng.randrange(16),
+              int(rng.random() < 0.2)) for _ in range(cycles)]
+            for _ in range(lanes)
+        ]
+
+        def trace(lane):
+            m, inputs, outputs = self.make_differential()
+            samples = []
+            async def testbench(ctx):
+                for cycle in range(cycles):
+                    for index, input in enumerate(inputs):
+                        if lane is None:
+                            ctx.set(input, [stimuli[l][cycle][index] for l in range(lanes)])
+                        else:
+                            ctx.set(input, stimuli[lane][cycle][index])
+                    await ctx.delay(1e-7)
+                    samples.append([ctx.get(output) for output in outputs])
+                    await ctx.tick()
+            self.simulate(m, testbench, lanes=None if lane is not None else lanes,
+                          domains=("sync", "ar"))
+            return samples
+
+        lane_samples = trace(None)
+        for lane in range(lanes):
+            for cycle, sample in enumerate(trace(lane)):
+                self.assertEqual(sample, [values[lane] for values in lane_samples[cycle]])
+
+    def test_shape_castable(self):
+        m = Module()
+        s = Signal(data.StructLayout({"x": 2, "y": signed(2)}))
+        y = Signal(signed(2))
+        m.d.comb += y.eq(s.y)
+        async def testbench(ctx):
+            ctx.set(s, [{"x": 1, "y": -1}, {"x": 2, "y": 1}])
+            self.assertEqual(ctx.get(s.x), [1, 2])
+            self.assertEqual(ctx.get(y), [-1, 1])
+            self.assertEqual([value.as_value().value for value in ctx.get(s)], [13, 6])
+        self.simulate(m, testbench, lanes=2, domains=())
+
+    def test_set_broadcast(self):
+        m = Module()
+        a = Signal(4)
+        async def testbench(ctx):
+            ctx.set(a, 5)
+            self.assertEqual(ctx.get(a), [5, 5, 5])
+            with self.assertRaisesRegex(ValueError,
+                    r"^Expected a list of 3 values, one for each lane, not 2$"):
+                ctx.set(a, [1, 2])
+        self.simulate(m, testbench, lanes=3, domains=())
+
+    def test_memory(self):
+        m = Module()
+        m.submodules.mem = mem = Memory(shape=4, depth=4, init=[1, 2, 3, 4])
+        async def testbench(ctx):
+            self.assertEqual(ctx.get(mem.data[1]), [2, 2, 2])
+            ctx.set(mem.data[1], [7, 8, 9])
+            self.assertEqual(ctx.get(mem.data[1]), [7, 8, 9])
+            self.assertEqual(ctx.get(mem.data[2]), [3, 3, 3])
+            ctx.memory_write(mem.data, 0, [5, 6])
+            self.assertEqual(ctx.get(mem.data[1]), [6, 6, 6])
+            with self.assertRaisesRegex(NotImplementedError,
+                    r"^Memories cannot be read in bulk when simulating several lanes$"):
+                ctx.memory_read(mem.data, 0, 2)
+        self.simulate(m, testbench, lanes=3, domains=())
+
+    def test_print_assert(self):
+        m = Module()
+        a = Signal(4)
+        m.d.comb += Print("a =", a)
+        m.d.comb += Assert(a != 7, "a must not be 7")
+        async def testbench(ctx):
+            ctx.set(a, [1, 2])
+            await ctx.delay(1e-6)
+            ctx.set(a, [3, 7])
+            await ctx.delay(1e-6)
+        output = StringIO()
+        with redirect_stdout(output):
+            with self.assertRaisesRegex(AssertionError,
+                    r"^Assertion violated in lane 1: a must not be 7$"):
+                self.simulate(m, testbench, lanes=2, domains=())
+        self.assertEqual(output.getvalue(), "a = 0\na = 0\na = 1\na = 2\na = 3\na = 7\n")
+
+    def test_edge_any_lane(self):
+        m = Module()
+        a = Signal()
+        b = Signal(4)
+        done = False
+        async def waiter(ctx):
+            nonlocal done
+            self.assertEqual(await ctx.posedge(a).changed(b), (False, [0, 3]))
+            self.assertEqual(await ctx.posedge(a), (True,))
+            self.assertEqual(ctx.get(a), [0, 1])
+            done = True
+        async def driver(ctx):
+            await ctx.delay(1e-6)
+            ctx.set(b, [0, 3])
+            await ctx.delay(1e-6)
+            ctx.set(a, [0, 1])
+        sim = Simulator(m, lanes=2)
+        sim.add_testbench(waiter)
+        sim.add_testbench(driver)
+        sim.run()
+        self.assertTrue(done)
+
+    def test_unsupported(self):
+        m = Module()
+        sim = Simulator(m, lanes=2)
+        with self.assertRaisesRegex(NotImplementedError,
+                r"^Waveforms cannot be captured when simulating several lanes$"):
+            with sim.write_vcd("test.vcd"):
+                pass
+        with self.assertRaisesRegex(NotImplementedError,
+                r"^Checkpoints are not supported when simulating several lanes$"):
+            sim.save_state()
+        with self.assertRaisesRegex(NotImplementedError,
+                r"^Toggles cannot be collected when simulating several lanes$"):
+            with sim.collect_toggles():
+                pass
+
+    def test_wrong_lanes(self):
+        m = Module()
+        with self.assertRaisesRegex(TypeError,
+                r"^Lane count must be a positive integer or None, not 0$"):
+            Simulator(m, lanes=0)
+        with self.assertRaisesRegex(TypeError,
+                r"^Lane count must be a positive integer or None, not True$"):
+            Simulator(m, lanes=True)
+        with self.assertRaisesRegex(ValueError,
+                r"^Simulation engine .+ does not support lockstep simulation$"):
+            Simulator(m, engine=PySimEngine, lanes=2)
+
+
+class RunManyTestCase(FHDLTestCase):
+    def make_counter(self):
+        m = Module()
+        m.count = Signal(8)
+        m.d.sync += m.count.eq(m.count + 1)
+        return m
+
+    def make_testbenches(self):
+        def make_testbench(cycles, expected):
+            def setup(sim, dut):
+                sim.add_clock(1e-6)
+                async def testbench(ctx):
+                    await ctx.tick().repeat(cycles)
+                    assert ctx.get(dut.count) == expected, "count mismatch"
+                sim.add_testbench(testbench)
+            return setup
+        return [make_testbench(n, n if n != 3 else 0) for n in range(1, 6)]
+
+    def assertResults(self, results):
+        results = sorted(results, key=lambda result: result.index)
+        self.assertEqual([result.index for result in results], [0, 1, 2, 3, 4])
+        self.assertEqual([result.passed for result in results], [True, True, False, True, True])
+        self.assertIsInstance(results[2].exception, AssertionError)
+        self.assertIn("count mismatch", results[2].traceback)
+        self.assertIn("make_testbench.<locals>.setup", results[2].name)
+
+    def test_forked(self):
+        self.assertResults(run_many(self.make_counter, self.make_testbenches(), workers=2))
+
+    def test_serial(self):
+        factory_calls = []
+        def design_factory():
+            factory_calls.append(None)
+            return self.make_counter()
+        self.assertResults(run_many(design_factory, self.make_testbenches(), workers=1))
+        self.assertEqual(len(factory_calls), 5)
+
+    def test_vcd_dir(self):
+        with tempfile.TemporaryDirectory() as vcd_dir:
+            results = list(run_many(self.make_counter, self.make_testbenches()[:2],
+                                    vcd_dir=vcd_dir))
+            for result in results:
+                self.assertEqual(result.vcd_file, os.path.join(vcd_dir, f"{result.index}.vcd"))
+                with open(result.vcd_file) as f:
+                    self.assertIn("count", f.read())
+
+    def test_worker_crash(self):
+        def setup(sim, dut):
+            os._exit(3)
+        result, = run_many(self.make_counter, [setup], workers=2)
+        self.assertIsInstance(result.exception, RuntimeError)
+        self.assertIn("exited with code 3", str(result.exception))
+
+    def test_unpicklable_exception(self):
+        class CustomError(Exception):
+            pass
+        def setup(sim, dut):
+            raise CustomError("bad")
+        result, = run_many(self.make_counter, [setup], workers=2)
+        self.assertIsInstance(result.exception, RuntimeError)
+        self.assertIn("CustomError('bad')", str(result.exception))
+
+    def test_wrong_workers(self):
+        with self.assertRaisesRegex(TypeError,
+                r"^Number of workers must be a positive integer, not 0$"):
+            run_many(self.make_counter, [], workers=0)
+
+
+class CxxSimEngineTestCase(FHDLTestCase):
+    def setUp(self):
+        from amaranth._toolchain import has_tool
+        from amaranth._toolchain.yosys import find_yosys, YosysError
+        try:
+            find_yosys(lambda ver: ver >= (0, 40))
+        except YosysError:
+            self.skipTest("Yosys 0.40 or later is not available")
+        if not has_tool("c++"):
+            self.skipTest("C++ compiler is not available")
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.env = os.environ.get("AMARANTH_cxxsim_cache")
+        os.environ["AMARANTH_cxxsim_cache"] = self.cache_dir.name
+
+    def tearDown(self):
+        if self.env is None:
+            del os.environ["AMARANTH_cxxsim_cache"]
+        else:
+            os.environ["AMARANTH_cxxsim_cache"] = self.env
+        self.cache_dir.cleanup()
+
+    def simulate(self, design, testbench, *, engine):
+        sim = Simulator(design, engine=engine)
+        sim.add_clock(1e-6, if_exists=True)
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_counter(self):
+        def make_design():
+            m = Module()
+            m.submodules.sub = sub = Module()
+            m.a = Signal(8)
+            m.b = Signal(8)
+            m.c = Signal(8)
+            sub.d.sync += m.b.eq(m.a + 1)
+            m.d.comb += m.c.eq(m.b * 2)
+            return m
+
+        for engine in ("pysim", "cxxrtl"):
+            with self.subTest(engine=engine):
+                results = []
+                m = make_design()
+                async def testbench(ctx):
+                    for value in range(5):
+                        ctx.set(m.a, value)
+                        _, _, b, c = await ctx.tick().sample(m.b, m.c)
+                        results.append((b, c, ctx.get(m.b), ctx.get(m.c)))
+                self.simulate(m, testbench, engine=engine)
+                if engine == "pysim":
+                    expected = results
+                else:
+                    self.assertEqual(results, expected)
+
+    def test_memory(self):
+        m = Module()
+        m.submodules.mem = mem = Memory(shape=8, depth=4, init=[1, 2, 3, 4])
+        rd = mem.read_port()
+        wr = mem.write_port()
+        async def testbench(ctx):
+            ctx.set(rd.addr, 2)
+            await ctx.tick()
+            self.assertEqual(ctx.get(rd.data), 3)
+            ctx.set(wr.addr, 2)
+            ctx.set(wr.data, 0x55)
+            ctx.set(wr.en, 1)
+            await ctx.tick()
+            ctx.set(wr.en, 0)
+            await ctx.tick()
+            self.assertEqual(ctx.get(rd.data), 0x55)
+            self.assertEqual(ctx.get(mem.data[2]), 0x55)
+            ctx.set(mem.data[3], 0xaa)
+            ctx.set(rd.addr, 3)
+            await ctx.tick()
+            self.assertEqual(ctx.get(rd.data), 0xaa)
+            ctx.memory_write(mem.data, 0, b"\x11\x22")
+            self.assertEqual(ctx.memory_read(mem.data, 0, 4), b"\x11\x22\x55\xaa")
+            ctx.set(rd.addr, 1)
+            await ctx.tick()
+            self.assertEqual(ctx.get(rd.data), 0x22)
+        self.simulate(m, testbench, engine="cxxrtl")
+
+    def test_memory_deep(self):
+        for engine in ("pysim", "cxxrtl"):
+            with self.subTest(engine=engine):
+                m = Module()
+                m.submodules.mem = mem = Memory(shape=40, depth=1 << 16, init=[1, 2])
+                wr = mem.write_port()
+                count = Signal(16)
+                m.d.sync += count.eq(count + 1)
+                m.d.comb += [
+                    wr.addr.eq(count + 0x8000),
+                    wr.data.eq(count * 0x1_0000_0001),
+                    wr.en.eq(1),
+                ]
+                results = []
+                async def testbench(ctx):
+                    results.append(ctx.get(mem.data[0]))
+                    ctx.memory_write(mem.data, 0xfffe, [0xff_0000_0001, 3])
+                    for _ in range(200):
+                        await ctx.tick()
+                    results.append(ctx.memory_read(mem.data, 0x8000 + 197, 4))
+                    results.append(ctx.memory_read(mem.data, 0xfffd, 3))
+                    ctx.set(mem.data[1], 5)
+                    await ctx.tick()
+                    results.append(ctx.memory_read(mem.data, 0, 3))
+                self.simulate(m, testbench, engine=engine)
+                if engine == "pysim":
+                    expected = results
+                    self.assertEqual(results[2], bytes(5) + bytes([1, 0, 0, 0, 0xff, 3, 0, 0, 0, 0]))
+                else:
+                    self.assertEqual(results, expected)
+
+    def test_print_assert(self):
+        m = Module()
+        a = Signal(8)
+        m.d.sync += Print("a =", a)
+        m.d.sync += Assert(a < 2, "a too large")
+        async def testbench(ctx):
+            for value in range(3):
+                ctx.set(a, value)
+                await ctx.tick()
+        output = StringIO()
+        with redirect_stdout(output):
+            with self.assertRaisesRegex(AssertionError, r"^Assertion violated: a too large$"):
+                self.simulate(m, testbench, engine="cxxrtl")
+        self.assertEqual(output.getvalue(), "a = 0\na = 1\na = 2\n")
+
+    def test_driver_conflict(self):
+        m = Module()
+        a = Signal(8)
+        m.d.comb += a.eq(1)
+        async def testbench(ctx):
+            ctx.set(a, 2)
+        with self.assertRaisesRegex(DriverConflict,
+                r"^Combinationally driven signals cannot be overriden by testbenches$"):
+            self.simulate(m, testbench, engine="cxxrtl")
+
+    def test_many_designs(self):
+        # Every design defines the same C++ symbols; they must not interfere with each other.
+        for width in range(1, 5):
+            m = Module()
+            a = Signal(width)
+            b = Signal(8)
+            m.d.comb += b.eq(Array(range(1, 1 << width + 1))[a])
+            async def testbench(ctx):
+                ctx.set(a, (1 << width) - 1)
+                self.assertEqual(ctx.get(b), 1 << width)
+            self.simulate(m, testbench, engine="cxxrtl")
+        self.assertEqual(len(os.listdir(self.cache_dir.name)), 4)
+
+    def test_collect_toggles(self):
+        for engine in ("pysim", "cxxrtl"):
+            with self.subTest(engine=engine):
+                m = Module()
+                count = Signal(4)
+                m.d.sync += count.eq(count + 1)
+                sim = Simulator(m, engine=engine)
+                sim.add_clock(1e-6)
+                async def testbench(ctx):
+                    await ctx.tick().repeat(10)
+                sim.add_testbench(testbench)
+                state = sim._engine._state
+                count_state = state.slots[state.get_signal(count)]
+                wakers = list(count_state.wakers)
+                with sim.collect_toggles(count) as toggles:
+                    sim.run()
+                # The counters stop waking up once collection ends.
+                self.assertEqual(count_state.wakers, wakers)
+                self.assertEqual(toggles.rises(count), [5, 3, 1, 1])
+                self.assertEqual(toggles.falls(count), [5, 2, 1, 0])
+
+    def test_chunk_accessors(self):
+        import ctypes
+        from amaranth.sim import cxxsim
+        for byteorder in ("little", "big"):
+            with self.subTest(byteorder=byteorder):
+                chunks = (ctypes.c_uint32 * 3)(0x33333333, 0x22222222, 0x1)
+                with unittest.mock.patch.object(cxxsim.sys, "byteorder", byteorder):
+                    read, write = cxxsim._chunk_accessors(chunks, 65)
+                self.assertEqual(read(), 0x1_22222222_33333333)
+                write(0x1_89abcdef_01234567)
+                self.assertEqual(list(chunks), [0x01234567, 0x89abcdef, 0x1])
+
+    def test_cache_trim(self):
+        from amaranth.sim import cxxsim
+        for width in range(1, 4):
+            m = Module()
+            a = Signal(width)
+            m.d.sync += a.eq(a + 1)
+            async def testbench(ctx):
+                await ctx.tick()
+                self.assertEqual(ctx.get(a), 1)
+            # Libraries used less recently than the newest one are evicted.
+            with unittest.mock.patch.object(cxxsim, "_DISK_CACHE_LIMIT", 0):
+                self.simulate(m, testbench, engine="cxxrtl")
+            self.assertEqual(len(os.listdir(self.cache_dir.name)), 1)
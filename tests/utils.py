@@ -1,7 +1,9 @@
 import os
 import re
+import atexit
 import shutil
 import subprocess
+import tempfile
 import textwrap
 import traceback
 import unittest
@@ -15,6 +17,14 @@ from amaranth._toolchain import require_tool
 __all__ = ["FHDLTestCase"]
 
 
+# Keep the code compiled by the simulators while running the tests out of the user's cache, and
+# start every test run with an empty cache.
+_cache_dir = tempfile.mkdtemp(prefix="amaranth_tests_")
+atexit.register(shutil.rmtree, _cache_dir, ignore_errors=True)
+os.environ["AMARANTH_pysim_cache"] = os.path.join(_cache_dir, "pysim")
+os.environ["AMARANTH_cxxsim_cache"] = os.path.join(_cache_dir, "cxxsim")
+
+
 class FHDLTestCase(unittest.TestCase):
     maxDiff = None
 